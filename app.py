@@ -33,6 +33,8 @@ from blueprints.admin.api import admin_api_bp
 from flask import Flask, render_template, jsonify
 from config import CurrentConfig
 from plataform_config import init_app
+from blueprints.services.request_profiler import init_request_profiler
+from blueprints.services.tracing import init_tracing
 from flask_cors import CORS
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
@@ -121,6 +123,11 @@ def create_app(config_class=None):
     app.register_blueprint(admin_bp)
     app.register_blueprint(admin_api_bp)
     
+    # Profiler por requisição (Server-Timing, log estruturado) e /metrics
+    init_request_profiler(app)
+    # Tracing por spans (desligado por padrão; TRACING_*)
+    init_tracing(app)
+    
     # Handler para erro 404
     @app.errorhandler(404)
     def not_found_error(error):
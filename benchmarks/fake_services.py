@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Servidores falsos das integrações externas (Bling, PagBank, Melhor Envio, ViaCEP)
+
+Um único servidor HTTP local responde pelas quatro integrações, cada uma sob
+um prefixo. A aplicação é apontada para ele pelas variáveis de ambiente
+BLING_API_BASE_URL, BLING_TOKEN_URL, PAGBANK_SANDBOX_API_URL,
+MELHOR_ENVIO_API_URL e VIACEP_API_URL (ver env_para_app()).
+
+As respostas têm o formato mínimo que os serviços da aplicação leem, e a
+latência de cada integração é configurável para simular a rede.
+
+Uso:
+    python benchmarks/fake_services.py --porta 8099 --latencia-ms 80
+"""
+import json
+import re
+import sys
+import time
+import uuid
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    # -------------------------------------------------------------------
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _ler_json(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        if not tamanho:
+            return {}
+        try:
+            return json.loads(self.rfile.read(tamanho) or b'{}')
+        except ValueError:
+            return {}
+
+    def _atender(self, metodo):
+        url = urlparse(self.path)
+        partes = url.path.strip('/').split('/', 1)
+        integracao = partes[0]
+        caminho = '/' + (partes[1] if len(partes) > 1 else '')
+        corpo = self._ler_json() if metodo in ('POST', 'PUT', 'PATCH') else {}
+
+        if integracao == '__stats':
+            return self._responder(200, self.server.estatisticas())
+
+        rota = {
+            'bling': self._bling,
+            'pagbank': self._pagbank,
+            'melhorenvio': self._melhor_envio,
+            'viacep': self._viacep,
+        }.get(integracao)
+        if rota is None:
+            return self._responder(404, {'error': f'integração desconhecida: {integracao}'})
+
+        self.server.registrar(integracao)
+        latencia = self.server.latencias.get(integracao, 0)
+        if latencia:
+            time.sleep(latencia / 1000.0)
+        status, resposta = rota(metodo, caminho, parse_qs(url.query), corpo)
+        self._responder(status, resposta)
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def do_PUT(self):
+        self._atender('PUT')
+
+    def do_PATCH(self):
+        self._atender('PATCH')
+
+    def do_DELETE(self):
+        self._atender('DELETE')
+
+    # -------------------------------------------------------------------
+    def _bling(self, metodo, caminho, query, corpo):
+        if caminho.endswith('/oauth/token'):
+            return 200, {
+                'access_token': 'bench-bling-token',
+                'refresh_token': 'bench-bling-refresh',
+                'token_type': 'Bearer',
+                'expires_in': 21600,
+            }
+        if '/estoques/saldos' in caminho:
+            ids = query.get('idsProdutos[]', [])
+            return 200, {'data': [
+                {'produto': {'id': int(i)}, 'saldoFisicoTotal': 50, 'saldoVirtualTotal': 50}
+                for i in ids if i.isdigit()
+            ]}
+        if metodo == 'GET':
+            return 200, {'data': []}
+        return 201 if metodo == 'POST' else 200, {'data': {'id': random.randint(10**9, 10**10)}}
+
+    def _pagbank(self, metodo, caminho, query, corpo):
+        if metodo != 'POST':
+            return 200, {'id': caminho.rsplit('/', 1)[-1], 'charges': []}
+        pedido_id = f"ORDE_{uuid.uuid4().hex[:32].upper()}"
+        valor = 0
+        for item in corpo.get('items', []):
+            valor += int(item.get('unit_amount', 0)) * int(item.get('quantity', 1))
+        if corpo.get('qr_codes'):
+            valor = corpo['qr_codes'][0].get('amount', {}).get('value', valor)
+            expira = (datetime.now() + timedelta(hours=1)).isoformat()
+            return 201, {
+                'id': pedido_id,
+                'reference_id': corpo.get('reference_id'),
+                'qr_codes': [{
+                    'id': f"QRCO_{uuid.uuid4().hex[:32].upper()}",
+                    'amount': {'value': valor},
+                    'expiration_date': expira,
+                    'text': '00020101021226830014br.gov.bcb.pix2561bench.example/pix',
+                    'links': [
+                        {'rel': 'QRCODE.PNG', 'href': 'http://localhost/qrcode.png', 'media': 'image/png', 'type': 'GET'},
+                        {'rel': 'QRCODE.BASE64', 'href': 'http://localhost/qrcode.base64', 'media': 'text/plain', 'type': 'GET'},
+                    ],
+                }],
+            }
+        cobrancas = corpo.get('charges') or [{}]
+        tipo = cobrancas[0].get('payment_method', {}).get('type', 'BOLETO')
+        valor = cobrancas[0].get('amount', {}).get('value', valor)
+        return 201, {
+            'id': pedido_id,
+            'reference_id': corpo.get('reference_id'),
+            'charges': [{
+                'id': f"CHAR_{uuid.uuid4().hex[:32].upper()}",
+                'status': 'WAITING' if tipo == 'BOLETO' else 'AUTHORIZED',
+                'amount': {'value': valor},
+                'payment_method': {
+                    'type': tipo,
+                    'boleto': {
+                        'barcode': '03399853012970000024227020901016278150000015630',
+                        'formatted_barcode': '03399.85301 29700.000242 27020.901016 2 78150000015630',
+                        'due_date': (datetime.now() + timedelta(days=3)).date().isoformat(),
+                    } if tipo == 'BOLETO' else None,
+                },
+                'links': [{'rel': 'SELF', 'href': 'http://localhost/boleto.pdf', 'media': 'application/pdf'}],
+            }],
+        }
+
+    def _melhor_envio(self, metodo, caminho, query, corpo):
+        if caminho.endswith('/shipment/calculate'):
+            return 200, [
+                {'id': 1, 'name': 'PAC', 'price': '24.90', 'custom_price': '24.90', 'delivery_time': 8,
+                 'custom_delivery_time': 8, 'company': {'id': 1, 'name': 'Correios', 'picture': ''}},
+                {'id': 2, 'name': 'SEDEX', 'price': '39.90', 'custom_price': '39.90', 'delivery_time': 3,
+                 'custom_delivery_time': 3, 'company': {'id': 1, 'name': 'Correios', 'picture': ''}},
+                {'id': 3, 'name': '.Package', 'price': '29.50', 'custom_price': '29.50', 'delivery_time': 6,
+                 'custom_delivery_time': 6, 'company': {'id': 2, 'name': 'Jadlog', 'picture': ''}},
+            ]
+        return 200, {'id': str(uuid.uuid4()), 'status': 'pending'}
+
+    def _viacep(self, metodo, caminho, query, corpo):
+        encontrado = re.search(r'/ws/(\d{8})/json', caminho)
+        if not encontrado:
+            return 400, {'erro': True}
+        return 200, {
+            'cep': f"{encontrado.group(1)[:5]}-{encontrado.group(1)[5:]}",
+            'logradouro': 'Rua de Benchmark',
+            'bairro': 'Centro',
+            'localidade': 'São Paulo',
+            'uf': 'SP',
+        }
+
+
+class FakeServicesServer(ThreadingHTTPServer):
+    """Servidor HTTP (uma thread por conexão) com contadores por integração"""
+
+    daemon_threads = True
+
+    def __init__(self, porta=0, latencias=None):
+        super().__init__(('127.0.0.1', porta), _Handler)
+        self.latencias = latencias or {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url_base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def registrar(self, integracao):
+        with self._lock:
+            self._contadores[integracao] = self._contadores.get(integracao, 0) + 1
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self._contadores)
+
+    def zerar_estatisticas(self):
+        with self._lock:
+            self._contadores.clear()
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True, name='fake-services')
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self.shutdown()
+        self.server_close()
+
+
+def env_para_app(url_base):
+    """Variáveis de ambiente que apontam a aplicação para os servidores falsos"""
+    return {
+        'BLING_API_BASE_URL': f"{url_base}/bling/Api/v3",
+        'BLING_TOKEN_URL': f"{url_base}/bling/Api/v3/oauth/token",
+        'PAGBANK_ENVIRONMENT': 'sandbox',
+        'PAGBANK_SANDBOX_API_URL': f"{url_base}/pagbank/orders",
+        'PAGBANK_API_TOKEN': 'bench-pagbank-token',
+        'MELHOR_ENVIO_API_URL': f"{url_base}/melhorenvio/api/v2/me",
+        'MELHOR_ENVIO_TOKEN': 'bench-melhor-envio-token',
+        'VIACEP_API_URL': f"{url_base}/viacep/ws/{{cep}}/json/",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidores falsos de Bling, PagBank, Melhor Envio e ViaCEP')
+    parser.add_argument('--porta', type=int, default=8099)
+    parser.add_argument('--latencia-ms', type=float, default=0, help='Latência simulada de todas as integrações')
+    args = parser.parse_args()
+
+    latencias = {nome: args.latencia_ms for nome in ('bling', 'pagbank', 'melhorenvio', 'viacep')}
+    servidor = FakeServicesServer(args.porta, latencias)
+    print(f"🧪 Servidores falsos em {servidor.url_base}")
+    for chave, valor in env_para_app(servidor.url_base).items():
+        print(f"   {chave}={valor}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
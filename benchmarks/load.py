@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga para os endpoints da loja e do checkout
+
+Cada cenário dispara requisições concorrentes (threads) por um tempo fixo e
+mede latência (p50/p95/p99), vazão e erros. Quando o banco tem a extensão
+pg_stat_statements, mede quantas consultas SQL cada requisição executa
+(delta de pg_stat_statements durante o cenário); sem ela, usa o header
+Server-Timing do profiler da aplicação.
+
+Os carrinhos usados são os anônimos criados por benchmarks/seed.py
+(X-Session-ID: bench-sessao-N); o checkout usa uma sessão nova por
+requisição (adiciona um item e fecha o pedido com PIX), medindo só o
+POST /api/checkout/process.
+
+Uso:
+    python benchmarks/load.py --url http://127.0.0.1:8000 --dsn postgresql://.../lhama_bench
+    python benchmarks/load.py --url ... --cenarios base_products,cart_view --duracao 30 --concorrencia 16
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import re
+
+import requests
+
+# Dados de checkout válidos para os validadores da aplicação
+_SHIPPING_INFO = {
+    'nome_recebedor': 'Cliente Bench',
+    'rua': 'Rua de Benchmark',
+    'numero': '100',
+    'complemento': '',
+    'bairro': 'Centro',
+    'cidade': 'São Paulo',
+    'estado': 'SP',
+    'cep': '01001000',
+    'telefone': '11999999999',
+    'email': 'bench@example.com',
+}
+_PAYMENT_DETAILS = {
+    'customer_name': 'Cliente Bench',
+    'customer_email': 'bench@example.com',
+    'customer_cpf_cnpj': '12345678909',
+    'phone_area': '11',
+    'phone_number': '999999999',
+}
+_SHIPPING_OPTION = {'name': 'PAC', 'price': 24.90, 'deadline': 8}
+
+# Server-Timing do profiler da aplicação: db;dur=12.3;desc="5 consultas"
+_SERVER_TIMING_DB_RE = re.compile(r'(?:^|,\s*)db;dur=([\d.]+);desc="(\d+)')
+
+
+class Contexto:
+    """Ids do catálogo sintético usados para montar as requisições"""
+
+    def __init__(self, nome_produto_ids, produto_ids, sessoes):
+        self.nome_produto_ids = nome_produto_ids
+        self.produto_ids = produto_ids
+        self.sessoes = sessoes
+
+    @classmethod
+    def do_banco(cls, dsn):
+        import psycopg2
+        conn = psycopg2.connect(dsn)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT id FROM nome_produto WHERE document_id LIKE 'bench-np-%' ORDER BY id")
+            nome_produto_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT id FROM produtos WHERE document_id LIKE 'bench-p-%' AND estoque > 0 ORDER BY id")
+            produto_ids = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT session_id FROM carrinhos WHERE session_id LIKE 'bench-sessao-%' ORDER BY id")
+            sessoes = [r[0] for r in cur.fetchall()]
+            cur.close()
+        finally:
+            conn.close()
+        if not nome_produto_ids or not produto_ids or not sessoes:
+            raise SystemExit("❌ Catálogo sintético não encontrado. Rode benchmarks/seed.py antes.")
+        return cls(nome_produto_ids, produto_ids, sessoes)
+
+
+# ---------------------------------------------------------------------------
+# Cenários: cada um recebe (http, url, ctx) e devolve a resposta medida.
+# Preparações (ex: adicionar item antes do checkout) ficam fora da medição
+# retornando uma função que faz a chamada medida.
+# ---------------------------------------------------------------------------
+
+def _base_products(http, url, ctx):
+    return lambda: http.get(f"{url}/api/base_products")
+
+
+def _store_filters(http, url, ctx):
+    return lambda: http.get(f"{url}/api/store/filters")
+
+
+def _base_product_detail(http, url, ctx):
+    nome_produto_id = random.choice(ctx.nome_produto_ids)
+    return lambda: http.get(f"{url}/api/base_products/{nome_produto_id}")
+
+
+def _cart_view(http, url, ctx):
+    headers = {'X-Session-ID': random.choice(ctx.sessoes)}
+    return lambda: http.get(f"{url}/api/cart", headers=headers)
+
+
+def _cart_add(http, url, ctx):
+    # Sessão nova: o carrinho existente não cresce entre execuções
+    headers = {'X-Session-ID': f"bench-tmp-{uuid.uuid4().hex}"}
+    corpo = {'product_id': random.choice(ctx.produto_ids), 'quantity': 1}
+    return lambda: http.post(f"{url}/api/cart/add", json=corpo, headers=headers)
+
+
+def _shipping_calculate(http, url, ctx):
+    headers = {'X-Session-ID': random.choice(ctx.sessoes)}
+    return lambda: http.post(f"{url}/api/shipping/calculate", json={'cep': '01310100'}, headers=headers)
+
+
+def _checkout(http, url, ctx):
+    headers = {'X-Session-ID': f"bench-tmp-{uuid.uuid4().hex}"}
+    http.post(f"{url}/api/cart/add", json={'product_id': random.choice(ctx.produto_ids), 'quantity': 1},
+              headers=headers)
+    corpo = {
+        'shipping_info': _SHIPPING_INFO,
+        'payment_details': _PAYMENT_DETAILS,
+        'payment_method': 'PIX',
+        'shipping_option': _SHIPPING_OPTION,
+    }
+    return lambda: http.post(f"{url}/api/checkout/process", json=corpo, headers=headers)
+
+
+CENARIOS = {
+    'base_products': _base_products,
+    'store_filters': _store_filters,
+    'base_product_detail': _base_product_detail,
+    'cart_view': _cart_view,
+    'cart_add': _cart_add,
+    'shipping_calculate': _shipping_calculate,
+    'checkout': _checkout,
+}
+
+# ---------------------------------------------------------------------------
+# Consultas por requisição (pg_stat_statements)
+# ---------------------------------------------------------------------------
+
+class ContadorConsultas:
+    """Total de chamadas do banco de benchmark registradas em pg_stat_statements"""
+
+    def __init__(self, dsn):
+        self.disponivel = False
+        self._conn = None
+        if not dsn:
+            return
+        try:
+            import psycopg2
+            self._conn = psycopg2.connect(dsn)
+            self._conn.autocommit = True
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+                self.disponivel = cur.fetchone() is not None
+            if self.disponivel:
+                self.total()
+            if not self.disponivel:
+                print("⚠️ Extensão pg_stat_statements não instalada; consultas por requisição virão do Server-Timing")
+        except Exception as e:
+            print(f"⚠️ pg_stat_statements indisponível ({e}); consultas por requisição virão do Server-Timing")
+            self.disponivel = False
+
+    def zerar(self):
+        if self.disponivel:
+            with self._conn.cursor() as cur:
+                cur.execute("SELECT pg_stat_statements_reset()")
+
+    def total(self):
+        if not self.disponivel:
+            return None
+        with self._conn.cursor() as cur:
+            cur.execute("""
+                SELECT COALESCE(SUM(calls), 0)
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                AND query NOT ILIKE '%pg_stat_statements%'
+            """)
+            return int(cur.fetchone()[0])
+
+    def fechar(self):
+        if self._conn:
+            self._conn.close()
+
+
+# ---------------------------------------------------------------------------
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    k = (len(valores_ordenados) - 1) * p / 100.0
+    baixo = int(k)
+    alto = min(baixo + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[baixo] + (valores_ordenados[alto] - valores_ordenados[baixo]) * (k - baixo)
+
+
+def executar_cenario(nome, url, ctx, duracao=20.0, concorrencia=8, aquecimento=2.0, contador=None):
+    """
+    Executa um cenário e devolve as métricas.
+
+    Returns:
+        Dict com requisicoes, erros, vazao_rps, latencia_ms (p50/p95/p99/media/max)
+        e consultas_por_requisicao (pg_stat_statements se disponível; senão, a média
+        do header Server-Timing das respostas medidas)
+    """
+    preparar = CENARIOS[nome]
+    latencias = []
+    erros = {}
+    banco = {'respostas': 0, 'consultas': 0, 'ms': 0.0}
+    lock = threading.Lock()
+    medindo = threading.Event()
+    parar = threading.Event()
+
+    def trabalhador():
+        http = requests.Session()
+        while not parar.is_set():
+            try:
+                chamada = preparar(http, url, ctx)
+                inicio = time.perf_counter()
+                resposta = chamada()
+                decorrido = (time.perf_counter() - inicio) * 1000.0
+                falha = None if resposta.status_code < 400 else f"HTTP {resposta.status_code}"
+                timing = _SERVER_TIMING_DB_RE.search(resposta.headers.get('Server-Timing', ''))
+            except requests.RequestException as e:
+                decorrido, falha, timing = None, type(e).__name__, None
+            if not medindo.is_set():
+                continue
+            with lock:
+                if falha:
+                    erros[falha] = erros.get(falha, 0) + 1
+                if decorrido is not None:
+                    latencias.append(decorrido)
+                if timing:
+                    banco['respostas'] += 1
+                    banco['ms'] += float(timing.group(1))
+                    banco['consultas'] += int(timing.group(2))
+        http.close()
+
+    threads = [threading.Thread(target=trabalhador, daemon=True) for _ in range(concorrencia)]
+    for t in threads:
+        t.start()
+    time.sleep(aquecimento)
+
+    if contador:
+        contador.zerar()
+    consultas_inicio = contador.total() if contador else None
+    with lock:
+        latencias.clear()
+        erros.clear()
+        banco.update(respostas=0, consultas=0, ms=0.0)
+    medindo.set()
+    inicio = time.monotonic()
+    time.sleep(duracao)
+    medindo.clear()
+    decorrido = time.monotonic() - inicio
+    with lock:
+        amostras = sorted(latencias)
+        erros_final = dict(erros)
+        banco_final = dict(banco)
+    consultas_fim = contador.total() if contador else None
+    parar.set()
+    for t in threads:
+        t.join(timeout=30)
+
+    total = len(amostras) + sum(v for k, v in erros_final.items() if not k.startswith('HTTP'))
+    consultas = None
+    if consultas_inicio is not None and consultas_fim is not None and total:
+        # Contadores de todo o banco: inclui as preparações do cenário (ex: /cart/add antes do checkout)
+        consultas = round((consultas_fim - consultas_inicio) / total, 2)
+    elif banco_final['respostas']:
+        consultas = round(banco_final['consultas'] / banco_final['respostas'], 2)
+    tempo_banco = round(banco_final['ms'] / banco_final['respostas'], 2) if banco_final['respostas'] else None
+
+    return {
+        'requisicoes': total,
+        'erros': erros_final,
+        'vazao_rps': round(total / decorrido, 2) if decorrido else 0,
+        'latencia_ms': {
+            'p50': _arredondar(percentil(amostras, 50)),
+            'p95': _arredondar(percentil(amostras, 95)),
+            'p99': _arredondar(percentil(amostras, 99)),
+            'media': _arredondar(sum(amostras) / len(amostras)) if amostras else None,
+            'max': _arredondar(amostras[-1]) if amostras else None,
+        },
+        'consultas_por_requisicao': consultas,
+        'tempo_banco_ms_medio': tempo_banco,
+        'duracao_segundos': round(decorrido, 2),
+        'concorrencia': concorrencia,
+    }
+
+
+def _arredondar(valor):
+    return round(valor, 2) if valor is not None else None
+
+
+def executar(url, dsn, cenarios=None, duracao=20.0, concorrencia=8, aquecimento=2.0):
+    """Executa os cenários em sequência. Returns: {nome: métricas}"""
+    ctx = Contexto.do_banco(dsn)
+    contador = ContadorConsultas(dsn)
+    resultados = {}
+    try:
+        for nome in cenarios or list(CENARIOS):
+            print(f"🚀 {nome}: {concorrencia} clientes por {duracao:.0f}s...")
+            resultado = executar_cenario(nome, url, ctx, duracao, concorrencia, aquecimento,
+                                         contador if contador.disponivel else None)
+            lat = resultado['latencia_ms']
+            print(f"   {resultado['requisicoes']} req, {resultado['vazao_rps']} req/s, "
+                  f"p50={lat['p50']}ms p95={lat['p95']}ms p99={lat['p99']}ms, "
+                  f"consultas/req={resultado['consultas_por_requisicao']}, erros={resultado['erros'] or 0}")
+            resultados[nome] = resultado
+    finally:
+        contador.fechar()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste de carga dos endpoints da loja e do checkout')
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='URL base da aplicação')
+    parser.add_argument('--dsn', default=os.environ.get('BENCH_DATABASE_URL'),
+                        help='DSN do banco de benchmark (padrão: BENCH_DATABASE_URL)')
+    parser.add_argument('--cenarios', help=f"Lista separada por vírgula (padrão: todos: {','.join(CENARIOS)})")
+    parser.add_argument('--duracao', type=float, default=20.0, help='Segundos medidos por cenário')
+    parser.add_argument('--concorrencia', type=int, default=8, help='Clientes simultâneos')
+    parser.add_argument('--aquecimento', type=float, default=2.0, help='Segundos de aquecimento por cenário')
+    parser.add_argument('--saida', help='Grava os resultados em JSON neste arquivo')
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error('Informe --dsn ou BENCH_DATABASE_URL')
+    cenarios = args.cenarios.split(',') if args.cenarios else None
+    desconhecidos = [c for c in cenarios or [] if c not in CENARIOS]
+    if desconhecidos:
+        parser.error(f"Cenários desconhecidos: {', '.join(desconhecidos)}")
+
+    resultados = executar(args.url, args.dsn, cenarios, args.duracao, args.concorrencia, args.aquecimento)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump({'cenarios': resultados}, f, indent=2, ensure_ascii=False)
+        print(f"📄 Resultados gravados em {args.saida}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -501,6 +501,17 @@ def sync_transportadoras():
             "message": f"Erro ao sincronizar transportadoras: {str(e)}"
         }), 500
 
+@admin_api_bp.route('/sistema/db-pool', methods=['GET'])
+@admin_required_email
+def db_pool_stats():
+    """Situação do pool de conexões do banco neste processo (em uso, ociosas, aguardando)"""
+    from ...services.db import get_pool_stats
+    
+    return jsonify({
+        "success": True,
+        "pool": get_pool_stats()
+    }), 200
+
 @admin_api_bp.route('/validate-strapi-access', methods=['POST'])
 def validate_strapi_access():
     """
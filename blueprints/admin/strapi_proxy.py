@@ -8,6 +8,7 @@ from flask import request, Response, current_app
 import requests
 from . import admin_bp
 from .decorators import admin_required_email
+from ..services.http_client import http_request
 
 # URL base do Strapi (configurável via variável de ambiente)
 # No Docker, usa o nome do serviço para comunicação interna
@@ -35,7 +36,7 @@ def admin_root():
             headers[header_name] = request.headers[header_name]
     
     try:
-        resp = requests.get(strapi_url, headers=headers, timeout=30, stream=True, allow_redirects=False)
+        resp = http_request('strapi', 'GET', strapi_url, headers=headers, timeout=30, stream=True, allow_redirects=False)
         
         response_headers = {}
         excluded_headers = ['content-encoding', 'content-length', 'transfer-encoding', 'connection']
@@ -133,20 +134,8 @@ def strapi_proxy(path):
     
     # Fazer requisição para o Strapi
     try:
-        if request.method == 'GET':
-            resp = requests.get(strapi_url, **request_kwargs)
-        elif request.method == 'POST':
-            resp = requests.post(strapi_url, **request_kwargs)
-        elif request.method == 'PUT':
-            resp = requests.put(strapi_url, **request_kwargs)
-        elif request.method == 'DELETE':
-            resp = requests.delete(strapi_url, **request_kwargs)
-        elif request.method == 'PATCH':
-            resp = requests.patch(strapi_url, **request_kwargs)
-        elif request.method == 'OPTIONS':
-            resp = requests.options(strapi_url, **request_kwargs)
-        elif request.method == 'HEAD':
-            resp = requests.head(strapi_url, **request_kwargs)
+        if request.method in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS', 'HEAD']:
+            resp = http_request('strapi', request.method, strapi_url, **request_kwargs)
         else:
             current_app.logger.warning(f"Método HTTP não suportado: {request.method}")
             return Response(
@@ -23,8 +23,9 @@ import json
 
 from ..services import get_db
 import psycopg2.extras
-from ..services.bling_api_service import BlingAPIError, BlingErrorType
+from ..services.bling_api_service import BlingAPIError, BlingErrorType, invalidate_bling_token_cache
 from ..admin.decorators import admin_required_email
+from ..services.http_client import http_request
 
 bling_bp = Blueprint('bling', __name__, url_prefix='/api/bling')
 
@@ -306,7 +307,7 @@ def exchange_code_for_token(code: str) -> dict:
     
     O Bling requer autenticação Basic Auth com client_id:client_secret
     """
-    BLING_TOKEN_URL = "https://www.bling.com.br/Api/v3/oauth/token"
+    BLING_TOKEN_URL = current_app.config.get('BLING_TOKEN_URL', "https://www.bling.com.br/Api/v3/oauth/token")
     
     client_id = current_app.config['BLING_CLIENT_ID']
     client_secret = current_app.config['BLING_CLIENT_SECRET']
@@ -328,7 +329,9 @@ def exchange_code_for_token(code: str) -> dict:
     }
     
     try:
-        response = requests.post(
+        response = http_request(
+            'bling',
+            'POST',
             BLING_TOKEN_URL,
             data=data,
             headers=headers,
@@ -391,6 +394,7 @@ def store_bling_tokens(access_token: str, refresh_token: str = None,
         """, (access_token, refresh_token, token_type, expires_at))
         
         conn.commit()
+        invalidate_bling_token_cache()
         
         current_app.logger.info(f"Tokens Bling armazenados. Expira em: {expires_at}")
         return True
@@ -471,6 +475,7 @@ def revoke_bling_authorization():
     try:
         cur.execute("DELETE FROM bling_tokens WHERE id = 1")
         conn.commit()
+        invalidate_bling_token_cache()
         
         current_app.logger.info("Autorização Bling revogada")
         
@@ -499,72 +504,40 @@ def refresh_bling_token_endpoint():
     POST /api/bling/refresh-token
     """
     try:
-        from ..services.bling_api_service import refresh_bling_token
+        from ..services.bling_api_service import get_valid_access_token
+        
+        # Renovação com lock na linha de bling_tokens (single-flight entre workers)
+        try:
+            get_valid_access_token(force_refresh=True)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e),
+                'authorize_url': '/api/bling/authorize'
+            }), 400
         
         conn = get_db()
         cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
         
         try:
-            # Buscar refresh_token do banco
             cur.execute("""
-                SELECT refresh_token, expires_at
+                SELECT expires_at
                 FROM bling_tokens
                 WHERE id = 1
             """)
-            
             token_data = cur.fetchone()
-            
-            if not token_data or not token_data.get('refresh_token'):
-                return jsonify({
-                    'success': False,
-                    'error': 'Refresh token não encontrado. É necessário autorizar novamente.',
-                    'authorize_url': '/api/bling/authorize'
-                }), 400
-            
-            refresh_token = token_data['refresh_token']
-            expires_at = token_data['expires_at']
-            
-            # Renovar token
-            new_tokens = refresh_bling_token(refresh_token)
-            
-            if not new_tokens:
-                return jsonify({
-                    'success': False,
-                    'error': 'Falha ao renovar token. Pode estar expirado ou bloqueado por rate limiting.',
-                    'expires_at': expires_at.isoformat() if expires_at else None
-                }), 500
-            
-            # Atualizar tokens no banco
-            new_expires_at = datetime.now() + timedelta(seconds=new_tokens.get('expires_in', 3600))
-            cur.execute("""
-                UPDATE bling_tokens
-                SET access_token = %s,
-                    refresh_token = %s,
-                    expires_at = %s,
-                    updated_at = NOW()
-                WHERE id = 1
-            """, (
-                new_tokens['access_token'],
-                new_tokens.get('refresh_token', refresh_token),
-                new_expires_at
-            ))
-            
-            conn.commit()
-            
-            current_app.logger.info(f"✅ Token Bling renovado via endpoint. Expira em: {new_expires_at}")
-            
-            return jsonify({
-                'success': True,
-                'message': 'Token renovado com sucesso',
-                'expires_at': new_expires_at.isoformat(),
-                'expires_in': new_tokens.get('expires_in', 3600)
-            }), 200
-            
-        except Exception as e:
-            conn.rollback()
-            raise e
+            new_expires_at = token_data['expires_at'] if token_data else None
         finally:
             cur.close()
+        
+        current_app.logger.info(f"✅ Token Bling renovado via endpoint. Expira em: {new_expires_at}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Token renovado com sucesso',
+            'expires_at': new_expires_at.isoformat() if new_expires_at else None,
+            'expires_in': int((new_expires_at - datetime.now()).total_seconds()) if new_expires_at else None
+        }), 200
             
     except Exception as e:
         current_app.logger.error(f"Erro ao renovar token: {e}")
@@ -596,6 +569,24 @@ def bling_status():
     return jsonify(info), 200
 
 
+@bling_bp.route('/rate-limit', methods=['GET'])
+@admin_required_email
+def bling_rate_limit_status():
+    """
+    Situação do rate limiter compartilhado do Bling
+    
+    GET /api/bling/rate-limit
+    Retorna tokens disponíveis no bucket e tempos de espera observados neste processo
+    """
+    from ..services.bling_api_service import _rate_limiter
+    
+    try:
+        return jsonify({'success': True, 'rate_limit': _rate_limiter.get_status()}), 200
+    except Exception as e:
+        current_app.logger.error(f"Erro ao consultar rate limiter do Bling: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @bling_bp.route('/test-auth', methods=['GET'])
 def test_bling_auth():
     """
@@ -891,6 +882,9 @@ def sync_product(produto_id: int):
 def sync_all_products():
     """
     Sincroniza todos os produtos com Bling
+    
+    Resposta: success (bool) e synced (produtos enviados), created, updated,
+    skipped, errors
     """
     from flask import request
     from ..services.bling_product_service import sync_all_products
@@ -916,6 +910,34 @@ def sync_all_products():
         }), 500
 
 
+@bling_bp.route('/produtos/sync-pending', methods=['POST'])
+def sync_pending_products():
+    """
+    Sincroniza com o Bling apenas os produtos alterados desde a última
+    sincronização (dirty set bling_produtos_pendentes)
+    
+    Resposta: success (bool) e synced (produtos enviados), created, updated,
+    skipped, errors
+    """
+    from ..services.bling_product_service import sync_pending_products_to_bling
+    
+    try:
+        result = sync_pending_products_to_bling()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Sincronização concluída',
+            **result
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Erro ao sincronizar produtos pendentes: {e}", exc_info=True)
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 @bling_bp.route('/produtos/status/<int:produto_id>', methods=['GET'])
 def get_product_sync_status(produto_id: int):
     """
@@ -1094,6 +1116,27 @@ def sync_stock_from_bling_endpoint():
         }), 500
 
 
+@bling_bp.route('/estoque/sync-from-bling/estado', methods=['GET'])
+@admin_required_email
+def sync_stock_from_bling_estado():
+    """
+    Progresso/checkpoint da sincronização de estoque em lote (Bling -> local)
+    """
+    from ..services.bling_product_service import get_bling_sync_estado
+    
+    try:
+        estado = get_bling_sync_estado('estoque')
+        if not estado:
+            return jsonify({'success': True, 'estado': None}), 200
+        for key in ('iniciado_em', 'atualizado_em', 'concluido_em'):
+            if estado.get(key):
+                estado[key] = estado[key].isoformat()
+        return jsonify({'success': True, 'estado': estado}), 200
+    except Exception as e:
+        current_app.logger.error(f"Erro ao obter estado da sincronização de estoque: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @bling_bp.route('/estoque/sync-to-bling', methods=['POST'])
 def sync_stock_to_bling_endpoint():
     """
@@ -1230,6 +1273,8 @@ def sync_all_orders():
     
     Aceita parâmetro opcional no body:
     - only_pending: Se true, sincroniza apenas pedidos que ainda não foram sincronizados
+    
+    Resposta: success (bool) e synced (pedidos enviados), errors
     """
     from flask import request
     from ..services.bling_order_service import sync_all_orders_to_bling
@@ -1279,12 +1324,16 @@ def sync_order_status(venda_id: int):
 @bling_bp.route('/pedidos/status/sync-all', methods=['POST'])
 def sync_all_orders_status():
     """
-    Sincroniza status de todos os pedidos sincronizados com Bling
+    Reconcilia o status dos pedidos não finais com o Bling (incremental;
+    {"full": true} ignora a marca d'água)
+    
+    Resposta: success (bool) e updated (pedidos atualizados), changed, errors
     """
     from ..services.bling_order_service import sync_all_orders_status
     
     try:
-        result = sync_all_orders_status()
+        full = request.json.get('full', False) if request.is_json else False
+        result = sync_all_orders_status(full=full)
         
         return jsonify({
             'success': True,
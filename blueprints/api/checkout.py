@@ -30,6 +30,8 @@ from ..services import (
 )
 import psycopg2.extras
 from ..services.user_service import get_user_by_firebase_uid
+from ..services.stock_reservation_service import release_order_reservations
+from ..services.coupon_service import get_cupom_by_codigo, validar_regras_cupom, calcular_desconto
 
 checkout_api_bp = Blueprint('checkout_api', __name__, url_prefix='/api/checkout')
 
@@ -147,17 +149,28 @@ def process_checkout():
                     }
                 })
 
-            # 4. Processar cupom se fornecido
+            # 4. Processar cupom se fornecido. O desconto é sempre recalculado aqui
+            # (discount_value enviado pelo cliente é ignorado) e exige usuário logado,
+            # como em /api/cupom/validate: os limites de uso são por usuário/CPF
             cupom_id = None
-            discount_value = float(data.get('discount_value', 0))
+            discount_value = 0.0
+            cupom_codigo = (data.get('cupom_codigo') or '').strip()
             
-            # Se houver desconto, buscar o cupom_id do código do cupom
-            if discount_value > 0 and data.get('cupom_codigo'):
-                cupom_codigo = data.get('cupom_codigo').strip().upper()
-                cur.execute("SELECT id FROM cupom WHERE codigo = %s AND ativo = TRUE", (cupom_codigo,))
-                cupom_result = cur.fetchone()
-                if cupom_result:
-                    cupom_id = cupom_result[0]
+            if cupom_codigo:
+                if not user_id:
+                    return jsonify({
+                        "erro": "Autenticação obrigatória",
+                        "mensagem": "Para usar cupons de desconto, você precisa ter uma conta.",
+                        "requer_login": True
+                    }), 401
+                cupom = get_cupom_by_codigo(cupom_codigo)
+                if not cupom:
+                    return jsonify({"erro": "Cupom inválido ou inativo"}), 400
+                erro_regra = validar_regras_cupom(cupom, total_value)
+                if erro_regra:
+                    return jsonify({"erro": erro_regra}), 400
+                cupom_id = cupom['id']
+                discount_value = calcular_desconto(cupom, total_value)
             
             # Calcular valores finais
             freight_value = float(shipping_option.get('price', data.get('freight_value', 0)))
@@ -193,7 +206,8 @@ def process_checkout():
                 user_agent=user_agent,
                 fiscal_data=fiscal_data,
                 cupom_id=cupom_id,
-                shipping_option=shipping_option
+                shipping_option=shipping_option,
+                payment_method=payment_method
             )
 
             # 7. Preparar dados do cliente
@@ -360,6 +374,9 @@ def process_checkout():
                 # Rollback da transação do pedido
                 conn.rollback()
                 
+                # Pedido já gravado sem cobrança: devolver o estoque reservado
+                release_order_reservations(venda_id)
+                
                 # Determinar mensagem de erro apropriada
                 error_message = "Erro ao processar pagamento"
                 error_details = str(api_error)
@@ -2,11 +2,11 @@
 API de Cupons de Desconto
 """
 from flask import Blueprint, request, jsonify, session, current_app
-from ..services import get_db
 from ..services.auth_service import verify_firebase_token
 from ..services.user_service import get_user_by_firebase_uid
-from datetime import datetime
-import re
+from ..services.coupon_service import (
+    get_cupom_by_codigo, get_cupom_usage, validar_regras_cupom, calcular_desconto
+)
 
 cupom_api_bp = Blueprint('cupom_api', __name__, url_prefix='/api/cupom')
 
@@ -55,94 +55,49 @@ def validate_cupom():
         user_id = user_data['id']
         user_cpf = user_data.get('cpf')
         
-        # Buscar cupom no banco
-        conn = get_db()
-        cur = conn.cursor()
+        # Regras do cupom em memória (cache invalidado quando o Strapi edita o cupom)
+        cupom = get_cupom_by_codigo(codigo_cupom)
         
-        cur.execute("""
-            SELECT 
-                id, codigo, tipo, valor, valor_minimo_pedido,
-                validade_inicio, validade_fim, uso_maximo, uso_maximo_por_usuario,
-                uso_atual, ativo, descricao
-            FROM cupom
-            WHERE codigo = %s AND ativo = TRUE
-        """, (codigo_cupom,))
-        
-        cupom_data = cur.fetchone()
-        
-        if not cupom_data:
-            cur.close()
+        if not cupom:
             return jsonify({"erro": "Cupom inválido ou inativo"}), 400
         
-        cupom_id, codigo, tipo, valor, valor_minimo, validade_inicio, validade_fim, \
-        uso_maximo, uso_maximo_por_usuario, uso_atual, ativo, descricao = cupom_data
+        cupom_id = cupom['id']
+        codigo = cupom['codigo']
+        tipo = cupom['tipo']
+        valor = cupom['valor']
+        valor_minimo = cupom['valor_minimo_pedido']
+        uso_maximo_por_usuario = cupom['uso_maximo_por_usuario']
+        descricao = cupom['descricao']
+        
+        # Obter valor total do carrinho (se fornecido)
+        valor_total_carrinho = float(data.get('valor_total_carrinho', 0))
         
-        # Validar validade
-        now = datetime.now()
-        if validade_inicio and now < validade_inicio:
-            cur.close()
-            return jsonify({"erro": "Este cupom ainda não está válido"}), 400
+        # Validar validade e valor mínimo do pedido
+        erro_regra = validar_regras_cupom(cupom, valor_total_carrinho)
+        if erro_regra:
+            resposta = {"erro": erro_regra}
+            if valor_minimo and valor_total_carrinho < float(valor_minimo):
+                resposta["valor_minimo"] = float(valor_minimo)
+            return jsonify(resposta), 400
         
-        if validade_fim and now > validade_fim:
-            cur.close()
-            return jsonify({"erro": "Este cupom expirou"}), 400
+        # Usos (total, por usuário e por CPF) em uma consulta. É só uma prévia:
+        # o limite é garantido na reivindicação atômica do checkout (claim_cupom)
+        uso = get_cupom_usage(cupom, user_id, user_cpf)
         
         # Validar uso máximo total
-        if uso_maximo is not None and uso_atual >= uso_maximo:
-            cur.close()
+        if uso['esgotado']:
             return jsonify({"erro": "Este cupom atingiu o limite máximo de usos"}), 400
         
         # Validar se o usuário já usou este cupom
-        cur.execute("""
-            SELECT COUNT(*) 
-            FROM cupom_usado 
-            WHERE cupom_id = %s AND usuario_id = %s
-        """, (cupom_id, user_id))
-        
-        uso_por_usuario = cur.fetchone()[0]
-        if uso_por_usuario >= (uso_maximo_por_usuario or 1):
-            cur.close()
+        if uso['uso_usuario'] >= (uso_maximo_por_usuario or 1):
             return jsonify({"erro": "Você já utilizou este cupom o número máximo de vezes permitido"}), 400
         
         # Validar se o CPF já usou este cupom (uma vez por CPF)
-        if user_cpf:
-            # Limpar CPF (remover formatação)
-            cpf_limpo = re.sub(r'[^0-9]', '', user_cpf)
-            
-            cur.execute("""
-                SELECT COUNT(*) 
-                FROM cupom_usado cu
-                JOIN usuarios u ON cu.usuario_id = u.id
-                WHERE cu.cupom_id = %s AND u.cpf = %s
-            """, (cupom_id, cpf_limpo))
-            
-            uso_por_cpf = cur.fetchone()[0]
-            if uso_por_cpf > 0:
-                cur.close()
-                return jsonify({"erro": "Este cupom já foi utilizado por este CPF"}), 400
-        
-        # Obter valor total do carrinho (se fornecido)
-        valor_total_carrinho = float(data.get('valor_total_carrinho', 0))
-        
-        # Validar valor mínimo do pedido
-        if valor_minimo and valor_total_carrinho < float(valor_minimo):
-            cur.close()
-            return jsonify({
-                "erro": f"Valor mínimo do pedido para este cupom é R$ {valor_minimo:.2f}",
-                "valor_minimo": float(valor_minimo)
-            }), 400
-        
-        # Calcular desconto
-        if tipo == 'p':  # Percentual
-            desconto = valor_total_carrinho * (float(valor) / 100)
-        else:  # Valor fixo
-            desconto = float(valor)
-        
-        # Garantir que o desconto não seja maior que o valor total
-        if desconto > valor_total_carrinho:
-            desconto = valor_total_carrinho
+        if uso['uso_cpf']:
+            return jsonify({"erro": "Este cupom já foi utilizado por este CPF"}), 400
         
-        cur.close()
+        # Calcular desconto (o mesmo cálculo é refeito no checkout)
+        desconto = calcular_desconto(cupom, valor_total_carrinho)
         
         return jsonify({
             "success": True,
@@ -1,6 +1,11 @@
 from . import api_bp
 from flask import jsonify, request, current_app
 from ..services import get_db, execute_query_safely
+from ..services.schema_capabilities import has_table, has_column
+from ..services.catalog_service import (
+    catalog_available, sync_pending_catalog, query_catalog, get_catalog_facets,
+    FILTROS_SEXO, FILTROS_PRECO
+)
 
 @api_bp.route('/store/filters', methods=['GET'])
 def get_store_filters():
@@ -17,22 +22,26 @@ def get_store_filters():
             # Se rollback falhar, tentar obter nova conexão
             conn = get_db()
         
+        # Facetas pré-calculadas junto com o catálogo materializado (sql/create-catalogo-facetas.sql)
+        if catalog_available() and has_table('catalogo_facetas'):
+            sync_pending_catalog(conn)
+            facetas = get_catalog_facets(conn)
+            if facetas is not None:
+                _versao, etag, dados = facetas
+                response = jsonify(dados)
+                response.set_etag(etag)
+                response.cache_control.public = True
+                response.cache_control.max_age = int(current_app.config.get('STORE_FILTERS_MAX_AGE', 60))
+                # If-None-Match igual ao ETag -> 304 sem corpo
+                return response.make_conditional(request)
+        
         filters = {
             'categorias': [],
             'tamanhos': [],
             'estampas': [],
             'tecidos': [],
-            'sexos': [
-                {'value': 'm', 'label': 'Masculino'},
-                {'value': 'f', 'label': 'Feminino'},
-                {'value': 'u', 'label': 'Unissex'}
-            ],
-            'precos': [
-                {'label': 'Até R$ 50', 'min': 0, 'max': 50},
-                {'label': 'R$ 50 - R$ 100', 'min': 50, 'max': 100},
-                {'label': 'R$ 100 - R$ 200', 'min': 100, 'max': 200},
-                {'label': 'Acima de R$ 200', 'min': 200, 'max': None}
-            ]
+            'sexos': FILTROS_SEXO,
+            'precos': FILTROS_PRECO
         }
         
         # Buscar categorias ativas (que têm produtos)
@@ -67,38 +76,14 @@ def get_store_filters():
             current_app.logger.error(f"Erro ao buscar tamanhos: {e}", exc_info=True)
             filters['tamanhos'] = []
         
-        # Verificar se a tabela tecidos existe
-        tecidos_table_exists = False
-        try:
-            result = execute_query_safely("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'tecidos'
-                )
-            """, fetch_mode='one')
-            if result:
-                tecidos_table_exists = result[0]
-        except Exception as e:
-            current_app.logger.warning(f"Erro ao verificar existência da tabela tecidos: {e}")
-            tecidos_table_exists = False
+        # Verificar se a tabela tecidos existe (cache do schema)
+        tecidos_table_exists = has_table('tecidos')
         
         # Buscar estampas disponíveis (apenas as que têm produtos em estoque)
         try:
             if tecidos_table_exists:
                 # Verificar se existe tabela de relacionamento estampa_tecido_lnk
-                tecido_lnk_exists = False
-                try:
-                    result = execute_query_safely("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_schema = 'public' 
-                            AND table_name = 'estampa_tecido_lnk'
-                        )
-                    """, fetch_mode='one')
-                    tecido_lnk_exists = result[0] if result else False
-                except Exception:
-                    tecido_lnk_exists = False
+                tecido_lnk_exists = has_table('estampa_tecido_lnk')
                 
                 try:
                     if tecido_lnk_exists:
@@ -138,15 +123,6 @@ def get_store_filters():
                 # Buscar tecidos únicos disponíveis
                 # Primeiro tenta buscar tecidos associados a produtos, depois todos os tecidos ativos
                 try:
-                    result = execute_query_safely("""
-                        SELECT EXISTS (
-                            SELECT FROM information_schema.tables 
-                            WHERE table_schema = 'public' 
-                            AND table_name = 'estampa_tecido_lnk'
-                        )
-                    """, fetch_mode='one')
-                    tecido_lnk_exists = result[0] if result else False
-                    
                     # Primeiro tentar buscar tecidos associados a produtos
                     tecidos = []
                     if tecido_lnk_exists:
@@ -236,6 +212,94 @@ def get_store_filters():
     finally:
         pass
 
+def _resolve_tecido_ids(conn, tecidos):
+    """Converte o filtro de tecido (ids ou nomes) em ids da tabela tecidos."""
+    tecido_ids = []
+    tecido_nomes = []
+    
+    for t in tecidos:
+        try:
+            if isinstance(t, str):
+                # Tentar converter para int
+                if t.isdigit():
+                    tecido_ids.append(int(t))
+                else:
+                    # Se não for dígito, guardar para buscar pelo nome depois
+                    tecido_nomes.append(t)
+            elif isinstance(t, int):
+                tecido_ids.append(t)
+        except Exception as e:
+            current_app.logger.warning(f"Erro ao processar filtro de tecido {t}: {e}")
+            continue
+    
+    # Buscar IDs dos tecidos por nome se necessário
+    if tecido_nomes:
+        cur_tec_ids = conn.cursor()
+        try:
+            placeholders_nomes = ','.join(['%s'] * len(tecido_nomes))
+            cur_tec_ids.execute(f"SELECT id FROM tecidos WHERE nome IN ({placeholders_nomes}) AND ativo = TRUE", tecido_nomes)
+            ids_por_nome = [row[0] for row in cur_tec_ids.fetchall()]
+            tecido_ids.extend(ids_por_nome)
+        finally:
+            cur_tec_ids.close()
+    
+    # Remover duplicatas
+    return list(set(tecido_ids))
+
+
+def _format_base_product(prod):
+    preco_minimo = float(prod[6]) if prod[6] is not None else None
+    preco_minimo_original = float(prod[7]) if prod[7] is not None else None
+    variacoes_em_estoque = prod[8] if prod[8] is not None else 0
+    
+    # Verificar se tem promoção (preço mínimo é menor que original)
+    tem_promocao = preco_minimo is not None and preco_minimo_original is not None and preco_minimo < preco_minimo_original
+    preco_original_para_exibir = preco_minimo_original if preco_minimo_original else preco_minimo
+    
+    return {
+        'id': prod[0],
+        'nome': prod[1],
+        'descricao': prod[2],
+        'categoria': prod[3] if prod[3] else 'Sem categoria',
+        'categoria_id': prod[4] if prod[4] else None,
+        'imagem_url': prod[5] if prod[5] else '/static/img/placeholder.jpg',
+        'preco_minimo': preco_minimo,
+        'preco_minimo_original': preco_original_para_exibir,
+        'tem_promocao': tem_promocao,
+        'estoque': variacoes_em_estoque
+    }
+
+
+def _get_base_products_from_catalog(conn, categoria_ids, tamanho_ids, estampa_ids, tecidos, sexos, preco_min, preco_max):
+    """Listagem a partir do catálogo materializado (uma leitura indexada)."""
+    # Reprocessar produtos alterados desde a última leitura (triggers -> pendentes)
+    sync_pending_catalog(conn)
+    
+    tecido_ids = None
+    tecidos_texto = None
+    if tecidos:
+        if has_table('tecidos'):
+            tecido_ids = _resolve_tecido_ids(conn, tecidos)
+            if not tecido_ids:
+                # Mesmo comportamento da query original: filtro sem tecidos válidos é ignorado
+                tecido_ids = None
+        elif has_column('estampa', 'tecido'):
+            tecidos_texto = tecidos
+    
+    rows = query_catalog(
+        categoria_ids=categoria_ids,
+        tamanho_ids=tamanho_ids,
+        estampa_ids=estampa_ids,
+        tecido_ids=tecido_ids,
+        tecidos_texto=tecidos_texto,
+        sexos=sexos,
+        preco_min=preco_min,
+        preco_max=preco_max,
+        conn=conn
+    )
+    return [_format_base_product(prod) for prod in rows]
+
+
 @api_bp.route('/base_products', methods=['GET'])
 def get_base_products():
     """Endpoint para listar produtos base (para a página da loja) com suporte a filtros."""
@@ -254,6 +318,13 @@ def get_base_products():
         preco_min = request.args.get('preco_min', type=float)
         preco_max = request.args.get('preco_max', type=float)
         
+        # Catálogo materializado (sql/create-catalogo-produtos.sql), se disponível
+        if catalog_available():
+            base_products_list = _get_base_products_from_catalog(
+                conn, categoria_ids, tamanho_ids, estampa_ids, tecidos, sexos, preco_min, preco_max
+            )
+            return jsonify(base_products_list), 200
+        
         # Construir query base
         # Usa LEFT JOIN para permitir produtos sem categoria (categoria_id NULL ou categoria deletada)
         query = """
@@ -287,28 +358,8 @@ def get_base_products():
             conditions.append(f"c.id = ANY(%s)")
             params.append(categoria_ids)
         
-        # Verificar se tabela tecidos existe (uma vez, antes dos filtros)
-        # Reutilizar a verificação já feita em get_store_filters se possível
-        # Mas como estamos em uma função diferente, vamos verificar novamente
-        tecidos_table_exists = False
-        try:
-            cur_tec_check = conn.cursor()
-            try:
-                cur_tec_check.execute("""
-                    SELECT EXISTS (
-                        SELECT FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = 'tecidos'
-                    )
-                """)
-                result = cur_tec_check.fetchone()
-                if result:
-                    tecidos_table_exists = result[0]
-            finally:
-                cur_tec_check.close()
-        except Exception as e:
-            current_app.logger.warning(f"Erro ao verificar existência da tabela tecidos: {e}")
-            tecidos_table_exists = False
+        # Verificar se tabela tecidos existe (cache do schema, compartilhado com get_store_filters)
+        tecidos_table_exists = has_table('tecidos')
         
         # Construir condições para filtros de variações (produtos)
         variation_conditions = []
@@ -327,37 +378,7 @@ def get_base_products():
             if tecidos_table_exists:
                 # Usar tecido_id se a tabela existir
                 # Converter strings para inteiros se necessário
-                tecido_ids = []
-                tecido_nomes = []
-                
-                for t in tecidos:
-                    try:
-                        if isinstance(t, str):
-                            # Tentar converter para int
-                            if t.isdigit():
-                                tecido_ids.append(int(t))
-                            else:
-                                # Se não for dígito, guardar para buscar pelo nome depois
-                                tecido_nomes.append(t)
-                        elif isinstance(t, int):
-                            tecido_ids.append(t)
-                    except Exception as e:
-                        current_app.logger.warning(f"Erro ao processar filtro de tecido {t}: {e}")
-                        continue
-                
-                # Buscar IDs dos tecidos por nome se necessário
-                if tecido_nomes:
-                    cur_tec_ids = conn.cursor()
-                    try:
-                        placeholders_nomes = ','.join(['%s'] * len(tecido_nomes))
-                        cur_tec_ids.execute(f"SELECT id FROM tecidos WHERE nome IN ({placeholders_nomes}) AND ativo = TRUE", tecido_nomes)
-                        ids_por_nome = [row[0] for row in cur_tec_ids.fetchall()]
-                        tecido_ids.extend(ids_por_nome)
-                    finally:
-                        cur_tec_ids.close()
-                
-                # Remover duplicatas
-                tecido_ids = list(set(tecido_ids))
+                tecido_ids = _resolve_tecido_ids(conn, tecidos)
                 
                 if tecido_ids:
                     # Usar IN ao invés de ANY para melhor compatibilidade
@@ -366,27 +387,10 @@ def get_base_products():
                     variation_params.extend(tecido_ids)
             else:
                 # Fallback: usar campo tecido VARCHAR (se existir)
-                # Verificar se a coluna tecido existe
-                try:
-                    cur_tec_col = conn.cursor()
-                    try:
-                        cur_tec_col.execute("""
-                            SELECT EXISTS (
-                                SELECT FROM information_schema.columns 
-                                WHERE table_name = 'estampa' 
-                                AND column_name = 'tecido'
-                            )
-                        """)
-                        result = cur_tec_col.fetchone()
-                        tecido_column_exists = result[0] if result else False
-                        if tecido_column_exists:
-                            variation_conditions.append("EXISTS (SELECT 1 FROM produtos_estampa_lnk pe JOIN estampa e ON pe.estampa_id = e.id WHERE pe.produto_id = p.id AND e.tecido = ANY(%s))")
-                            variation_params.append(tecidos)
-                    finally:
-                        cur_tec_col.close()
-                except:
-                    # Se não conseguir verificar, simplesmente ignorar o filtro de tecido
-                    pass
+                # Verificar se a coluna tecido existe (cache do schema)
+                if has_column('estampa', 'tecido'):
+                    variation_conditions.append("EXISTS (SELECT 1 FROM produtos_estampa_lnk pe JOIN estampa e ON pe.estampa_id = e.id WHERE pe.produto_id = p.id AND e.tecido = ANY(%s))")
+                    variation_params.append(tecidos)
         
         if sexos:
             variation_conditions.append("EXISTS (SELECT 1 FROM produtos_estampa_lnk pe JOIN estampa e ON pe.estampa_id = e.id WHERE pe.produto_id = p.id AND e.sexo = ANY(%s))")
@@ -431,27 +435,7 @@ def get_base_products():
         cur.execute(query, params)
         products_db = cur.fetchall()
 
-        for prod in products_db:
-            preco_minimo = float(prod[6]) if prod[6] is not None else None
-            preco_minimo_original = float(prod[7]) if prod[7] is not None else None
-            variacoes_em_estoque = prod[8] if prod[8] is not None else 0
-            
-            # Verificar se tem promoção (preço mínimo é menor que original)
-            tem_promocao = preco_minimo is not None and preco_minimo_original is not None and preco_minimo < preco_minimo_original
-            preco_original_para_exibir = preco_minimo_original if preco_minimo_original else preco_minimo
-            
-            base_products_list.append({
-                'id': prod[0],
-                'nome': prod[1],
-                'descricao': prod[2],
-                'categoria': prod[3] if prod[3] else 'Sem categoria',
-                'categoria_id': prod[4] if prod[4] else None,
-                'imagem_url': prod[5] if prod[5] else '/static/img/placeholder.jpg',
-                'preco_minimo': preco_minimo,
-                'preco_minimo_original': preco_original_para_exibir,
-                'tem_promocao': tem_promocao,
-                'estoque': variacoes_em_estoque
-            })
+        base_products_list = [_format_base_product(prod) for prod in products_db]
 
         return jsonify(base_products_list), 200
 
@@ -1,12 +1,25 @@
 from . import api_bp
-from flask import jsonify, request, current_app
+import json
+import time
+from flask import jsonify, request, current_app, Response, stream_with_context
 from ..services.auth_service import verify_firebase_token
-from ..services.user_service import get_user_by_firebase_uid, get_user_orders
-from ..services.order_service import get_order_by_token
+from ..services.user_service import get_user_by_firebase_uid, get_user_orders_page, USER_ORDERS_DEFAULT_LIMIT
+from ..services.order_service import get_order_by_token, get_order_status_by_token
+from ..services.order_events import (
+    ensure_order_status_listener, order_status_listener_healthy, wait_for_order_status,
+    try_acquire_stream, release_stream, FINAL_ORDER_STATUSES
+)
+from ..services.db import close_db_connection
 
 @api_bp.route('/orders', methods=['GET'])
 def get_orders():
-    """Retorna todos os pedidos do usuário logado."""
+    """
+    Retorna o histórico de pedidos do usuário logado, paginado.
+    
+    Query params:
+        limit: Pedidos por página (padrão 10, máximo 50)
+        cursor: Valor de next_cursor da resposta anterior
+    """
     auth_header = request.headers.get('Authorization', '')
     if not auth_header.startswith('Bearer '):
         return jsonify({"erro": "Token de autenticação é obrigatório"}), 401
@@ -24,8 +37,18 @@ def get_orders():
         if not user_data:
             return jsonify({"erro": "Usuário não encontrado"}), 404
         
-        orders = get_user_orders(user_data['id'])
-        return jsonify({"orders": orders}), 200
+        limit = request.args.get('limit', USER_ORDERS_DEFAULT_LIMIT, type=int)
+        cursor = request.args.get('cursor') or None
+        try:
+            page = get_user_orders_page(user_data['id'], limit=limit, cursor=cursor)
+        except ValueError as e:
+            return jsonify({"erro": str(e)}), 400
+        
+        return jsonify({
+            "orders": page['orders'],
+            "next_cursor": page['next_cursor'],
+            "has_more": page['next_cursor'] is not None
+        }), 200
         
     except Exception as e:
         print(f"Erro ao buscar pedidos: {e}")
@@ -83,13 +106,13 @@ def get_order_by_public_token(token):
 @api_bp.route('/orders/<token>/status', methods=['GET'])
 def get_order_status_only(token):
     """
-    Retorna apenas o status do pedido (para polling).
-    Mais leve que o endpoint completo.
+    Retorna apenas o status do pedido (fallback do SSE / polling).
+    Usa a consulta leve de status, sem carregar pagamento e etiquetas.
     """
     try:
-        order = get_order_by_token(token)
+        status = get_order_status_by_token(token)
         
-        if not order:
+        if not status:
             return jsonify({
                 "success": False,
                 "erro": "Pedido não encontrado"
@@ -97,7 +120,7 @@ def get_order_status_only(token):
         
         return jsonify({
             "success": True,
-            "status": order.get('status', 'UNKNOWN')
+            "status": status
         }), 200
         
     except Exception as e:
@@ -106,3 +129,97 @@ def get_order_status_only(token):
             "success": False,
             "erro": "Erro ao buscar status do pedido"
         }), 500
+
+
+def _sse_event(status):
+    return f"event: status\ndata: {json.dumps({'status': status})}\n\n"
+
+
+@api_bp.route('/orders/<token>/events', methods=['GET'])
+def stream_order_status(token):
+    """
+    Server-Sent Events com as mudanças de status do pedido.
+    
+    Envia o status atual e, depois, cada transição publicada pelos webhooks
+    (LISTEN/NOTIFY), sem segurar conexão do banco durante a espera. O stream
+    termina em status final ou após ORDER_STATUS_STREAM_SECONDS (o
+    EventSource do navegador reconecta sozinho).
+    
+    Cada stream ocupa uma thread do Gunicorn: acima de ORDER_STATUS_MAX_STREAMS
+    por processo responde 503 e o cliente volta para GET /orders/<token>/status.
+    Com ORDER_STATUS_MAX_STREAMS = 0 (padrão) o SSE fica desligado e o 503 é
+    imediato, sem consultar o banco.
+    """
+    max_streams = int(current_app.config.get('ORDER_STATUS_MAX_STREAMS', 0))
+    if max_streams <= 0:
+        response = jsonify({"success": False, "erro": "Acompanhamento em tempo real desabilitado"})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    try:
+        status = get_order_status_by_token(token)
+    except Exception as e:
+        current_app.logger.error(f"Erro ao buscar status do pedido: {e}")
+        return jsonify({"success": False, "erro": "Erro ao buscar status do pedido"}), 500
+    
+    if not status:
+        return jsonify({"success": False, "erro": "Pedido não encontrado"}), 404
+    
+    # Devolver a conexão ao pool antes da espera longa
+    close_db_connection()
+    
+    if status in FINAL_ORDER_STATUSES:
+        return Response(_sse_event(status), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    
+    if not try_acquire_stream(max_streams):
+        response = jsonify({"success": False, "erro": "Muitas conexões em espera", "status": status})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    
+    ensure_order_status_listener()
+    stream_seconds = float(current_app.config.get('ORDER_STATUS_STREAM_SECONDS', 55))
+    
+    def generate():
+        current_status = status
+        deadline = time.monotonic() + stream_seconds
+        try:
+            yield "retry: 3000\n\n"
+            yield _sse_event(current_status)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if order_status_listener_healthy():
+                    new_status = wait_for_order_status(token, current_status, min(15.0, remaining))
+                else:
+                    # Listener indisponível: consulta leve periódica
+                    time.sleep(min(5.0, remaining))
+                    new_status = get_order_status_by_token(token)
+                    close_db_connection()
+                    if new_status == current_status:
+                        new_status = None
+                
+                if new_status is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                
+                current_status = new_status
+                yield _sse_event(current_status)
+                if current_status in FINAL_ORDER_STATUSES:
+                    return
+        except Exception as e:
+            current_app.logger.warning(f"Stream de status do pedido encerrado com erro: {e}")
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Nginx: não bufferizar o stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    # Liberar a vaga mesmo se o cliente desconectar antes do primeiro evento
+    response.call_on_close(release_stream)
+    return response
@@ -10,6 +10,8 @@ REGRAS ARQUITETURAIS:
 - IDs do PagBank (charge_id, order_id) são usados para reconciliação
 - Status finais possíveis: PAID, DECLINED, CANCELED, REFUNDED
 - Este endpoint atualiza: tabela pagamentos, tabela vendas, tabela orders
+- Com sql/create-webhook-inbox.sql, os endpoints do PagBank e do Bling só
+  validam e gravam o evento em webhook_inbox; o worker processa depois
 
 IMPORTANTE:
 - Nenhum outro código deve atualizar o status de pagamento
@@ -19,14 +21,30 @@ IMPORTANTE:
 from flask import Blueprint, request, jsonify, current_app
 from ..services.order_service import get_order_by_venda_id, update_order_status, delete_order_token, sync_order_status_from_venda
 from ..services import get_db
+from ..services.http_client import http_request
+from ..services.webhook_inbox_service import (
+    store_webhook, register_webhook_processor, register_webhook_batch_processor
+)
 import psycopg2.extras
 import json
 import hmac
-import requests
+import hashlib
 
 webhook_api_bp = Blueprint('webhook_api', __name__, url_prefix='/api/webhook')
 
 
+def _webhook_response_result(response) -> dict:
+    """
+    Converte a resposta de um processador de webhook no resultado gravado na
+    caixa de entrada. Respostas 5xx fazem o evento entrar em retry.
+    """
+    body, status_code = response if isinstance(response, tuple) else (response, 200)
+    data = body.get_json(silent=True) or {}
+    if status_code >= 500:
+        raise RuntimeError(data.get('erro') or data.get('message') or f"HTTP {status_code}")
+    return {'status_code': status_code, 'resposta': data}
+
+
 def is_request_from_pagbank():
     """
     Verifica se a requisição veio do PagBank através de múltiplos métodos.
@@ -166,27 +184,99 @@ def pagbank_webhook():
             "message": "Requisição não autorizada"
         }), 403
     
-    # Se for POST e passar validação, processar notificação
+    # Log da requisição recebida
+    current_app.logger.info("=" * 80)
+    current_app.logger.info("🔔 WEBHOOK PAGBANK RECEBIDO (VALIDADO)")
+    current_app.logger.info("=" * 80)
+    current_app.logger.info(f"Headers: {dict(request.headers)}")
+    current_app.logger.info(f"Body (primeiros 500 chars): {request.get_data(as_text=True)[:500]}")
+    
+    # Obter dados do webhook - aceitar tanto JSON quanto form data
+    content_type = request.headers.get('Content-Type', '')
+    if 'application/json' in content_type:
+        # Formato JSON (novo formato do PagBank)
+        payload = {'formato': 'json', 'data': request.get_json(silent=True)}
+        if not payload['data']:
+            current_app.logger.warning("Webhook PagBank sem dados válidos")
+            return jsonify({"erro": "Dados não fornecidos"}), 400
+    elif 'application/x-www-form-urlencoded' in content_type:
+        # Formato form data (formato antigo do PagSeguro/PagBank)
+        payload = {
+            'formato': 'form',
+            'notificationCode': request.form.get('notificationCode'),
+            'notificationType': request.form.get('notificationType')
+        }
+    else:
+        current_app.logger.warning("Webhook PagBank sem dados válidos")
+        return jsonify({"erro": "Dados não fornecidos"}), 400
+    
+    # Caixa de entrada: gravar e responder na hora; o worker processa.
+    # O PagBank não envia id de evento: reentregas têm o mesmo corpo
+    event_id = f"pagbank:{hashlib.sha256(request.get_data()).hexdigest()}"
+    evento, entidade = _pagbank_webhook_event_and_entity(payload)
+    try:
+        stored = store_webhook('pagbank', event_id, evento, entidade, payload)
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao gravar webhook PagBank na caixa de entrada: {e}")
+        # Não confirmar: o PagBank reenvia
+        return jsonify({"erro": "Erro ao registrar webhook"}), 500
+    
+    if stored is not None:
+        return jsonify({
+            "status": "ok",
+            "message": "Webhook recebido" if stored else "Webhook já recebido"
+        }), 200
+    
+    # Sem caixa de entrada (sql/create-webhook-inbox.sql não aplicado): processar na hora
+    return process_pagbank_webhook_payload(payload)
+
+
+def _pagbank_webhook_event_and_entity(payload: dict):
+    """Status (evento) e chave de ordenação (pedido/cobrança no PagBank) de uma notificação"""
+    if payload.get('formato') == 'form':
+        code = payload.get('notificationCode')
+        return payload.get('notificationType'), f"pagbank:{code}" if code else None
+    
+    data = payload.get('data')
+    if not isinstance(data, dict):
+        return None, None
+    charge = {}
+    if isinstance(data.get('charges'), list) and data['charges'] and isinstance(data['charges'][0], dict):
+        charge = data['charges'][0]
+    elif isinstance(data.get('charge'), dict):
+        charge = data['charge']
+    status = charge.get('status') or data.get('status')
+    entidade = data.get('id') or charge.get('id')
+    return status, f"pagbank:{entidade}" if entidade else None
+
+
+@register_webhook_processor('pagbank')
+def _process_pagbank_inbox_event(payload: dict) -> dict:
+    return _webhook_response_result(process_pagbank_webhook_payload(payload, from_inbox=True))
+
+
+def process_pagbank_webhook_payload(payload: dict, from_inbox: bool = False):
+    """
+    Processa uma notificação do PagBank (gravada na caixa de entrada ou, sem
+    ela, recebida agora).
+    
+    Args:
+        payload: {'formato': 'json', 'data': {...}} ou
+                 {'formato': 'form', 'notificationCode': ..., 'notificationType': ...}
+        from_inbox: Evento da caixa de entrada: erros são propagados (retry) em vez de
+                    respondidos com 200
+    
+    Returns:
+        Response Flask
+    """
     try:
-        # Log da requisição recebida
-        current_app.logger.info("=" * 80)
-        current_app.logger.info("🔔 WEBHOOK PAGBANK RECEBIDO (VALIDADO)")
-        current_app.logger.info("=" * 80)
-        current_app.logger.info(f"Headers: {dict(request.headers)}")
-        current_app.logger.info(f"Body (primeiros 500 chars): {request.get_data(as_text=True)[:500]}")
-        
-        # Obter dados do webhook - aceitar tanto JSON quanto form data
-        content_type = request.headers.get('Content-Type', '')
         data = None
         
-        if 'application/json' in content_type:
-            # Formato JSON (novo formato do PagBank)
-            data = request.get_json()
-        elif 'application/x-www-form-urlencoded' in content_type:
-            # Formato form data (formato antigo do PagSeguro/PagBank)
-            form_data = request.form
-            notification_code = form_data.get('notificationCode')
-            notification_type = form_data.get('notificationType')
+        if payload.get('formato') == 'json':
+            data = payload.get('data')
+        elif payload.get('formato') == 'form':
+            notification_code = payload.get('notificationCode')
+            notification_type = payload.get('notificationType')
             
             current_app.logger.info(f"Webhook recebido em formato form data: notificationCode={notification_code}, notificationType={notification_type}")
             
@@ -216,7 +306,7 @@ def pagbank_webhook():
                     }
                     
                     current_app.logger.info(f"Buscando transação na API: {order_url}")
-                    response = requests.get(order_url, headers=headers, timeout=30)
+                    response = http_request('pagbank', 'GET', order_url, headers=headers, timeout=30)
                     
                     if response.status_code == 200:
                         data = response.json()
@@ -271,19 +361,15 @@ def pagbank_webhook():
                                                 f"Criando pedido para venda {venda_id}..."
                                             )
                                             try:
-                                                from ..services.bling_order_service import sync_order_to_bling
-                                                result = sync_order_to_bling(venda_id)
-                                                
-                                                if result.get('success'):
-                                                    bling_pedido_id = result.get('bling_pedido_id')
-                                                    current_app.logger.info(f"✅ Pedido criado no Bling: {bling_pedido_id}")
-                                                else:
-                                                    current_app.logger.warning(
-                                                        f"⚠️ Falha ao criar pedido no Bling: {result.get('error')}"
-                                                    )
+                                                from ..services.job_queue_service import enqueue_job
+                                                enqueue_job(
+                                                    'bling.sync_order',
+                                                    {'venda_id': venda_id},
+                                                    chave_idempotencia=f'bling.sync_order:{venda_id}'
+                                                )
                                             except Exception as bling_error:
                                                 current_app.logger.error(
-                                                    f"❌ Erro ao criar pedido no Bling: {bling_error}",
+                                                    f"❌ Erro ao enfileirar criação do pedido no Bling: {bling_error}",
                                                     exc_info=True
                                                 )
                                         else:
@@ -312,14 +398,18 @@ def pagbank_webhook():
                     else:
                         current_app.logger.error(f"Erro ao buscar transação na API: {response.status_code} - {response.text[:200]}")
                         # Aceitar a notificação para não bloquear o PagBank, mas logar o erro
+                        # (na caixa de entrada, 502 faz o evento entrar em retry)
                         return jsonify({
                             "status": "ok",
                             "message": "Notificação recebida, mas erro ao buscar transação"
-                        }), 200
+                        }), 502 if from_inbox else 200
                 except Exception as e:
                     current_app.logger.error(f"Erro ao processar notificationCode: {e}")
                     import traceback
                     current_app.logger.error(f"Traceback: {traceback.format_exc()}")
+                    if from_inbox:
+                        # Caixa de entrada: o evento volta para retry em vez de ser marcado processado
+                        raise
                     # Aceitar a notificação mesmo com erro para não bloquear o PagBank
                     return jsonify({
                         "status": "ok",
@@ -646,35 +736,23 @@ def pagbank_webhook():
                 current_app.logger.warning(f"Order não encontrado para venda_id: {venda_id}")
             
             # Criar pedido no Bling quando pagamento for confirmado
+            # A criação roda no worker de jobs para não prender o webhook esperando o Bling
             if status_upper in ['PAID', 'AUTHORIZED', 'APPROVED']:
                 try:
-                    from ..services.bling_order_service import sync_order_to_bling
-                    current_app.logger.info(f"💰 Pagamento confirmado. Criando pedido no Bling para venda {venda_id}...")
+                    from ..services.job_queue_service import enqueue_job
+                    current_app.logger.info(f"💰 Pagamento confirmado. Enfileirando criação do pedido no Bling para venda {venda_id}...")
                     
-                    result = sync_order_to_bling(venda_id)
-                    
-                    if result.get('success'):
-                        bling_pedido_id = result.get('bling_pedido_id')
-                        current_app.logger.info(f"✅ Pedido criado no Bling: {bling_pedido_id}")
-                        
-                        # NOTA: Não emitir NF-e quando pedido está em aberto
-                        # A NF-e será emitida apenas quando a nota for aprovada (via webhook NFE)
-                        current_app.logger.info(
-                            f"ℹ️ Pedido {bling_pedido_id} criado no Bling. "
-                            f"NF-e será emitida apenas quando a nota for aprovada."
-                        )
-                        
-                        # REMOVIDO: Lógica de emissão de NF-e no pedido em aberto
-                        # A emissão agora acontece apenas quando a nota é aprovada (via webhook NFE)
-                    else:
-                        current_app.logger.warning(
-                            f"⚠️ Falha ao criar pedido no Bling: {result.get('error')}. "
-                            f"Pedido pode ser sincronizado manualmente depois."
-                        )
+                    # NOTA: Não emitir NF-e quando pedido está em aberto
+                    # A NF-e será emitida apenas quando o pedido for para "Em andamento" (via webhook do Bling)
+                    enqueue_job(
+                        'bling.sync_order',
+                        {'venda_id': venda_id},
+                        chave_idempotencia=f'bling.sync_order:{venda_id}'
+                    )
                 except Exception as bling_error:
                     # Não falhar o webhook por erro no Bling
                     current_app.logger.error(
-                        f"❌ Erro ao criar pedido no Bling: {bling_error}. "
+                        f"❌ Erro ao enfileirar criação do pedido no Bling: {bling_error}. "
                         f"Webhook continuará processando normalmente."
                     )
             
@@ -741,6 +819,8 @@ def pagbank_webhook():
             current_app.logger.error(f"Erro ao processar webhook: {e}")
             import traceback
             current_app.logger.error(traceback.format_exc())
+            if from_inbox:
+                raise
             # Retornar 200 para não fazer o PagBank reenviar em caso de erro interno
             return jsonify({
                 "erro": "Erro ao processar webhook",
@@ -753,6 +833,8 @@ def pagbank_webhook():
         current_app.logger.error(f"Erro no webhook PagBank: {e}")
         import traceback
         current_app.logger.error(traceback.format_exc())
+        if from_inbox:
+            raise
         # Retornar 200 para não fazer o PagBank reenviar
         return jsonify({
             "erro": "Erro ao processar webhook",
@@ -760,7 +842,7 @@ def pagbank_webhook():
         }), 200
 
 
-def process_order_webhook(webhook_data: dict, event: str, event_id: str, data: dict):
+def process_order_webhook(webhook_data: dict, event: str, event_id: str, data: dict, from_inbox: bool = False):
     """
     Processa webhook de pedido do Bling
     
@@ -769,6 +851,7 @@ def process_order_webhook(webhook_data: dict, event: str, event_id: str, data: d
         event: Tipo do evento (ex: "order.updated")
         event_id: ID do evento
         data: Dados do pedido do webhook
+        from_inbox: Evento da caixa de entrada: erros são propagados (retry)
     
     Returns:
         Response Flask
@@ -1045,89 +1128,35 @@ def process_order_webhook(webhook_data: dict, event: str, event_id: str, data: d
                 f"situacao_atual_id={situacao_atual_id}"
             )
             
-            # Função auxiliar para verificar e emitir NF-e
+            # Função auxiliar para enfileirar a emissão de NF-e
             def verificar_e_emitir_nfe():
-                """Verifica se precisa emitir NF-e e emite se necessário"""
+                """
+                Enfileira a emissão de NF-e (job 'bling.emit_nfe').
+                
+                A verificação de associação NF-e/pedido e a emissão rodam no worker
+                de jobs, fora da requisição do webhook.
+                """
                 if not is_em_andamento or is_em_aberto:
                     return False
                 
-                # Verificar se NF-e já foi emitida E está associada ao pedido no Bling
-                cur.execute("""
-                    SELECT bp.bling_nfe_id, bp.nfe_status, bp.bling_pedido_id
-                    FROM bling_pedidos bp
-                    WHERE bp.venda_id = %s
-                """, (venda_id,))
-                
-                nfe_info = cur.fetchone()
-                pedido_bling_id = nfe_info.get('bling_pedido_id') if nfe_info else None
-                nfe_id_local = nfe_info.get('bling_nfe_id') if nfe_info else None
-                
-                # Verificar se a NF-e está realmente associada ao pedido no Bling
-                nfe_associada = False
-                if nfe_id_local and pedido_bling_id:
-                    try:
-                        from ..services.bling_api_service import make_bling_api_request
-                        
-                        # Buscar pedido no Bling para verificar se tem NF-e associada
-                        response_pedido = make_bling_api_request(
-                            'GET',
-                            f'/pedidos/vendas/{pedido_bling_id}'
-                        )
-                        
-                        if response_pedido.status_code == 200:
-                            pedido_data = response_pedido.json().get('data', {})
-                            nfe_pedido = pedido_data.get('notaFiscal', {})
-                            
-                            if nfe_pedido and nfe_pedido.get('id') == nfe_id_local:
-                                nfe_associada = True
-                                current_app.logger.info(
-                                    f"✅ NF-e {nfe_id_local} está associada ao pedido {pedido_bling_id} no Bling"
-                                )
-                            else:
-                                current_app.logger.info(
-                                    f"⚠️ NF-e {nfe_id_local} existe no banco local mas NÃO está associada ao pedido {pedido_bling_id} no Bling. "
-                                    f"Vamos emitir uma nova NF-e associada ao pedido."
-                                )
-                    except Exception as e:
-                        current_app.logger.warning(
-                            f"⚠️ Erro ao verificar associação NF-e/pedido no Bling: {e}. "
-                            f"Vamos tentar emitir NF-e novamente."
-                        )
+                from ..services.job_queue_service import enqueue_job
                 
-                # Se não tem NF-e associada, emitir agora
-                if not nfe_associada:
-                    current_app.logger.info(
-                        f"📄 Pedido {venda_id} está em 'Em andamento' e não tem NF-e. "
-                        f"Emitindo NF-e agora..."
+                try:
+                    enqueue_job(
+                        'bling.emit_nfe',
+                        {'venda_id': venda_id},
+                        chave_idempotencia=f'bling.emit_nfe:{venda_id}'
                     )
-                    try:
-                        from ..services.bling_nfe_service import emit_nfe
-                        nfe_result = emit_nfe(venda_id)
-                        
-                        if nfe_result.get('success'):
-                            current_app.logger.info(
-                                f"✅ NF-e emitida com sucesso para pedido {venda_id}: "
-                                f"ID={nfe_result.get('nfe_id')}, "
-                                f"Status={nfe_result.get('nfe_situacao')}"
-                            )
-                            return True
-                        else:
-                            current_app.logger.error(
-                                f"❌ Falha ao emitir NF-e para pedido {venda_id}: "
-                                f"{nfe_result.get('error')}"
-                            )
-                            return False
-                    except Exception as nfe_error:
-                        current_app.logger.error(
-                            f"❌ Erro ao emitir NF-e para pedido {venda_id}: {nfe_error}",
-                            exc_info=True
-                        )
-                        return False
-                else:
                     current_app.logger.info(
-                        f"ℹ️ Pedido {venda_id} está em 'Em andamento' e já tem NF-e associada."
+                        f"📥 Emissão de NF-e enfileirada para pedido {venda_id} ('Em andamento')"
                     )
                     return True
+                except Exception as nfe_error:
+                    current_app.logger.error(
+                        f"❌ Erro ao enfileirar emissão de NF-e para pedido {venda_id}: {nfe_error}",
+                        exc_info=True
+                    )
+                    return False
             
             # IMPORTANTE: Se está em "Em andamento", SEMPRE verificar e emitir NF-e
             # Isso deve acontecer ANTES de verificar se a situação mudou
@@ -1380,6 +1409,8 @@ def process_order_webhook(webhook_data: dict, event: str, event_id: str, data: d
             current_app.logger.error(f"Erro ao processar webhook de pedido: {e}")
             import traceback
             current_app.logger.error(traceback.format_exc())
+            if from_inbox:
+                raise
             return jsonify({
                 "status": "ok",
                 "message": "Erro ao processar webhook, mas retornando 200 para idempotência"
@@ -1391,13 +1422,15 @@ def process_order_webhook(webhook_data: dict, event: str, event_id: str, data: d
         current_app.logger.error(f"Erro no webhook Bling: {e}")
         import traceback
         current_app.logger.error(traceback.format_exc())
+        if from_inbox:
+            raise
         return jsonify({
             "status": "ok",
             "message": "Erro ao processar webhook"
         }), 200
 
 
-def process_nfe_webhook(webhook_data: dict, event: str, event_id: str, data: dict):
+def process_nfe_webhook(webhook_data: dict, event: str, event_id: str, data: dict, from_inbox: bool = False):
     """
     Processa webhook de nota fiscal do Bling
     
@@ -1413,6 +1446,7 @@ def process_nfe_webhook(webhook_data: dict, event: str, event_id: str, data: dic
         event: Tipo do evento (ex: "consumer_invoice.updated")
         event_id: ID do evento
         data: Dados da nota fiscal do webhook
+        from_inbox: Evento da caixa de entrada: erros são propagados (retry)
     
     Returns:
         Response Flask
@@ -2044,6 +2078,8 @@ def process_nfe_webhook(webhook_data: dict, event: str, event_id: str, data: dic
             current_app.logger.error(f"Erro ao processar webhook de NF-e: {e}")
             import traceback
             current_app.logger.error(traceback.format_exc())
+            if from_inbox:
+                raise
             return jsonify({
                 "status": "ok",
                 "message": "Erro ao processar webhook, mas retornando 200 para idempotência"
@@ -2055,6 +2091,8 @@ def process_nfe_webhook(webhook_data: dict, event: str, event_id: str, data: dic
         current_app.logger.error(f"Erro no webhook de NF-e: {e}")
         import traceback
         current_app.logger.error(traceback.format_exc())
+        if from_inbox:
+            raise
         return jsonify({
             "status": "ok",
             "message": "Erro ao processar webhook"
@@ -2116,15 +2154,89 @@ def bling_webhook():
             "message": "Assinatura inválida"
         }), 403
     
-    # Processar webhook
+    # Obter dados JSON do webhook
+    webhook_data = request.get_json(silent=True)
+    
+    if not webhook_data:
+        current_app.logger.warning("Webhook Bling sem dados JSON")
+        return jsonify({"erro": "Dados não fornecidos"}), 400
+    
+    # Caixa de entrada: gravar e responder na hora; o worker processa,
+    # em ordem por pedido/produto. Reentregas do mesmo eventId são ignoradas
+    event_id = f"bling:{webhook_data.get('eventId') or hashlib.sha256(request_body).hexdigest()}"
+    # Eventos de saldo esperam uma janela curta para serem agrupados por produto
+    atraso = 0
+    if webhook_data.get('event') in BLING_STOCK_COALESCED_EVENTS:
+        atraso = current_app.config.get('WEBHOOK_STOCK_COALESCE_SECONDS', 2)
+    try:
+        stored = store_webhook(
+            'bling', event_id, webhook_data.get('event'),
+            _bling_webhook_entity(webhook_data), webhook_data,
+            atraso_segundos=atraso
+        )
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao gravar webhook Bling na caixa de entrada: {e}")
+        # Não confirmar: o Bling reenvia
+        return jsonify({"erro": "Erro ao registrar webhook"}), 500
+    
+    if stored is not None:
+        return jsonify({
+            "status": "ok",
+            "message": "Webhook recebido" if stored else "Evento já recebido"
+        }), 200
+    
+    # Sem caixa de entrada (sql/create-webhook-inbox.sql não aplicado): processar na hora
+    return process_bling_webhook_payload(webhook_data)
+
+
+def _bling_webhook_entity(webhook_data: dict):
+    """Chave de ordenação de um evento do Bling (pedido, produto ou nota)"""
+    event = webhook_data.get('event') or ''
+    data = webhook_data.get('data')
+    if not isinstance(data, dict):
+        return None
+    
+    if event.startswith('stock.') and isinstance(data.get('produto'), dict):
+        produto_id = data['produto'].get('id')
+        return f"bling:produto:{produto_id}" if produto_id else None
+    if event.startswith('order.'):
+        return f"bling:pedido:{data['id']}" if data.get('id') else None
+    if event.startswith(('consumer_invoice.', 'invoice.', 'nfe.')):
+        return f"bling:nfe:{data['id']}" if data.get('id') else None
+    if event.startswith('product.'):
+        return f"bling:produto:{data['id']}" if data.get('id') else None
+    return None
+
+
+@register_webhook_processor('bling')
+def _process_bling_inbox_event(payload: dict) -> dict:
+    return _webhook_response_result(process_bling_webhook_payload(payload, from_inbox=True))
+
+
+# Saldo completo por evento: só o último de cada produto importa
+BLING_STOCK_COALESCED_EVENTS = ('stock.created', 'stock.updated')
+
+
+@register_webhook_batch_processor('bling', BLING_STOCK_COALESCED_EVENTS)
+def _process_bling_stock_inbox_events(events: list) -> dict:
+    from ..services.bling_stock_service import apply_stock_webhook_events
+    return apply_stock_webhook_events(events)
+
+
+def process_bling_webhook_payload(webhook_data: dict, from_inbox: bool = False):
+    """
+    Processa um evento do Bling (gravado na caixa de entrada ou, sem ela,
+    recebido agora).
+    
+    Args:
+        webhook_data: Corpo JSON do webhook
+        from_inbox: Evento da caixa de entrada: erros são propagados (retry) em vez de
+                    respondidos com 200
+    
+    Returns:
+        Response Flask
+    """
     try:
-        # Obter dados JSON do webhook
-        webhook_data = request.get_json()
-        
-        if not webhook_data:
-            current_app.logger.warning("Webhook Bling sem dados JSON")
-            return jsonify({"erro": "Dados não fornecidos"}), 400
-        
         # Log da requisição recebida
         current_app.logger.info("=" * 80)
         current_app.logger.info("🔔 WEBHOOK BLING RECEBIDO (VALIDADO)")
@@ -2146,13 +2258,13 @@ def bling_webhook():
             pass
         elif event.startswith('order.'):
             # Processar evento de pedido
-            return process_order_webhook(webhook_data, event, event_id, data)
+            return process_order_webhook(webhook_data, event, event_id, data, from_inbox)
         elif (event.startswith('consumer_invoice.') or 
               event.startswith('invoice.') or 
               event.startswith('nfe.')):
             # Processar evento de nota fiscal
             # Bling pode enviar: consumer_invoice.updated, invoice.updated, nfe.updated
-            return process_nfe_webhook(webhook_data, event, event_id, data)
+            return process_nfe_webhook(webhook_data, event, event_id, data, from_inbox)
         elif event.startswith('product.'):
             # Processar evento de produto (estoque, atualização, etc.)
             # Eventos: product.created, product.updated, product.deleted
@@ -2295,6 +2407,8 @@ def bling_webhook():
             current_app.logger.error(f"Erro ao processar webhook Bling: {e}")
             import traceback
             current_app.logger.error(traceback.format_exc())
+            if from_inbox:
+                raise
             # Retornar 200 para não fazer o Bling reenviar (idempotência)
             return jsonify({
                 "status": "ok",
@@ -2307,6 +2421,8 @@ def bling_webhook():
         current_app.logger.error(f"Erro no webhook Bling: {e}")
         import traceback
         current_app.logger.error(traceback.format_exc())
+        if from_inbox:
+            raise
         # Retornar 200 para não fazer o Bling reenviar (idempotência - conforme documentação)
         return jsonify({
             "status": "ok",
@@ -2478,3 +2594,37 @@ def bling_webhook():
             "message": "Erro ao processar webhook"
         }), 200
 
+
+
+@webhook_api_bp.route('/strapi', methods=['POST'])
+def strapi_webhook():
+    """
+    Webhook do Strapi: invalida o cache das páginas institucionais (CMS).
+    
+    POST /api/webhook/strapi
+    
+    Configurar no Strapi (Settings > Webhooks) com os eventos entry.* e o
+    header "Authorization: Bearer <STRAPI_WEBHOOK_SECRET>".
+    Eventos de content-types que não são páginas do CMS são ignorados.
+    """
+    webhook_secret = current_app.config.get('STRAPI_WEBHOOK_SECRET', '')
+    auth_header = request.headers.get('Authorization', '')
+    received_token = auth_header[7:].strip() if auth_header.startswith('Bearer ') else auth_header.strip()
+    
+    if not webhook_secret or not hmac.compare_digest(received_token, webhook_secret):
+        current_app.logger.warning("🚨 Webhook Strapi rejeitado: token inválido ou STRAPI_WEBHOOK_SECRET não configurado")
+        return jsonify({"erro": "Acesso negado"}), 403
+    
+    from ..services.cms_cache import invalidate_cms_cache, keys_for_strapi_model
+    
+    webhook_data = request.get_json(silent=True) or {}
+    event = webhook_data.get('event', '')
+    model = webhook_data.get('model')
+    
+    keys = keys_for_strapi_model(model)
+    if model and keys is None:
+        return jsonify({"status": "ignored", "model": model}), 200
+    
+    invalidate_cms_cache(keys)
+    current_app.logger.info(f"🔔 Webhook Strapi: {event or 'evento'} em {model or 'todos'} - cache do CMS invalidado")
+    return jsonify({"status": "ok", "invalidated": list(keys) if keys else "all"}), 200
@@ -1,6 +1,5 @@
 from flask import render_template, session, current_app, request, flash, redirect, url_for
-from ..services import get_db
-import psycopg2.extras
+from ..services.cms_cache import get_cms_content
 import json
 from . import main_bp
 
@@ -21,56 +20,58 @@ def _is_json_array(value):
 def _is_json_object(value):
     return isinstance(value, dict)
 
+def _carregar_contato(cur):
+    """Carrega e processa o conteúdo da página (chamado apenas quando o cache expira)"""
+    # Buscar conteúdo de contato
+    cur.execute("""
+        SELECT 
+            titulo,
+            texto_principal,
+            informacoes_contato,
+            redes_sociais
+        FROM site_conteudo_contato
+        ORDER BY updated_at DESC
+        LIMIT 1
+    """)
+    
+    conteudo = cur.fetchone()
+    
+    if conteudo:
+        # Robustez: em alguns estados do banco, os campos JSON podem estar "trocados"
+        # (ex.: links indo para informacoes_contato). Vamos detectar pelo tipo.
+        raw_info = parse_json_field(conteudo.get('informacoes_contato'))
+        raw_links = parse_json_field(conteudo.get('redes_sociais'))
+
+        informacoes = raw_info if _is_json_array(raw_info) else (raw_links if _is_json_array(raw_links) else [])
+        links = raw_links if _is_json_object(raw_links) else (raw_info if _is_json_object(raw_info) else {})
+
+        contato_data = {
+            'titulo': conteudo.get('titulo') or 'Entre em Contato',
+            'texto_principal': conteudo.get('texto_principal') or '',
+            # Mantém as chaves esperadas pelo template (informacoes/links)
+            'informacoes': informacoes,
+            'links': links,
+        }
+    else:
+        contato_data = {
+            'titulo': 'Entre em Contato',
+            'texto_principal': '',
+            'informacoes': [],
+            'links': {}
+        }
+    
+    return contato_data
+
 @main_bp.route('/contato', methods=['GET', 'POST'])
 def contato_page():
-    """Renderiza a página de contato com conteúdo dinâmico do banco de dados"""
+    """Renderiza a página de contato com conteúdo dinâmico do banco de dados (em cache)"""
     if request.method == 'POST':
         # Processar formulário de contato (se necessário)
         flash('Mensagem enviada com sucesso! Entraremos em contato em breve.', 'success')
         return redirect(url_for('main.contato_page'))
     
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
     try:
-        # Buscar conteúdo de contato
-        cur.execute("""
-            SELECT 
-                titulo,
-                texto_principal,
-                informacoes_contato,
-                redes_sociais
-            FROM site_conteudo_contato
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """)
-        
-        conteudo = cur.fetchone()
-        
-        if conteudo:
-            # Robustez: em alguns estados do banco, os campos JSON podem estar "trocados"
-            # (ex.: links indo para informacoes_contato). Vamos detectar pelo tipo.
-            raw_info = parse_json_field(conteudo.get('informacoes_contato'))
-            raw_links = parse_json_field(conteudo.get('redes_sociais'))
-
-            informacoes = raw_info if _is_json_array(raw_info) else (raw_links if _is_json_array(raw_links) else [])
-            links = raw_links if _is_json_object(raw_links) else (raw_info if _is_json_object(raw_info) else {})
-
-            contato_data = {
-                'titulo': conteudo.get('titulo') or 'Entre em Contato',
-                'texto_principal': conteudo.get('texto_principal') or '',
-                # Mantém as chaves esperadas pelo template (informacoes/links)
-                'informacoes': informacoes,
-                'links': links,
-            }
-        else:
-            contato_data = {
-                'titulo': 'Entre em Contato',
-                'texto_principal': '',
-                'informacoes': [],
-                'links': {}
-            }
-        
+        contato_data = get_cms_content('contato', _carregar_contato)
         return render_template(
             'contato.html',
             user=session.get('username'),
@@ -89,5 +90,3 @@ def contato_page():
                 'links': {}
             }
         )
-    finally:
-        cur.close()
\ No newline at end of file
@@ -1,6 +1,5 @@
 from flask import render_template, session, current_app
-from ..services import get_db
-import psycopg2.extras
+from ..services.cms_cache import get_cms_content
 import json
 from . import main_bp
 
@@ -15,46 +14,48 @@ def parse_json_field(field):
             return []
     return field
 
+def _carregar_direitos_reservados(cur):
+    """Carrega e processa o conteúdo da página (chamado apenas quando o cache expira)"""
+    # Buscar conteúdo
+    cur.execute("""
+        SELECT 
+            titulo,
+            ultima_atualizacao,
+            conteudo,
+            secoes
+        FROM site_direitos_reservados
+        ORDER BY updated_at DESC
+        LIMIT 1
+    """)
+    
+    conteudo = cur.fetchone()
+    
+    if conteudo:
+        direitos_data = {
+            'titulo': conteudo.get('titulo') or 'Todos os Direitos Reservados',
+            'ultima_atualizacao': conteudo.get('ultima_atualizacao'),
+            'conteudo': conteudo.get('conteudo') or '',
+            'secoes': parse_json_field(conteudo.get('secoes'))
+        }
+        # Ordenar seções por ordem
+        if direitos_data['secoes']:
+            direitos_data['secoes'].sort(key=lambda x: x.get('ordem', 0))
+    else:
+        direitos_data = {
+            'titulo': 'Todos os Direitos Reservados',
+            'ultima_atualizacao': None,
+            'conteudo': '',
+            'secoes': []
+        }
+    
+    return direitos_data
+
 @main_bp.route('/direitos-reservados')
 @main_bp.route('/direitos')
 def direitos_reservados():
-    """Renderiza a página de direitos reservados com conteúdo dinâmico do banco de dados"""
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
+    """Renderiza a página de direitos reservados com conteúdo dinâmico do banco de dados (em cache)"""
     try:
-        # Buscar conteúdo
-        cur.execute("""
-            SELECT 
-                titulo,
-                ultima_atualizacao,
-                conteudo,
-                secoes
-            FROM site_direitos_reservados
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """)
-        
-        conteudo = cur.fetchone()
-        
-        if conteudo:
-            direitos_data = {
-                'titulo': conteudo.get('titulo') or 'Todos os Direitos Reservados',
-                'ultima_atualizacao': conteudo.get('ultima_atualizacao'),
-                'conteudo': conteudo.get('conteudo') or '',
-                'secoes': parse_json_field(conteudo.get('secoes'))
-            }
-            # Ordenar seções por ordem
-            if direitos_data['secoes']:
-                direitos_data['secoes'].sort(key=lambda x: x.get('ordem', 0))
-        else:
-            direitos_data = {
-                'titulo': 'Todos os Direitos Reservados',
-                'ultima_atualizacao': None,
-                'conteudo': '',
-                'secoes': []
-            }
-        
+        direitos_data = get_cms_content('direitos_reservados', _carregar_direitos_reservados)
         return render_template(
             'direitos_reservados.html',
             user=session.get('uid'),
@@ -73,5 +74,3 @@ def direitos_reservados():
                 'secoes': []
             }
         )
-    finally:
-        cur.close()
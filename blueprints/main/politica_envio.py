@@ -1,6 +1,5 @@
 from flask import render_template, session, current_app
-from ..services import get_db
-import psycopg2.extras
+from ..services.cms_cache import get_cms_content
 import json
 from . import main_bp
 
@@ -15,46 +14,48 @@ def parse_json_field(field):
             return []
     return field
 
+def _carregar_politica_envio(cur):
+    """Carrega e processa o conteúdo da página (chamado apenas quando o cache expira)"""
+    # Buscar conteúdo da política
+    cur.execute("""
+        SELECT 
+            titulo,
+            ultima_atualizacao,
+            conteudo,
+            secoes
+        FROM site_politica_envio
+        ORDER BY updated_at DESC
+        LIMIT 1
+    """)
+    
+    conteudo = cur.fetchone()
+    
+    if conteudo:
+        politica_data = {
+            'titulo': conteudo.get('titulo') or 'Política de Envio',
+            'ultima_atualizacao': conteudo.get('ultima_atualizacao'),
+            'conteudo': conteudo.get('conteudo') or '',
+            'secoes': parse_json_field(conteudo.get('secoes'))
+        }
+        # Ordenar seções por ordem
+        if politica_data['secoes']:
+            politica_data['secoes'].sort(key=lambda x: x.get('ordem', 0))
+    else:
+        politica_data = {
+            'titulo': 'Política de Envio',
+            'ultima_atualizacao': None,
+            'conteudo': '',
+            'secoes': []
+        }
+    
+    return politica_data
+
 @main_bp.route('/politica-envio')
 @main_bp.route('/envio')
 def politica_envio():
-    """Renderiza a página de política de envio com conteúdo dinâmico do banco de dados"""
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
+    """Renderiza a página de política de envio com conteúdo dinâmico do banco de dados (em cache)"""
     try:
-        # Buscar conteúdo da política
-        cur.execute("""
-            SELECT 
-                titulo,
-                ultima_atualizacao,
-                conteudo,
-                secoes
-            FROM site_politica_envio
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """)
-        
-        conteudo = cur.fetchone()
-        
-        if conteudo:
-            politica_data = {
-                'titulo': conteudo.get('titulo') or 'Política de Envio',
-                'ultima_atualizacao': conteudo.get('ultima_atualizacao'),
-                'conteudo': conteudo.get('conteudo') or '',
-                'secoes': parse_json_field(conteudo.get('secoes'))
-            }
-            # Ordenar seções por ordem
-            if politica_data['secoes']:
-                politica_data['secoes'].sort(key=lambda x: x.get('ordem', 0))
-        else:
-            politica_data = {
-                'titulo': 'Política de Envio',
-                'ultima_atualizacao': None,
-                'conteudo': '',
-                'secoes': []
-            }
-        
+        politica_data = get_cms_content('politica_envio', _carregar_politica_envio)
         return render_template(
             'politica_envio.html',
             user=session.get('uid'),
@@ -73,5 +74,3 @@ def politica_envio():
                 'secoes': []
             }
         )
-    finally:
-        cur.close()
@@ -1,6 +1,5 @@
 from flask import render_template, session, current_app
-from ..services import get_db
-import psycopg2.extras
+from ..services.cms_cache import get_cms_content
 import json
 from . import main_bp
 
@@ -15,49 +14,51 @@ def parse_json_field(field):
             return [] if '[' in field else {}
     return field
 
+def _carregar_sobre(cur):
+    """Carrega e processa o conteúdo da página (chamado apenas quando o cache expira)"""
+    # Buscar conteúdo sobre
+    cur.execute("""
+        SELECT 
+            historia_titulo,
+            historia_conteudo,
+            valores_titulo,
+            valores_conteudo,
+            equipe_titulo,
+            equipe_conteudo
+        FROM site_conteudo_sobre
+        ORDER BY updated_at DESC
+        LIMIT 1
+    """)
+    
+    conteudo = cur.fetchone()
+    
+    if conteudo:
+        sobre_data = {
+            'historia_titulo': conteudo.get('historia_titulo') or 'Nossa História',
+            'historia_conteudo': conteudo.get('historia_conteudo') or '',
+            'valores_titulo': conteudo.get('valores_titulo') or 'Nossos Valores',
+            'valores': parse_json_field(conteudo.get('valores_conteudo')),
+            'equipe_titulo': conteudo.get('equipe_titulo') or 'Nossa Equipe',
+            'equipe': parse_json_field(conteudo.get('equipe_conteudo'))
+        }
+    else:
+        sobre_data = {
+            'historia_titulo': 'Nossa História',
+            'historia_conteudo': '',
+            'valores_titulo': 'Nossos Valores',
+            'valores': [],
+            'equipe_titulo': 'Nossa Equipe',
+            'equipe': []
+        }
+    
+    return sobre_data
+
 @main_bp.route('/sobre-nos')
 @main_bp.route('/sobre')
 def sobre_nos():
-    """Renderiza a página sobre nós com conteúdo dinâmico do banco de dados"""
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
+    """Renderiza a página sobre nós com conteúdo dinâmico do banco de dados (em cache)"""
     try:
-        # Buscar conteúdo sobre
-        cur.execute("""
-            SELECT 
-                historia_titulo,
-                historia_conteudo,
-                valores_titulo,
-                valores_conteudo,
-                equipe_titulo,
-                equipe_conteudo
-            FROM site_conteudo_sobre
-            ORDER BY updated_at DESC
-            LIMIT 1
-        """)
-        
-        conteudo = cur.fetchone()
-        
-        if conteudo:
-            sobre_data = {
-                'historia_titulo': conteudo.get('historia_titulo') or 'Nossa História',
-                'historia_conteudo': conteudo.get('historia_conteudo') or '',
-                'valores_titulo': conteudo.get('valores_titulo') or 'Nossos Valores',
-                'valores': parse_json_field(conteudo.get('valores_conteudo')),
-                'equipe_titulo': conteudo.get('equipe_titulo') or 'Nossa Equipe',
-                'equipe': parse_json_field(conteudo.get('equipe_conteudo'))
-            }
-        else:
-            sobre_data = {
-                'historia_titulo': 'Nossa História',
-                'historia_conteudo': '',
-                'valores_titulo': 'Nossos Valores',
-                'valores': [],
-                'equipe_titulo': 'Nossa Equipe',
-                'equipe': []
-            }
-        
+        sobre_data = get_cms_content('sobre', _carregar_sobre)
         return render_template(
             'sobre_nos.html',
             user=session.get('uid'),
@@ -78,5 +79,3 @@ def sobre_nos():
                 'equipe': []
             }
         )
-    finally:
-        cur.close()
\ No newline at end of file
@@ -27,7 +27,11 @@ document.addEventListener('DOMContentLoaded', function() {
     const statusLink = document.getElementById('statusLink');
     const paymentLoading = document.getElementById('paymentLoading');
     
+    // Status finais (FINAL_ORDER_STATUSES no servidor): o stream é encerrado e não deve reconectar
+    const FINAL_ORDER_STATUSES = ['PAGO', 'APROVADO', 'NA TRANSPORTADORA', 'ENTREGUE', 'CANCELADO', 'EXPIRADO'];
+    
     let pollingInterval = null;
+    let eventSource = null;
     
     /**
      * Carrega dados do pedido via API
@@ -137,12 +141,59 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     /**
-     * Faz polling do status do pedido
+     * Trata um novo status recebido (SSE ou polling)
+     */
+    async function handleStatus(status) {
+        updateStatus(status);
+        
+        // Status final: fechar o EventSource (senão ele reconecta a cada 3s) e parar o polling
+        if (FINAL_ORDER_STATUSES.includes(status)) {
+            stopPolling();
+        }
+        
+        // Se pagamento foi confirmado, recarregar dados completos
+        if (status === 'PAGO' || status === 'APROVADO') {
+            await loadOrderData();
+        }
+    }
+    
+    /**
+     * Acompanha o status do pedido via Server-Sent Events.
+     * Se o navegador não suportar ou o servidor recusar (503), usa polling.
      */
     function startPolling() {
-        // Parar polling anterior se existir
+        // Parar acompanhamento anterior se existir
         stopPolling();
         
+        if (!window.EventSource) {
+            startIntervalPolling();
+            return;
+        }
+        
+        eventSource = new EventSource(`/api/orders/${token}/events`);
+        eventSource.addEventListener('status', async (event) => {
+            try {
+                const data = JSON.parse(event.data);
+                if (data.status) {
+                    await handleStatus(data.status);
+                }
+            } catch (error) {
+                console.error('Erro ao processar status:', error);
+            }
+        });
+        eventSource.onerror = () => {
+            // Em queda de rede o EventSource reconecta sozinho; se foi recusado, cair para polling
+            if (eventSource && eventSource.readyState === EventSource.CLOSED) {
+                eventSource = null;
+                startIntervalPolling();
+            }
+        };
+    }
+    
+    /**
+     * Faz polling do status do pedido (fallback do SSE)
+     */
+    function startIntervalPolling() {
         // Fazer polling a cada 5 segundos
         pollingInterval = setInterval(async () => {
             try {
@@ -150,13 +201,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 const data = await response.json();
                 
                 if (data.success && data.status) {
-                    updateStatus(data.status);
-                    
-                    // Se pagamento foi confirmado, recarregar dados completos
-                    if (data.status === 'PAGO' || data.status === 'APROVADO') {
-                        stopPolling();
-                        await loadOrderData();
-                    }
+                    await handleStatus(data.status);
                 }
             } catch (error) {
                 console.error('Erro ao verificar status:', error);
@@ -165,9 +210,13 @@ document.addEventListener('DOMContentLoaded', function() {
     }
     
     /**
-     * Para o polling
+     * Para o acompanhamento de status (SSE e polling)
      */
     function stopPolling() {
+        if (eventSource) {
+            eventSource.close();
+            eventSource = null;
+        }
         if (pollingInterval) {
             clearInterval(pollingInterval);
             pollingInterval = null;
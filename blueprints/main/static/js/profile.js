@@ -703,14 +703,29 @@ function setupAddressButtons() {
     });
 }
 
+// Pedidos já carregados e cursor da próxima página (/api/orders é paginado)
+let loadedOrders = [];
+let ordersNextCursor = null;
+
 // Função para carregar pedidos do usuário
-async function loadUserOrders() {
+// loadMore = true busca a próxima página e acrescenta à lista
+async function loadUserOrders(loadMore = false) {
     const currentUser = auth.currentUser;
     if (!currentUser) return;
     
+    if (!loadMore) {
+        loadedOrders = [];
+        ordersNextCursor = null;
+    }
+    
     try {
         const idToken = await currentUser.getIdToken();
-        const response = await fetch('/api/orders', {
+        const params = new URLSearchParams();
+        if (loadMore && ordersNextCursor) {
+            params.set('cursor', ordersNextCursor);
+        }
+        const query = params.toString();
+        const response = await fetch('/api/orders' + (query ? `?${query}` : ''), {
             method: 'GET',
             headers: {
                 'Authorization': `Bearer ${idToken}`
@@ -720,22 +735,24 @@ async function loadUserOrders() {
         if (response.ok) {
             const result = await response.json();
             if (result.orders && Array.isArray(result.orders)) {
-                renderOrders(result.orders);
-            } else {
-                renderOrders([]);
+                loadedOrders = loadedOrders.concat(result.orders);
             }
+            ordersNextCursor = result.next_cursor || null;
+            renderOrders(loadedOrders, ordersNextCursor !== null);
         } else {
             console.error("Erro ao carregar pedidos:", response.status, response.statusText);
-            renderOrders([]);
+            ordersNextCursor = null;
+            renderOrders(loadedOrders);
         }
     } catch (error) {
         console.error('Erro ao carregar pedidos:', error);
-        renderOrders([]);
+        ordersNextCursor = null;
+        renderOrders(loadedOrders);
     }
 }
 
 // Função para renderizar pedidos
-function renderOrders(orders) {
+function renderOrders(orders, hasMore = false) {
     const container = document.getElementById('orders-section');
     if (!container) return;
     
@@ -890,7 +907,25 @@ function renderOrders(orders) {
         `;
     });
     html += '</div>';
+    if (hasMore) {
+        html += `
+            <div class="orders-load-more">
+                <button type="button" class="btn btn-outline" id="orders-load-more-btn">
+                    <i class="fas fa-chevron-down"></i> Carregar mais pedidos
+                </button>
+            </div>
+        `;
+    }
     ordersContainer.innerHTML = html;
+    
+    const loadMoreBtn = document.getElementById('orders-load-more-btn');
+    if (loadMoreBtn) {
+        loadMoreBtn.addEventListener('click', async () => {
+            loadMoreBtn.disabled = true;
+            loadMoreBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Carregando...';
+            await loadUserOrders(true);
+        });
+    }
 }
 
 // =====================================================
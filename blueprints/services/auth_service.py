@@ -11,6 +11,7 @@ from flask import current_app
 from typing import Dict, Optional, Tuple
 from .user_service import get_user_by_firebase_uid, insert_new_user, update_user_profile_db
 from .db import get_db, execute_query_safely, execute_write_safely
+from .schema_capabilities import has_table, has_column
 import logging
 import traceback
 import pyotp
@@ -181,16 +182,9 @@ def sync_user_from_firebase(decoded_token: Dict) -> Tuple[Optional[Dict], bool]:
     user_data = get_user_by_firebase_uid(uid)
     is_new_user = user_data is None
     
-    # Verificar se colunas MFA existem
-    mfa_columns_result = execute_query_safely("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'usuarios' 
-        AND column_name IN ('mfa_enabled', 'mfa_secret')
-    """, fetch_mode='all')
-    mfa_columns = [row[0] for row in mfa_columns_result] if mfa_columns_result else []
-    has_mfa_enabled = 'mfa_enabled' in mfa_columns
-    has_mfa_secret = 'mfa_secret' in mfa_columns
+    # Verificar se colunas MFA existem (cache do schema)
+    has_mfa_enabled = has_column('usuarios', 'mfa_enabled')
+    has_mfa_secret = has_column('usuarios', 'mfa_secret')
     
     conn = get_db()
     cur = conn.cursor()
@@ -460,15 +454,8 @@ def log_auth_event(event_type: str, firebase_uid: str, success: bool, details: s
         user_data = get_user_by_firebase_uid(firebase_uid) if firebase_uid != 'unknown' else None
         user_id = user_data.get('id') if user_data else None
         
-        # Verificar se a tabela existe antes de tentar inserir
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'auditoria_logs'
-            );
-        """)
-        table_exists = cur.fetchone()[0]
+        # Verificar se a tabela existe antes de tentar inserir (cache do schema)
+        table_exists = has_table('auditoria_logs')
         
         if table_exists:
             try:
@@ -595,16 +582,8 @@ def enable_mfa_for_user(user_id: int, secret: str) -> bool:
         True se habilitado com sucesso
     """
     try:
-        # Verificar se colunas MFA existem
-        mfa_columns_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'usuarios' 
-            AND column_name IN ('mfa_enabled', 'mfa_secret')
-        """, fetch_mode='all')
-        mfa_columns = [row[0] for row in mfa_columns_result] if mfa_columns_result else []
-        
-        if 'mfa_enabled' not in mfa_columns or 'mfa_secret' not in mfa_columns:
+        # Verificar se colunas MFA existem (cache do schema)
+        if not has_column('usuarios', 'mfa_enabled') or not has_column('usuarios', 'mfa_secret'):
             logger.error("Colunas MFA não existem na tabela usuarios")
             return False
         
@@ -639,16 +618,8 @@ def disable_mfa_for_user(user_id: int) -> bool:
         True se desabilitado com sucesso
     """
     try:
-        # Verificar se colunas MFA existem
-        mfa_columns_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'usuarios' 
-            AND column_name IN ('mfa_enabled', 'mfa_secret')
-        """, fetch_mode='all')
-        mfa_columns = [row[0] for row in mfa_columns_result] if mfa_columns_result else []
-        
-        if 'mfa_enabled' not in mfa_columns or 'mfa_secret' not in mfa_columns:
+        # Verificar se colunas MFA existem (cache do schema)
+        if not has_column('usuarios', 'mfa_enabled') or not has_column('usuarios', 'mfa_secret'):
             logger.error("Colunas MFA não existem na tabela usuarios")
             return False
         
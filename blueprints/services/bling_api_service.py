@@ -5,21 +5,30 @@ Service para requisições à API do Bling
 Camada de abstração para integração com API do Bling, incluindo:
 - Retry automático com backoff exponencial
 - Tratamento de erros padronizado
-- Rate limiting
+- Rate limiting compartilhado entre processos (token bucket no PostgreSQL)
 - Logs estruturados
 - Idempotência
 """
 from flask import current_app
 import requests
 import json
-from .db import get_db
+from .db import open_dedicated_connection
+from . import metrics
+from .http_client import http_request
+import psycopg2
 import psycopg2.extras
 from datetime import datetime, timedelta
 import base64
+import logging
+import os
+import threading
 import time
-from typing import Dict, Optional, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
 from enum import Enum
 
+logger = logging.getLogger(__name__)
+
 
 class BlingErrorType(Enum):
     """Tipos de erros do Bling"""
@@ -46,110 +55,498 @@ class BlingAPIError(Exception):
 
 class BlingRateLimiter:
     """
-    Rate Limiter para API do Bling
+    Rate Limiter (token bucket) compartilhado para API do Bling
+    
+    Bling tem limite de ~100 requisições/minuto POR CONTA, não por processo.
+    O estado do bucket fica na tabela bling_rate_limit, então todos os workers
+    do Gunicorn, o worker de jobs e os scripts/ consomem do mesmo orçamento.
     
-    Bling tem limite de ~100 requisições/minuto
-    Implementa delay automático entre requisições
+    Cada aquisição é um único UPDATE atômico que reabastece o bucket pelo tempo
+    decorrido e debita o peso da requisição. O saldo pode ficar negativo: quem
+    "reservou" além do disponível dorme exatamente o tempo necessário para o
+    bucket repor a dívida (sem polling e sem sleeps fixos).
+    
+    Se o banco não estiver acessível (ou sql/create-bling-rate-limit.sql não
+    tiver sido aplicado), usa um bucket local (por processo) com a mesma taxa,
+    para não travar as integrações.
     """
-    def __init__(self, min_delay_seconds: float = 0.5):
-        self.min_delay_seconds = min_delay_seconds
-        self.last_request_time = 0.0
-    
-    def wait_if_needed(self):
-        """Aguarda tempo mínimo entre requisições"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+    def __init__(self, bucket_name: str = 'bling_api', rate_per_minute: float = 100.0,
+                 burst: float = 10.0, weights: Optional[Dict[str, float]] = None):
+        self.bucket_name = bucket_name
+        self.rate_per_minute = float(rate_per_minute)
+        self.burst = float(burst)
+        self.weights = weights or {}
+        self._configured = False
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self._bucket_ready = False
+        self._retry_shared_at = 0.0
+        self._local_tokens = self.burst
+        self._local_updated = time.monotonic()
+
+    @property
+    def rate_per_second(self) -> float:
+        return self.rate_per_minute / 60.0
+
+    def configure(self, rate_per_minute: float = None, burst: float = None,
+                  weights: Optional[Dict[str, float]] = None):
+        """Aplica configuração (normalmente vinda do app.config)"""
+        with self._lock:
+            if rate_per_minute is not None:
+                self.rate_per_minute = float(rate_per_minute)
+            if burst is not None:
+                self.burst = float(burst)
+                self._local_tokens = min(self._local_tokens, self.burst)
+            if weights is not None:
+                self.weights = dict(weights)
+            # Forçar reaplicar capacidade/taxa no bucket compartilhado
+            self._bucket_ready = False
+            self._configured = True
+
+    def _ensure_configured(self):
+        if self._configured:
+            return
+        try:
+            config = current_app.config
+        except RuntimeError:
+            # Fora de app context: manter valores padrão
+            self._configured = True
+            return
+        self.configure(
+            rate_per_minute=config.get('BLING_RATE_LIMIT_PER_MINUTE', self.rate_per_minute),
+            burst=config.get('BLING_RATE_LIMIT_BURST', self.burst),
+            weights=_parse_rate_limit_weights(config.get('BLING_RATE_LIMIT_WEIGHTS', ''))
+        )
+
+    def weight_for(self, method: str = None, endpoint: str = None) -> float:
+        """
+        Peso de uma requisição. Regras mais específicas vencem:
+        'POST /nfe' > '/nfe' > padrão (1).
+        """
+        if not endpoint:
+            return 1.0
+        path = endpoint.split('?', 1)[0]
+        best_weight, best_len = 1.0, -1
+        for rule, weight in self.weights.items():
+            rule_method, _, rule_path = rule.rpartition(' ')
+            if rule_method and method and rule_method.upper() != method.upper():
+                continue
+            if rule_method and not method:
+                continue
+            if path.startswith(rule_path):
+                specificity = len(rule_path) + (1000 if rule_method else 0)
+                if specificity > best_len:
+                    best_weight, best_len = weight, specificity
+        return best_weight
+
+    def _get_connection(self):
+        """Conexão dedicada (autocommit) por processo; recriada após fork"""
+        pid = os.getpid()
+        if self._conn is not None and self._conn_pid == pid and not self._conn.closed:
+            return self._conn
+        if self._conn is not None and self._conn_pid == pid:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        # Conexão herdada de outro processo (fork) não é fechada: pertence ao pai
+        self._conn = open_dedicated_connection(autocommit=True)
+        self._conn_pid = pid
+        self._bucket_ready = False
+        return self._conn
+
+    def _ensure_bucket(self, cur):
+        if self._bucket_ready:
+            return
+        # Tabela criada por sql/create-bling-rate-limit.sql (sem DDL no caminho das chamadas);
+        # aqui só a linha do bucket e a capacidade/taxa configuradas
+        cur.execute("""
+            INSERT INTO bling_rate_limit (nome, tokens, capacidade, taxa_por_segundo, atualizado_em)
+            VALUES (%s, %s, %s, %s, clock_timestamp())
+            ON CONFLICT (nome) DO UPDATE
+            SET capacidade = EXCLUDED.capacidade,
+                taxa_por_segundo = EXCLUDED.taxa_por_segundo
+        """, (self.bucket_name, self.burst, self.burst, self.rate_per_second))
+        self._bucket_ready = True
+
+    def _reserve_shared(self, weight: float) -> float:
+        """
+        Reserva `weight` tokens no bucket compartilhado.
+        Retorna quantos segundos o chamador deve aguardar.
         
-        if time_since_last < self.min_delay_seconds:
-            sleep_time = self.min_delay_seconds - time_since_last
-            time.sleep(sleep_time)
+        O UPDATE bloqueia a linha do bucket; em READ COMMITTED o Postgres
+        reavalia as expressões do SET sobre a versão mais recente da linha,
+        então reservas concorrentes de processos diferentes são serializadas.
+        """
+        conn = self._get_connection()
+        with conn.cursor() as cur:
+            self._ensure_bucket(cur)
+            cur.execute("""
+                UPDATE bling_rate_limit
+                SET tokens = LEAST(
+                        capacidade,
+                        tokens + GREATEST(EXTRACT(EPOCH FROM clock_timestamp() - atualizado_em), 0) * taxa_por_segundo
+                    ) - %s,
+                    atualizado_em = clock_timestamp()
+                WHERE nome = %s
+                RETURNING tokens, taxa_por_segundo
+            """, (weight, self.bucket_name))
+            row = cur.fetchone()
+            if row is None:
+                # Linha removida manualmente - recriar na próxima tentativa
+                self._bucket_ready = False
+                raise psycopg2.OperationalError("Bucket de rate limit não encontrado")
+        tokens, rate = row
+        return max(0.0, -float(tokens)) / float(rate) if rate else 0.0
+
+    def _reserve_local(self, weight: float) -> float:
+        """Mesmo algoritmo, em memória (fallback por processo)"""
+        now = time.monotonic()
+        elapsed = max(0.0, now - self._local_updated)
+        self._local_tokens = min(self.burst, self._local_tokens + elapsed * self.rate_per_second) - weight
+        self._local_updated = now
+        return max(0.0, -self._local_tokens) / self.rate_per_second if self.rate_per_second else 0.0
+
+    def acquire(self, method: str = None, endpoint: str = None, weight: float = None) -> float:
+        """
+        Aguarda até haver orçamento para uma requisição ao Bling.
         
-        self.last_request_time = time.time()
+        Returns:
+            Tempo (segundos) efetivamente aguardado
+        """
+        self._ensure_configured()
+        if weight is None:
+            weight = self.weight_for(method, endpoint)
+
+        backend = 'shared'
+        with self._lock:
+            wait = None
+            if time.monotonic() >= self._retry_shared_at:
+                try:
+                    wait = self._reserve_shared(weight)
+                except (psycopg2.Error, RuntimeError) as e:
+                    # Evitar tentar o banco a cada requisição enquanto estiver fora
+                    self._retry_shared_at = time.monotonic() + 30
+                    self._bucket_ready = False
+                    if self._conn is not None and self._conn_pid == os.getpid():
+                        try:
+                            self._conn.close()
+                        except Exception:
+                            pass
+                    self._conn = None
+                    logger.warning(f"⚠️ Rate limiter compartilhado do Bling indisponível, usando limite local: {e}")
+            if wait is None:
+                backend = 'local'
+                wait = self._reserve_local(weight)
+
+        if wait > 0:
+            time.sleep(wait)
+
+        _rate_limit_wait_seconds.observe(wait, bucket=self.bucket_name, backend=backend)
+        _rate_limit_tokens_total.inc(weight, bucket=self.bucket_name, backend=backend)
+        return wait
+
+    def wait_if_needed(self, method: str = None, endpoint: str = None) -> float:
+        """Compatibilidade: equivalente a acquire()"""
+        return self.acquire(method, endpoint)
+
+    def penalize(self):
+        """
+        Zera o bucket após um 429 do Bling, para que todos os processos
+        desacelerem juntos em vez de cada um descobrir o limite sozinho.
+        """
+        self._ensure_configured()
+        with self._lock:
+            self._local_tokens = min(self._local_tokens, 0.0)
+            self._local_updated = time.monotonic()
+            if time.monotonic() < self._retry_shared_at:
+                return
+            try:
+                conn = self._get_connection()
+                with conn.cursor() as cur:
+                    self._ensure_bucket(cur)
+                    cur.execute("""
+                        UPDATE bling_rate_limit
+                        SET tokens = LEAST(tokens, 0), atualizado_em = clock_timestamp()
+                        WHERE nome = %s
+                    """, (self.bucket_name,))
+            except (psycopg2.Error, RuntimeError) as e:
+                logger.warning(f"⚠️ Não foi possível penalizar o bucket compartilhado do Bling: {e}")
+        _rate_limit_throttled_total.inc(bucket=self.bucket_name)
+
+    def get_status(self) -> Dict:
+        """Situação atual do bucket e das esperas (para o painel admin)"""
+        self._ensure_configured()
+        status = {
+            'bucket': self.bucket_name,
+            'rate_per_minute': self.rate_per_minute,
+            'burst': self.burst,
+            'weights': self.weights,
+            'backend': 'local' if time.monotonic() < self._retry_shared_at else 'shared',
+            'shared_tokens': None,
+        }
+        if status['backend'] == 'shared':
+            with self._lock:
+                try:
+                    conn = self._get_connection()
+                    with conn.cursor() as cur:
+                        self._ensure_bucket(cur)
+                        cur.execute("""
+                            SELECT LEAST(
+                                capacidade,
+                                tokens + GREATEST(EXTRACT(EPOCH FROM clock_timestamp() - atualizado_em), 0) * taxa_por_segundo
+                            )
+                            FROM bling_rate_limit
+                            WHERE nome = %s
+                        """, (self.bucket_name,))
+                        row = cur.fetchone()
+                        status['shared_tokens'] = float(row[0]) if row else None
+                except (psycopg2.Error, RuntimeError) as e:
+                    status['shared_error'] = str(e)
+
+        # Esperas observadas neste processo
+        snapshot = _rate_limit_wait_seconds.snapshot()
+        waits = {}
+        for key, series in snapshot['series'].items():
+            labels = dict(key)
+            if labels.get('bucket') != self.bucket_name:
+                continue
+            count = series[-1]
+            waits[labels.get('backend', 'shared')] = {
+                'count': int(count),
+                'total_wait_seconds': round(series[-2], 3),
+                'avg_wait_seconds': round(series[-2] / count, 4) if count else 0.0,
+            }
+        status['process_waits'] = waits
+        status['pid'] = os.getpid()
+        return status
+
+
+def _parse_rate_limit_weights(raw: str) -> Dict[str, float]:
+    """
+    Converte BLING_RATE_LIMIT_WEIGHTS em dict.
+    Formato: "/nfe=2,POST /pedidos/vendas=2,/estoques=1"
+    """
+    weights = {}
+    for item in (raw or '').split(','):
+        if '=' not in item:
+            continue
+        rule, _, value = item.rpartition('=')
+        rule = rule.strip()
+        try:
+            weights[rule] = float(value)
+        except ValueError:
+            logger.warning(f"⚠️ Peso inválido em BLING_RATE_LIMIT_WEIGHTS: {item!r}")
+    return weights
+
 
+_rate_limit_wait_seconds = metrics.histogram(
+    'bling_rate_limit_wait_seconds',
+    'Tempo aguardado no rate limiter do Bling antes de cada requisição',
+    buckets=(0.0, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+_rate_limit_tokens_total = metrics.counter(
+    'bling_rate_limit_tokens_total',
+    'Tokens consumidos do bucket do Bling (soma dos pesos das requisições)'
+)
+_rate_limit_throttled_total = metrics.counter(
+    'bling_rate_limit_throttled_total',
+    'Respostas 429 recebidas do Bling'
+)
 
-# Instância global do rate limiter
-_rate_limiter = BlingRateLimiter(min_delay_seconds=0.5)
+# Instância global do rate limiter (configurada a partir do app.config no primeiro uso)
+_rate_limiter = BlingRateLimiter()
 
 
-def get_valid_access_token() -> str:
+# Cache do access token por processo (evita um SELECT em bling_tokens a cada requisição)
+_token_cache: Dict[str, Any] = {'access_token': None, 'expires_at': None, 'pid': None}
+_token_lock = threading.Lock()
+
+# Margem antes do vencimento em que o token já é considerado "expirando"
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+
+def invalidate_bling_token_cache():
     """
-    Obtém access token válido do banco de dados
-    Renova automaticamente se expirado (usando refresh_token)
+    Descarta o token em cache neste processo.
+    Chamado quando os tokens são gravados/revogados ou o Bling responde 401.
     """
-    conn = get_db()
+    with _token_lock:
+        _token_cache.update({'access_token': None, 'expires_at': None, 'pid': None})
+
+
+def _get_cached_token() -> Optional[str]:
+    if _token_cache['pid'] != os.getpid():
+        return None
+    expires_at = _token_cache['expires_at']
+    if not _token_cache['access_token'] or not expires_at:
+        return None
+    if datetime.now() + TOKEN_REFRESH_MARGIN > expires_at:
+        return None
+    return _token_cache['access_token']
+
+
+def _set_cached_token(access_token: str, expires_at: Optional[datetime]):
+    _token_cache.update({'access_token': access_token, 'expires_at': expires_at, 'pid': os.getpid()})
+
+
+def _load_or_refresh_token(rejected_token: Optional[str] = None, force_refresh: bool = False) -> Tuple[str, Optional[datetime]]:
+    """
+    Lê o token do banco e, se necessário, renova com single-flight entre processos.
+    
+    Usa uma conexão própria (não a da requisição) para não interferir na
+    transação do chamador. A renovação acontece sob SELECT ... FOR UPDATE na
+    linha de bling_tokens: o primeiro processo renova, os demais esperam o
+    lock e, ao reler a linha, já encontram o token novo.
+    
+    Args:
+        rejected_token: Token que o Bling acabou de recusar (401) - não reutilizar
+        force_refresh: Renovar mesmo que o token ainda não esteja expirando
+    
+    Returns:
+        Tuple (access_token, expires_at)
+    """
+    conn = open_dedicated_connection(autocommit=False)
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     
     try:
+        def needs_refresh(row) -> bool:
+            if force_refresh:
+                return True
+            if rejected_token and row['access_token'] == rejected_token:
+                return True
+            expires_at = row['expires_at']
+            return bool(expires_at and datetime.now() + TOKEN_REFRESH_MARGIN > expires_at)
+        
         cur.execute("""
             SELECT access_token, refresh_token, expires_at, token_type
             FROM bling_tokens
             WHERE id = 1
         """)
+        token_data = cur.fetchone()
+        
+        if not token_data:
+            raise ValueError("Bling não autorizado. Use /api/bling/authorize")
         
+        if not needs_refresh(token_data):
+            conn.commit()
+            return token_data['access_token'], token_data['expires_at']
+        
+        # Single-flight: bloquear a linha e reavaliar (outro processo pode ter renovado)
+        cur.execute("SET LOCAL lock_timeout = '60s'")
+        cur.execute("""
+            SELECT access_token, refresh_token, expires_at, token_type
+            FROM bling_tokens
+            WHERE id = 1
+            FOR UPDATE
+        """)
         token_data = cur.fetchone()
         
         if not token_data:
             raise ValueError("Bling não autorizado. Use /api/bling/authorize")
         
-        # Verificar se token expirou (com margem de 5 minutos)
+        if token_data['access_token'] != (rejected_token or token_data['access_token']) or \
+                (not force_refresh and not needs_refresh(token_data)):
+            # Já renovado por outro processo enquanto aguardávamos o lock
+            conn.commit()
+            current_app.logger.info("🔁 Token Bling já renovado por outro processo")
+            return token_data['access_token'], token_data['expires_at']
+        
         expires_at = token_data['expires_at']
-        token_expired = expires_at and datetime.now() > expires_at
-        token_expiring_soon = expires_at and datetime.now() + timedelta(minutes=5) > expires_at
+        token_expired = bool(expires_at and datetime.now() > expires_at)
         
-        if token_expired or token_expiring_soon:
-            # Token expirado ou próximo de expirar - tentar renovar
-            if token_expired:
-                current_app.logger.warning("Token Bling expirado. Tentando renovar...")
-            else:
-                current_app.logger.info("Token Bling próximo de expirar. Tentando renovar...")
-            
-            refresh_token = token_data.get('refresh_token')
-            if refresh_token:
-                new_tokens = refresh_bling_token(refresh_token)
-                
-                if new_tokens:
-                    # Atualizar tokens no banco
-                    new_expires_at = datetime.now() + timedelta(seconds=new_tokens.get('expires_in', 3600))
-                    cur.execute("""
-                        UPDATE bling_tokens
-                        SET access_token = %s,
-                            refresh_token = %s,
-                            expires_at = %s,
-                            updated_at = NOW()
-                        WHERE id = 1
-                    """, (
-                        new_tokens['access_token'],
-                        new_tokens.get('refresh_token', refresh_token),
-                        new_expires_at
-                    ))
-                    conn.commit()
-                    
-                    current_app.logger.info("✅ Token Bling renovado com sucesso")
-                    return new_tokens['access_token']
-                else:
-                    if token_expired:
-                        current_app.logger.error("❌ Falha ao renovar token expirado. É necessário reautorizar via /api/bling/authorize")
-                        raise ValueError("Token Bling expirado e não foi possível renovar. Reautorize via /api/bling/authorize")
-                    else:
-                        current_app.logger.warning("⚠️ Falha ao renovar token. Usando token atual.")
-            else:
-                current_app.logger.error("❌ Token expirado e refresh_token não disponível. É necessário reautorizar via /api/bling/authorize")
-                raise ValueError("Token Bling expirado e refresh_token não disponível. Reautorize via /api/bling/authorize")
+        if token_expired:
+            current_app.logger.warning("Token Bling expirado. Tentando renovar...")
+        else:
+            current_app.logger.info("Token Bling próximo de expirar. Tentando renovar...")
         
-        return token_data['access_token']
+        refresh_token = token_data.get('refresh_token')
+        if not refresh_token:
+            current_app.logger.error("❌ Token expirado e refresh_token não disponível. É necessário reautorizar via /api/bling/authorize")
+            raise ValueError("Token Bling expirado e refresh_token não disponível. Reautorize via /api/bling/authorize")
         
-    except Exception as e:
-        current_app.logger.error(f"Erro ao obter access token: {e}")
+        new_tokens = refresh_bling_token(refresh_token)
+        
+        if not new_tokens:
+            conn.rollback()
+            if token_expired or rejected_token or force_refresh:
+                current_app.logger.error("❌ Falha ao renovar token expirado. É necessário reautorizar via /api/bling/authorize")
+                raise ValueError("Token Bling expirado e não foi possível renovar. Reautorize via /api/bling/authorize")
+            current_app.logger.warning("⚠️ Falha ao renovar token. Usando token atual.")
+            return token_data['access_token'], expires_at
+        
+        # Atualizar tokens no banco (libera o lock no commit)
+        new_expires_at = datetime.now() + timedelta(seconds=new_tokens.get('expires_in', 3600))
+        cur.execute("""
+            UPDATE bling_tokens
+            SET access_token = %s,
+                refresh_token = %s,
+                expires_at = %s,
+                updated_at = NOW()
+            WHERE id = 1
+        """, (
+            new_tokens['access_token'],
+            new_tokens.get('refresh_token', refresh_token),
+            new_expires_at
+        ))
+        conn.commit()
+        
+        current_app.logger.info("✅ Token Bling renovado com sucesso")
+        return new_tokens['access_token'], new_expires_at
+        
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
         raise
     finally:
         cur.close()
+        conn.close()
+
+
+def get_valid_access_token(rejected_token: Optional[str] = None, force_refresh: bool = False) -> str:
+    """
+    Obtém access token válido
+    
+    O token fica em cache no processo até TOKEN_REFRESH_MARGIN antes de
+    expires_at, então o banco só é consultado na primeira chamada e perto
+    do vencimento. A renovação (refresh_token) é feita uma única vez por vez
+    entre todos os processos (ver _load_or_refresh_token).
+    
+    Args:
+        rejected_token: Token recusado pelo Bling (401); força renovação se ainda for o atual
+        force_refresh: Renova mesmo que o token ainda seja válido
+    """
+    if not rejected_token and not force_refresh:
+        cached = _get_cached_token()
+        if cached:
+            return cached
+    
+    # Single-flight dentro do processo: apenas uma thread consulta/renova
+    with _token_lock:
+        if not force_refresh:
+            cached = _get_cached_token()
+            if cached and cached != rejected_token:
+                return cached
+        
+        try:
+            access_token, expires_at = _load_or_refresh_token(rejected_token, force_refresh)
+        except Exception as e:
+            _token_cache.update({'access_token': None, 'expires_at': None, 'pid': None})
+            current_app.logger.error(f"Erro ao obter access token: {e}")
+            raise
+        
+        _set_cached_token(access_token, expires_at)
+        return access_token
 
 
 def refresh_bling_token(refresh_token: str) -> dict:
     """
     Renova access token usando refresh token
     """
-    BLING_TOKEN_URL = "https://www.bling.com.br/Api/v3/oauth/token"
+    BLING_TOKEN_URL = current_app.config.get('BLING_TOKEN_URL', "https://www.bling.com.br/Api/v3/oauth/token")
     
     client_id = current_app.config['BLING_CLIENT_ID']
     client_secret = current_app.config['BLING_CLIENT_SECRET']
@@ -170,7 +567,9 @@ def refresh_bling_token(refresh_token: str) -> dict:
     }
     
     try:
-        response = requests.post(
+        response = http_request(
+            'bling',
+            'POST',
             BLING_TOKEN_URL,
             data=data,
             headers=headers,
@@ -289,10 +688,7 @@ def make_bling_api_request(method: str, endpoint: str, max_retries: int = 3,
     Raises:
         BlingAPIError: Em caso de erro na requisição
     """
-    BLING_API_BASE_URL = "https://www.bling.com.br/Api/v3"
-    
-    # Rate limiting
-    _rate_limiter.wait_if_needed()
+    BLING_API_BASE_URL = current_app.config.get('BLING_API_BASE_URL', "https://www.bling.com.br/Api/v3")
     
     # Obter token
     access_token = get_valid_access_token()
@@ -320,7 +716,10 @@ def make_bling_api_request(method: str, endpoint: str, max_retries: int = 3,
     # Loop de retry
     for attempt in range(max_retries + 1):
         try:
-            response = requests.request(method, url, timeout=30, **kwargs)
+            # Rate limiting (cada tentativa é uma requisição e consome do bucket)
+            _rate_limiter.acquire(method, endpoint)
+            
+            response = http_request('bling', method, url, timeout=30, **kwargs)
             
             # Log da resposta
             current_app.logger.debug(
@@ -339,8 +738,8 @@ def make_bling_api_request(method: str, endpoint: str, max_retries: int = 3,
                 if 'expired' in error_msg.lower() or 'invalid_token' in error_msg.lower():
                     current_app.logger.warning("⚠️ Token expirado detectado na resposta. Tentando renovar...")
                     try:
-                        # Forçar renovação do token
-                        access_token = get_valid_access_token()  # Isso já tenta renovar automaticamente
+                        # Forçar renovação do token (se outro processo ainda não renovou)
+                        access_token = get_valid_access_token(rejected_token=access_token)
                         headers['Authorization'] = f'Bearer {access_token}'
                         kwargs['headers'] = headers
                         current_app.logger.info("✅ Token renovado. Tentando requisição novamente...")
@@ -359,7 +758,13 @@ def make_bling_api_request(method: str, endpoint: str, max_retries: int = 3,
                 error_type, error_msg = _classify_bling_error(response)
                 is_rate_limit = (response.status_code == 429)
                 
-                delay = _calculate_backoff_delay(attempt, is_rate_limit=is_rate_limit)
+                if is_rate_limit:
+                    # Esvaziar o bucket compartilhado para todos os processos desacelerarem
+                    _rate_limiter.penalize()
+                    retry_after = response.headers.get('Retry-After', '')
+                    delay = float(retry_after) if retry_after.isdigit() else _calculate_backoff_delay(attempt, is_rate_limit=True)
+                else:
+                    delay = _calculate_backoff_delay(attempt)
                 
                 current_app.logger.warning(
                     f"⚠️ Erro {response.status_code} na requisição. "
@@ -476,3 +881,49 @@ def make_bling_api_request(method: str, endpoint: str, max_retries: int = 3,
         error_type=BlingErrorType.UNKNOWN_ERROR
     )
 
+
+# =====================================================
+# Execução concorrente (sincronizações em lote)
+# =====================================================
+
+def run_bling_calls_concurrently(func: Callable, items: Iterable, max_workers: int = None) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Executa func(item) para cada item em um pool limitado de threads
+    
+    As threads compartilham o mesmo _rate_limiter (e o bucket no PostgreSQL),
+    então o pool não aumenta a taxa de requisições ao Bling: apenas sobrepõe a
+    latência de rede das chamadas que o bucket já liberou. Cada thread roda
+    dentro de um app context próprio (current_app, logger, config); se func
+    usar get_db(), a conexão é devolvida ao pool no teardown do contexto.
+    
+    Args:
+        func: Função chamada com um item
+        items: Itens a processar
+        max_workers: Tamanho do pool (padrão: BLING_SYNC_MAX_WORKERS)
+    
+    Returns:
+        Lista (na ordem dos itens) de tuplas (resultado, exceção ou None)
+    """
+    app = current_app._get_current_object()
+    items = list(items)
+    max_workers = max(1, int(max_workers or app.config.get('BLING_SYNC_MAX_WORKERS', 4)))
+    
+    def _run(item):
+        with app.app_context():
+            try:
+                return func(item), None
+            except Exception as e:
+                return None, e
+    
+    if max_workers == 1 or len(items) <= 1:
+        # Sem ganho com threads: executa no contexto atual
+        results = []
+        for item in items:
+            try:
+                results.append((func(item), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+    
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix='bling-sync') as executor:
+        return list(executor.map(_run, items))
@@ -9,6 +9,7 @@ from typing import Dict, Optional
 import logging
 
 from .bling_api_service import make_bling_api_request
+from .reference_cache import get_reference_data
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +37,21 @@ SERVICOS_LOGISTICOS_IDS = {
 }
 
 
+def _fetch_melhor_envio_services() -> list:
+    """Lista os serviços de logística Melhor Envio no Bling (loader do cache de referência)"""
+    response = make_bling_api_request(
+        'GET',
+        '/logisticas/servicos',
+        params={
+            'tipoIntegracao': 'MelhorEnvio',
+            'limite': 100
+        }
+    )
+    if response.status_code != 200:
+        raise Exception(f"HTTP {response.status_code} ao listar serviços de logística")
+    return response.json().get('data', [])
+
+
 def get_or_create_logistics_service(melhor_envio_service_id: int, service_name: str, transportadora_nome: Optional[str] = None) -> Optional[Dict]:
     """
     Busca ou retorna ID fixo de serviço de logística no Bling baseado no código do Melhor Envio.
@@ -87,18 +103,9 @@ def get_or_create_logistics_service(melhor_envio_service_id: int, service_name:
             f"Tentando buscar no Bling..."
         )
         
-        response = make_bling_api_request(
-            'GET',
-            '/logisticas/servicos',
-            params={
-                'tipoIntegracao': 'MelhorEnvio',
-                'limite': 100
-            }
-        )
+        servicos_data = get_reference_data('servicos_logisticos', _fetch_melhor_envio_services)
         
-        if response.status_code == 200:
-            servicos_data = response.json().get('data', [])
-            
+        if servicos_data:
             # Procurar serviço com código correspondente
             # Preferir serviços específicos da loja (LhamaBanana) se existirem
             servico_bling = None
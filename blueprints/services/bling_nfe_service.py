@@ -1288,3 +1288,51 @@ def emit_nfe_for_order(venda_id: int) -> Dict:
     finally:
         cur.close()
 
+
+
+def emit_nfe_if_not_associated(venda_id: int) -> Dict:
+    """
+    Emite NF-e para o pedido apenas se ainda não houver NF-e associada a ele no Bling
+    
+    Usado pelo job 'bling.emit_nfe' (enfileirado pelo webhook de pedido quando o
+    pedido entra em "Em andamento"). A NF-e registrada localmente só é considerada
+    válida se o pedido no Bling apontar para ela.
+    
+    Args:
+        venda_id: ID da venda local
+    
+    Returns:
+        Dict com resultado da emissão (success=True se já existia NF-e associada)
+    """
+    bling_pedido = get_bling_order_by_local_id(venda_id)
+    pedido_bling_id = bling_pedido.get('bling_pedido_id') if bling_pedido else None
+    nfe_id_local = bling_pedido.get('bling_nfe_id') if bling_pedido else None
+    
+    if nfe_id_local and pedido_bling_id:
+        try:
+            response_pedido = make_bling_api_request('GET', f'/pedidos/vendas/{pedido_bling_id}')
+            pedido_data = response_pedido.json().get('data', {})
+            nfe_pedido = pedido_data.get('notaFiscal') or {}
+            
+            if nfe_pedido.get('id') == nfe_id_local:
+                current_app.logger.info(
+                    f"ℹ️ Pedido {venda_id} já tem NF-e {nfe_id_local} associada no Bling"
+                )
+                return {
+                    'success': True,
+                    'action': 'skipped',
+                    'nfe_id': nfe_id_local
+                }
+            
+            current_app.logger.info(
+                f"⚠️ NF-e {nfe_id_local} existe no banco local mas NÃO está associada ao pedido "
+                f"{pedido_bling_id} no Bling. Emitindo nova NF-e associada ao pedido."
+            )
+        except BlingAPIError as e:
+            current_app.logger.warning(
+                f"⚠️ Erro ao verificar associação NF-e/pedido no Bling: {e.message}. "
+                f"Tentando emitir NF-e novamente."
+            )
+    
+    current_app.logger.info(f"📄 Emitindo NF-e para pedido {venda_id}...")
+    return emit_nfe(venda_id)
@@ -7,6 +7,7 @@ Este módulo implementa a sincronização de vendas do LhamaBanana para o Bling.
 from flask import current_app
 from typing import Dict, Optional, List
 from datetime import datetime
+import os
 import time
 import json
 import re
@@ -1111,51 +1112,215 @@ def sync_order_status_from_bling(venda_id: int) -> Dict:
         }
 
 
-def sync_all_orders_status() -> Dict:
+# Status locais finais: o pedido não muda mais de situação e fica fora da reconciliação
+STATUS_PEDIDO_FINAIS = ('entregue', 'cancelado_pelo_cliente', 'cancelado_pelo_vendedor', 'devolvido', 'reembolsado')
+
+
+def reconcile_orders_status_from_bling(full: bool = False, page_size: int = None) -> Dict:
     """
-    Sincroniza status de todos os pedidos sincronizados com Bling
+    Reconcilia a situação dos pedidos com o Bling de forma incremental
+    
+    Em vez de um GET por pedido, lista /pedidos/vendas paginado e compara a
+    situação de cada pedido com a local, apenas para pedidos em status não
+    final. Só os pedidos cuja situação mudou são atualizados (em lote, via
+    update_pedidos_situacao_batch), junto com os dados da NF-e (notaFiscal) em
+    bling_pedidos; quando a listagem não traz notaFiscal, o pedido completo é
+    buscado apenas para esses pedidos.
+    
+    A marca d'água (bling_sync_estado, nome 'pedidos_status') guarda o início
+    da última execução concluída: as seguintes pedem só os pedidos alterados
+    desde então (dataAlteracaoInicial, com BLING_STATUS_OVERLAP_MINUTES de
+    folga). Sem marca d'água ou com full=True, a janela começa na data do
+    pedido não final mais antigo.
+    
+    O Bling interpreta as datas no horário de Brasília (UTC-3), e o container
+    roda em UTC: a marca d'água é gerada e gravada em horário de Brasília.
+    
+    Args:
+        full: Ignorar a marca d'água e varrer toda a janela dos pedidos não finais
+        page_size: Pedidos por página (padrão: BLING_STATUS_PAGE_SIZE)
+    
+    Returns:
+        Dict com success (bool: execução concluída), total, changed, updated (pedidos
+        atualizados), errors, watermark e results
     """
+    from datetime import timedelta, timezone
+    from .bling_product_service import (
+        ensure_bling_sync_estado_table, _sync_log_row, _try_sync_lock, _release_sync_lock
+    )
+    from .bling_api_service import run_bling_calls_concurrently
+    from .bling_situacao_service import update_pedidos_situacao_batch
+    from .order_service import sync_order_status_from_venda
+    from .schema_capabilities import has_column
+    
+    config = current_app.config
+    page_size = int(page_size or config.get('BLING_STATUS_PAGE_SIZE', 100))
+    overlap_minutes = int(config.get('BLING_STATUS_OVERLAP_MINUTES', 10))
+    situacao_column = 'v.bling_situacao_id' if has_column('vendas', 'bling_situacao_id') else 'NULL::INTEGER'
+    
     conn = get_db()
-    cur = conn.cursor()
+    ensure_bling_sync_estado_table(conn)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    
+    if not _try_sync_lock(cur, 'pedidos_status'):
+        cur.close()
+        return {
+            'success': False,
+            'error': 'Reconciliação de status já em andamento',
+            'total': 0,
+            'results': []
+        }
+    
+    # Horário de Brasília sem tzinfo: mesmo formato de dataAlteracaoInicial e de marca_dagua (TIMESTAMP)
+    tz_brasil = timezone(timedelta(hours=-3))
+    inicio = datetime.now(tz_brasil).replace(tzinfo=None)
     
     try:
-        cur.execute("""
-            SELECT venda_id FROM bling_pedidos
-        """)
+        cur.execute(f"""
+            SELECT bp.bling_pedido_id, bp.venda_id, v.data_venda, {situacao_column} AS bling_situacao_id
+            FROM bling_pedidos bp
+            JOIN vendas v ON v.id = bp.venda_id
+            WHERE v.status_pedido <> ALL(%s)
+        """, (list(STATUS_PEDIDO_FINAIS),))
+        locais = {row['bling_pedido_id']: dict(row) for row in cur.fetchall()}
+        
+        cur.execute("SELECT marca_dagua FROM bling_sync_estado WHERE nome = 'pedidos_status'")
+        estado = cur.fetchone()
+        marca_dagua = estado['marca_dagua'] if estado else None
+        conn.commit()
         
-        venda_ids = [row[0] for row in cur.fetchall()]
-        results = []
+        transicoes = []
+        paginas = 0
         
-        for venda_id in venda_ids:
-            try:
-                result = sync_order_status_from_bling(venda_id)
-                results.append({
-                    'venda_id': venda_id,
-                    'success': result.get('success'),
-                    'status': result.get('status'),
-                    'error': result.get('error')
+        if locais:
+            # Marca d'água no futuro (gravada em UTC por versões anteriores): varrer a janela toda
+            if marca_dagua and not full and marca_dagua <= inicio:
+                desde = marca_dagua - timedelta(minutes=overlap_minutes)
+                params = {'dataAlteracaoInicial': desde.strftime('%Y-%m-%d %H:%M:%S')}
+            else:
+                datas = [row['data_venda'] for row in locais.values() if row['data_venda']]
+                params = {'dataInicial': min(datas).strftime('%Y-%m-%d')} if datas else {}
+            
+            current_app.logger.info(
+                f"[reconcile_orders_status] {len(locais)} pedidos não finais; "
+                f"buscando no Bling com {params or 'sem filtro de data'}"
+            )
+            
+            vistos = set()
+            while True:
+                paginas += 1
+                response = make_bling_api_request('GET', '/pedidos/vendas', params={
+                    **params,
+                    'pagina': paginas,
+                    'limite': page_size
                 })
+                if response.status_code != 200:
+                    raise Exception(f'Erro HTTP {response.status_code} ao listar pedidos no Bling (página {paginas})')
                 
-                # Rate limiting
-                time.sleep(0.5)
+                pedidos = response.json().get('data', [])
+                for pedido in pedidos:
+                    local = locais.get(pedido.get('id'))
+                    situacao = pedido.get('situacao')
+                    situacao_id = situacao.get('id') if isinstance(situacao, dict) else None
+                    if local is None or situacao_id is None:
+                        continue
+                    vistos.add(pedido['id'])
+                    if situacao_id != local['bling_situacao_id']:
+                        transicoes.append({
+                            'venda_id': local['venda_id'],
+                            'bling_pedido_id': pedido['id'],
+                            'bling_situacao_id': situacao_id,
+                            'situacao_anterior': local['bling_situacao_id'],
+                            'nota_fiscal': pedido.get('notaFiscal')
+                        })
                 
-            except Exception as e:
-                current_app.logger.error(f"Erro ao sincronizar status do pedido {venda_id}: {e}")
-                results.append({
-                    'venda_id': venda_id,
-                    'success': False,
-                    'error': str(e)
-                })
+                # Última página, ou todos os pedidos não finais já vistos
+                if len(pedidos) < page_size or len(vistos) == len(locais):
+                    break
+            
+            # A listagem nem sempre traz notaFiscal: buscar o pedido completo só dos que mudaram
+            sem_nfe = [t for t in transicoes if t['nota_fiscal'] is None]
+            if sem_nfe:
+                def _fetch_nota_fiscal(transicao):
+                    response = make_bling_api_request('GET', f"/pedidos/vendas/{transicao['bling_pedido_id']}")
+                    if response.status_code != 200:
+                        raise Exception(f'Erro HTTP {response.status_code} ao buscar pedido no Bling')
+                    return response.json().get('data', {}).get('notaFiscal')
+                
+                for t, (nota_fiscal, erro) in zip(sem_nfe, run_bling_calls_concurrently(_fetch_nota_fiscal, sem_nfe)):
+                    if erro:
+                        current_app.logger.warning(
+                            f"Erro ao buscar NF-e do pedido {t['bling_pedido_id']} (venda {t['venda_id']}): {erro}"
+                        )
+                    t['nota_fiscal'] = nota_fiscal
+        
+        atualizados = update_pedidos_situacao_batch(transicoes)
+        
+        # A tabela orders acompanha o status da venda (como no webhook)
+        for venda_id in atualizados:
+            try:
+                sync_order_status_from_venda(venda_id)
+            except Exception as sync_error:
+                current_app.logger.warning(f"Erro ao sincronizar status do order {venda_id}: {sync_error}")
+        
+        atualizados_set = set(atualizados)
+        results = [{
+            'venda_id': t['venda_id'],
+            'success': t['venda_id'] in atualizados_set,
+            'situacao_anterior': t['situacao_anterior'],
+            'situacao_bling': t['bling_situacao_id']
+        } for t in transicoes]
+        
+        if results:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO bling_sync_logs (entity_type, entity_id, action, status, response_data, error_message)
+                VALUES %s
+            """, [
+                _sync_log_row('pedido', r['venda_id'], 'sync', {
+                    'status': 'success' if r['success'] else 'pending',
+                    'action': 'status_reconcile',
+                    'situacao_anterior': r['situacao_anterior'],
+                    'situacao_bling': r['situacao_bling']
+                }) for r in results
+            ])
+        
+        # Marca d'água = início desta execução (alterações durante a varredura entram na próxima)
+        cur.execute("""
+            INSERT INTO bling_sync_estado (nome, status, total, processados, alterados, erros,
+                                           iniciado_em, atualizado_em, concluido_em, marca_dagua)
+            VALUES ('pedidos_status', 'concluido', %s, %s, %s, 0, %s, NOW(), NOW(), %s)
+            ON CONFLICT (nome) DO UPDATE SET
+                status = 'concluido',
+                total = EXCLUDED.total,
+                processados = EXCLUDED.processados,
+                alterados = EXCLUDED.alterados,
+                erros = 0,
+                iniciado_em = EXCLUDED.iniciado_em,
+                atualizado_em = NOW(),
+                concluido_em = NOW(),
+                marca_dagua = EXCLUDED.marca_dagua
+        """, (len(locais), len(transicoes), len(atualizados), inicio, inicio))
+        conn.commit()
+        
+        current_app.logger.info(
+            f"✅ Reconciliação de status concluída: {len(locais)} pedidos não finais, {paginas} páginas, "
+            f"{len(atualizados)} atualizados"
+        )
         
         return {
-            'total': len(venda_ids),
-            'success': sum(1 for r in results if r.get('success')),
-            'errors': sum(1 for r in results if not r.get('success')),
+            'success': True,
+            'total': len(locais),
+            'pages': paginas,
+            'changed': len(transicoes),
+            'updated': len(atualizados),
+            'errors': len(transicoes) - len(atualizados),
+            'watermark': inicio.isoformat(),
             'results': results
         }
         
     except Exception as e:
-        current_app.logger.error(f"Erro ao sincronizar status dos pedidos: {e}")
+        conn.rollback()
+        current_app.logger.error(f"Erro ao reconciliar status dos pedidos: {e}", exc_info=True)
         return {
             'success': False,
             'error': str(e),
@@ -1163,9 +1328,20 @@ def sync_all_orders_status() -> Dict:
             'results': []
         }
     finally:
+        _release_sync_lock(conn, cur, 'pedidos_status')
         cur.close()
 
 
+def sync_all_orders_status(full: bool = False) -> Dict:
+    """
+    Sincroniza status dos pedidos sincronizados com Bling
+    
+    Delegado para reconcile_orders_status_from_bling (listagem paginada e
+    incremental em vez de um GET por pedido).
+    """
+    return reconcile_orders_status_from_bling(full=full)
+
+
 def update_order_situacao_to_verificado(venda_id: int) -> Dict:
     """
     Atualiza situação do pedido no Bling para "Verificado"
@@ -1350,6 +1526,9 @@ def update_order_situacao_to_logistica(venda_id: int) -> Dict:
                         )
                 
                 if estoque_decrementado:
+                    # Unidades saíram do estoque: a reserva do checkout deixa de segurá-las
+                    from .stock_reservation_service import consume_order_reservations
+                    consume_order_reservations(cur, venda_id)
                     conn.commit()
                     current_app.logger.info(
                         f"✅ Estoque local decrementado para pedido {venda_id} quando mudou para 'Logística'"
@@ -1946,45 +2125,96 @@ def approve_order_in_bling(venda_id: int) -> Dict:
         }
 
 
-def sync_all_orders_to_bling(only_pending: bool = False) -> Dict:
+def sync_all_orders_to_bling(only_pending: bool = False, batch_size: int = None,
+                             max_workers: int = None, resume: bool = True) -> Dict:
     """
     Sincroniza todos os pedidos para o Bling
     
+    Os pedidos são enviados em lotes (do mais recente para o mais antigo) por
+    um pool de threads limitado (run_bling_calls_concurrently), que divide o
+    rate limit global do Bling. Cada thread usa sua própria conexão do pool
+    do banco, então o número de threads também é limitado pelo que sobra de
+    DB_POOL_MAX_CONNECTIONS depois das threads web (GUNICORN_THREADS + 1). O progresso fica em bling_sync_estado (nome
+    'pedidos'): uma execução interrompida continua do último lote concluído.
+    
     Args:
         only_pending: Se True, sincroniza apenas pedidos que ainda não foram sincronizados
+        batch_size: Pedidos por lote (padrão: BLING_SYNC_BATCH_SIZE)
+        max_workers: Threads do pool (padrão: BLING_SYNC_MAX_WORKERS)
+        resume: Continuar execução interrompida em vez de recomeçar
     
     Returns:
-        Dict com resultado da sincronização
+        Dict com success (bool: execução concluída), total, synced (pedidos
+        enviados), errors, progress e results
     """
+    from .bling_api_service import run_bling_calls_concurrently
+    from .bling_product_service import (
+        ensure_bling_sync_estado_table, log_sync, _try_sync_lock, _release_sync_lock,
+        _start_sync_checkpoint, _save_sync_checkpoint, _finish_sync_checkpoint
+    )
+    
+    config = current_app.config
+    batch_size = int(batch_size or config.get('BLING_SYNC_BATCH_SIZE', 50))
+    max_workers = int(max_workers or config.get('BLING_SYNC_MAX_WORKERS', 4))
+    # O pool de conexões é dividido com as threads do gunicorn (uma delas é esta,
+    # que segura o lock e o checkpoint) e mais uma de folga: o resto fica para o pool
+    pool_size = int(config.get('DB_POOL_MAX_CONNECTIONS', 4))
+    threads_web = int(os.environ.get('GUNICORN_THREADS', 2))
+    max_workers = max(1, min(max_workers, pool_size - (threads_web + 1)))
+    
     conn = get_db()
+    ensure_bling_sync_estado_table(conn)
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     
+    if not _try_sync_lock(cur, 'pedidos'):
+        cur.close()
+        return {
+            'success': False,
+            'error': 'Sincronização de pedidos já em andamento',
+            'total': 0,
+            'results': []
+        }
+    
+    # Apenas pedidos que não foram sincronizados
+    filtro = "NOT EXISTS (SELECT 1 FROM bling_pedidos bp WHERE bp.venda_id = v.id)" if only_pending else "TRUE"
+    results = []
+    
     try:
-        if only_pending:
-            # Buscar apenas pedidos que não foram sincronizados
-            cur.execute("""
-                SELECT v.id
-                FROM vendas v
-                LEFT JOIN bling_pedidos bp ON v.id = bp.venda_id
-                WHERE bp.venda_id IS NULL
-                ORDER BY v.id DESC
-            """)
-        else:
-            # Buscar todos os pedidos
-            cur.execute("""
+        cur.execute(f"SELECT COUNT(*) FROM vendas v WHERE {filtro}")
+        progresso = _start_sync_checkpoint(conn, cur, 'pedidos', cur.fetchone()[0], resume)
+        
+        current_app.logger.info(
+            f"Iniciando sincronização de {progresso['total'] - progresso['processados']} pedidos para o Bling "
+            f"({max_workers} em paralelo)..."
+        )
+        
+        while True:
+            # ultimo_id = 0: início (ordem decrescente, o checkpoint guarda o menor id já enviado)
+            cur.execute(f"""
                 SELECT v.id
                 FROM vendas v
+                WHERE {filtro}
+                AND (%s = 0 OR v.id < %s)
                 ORDER BY v.id DESC
-            """)
-        
-        venda_ids = [row['id'] for row in cur.fetchall()]
-        results = []
-        
-        current_app.logger.info(f"Iniciando sincronização de {len(venda_ids)} pedidos para o Bling...")
-        
-        for venda_id in venda_ids:
-            try:
-                result = sync_order_to_bling(venda_id)
+                LIMIT %s
+            """, (progresso['ultimo_id'], progresso['ultimo_id'], batch_size))
+            venda_ids = [row['id'] for row in cur.fetchall()]
+            if not venda_ids:
+                break
+            # Não segurar transação aberta enquanto as threads chamam o Bling
+            conn.commit()
+            
+            respostas = run_bling_calls_concurrently(sync_order_to_bling, venda_ids, max_workers)
+            
+            for venda_id, (result, erro) in zip(venda_ids, respostas):
+                if erro is not None:
+                    current_app.logger.error(f"Erro ao sincronizar pedido {venda_id}: {erro}")
+                    results.append({
+                        'venda_id': venda_id,
+                        'success': False,
+                        'error': str(erro)
+                    })
+                    continue
                 results.append({
                     'venda_id': venda_id,
                     'success': result.get('success'),
@@ -1993,40 +2223,58 @@ def sync_all_orders_to_bling(only_pending: bool = False) -> Dict:
                     'error': result.get('error'),
                     'message': result.get('message')
                 })
-                
-                # Rate limiting - aguardar 0.5s entre requisições
-                time.sleep(0.5)
-                
-            except Exception as e:
-                current_app.logger.error(f"Erro ao sincronizar pedido {venda_id}: {e}")
-                results.append({
-                    'venda_id': venda_id,
-                    'success': False,
-                    'error': str(e)
-                })
+            
+            lote_sucessos = sum(1 for r in results[-len(venda_ids):] if r.get('success'))
+            progresso.update(
+                ultimo_id=venda_ids[-1],
+                processados=progresso['processados'] + len(venda_ids),
+                alterados=progresso['alterados'] + lote_sucessos,
+                erros=progresso['erros'] + len(venda_ids) - lote_sucessos
+            )
+            _save_sync_checkpoint(cur, 'pedidos', progresso)
+            conn.commit()
+            
+            current_app.logger.info(
+                f"[sync_all_orders_to_bling] {progresso['processados']}/{progresso['total']} pedidos "
+                f"({progresso['alterados']} sincronizados, {progresso['erros']} erros)"
+            )
+        
+        _finish_sync_checkpoint(conn, cur, 'pedidos')
         
         success_count = sum(1 for r in results if r.get('success'))
         error_count = len(results) - success_count
         
         current_app.logger.info(
-            f"✅ Sincronização concluída: {success_count} sucessos, {error_count} erros de {len(venda_ids)} pedidos"
+            f"✅ Sincronização concluída: {success_count} sucessos, {error_count} erros de {len(results)} pedidos"
         )
+        log_sync('pedido', 0, 'bulk_sync', {
+            'status': 'success',
+            'total': progresso['total'],
+            'processados': progresso['processados'],
+            'alterados': progresso['alterados'],
+            'erros': progresso['erros']
+        })
         
         return {
-            'total': len(venda_ids),
-            'success': success_count,
+            'success': True,
+            'total': len(results),
+            'synced': success_count,
             'errors': error_count,
+            'progress': progresso,
             'results': results
         }
         
     except Exception as e:
+        conn.rollback()
         current_app.logger.error(f"Erro ao sincronizar pedidos: {e}", exc_info=True)
         return {
             'success': False,
             'error': str(e),
             'total': 0,
-            'results': []
+            'resumable': True,
+            'results': results
         }
     finally:
+        _release_sync_lock(conn, cur, 'pedidos')
         cur.close()
 
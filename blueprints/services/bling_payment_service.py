@@ -7,70 +7,57 @@ Mapeia formas de pagamento do checkout para formas de pagamento do Bling
 from flask import current_app
 from typing import Dict, Optional, List
 from .bling_api_service import make_bling_api_request
+from .reference_cache import get_reference_data, invalidate_reference_cache
 import json
 
-# Cache para formas de pagamento do Bling
-_formas_pagamento_cache = None
-_cache_timestamp = None
+# Formas de pagamento ficam no cache de referência ('formas_pagamento')
 CACHE_DURATION = 86400  # 1 dia (formas de pagamento raramente mudam)
 
 
+def _fetch_bling_payment_methods() -> List[Dict]:
+    """Busca as formas de pagamento na API do Bling (loader do cache de referência)"""
+    current_app.logger.info("🔍 Buscando formas de pagamento do Bling...")
+    
+    response = make_bling_api_request(
+        'GET',
+        '/formas-pagamentos',
+        params={'limite': 100}
+    )
+    
+    if response.status_code != 200:
+        raise Exception(f"HTTP {response.status_code}")
+    
+    formas_pagamento = response.json().get('data', [])
+    
+    current_app.logger.info(
+        f"✅ {len(formas_pagamento)} forma(s) de pagamento encontrada(s) no Bling"
+    )
+    
+    # Logar todas as formas para referência
+    for forma in formas_pagamento:
+        current_app.logger.debug(
+            f"   - ID: {forma.get('id')}, Descrição: {forma.get('descricao', 'N/A')}, "
+            f"Tipo: {forma.get('tipoPagamento', 'N/A')}"
+        )
+    
+    return formas_pagamento
+
+
 def get_bling_payment_methods(force_refresh: bool = False) -> List[Dict]:
     """
     Busca todas as formas de pagamento do Bling
     
     Args:
-        force_refresh: Se True, força atualização do cache
+        force_refresh: Se True, força atualização do cache (em todos os workers)
     
     Returns:
         Lista de formas de pagamento do Bling
     """
-    global _formas_pagamento_cache, _cache_timestamp
-    import time
-    
-    # Verificar cache
-    if not force_refresh and _formas_pagamento_cache and _cache_timestamp:
-        if time.time() - _cache_timestamp < CACHE_DURATION:
-            current_app.logger.debug(
-                f"📋 Usando cache de formas de pagamento ({len(_formas_pagamento_cache)} formas)"
-            )
-            return _formas_pagamento_cache
+    if force_refresh:
+        invalidate_reference_cache('formas_pagamento')
     
     try:
-        current_app.logger.info("🔍 Buscando formas de pagamento do Bling...")
-        
-        response = make_bling_api_request(
-            'GET',
-            '/formas-pagamentos',
-            params={'limite': 100}
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            formas_pagamento = data.get('data', [])
-            
-            # Atualizar cache
-            _formas_pagamento_cache = formas_pagamento
-            _cache_timestamp = time.time()
-            
-            current_app.logger.info(
-                f"✅ {len(formas_pagamento)} forma(s) de pagamento encontrada(s) no Bling"
-            )
-            
-            # Logar todas as formas para referência
-            for forma in formas_pagamento:
-                current_app.logger.debug(
-                    f"   - ID: {forma.get('id')}, Descrição: {forma.get('descricao', 'N/A')}, "
-                    f"Tipo: {forma.get('tipoPagamento', 'N/A')}"
-                )
-            
-            return formas_pagamento
-        else:
-            current_app.logger.error(
-                f"❌ Erro ao buscar formas de pagamento: HTTP {response.status_code}"
-            )
-            return []
-            
+        return get_reference_data('formas_pagamento', _fetch_bling_payment_methods, ttl=CACHE_DURATION)
     except Exception as e:
         current_app.logger.error(
             f"❌ Erro ao buscar formas de pagamento do Bling: {e}", 
@@ -8,9 +8,68 @@ from flask import current_app
 from typing import Dict, Optional, List
 import time
 import json
+import hashlib
 import psycopg2.extras
 from .db import get_db
-from .bling_api_service import make_bling_api_request, BlingAPIError
+from .bling_api_service import make_bling_api_request, run_bling_calls_concurrently, BlingAPIError, BlingErrorType
+from .schema_capabilities import has_table, has_column, mark_table_created
+from .tracing import get_tracer
+
+tracer = get_tracer(__name__)
+
+
+def _product_sync_query(where: str, ativo_column_exists: bool, with_bling_ref: bool = False) -> str:
+    """
+    SELECT com todos os dados de produto usados na sincronização com o Bling
+    (compartilhado entre get_product_for_bling_sync e load_products_for_bling_sync)
+    
+    IMPORTANTE: peso_kg e dimensões estão na tabela produtos, não em nome_produto
+    """
+    ativo = ' p.ativo,' if ativo_column_exists else ''
+    if with_bling_ref:
+        # DISTINCT ON: mesma linha que o fetchone() da busca individual (categoria repetida não duplica o produto)
+        distinct, bling_columns = 'DISTINCT ON (p.id)', ', bp.bling_id, bp.status_sincronizacao'
+        if has_column('bling_produtos', 'payload_hash'):
+            bling_columns += ', bp.payload_hash'
+        bling_join = 'LEFT JOIN bling_produtos bp ON p.id = bp.produto_id'
+        order_by = 'ORDER BY p.id'
+    else:
+        distinct = bling_columns = bling_join = order_by = ''
+    
+    return f"""
+        SELECT {distinct}
+            p.id,
+            p.codigo_sku,
+            p.ncm,
+            p.cest,
+            p.preco_venda,
+            p.preco_promocional,
+            p.custo,
+            p.estoque,
+            p.codigo_barras,{ativo}
+            p.peso_kg,
+            p.dimensoes_largura,
+            p.dimensoes_altura,
+            p.dimensoes_comprimento,
+            np.nome,
+            np.descricao,
+            np.descricao_curta,
+            c.nome as categoria_nome,
+            e.nome as estampa_nome,
+            t.nome as tamanho_nome{bling_columns}
+        FROM produtos p
+        JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
+        JOIN nome_produto np ON pnp.nome_produto_id = np.id
+        LEFT JOIN nome_produto_categoria_lnk npc ON np.id = npc.nome_produto_id
+        LEFT JOIN categorias c ON npc.categoria_id = c.id
+        LEFT JOIN produtos_estampa_lnk pe ON p.id = pe.produto_id
+        LEFT JOIN estampa e ON pe.estampa_id = e.id
+        LEFT JOIN produtos_tamanho_lnk pt ON p.id = pt.produto_id
+        LEFT JOIN tamanho t ON pt.tamanho_id = t.id
+        {bling_join}
+        WHERE {where}
+        {order_by}
+    """
 
 
 def get_product_for_bling_sync(produto_id: int) -> Optional[Dict]:
@@ -23,399 +82,53 @@ def get_product_for_bling_sync(produto_id: int) -> Optional[Dict]:
     Returns:
         Dict com dados do produto ou None se não encontrado
 """
-    # #region agent log
-    import os
-    import json as json_module
-    log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-    try:
-        with open(log_path, 'a', encoding='utf-8') as f:
-            f.write(json_module.dumps({
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "A,B,C,D,E",
-                "location": "bling_product_service.py:get_product_for_bling_sync:entry",
-                "message": "Function entry",
-                "data": {"produto_id": produto_id},
-                "timestamp": int(time.time() * 1000)
-            }) + '\n')
-    except Exception:
-        pass
-    # #endregion
-    
-    try:
-        conn = get_db()
-        # #region agent log
-        import os
-        import json
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "D",
-                    "location": "bling_product_service.py:get_product_for_bling_sync:conn_ok",
-                    "message": "Database connection obtained",
-                    "data": {"conn_type": type(conn).__name__},
-                    "timestamp": int(time.time() * 1000)
-                }) + '\n')
-        except Exception:
-            pass
-        # #endregion
-        
-        # Fazer rollback para garantir que a conexão está limpa
+    with tracer.span('get_product_for_bling_sync', produto_id=produto_id) as span:
+        cur = None
+        conn = None
         try:
-            conn.rollback()
-        except Exception:
-            pass
-        
-        cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-        
-        # Verificar primeiro se produto existe na tabela produtos (hipótese C)
-        # #region agent log
-        try:
-            # Não tentar acessar colunas que não existem diretamente em produtos
-            cur.execute("SELECT id, codigo_sku, ncm FROM produtos WHERE id = %s", (produto_id,))
-            produto_raw = cur.fetchone()
-            import os
-            import json as json_module
-            log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-            try:
-                with open(log_path, 'a', encoding='utf-8') as f:
-                    import json
-                    f.write(json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "C",
-                        "location": "bling_product_service.py:get_product_for_bling_sync:check_exists",
-                        "message": "Direct produto check",
-                        "data": {
-                            "produto_id": produto_id,
-                            "found": produto_raw is not None,
-                            "produto_data": dict(produto_raw) if produto_raw else None
-                        },
-                        "timestamp": int(time.time() * 1000)
-                    }) + '\n')
-            except Exception:
-                pass
-        except Exception as check_err:
-            import os
-            import json as json_module
-            log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-            try:
-                with open(log_path, 'a', encoding='utf-8') as f:
-                    f.write(json_module.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "A,C",
-                        "location": "bling_product_service.py:get_product_for_bling_sync:check_exists_error",
-                        "message": "Error checking produto existence",
-                        "data": {"produto_id": produto_id, "error": str(check_err), "error_type": type(check_err).__name__},
-                        "timestamp": int(time.time() * 1000)
-                    }) + '\n')
-            except Exception:
-                pass
-        # #endregion
-        
-        # Query base - campos que sempre existem
-        # IMPORTANTE: peso_kg e dimensões estão na tabela produtos, não em nome_produto
-        query_base = """
-            SELECT 
-                p.id,
-                p.codigo_sku,
-                p.ncm,
-                p.cest,
-                p.preco_venda,
-                p.preco_promocional,
-                p.custo,
-                p.estoque,
-                p.codigo_barras,
-                p.peso_kg,
-                p.dimensoes_largura,
-                p.dimensoes_altura,
-                p.dimensoes_comprimento,
-                np.nome,
-                np.descricao,
-                np.descricao_curta,
-                c.nome as categoria_nome,
-                e.nome as estampa_nome,
-                t.nome as tamanho_nome
-            FROM produtos p
-            JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
-            JOIN nome_produto np ON pnp.nome_produto_id = np.id
-            LEFT JOIN nome_produto_categoria_lnk npc ON np.id = npc.nome_produto_id
-            LEFT JOIN categorias c ON npc.categoria_id = c.id
-            LEFT JOIN produtos_estampa_lnk pe ON p.id = pe.produto_id
-            LEFT JOIN estampa e ON pe.estampa_id = e.id
-            LEFT JOIN produtos_tamanho_lnk pt ON p.id = pt.produto_id
-            LEFT JOIN tamanho t ON pt.tamanho_id = t.id
-            WHERE p.id = %s
-        """
-        
-        # Verificar se coluna 'ativo' existe e adicionar se necessário
-        # #region agent log
-        ativo_column_exists = False
-        ativo_check_error = None
-        # #endregion
-        
-        # Fazer rollback antes de verificar coluna ativo
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        
-        try:
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'produtos' AND column_name = 'ativo'
-            """)
-            ativo_column_exists = cur.fetchone() is not None
-            # #region agent log
-            import os
-            import json as json_module
-            log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
+            conn = get_db()
+            
+            # Fazer rollback para garantir que a conexão está limpa
             try:
-                with open(log_path, 'a', encoding='utf-8') as f:
-                    import json
-                    f.write(json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "E",
-                        "location": "bling_product_service.py:get_product_for_bling_sync:ativo_check",
-                        "message": "Ativo column check",
-                        "data": {"exists": ativo_column_exists},
-                        "timestamp": int(time.time() * 1000)
-                    }) + '\n')
+                conn.rollback()
             except Exception:
                 pass
-            # #endregion
             
-            if ativo_column_exists:
-                query_base_before = query_base
-                query_base = query_base.replace(
-                    'p.codigo_barras,',
-                    'p.codigo_barras, p.ativo,'
-                )
-                # #region agent log
-                import os
-                import json as json_module
-                log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
+            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            
+            # Coluna 'ativo' só existe em bancos migrados (cache de schema, sem consulta por produto)
+            ativo_column_exists = has_column('produtos', 'ativo')
+            span.set_attribute('ativo_column', ativo_column_exists)
+            
+            query_base = _product_sync_query('p.id = %s', ativo_column_exists)
+            
+            cur.execute(query_base, (produto_id,))
+            span.add_event('query_executed')
+            produto = cur.fetchone()
+            
+            if not produto:
+                span.set_attribute('found', False)
+                current_app.logger.warning(f"Produto {produto_id} não encontrado na query SQL")
+                return None
+            
+            produto_dict = dict(produto)
+            span.set_attributes(found=True, sku=produto_dict.get('codigo_sku'), ncm=produto_dict.get('ncm'))
+            current_app.logger.debug(f"Produto {produto_id} encontrado: SKU={produto_dict.get('codigo_sku')}, NCM={produto_dict.get('ncm')}, CEST={produto_dict.get('cest')}")
+            
+            return produto_dict
+            
+        except Exception as e:
+            span.set_attributes(error=str(e), error_type=type(e).__name__)
+            current_app.logger.error(f"Erro ao buscar produto {produto_id}: {e}", exc_info=True)
+            if conn:
                 try:
-                    with open(log_path, 'a', encoding='utf-8') as f:
-                        import json
-                        f.write(json.dumps({
-                            "sessionId": "debug-session",
-                            "runId": "run1",
-                            "hypothesisId": "E",
-                            "location": "bling_product_service.py:get_product_for_bling_sync:ativo_added",
-                            "message": "Ativo field added to query",
-                            "data": {"query_changed": query_base != query_base_before},
-                            "timestamp": int(time.time() * 1000)
-                        }) + '\n')
+                    conn.rollback()
                 except Exception:
                     pass
-                # #endregion
-        except Exception as ativo_err:
-            # #region agent log
-            ativo_check_error = str(ativo_err)
-            import os
-            import json as json_module
-            log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-            try:
-                with open(log_path, 'a', encoding='utf-8') as f:
-                    import json
-                    f.write(json.dumps({
-                        "sessionId": "debug-session",
-                        "runId": "run1",
-                        "hypothesisId": "A,E",
-                        "location": "bling_product_service.py:get_product_for_bling_sync:ativo_check_error",
-                        "message": "Error checking ativo column",
-                        "data": {"error": str(ativo_err), "error_type": type(ativo_err).__name__},
-                        "timestamp": int(time.time() * 1000)
-                    }) + '\n')
-            except Exception:
-                pass
-            # #endregion
-        
-        # #region agent log
-        import os
-        import json
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "B",
-                    "location": "bling_product_service.py:get_product_for_bling_sync:before_execute",
-                    "message": "About to execute main query",
-                    "data": {"produto_id": produto_id, "query_length": len(query_base)},
-                    "timestamp": int(time.time() * 1000)
-                }) + '\n')
-        except Exception:
-            pass
-        # #endregion
-        
-        # Fazer rollback antes de executar a query principal para garantir conexão limpa
-        try:
-            conn.rollback()
-        except Exception:
-            pass
-        
-        cur.execute(query_base, (produto_id,))
-        
-        # #region agent log
-        import os
-        import json
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                "hypothesisId": "A,B",
-                "location": "bling_product_service.py:get_product_for_bling_sync:after_execute",
-                "message": "Query executed successfully",
-                "data": {"produto_id": produto_id},
-                "timestamp": int(time.time() * 1000)
-            }) + '\n')
-        except Exception:
-            pass
-        # #endregion
-        
-        produto = cur.fetchone()
-        
-        # #region agent log
-        import os
-        import json
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                "hypothesisId": "B,C",
-                "location": "bling_product_service.py:get_product_for_bling_sync:fetch_result",
-                "message": "Fetch result",
-                "data": {
-                    "produto_id": produto_id,
-                    "found": produto is not None,
-                    "row_count": 1 if produto else 0
-                },
-                "timestamp": int(time.time() * 1000)
-            }) + '\n')
-        except Exception:
-            pass
-        # #endregion
-        
-        if not produto:
-            current_app.logger.warning(f"Produto {produto_id} não encontrado na query SQL")
-            # #region agent log
-            import os
-            import json as json_module
-            log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-            try:
-                with open(log_path, 'a', encoding='utf-8') as f:
-                    import json
-                    f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "B,C",
-                    "location": "bling_product_service.py:get_product_for_bling_sync:not_found",
-                    "message": "Produto not found in query result",
-                    "data": {"produto_id": produto_id},
-                    "timestamp": int(time.time() * 1000)
-                }) + '\n')
-            except Exception:
-                pass
-            # #endregion
             return None
-        
-        produto_dict = dict(produto)
-        current_app.logger.debug(f"Produto {produto_id} encontrado: SKU={produto_dict.get('codigo_sku')}, NCM={produto_dict.get('ncm')}, CEST={produto_dict.get('cest')}")
-        
-        # #region agent log
-        import os
-        import json
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                "hypothesisId": "B",
-                "location": "bling_product_service.py:get_product_for_bling_sync:success",
-                "message": "Produto found and converted to dict",
-                "data": {
-                    "produto_id": produto_id,
-                    "sku": produto_dict.get('codigo_sku'),
-                    "ncm": produto_dict.get('ncm'),
-                    "nome": produto_dict.get('nome'),
-                    "has_all_fields": all(k in produto_dict for k in ['id', 'codigo_sku', 'ncm', 'nome'])
-                },
-                "timestamp": int(time.time() * 1000)
-            }) + '\n')
-        except Exception:
-            pass
-        # #endregion
-        
-        return produto_dict
-        
-    except Exception as e:
-        # #region agent log
-        import os
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            import json
-            import traceback
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                "sessionId": "debug-session",
-                "runId": "run1",
-                "hypothesisId": "A",
-                "location": "bling_product_service.py:get_product_for_bling_sync:exception",
-                "message": "Exception caught",
-                "data": {
-                    "produto_id": produto_id,
-                    "error": str(e),
-                    "error_type": type(e).__name__,
-                    "traceback": traceback.format_exc()
-                },
-                "timestamp": int(time.time() * 1000)
-            }) + '\n')
-        except Exception:
-            pass
-        # #endregion
-        
-        current_app.logger.error(f"Erro ao buscar produto {produto_id}: {e}", exc_info=True)
-        if 'conn' in locals() and conn:
-            try:
-                conn.rollback()
-            except:
-                pass
-        return None
-    finally:
-        if 'cur' in locals() and cur:
-            cur.close()
-        # #region agent log
-        import os
-        log_path = r'c:\Users\joaobussi\Documents\lhama_banana\LhamaBanana_visual_estatica_corrigida\.cursor\debug.log'
-        try:
-            import json
-            with open(log_path, 'a', encoding='utf-8') as f:
-                f.write(json.dumps({
-                    "sessionId": "debug-session",
-                    "runId": "run1",
-                    "hypothesisId": "A,B,C,D,E",
-                    "location": "bling_product_service.py:get_product_for_bling_sync:finally",
-                "message": "Function exit (finally block)",
-                "data": {"produto_id": produto_id},
-                "timestamp": int(time.time() * 1000)
-            }) + '\n')
-        except Exception:
-            pass
-        # #endregion
+        finally:
+            if cur:
+                cur.close()
 
 
 def validate_product_for_bling(produto: Dict) -> List[str]:
@@ -678,6 +391,22 @@ def sync_product_to_bling(produto_id: int, force_update: bool = False) -> Dict:
         bling_product_data = map_product_to_bling_format(produto)
         current_app.logger.debug(f"[sync_product_to_bling] Dados preparados: {json.dumps(bling_product_data, ensure_ascii=False, indent=2)}")
         
+        # 4.5. Payload idêntico ao da última sincronização: sem PUT, só confere o estoque
+        payload_hash = _bling_payload_hash(bling_product_data)
+        if bling_produto and not force_update and _is_unchanged_in_bling(bling_produto, payload_hash):
+            current_app.logger.info(f"[sync_product_to_bling] Produto {produto_id} sem alterações desde a última sincronização")
+            _push_stock_for_batch([{
+                'produto_id': produto_id,
+                'bling_id': bling_produto['bling_id'],
+                'estoque': produto.get('estoque')
+            }], {})
+            return {
+                'success': True,
+                'action': 'skipped',
+                'bling_id': bling_produto['bling_id'],
+                'message': 'Produto sem alterações desde a última sincronização'
+            }
+        
         try:
             # 5. Criar ou atualizar no Bling
             if bling_produto and not force_update:
@@ -735,7 +464,8 @@ def sync_product_to_bling(produto_id: int, force_update: bool = False) -> Dict:
                     produto_id=produto_id,
                     bling_id=bling_id,
                     bling_codigo=produto.get('codigo_sku'),
-                    status='sync'
+                    status='sync',
+                    payload_hash=payload_hash
                 )
                 
                 # 7.5. Atualizar estoque separadamente após criar/atualizar produto
@@ -862,8 +592,9 @@ def get_bling_product_by_local_id(produto_id: int) -> Optional[Dict]:
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     
     try:
-        cur.execute("""
-            SELECT id, produto_id, bling_id, bling_codigo, status_sincronizacao, erro_ultima_sync
+        payload_hash = ', payload_hash' if has_column('bling_produtos', 'payload_hash') else ''
+        cur.execute(f"""
+            SELECT id, produto_id, bling_id, bling_codigo, status_sincronizacao, erro_ultima_sync{payload_hash}
             FROM bling_produtos
             WHERE produto_id = %s
         """, (produto_id,))
@@ -880,25 +611,42 @@ def get_bling_product_by_local_id(produto_id: int) -> Optional[Dict]:
 
 def save_bling_product_reference(produto_id: int, bling_id: int, 
                                  bling_codigo: str, status: str = 'sync', 
-                                 error: str = None):
+                                 error: str = None, payload_hash: str = None):
     """
     Salva ou atualiza referência de produto sincronizado
+    
+    payload_hash: hash do payload enviado (_bling_payload_hash); permite pular
+    o próximo envio se nada mudar
     """
     conn = get_db()
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            INSERT INTO bling_produtos (produto_id, bling_id, bling_codigo, status_sincronizacao, erro_ultima_sync, ultima_sincronizacao)
-            VALUES (%s, %s, %s, %s, %s, NOW())
-            ON CONFLICT (produto_id) DO UPDATE
-            SET bling_id = EXCLUDED.bling_id,
-                bling_codigo = EXCLUDED.bling_codigo,
-                status_sincronizacao = EXCLUDED.status_sincronizacao,
-                erro_ultima_sync = EXCLUDED.erro_ultima_sync,
-                ultima_sincronizacao = NOW(),
-                updated_at = NOW()
-        """, (produto_id, bling_id, bling_codigo, status, error))
+        if has_column('bling_produtos', 'payload_hash'):
+            cur.execute("""
+                INSERT INTO bling_produtos (produto_id, bling_id, bling_codigo, status_sincronizacao, erro_ultima_sync, ultima_sincronizacao, payload_hash)
+                VALUES (%s, %s, %s, %s, %s, NOW(), %s)
+                ON CONFLICT (produto_id) DO UPDATE
+                SET bling_id = EXCLUDED.bling_id,
+                    bling_codigo = EXCLUDED.bling_codigo,
+                    status_sincronizacao = EXCLUDED.status_sincronizacao,
+                    erro_ultima_sync = EXCLUDED.erro_ultima_sync,
+                    payload_hash = EXCLUDED.payload_hash,
+                    ultima_sincronizacao = NOW(),
+                    updated_at = NOW()
+            """, (produto_id, bling_id, bling_codigo, status, error, payload_hash))
+        else:
+            cur.execute("""
+                INSERT INTO bling_produtos (produto_id, bling_id, bling_codigo, status_sincronizacao, erro_ultima_sync, ultima_sincronizacao)
+                VALUES (%s, %s, %s, %s, %s, NOW())
+                ON CONFLICT (produto_id) DO UPDATE
+                SET bling_id = EXCLUDED.bling_id,
+                    bling_codigo = EXCLUDED.bling_codigo,
+                    status_sincronizacao = EXCLUDED.status_sincronizacao,
+                    erro_ultima_sync = EXCLUDED.erro_ultima_sync,
+                    ultima_sincronizacao = NOW(),
+                    updated_at = NOW()
+            """, (produto_id, bling_id, bling_codigo, status, error))
         
         conn.commit()
         
@@ -934,6 +682,13 @@ def update_bling_product_status(produto_id: int, status: str, error: str = None)
         cur.close()
 
 
+def _sync_log_row(entity_type: str, entity_id: int, action: str, details: Dict) -> tuple:
+    """Linha de bling_sync_logs (entity_type, entity_id, action, status, response_data, error_message)"""
+    status = 'success' if details.get('status') == 'success' else 'error' if 'error' in details else 'pending'
+    error_message = details.get('error') if status == 'error' else None
+    return (entity_type, entity_id, action, status, json.dumps(details, default=str), error_message)
+
+
 def log_sync(entity_type: str, entity_id: int, action: str, details: Dict):
     """
     Registra log de sincronização
@@ -942,13 +697,10 @@ def log_sync(entity_type: str, entity_id: int, action: str, details: Dict):
     cur = conn.cursor()
     
     try:
-        status = 'success' if details.get('status') == 'success' else 'error' if 'error' in details else 'pending'
-        error_message = details.get('error') if status == 'error' else None
-        
         cur.execute("""
             INSERT INTO bling_sync_logs (entity_type, entity_id, action, status, response_data, error_message)
             VALUES (%s, %s, %s, %s, %s, %s)
-        """, (entity_type, entity_id, action, status, json.dumps(details), error_message))
+        """, _sync_log_row(entity_type, entity_id, action, details))
         
         conn.commit()
         
@@ -963,68 +715,599 @@ def sync_all_products(limit: int = None, only_active: bool = True):
     """
     Sincroniza todos os produtos (worker periódico)
     
+    Delega para sync_products_to_bling_bulk (lotes, pool de threads limitado
+    pelo rate limit global e checkpoint para retomar execuções interrompidas).
+    
     Args:
-        limit: Limite de produtos para sincronizar (None = todos)
+        limit: Limite de produtos para sincronizar nesta execução (None = todos)
         only_active: Sincronizar apenas produtos ativos
     """
+    return sync_products_to_bling_bulk(limit=limit, only_active=only_active)
+
+
+def load_products_for_bling_sync(produto_ids: List[int]) -> Dict[int, Dict]:
+    """
+    Versão em lote de get_product_for_bling_sync: dados de vários produtos e
+    suas referências em bling_produtos (bling_id, status_sincronizacao,
+    payload_hash) em uma única consulta
+    
+    Returns:
+        Dict produto_id -> dados do produto (ids não encontrados ficam de fora)
+    """
+    if not produto_ids:
+        return {}
+    
     conn = get_db()
-    cur = conn.cursor()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        query = _product_sync_query('p.id = ANY(%s)', has_column('produtos', 'ativo'), with_bling_ref=True)
+        cur.execute(query, (list(produto_ids),))
+        return {row['id']: dict(row) for row in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def _push_product_to_bling(tarefa: Dict) -> Dict:
+    """Cria ou atualiza um produto no Bling (roda nas threads do pool; não acessa o banco)"""
+    bling_id = tarefa['bling_id']
+    if bling_id and not tarefa['force_update']:
+        response = make_bling_api_request('PUT', f'/produtos/{bling_id}', json=tarefa['payload'])
+        action = 'update'
+    else:
+        response = make_bling_api_request('POST', '/produtos', json=tarefa['payload'])
+        action = 'create'
     
     try:
-        query = """
-            SELECT id FROM produtos
-            WHERE ativo = %s
-            ORDER BY id
-        """
-        params = [only_active]
+        data = response.json().get('data') or {}
+    except ValueError:
+        # PUT pode responder sem corpo
+        data = {}
+    return {'action': action, 'bling_id': data.get('id') or bling_id}
+
+
+def _post_stock_adjustment(ajuste: Dict):
+    """Lança no Bling a diferença de estoque de um produto (mesmo payload de sync_stock_to_bling)"""
+    diferenca = ajuste['diferenca']
+    tipo_lancamento = "E" if diferenca > 0 else "S"
+    make_bling_api_request('POST', '/estoques', json={
+        "produto": {"id": ajuste['bling_id']},
+        "deposito": {"id": ajuste['deposito_id']},
+        "tipo": tipo_lancamento,
+        "tipoOperacao": tipo_lancamento,
+        "quantidade": abs(diferenca)
+    })
+
+
+def _get_default_deposito_id() -> Optional[int]:
+    """Primeiro depósito cadastrado no Bling (o mesmo usado por sync_stock_to_bling)"""
+    response = make_bling_api_request('GET', '/depositos')
+    depositos = response.json().get('data', []) if response.status_code == 200 else []
+    return depositos[0].get('id') if depositos else None
+
+
+def _bling_payload_hash(payload: Dict) -> str:
+    """
+    Hash do payload do produto no Bling, sem o bloco de estoque (saldoVirtualTotal
+    é somente leitura no PUT; o estoque é ajustado via /estoques)
+    """
+    conteudo = {key: value for key, value in payload.items() if key != 'estoque'}
+    serializado = json.dumps(conteudo, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serializado.encode('utf-8')).hexdigest()
+
+
+def _is_unchanged_in_bling(bling_ref: Dict, payload_hash: str) -> bool:
+    """Produto já sincronizado com exatamente este payload (PUT desnecessário)"""
+    return bool(
+        bling_ref.get('bling_id')
+        and bling_ref.get('status_sincronizacao') == 'sync'
+        and bling_ref.get('payload_hash') == payload_hash
+    )
+
+
+def _push_stock_for_batch(enviados: List[Dict], estado: Dict, max_workers: int = None):
+    """
+    Ajusta no Bling o estoque dos produtos informados: saldos do lote em uma
+    chamada e lançamentos só para as diferenças. Falhas aqui não invalidam o
+    envio do produto (mesmo comportamento de sync_product_to_bling).
+    """
+    try:
+        saldos = fetch_stock_balances_from_bling([item['bling_id'] for item in enviados])
         
-        if limit:
-            query += " LIMIT %s"
-            params.append(limit)
+        ajustes = []
+        for item in enviados:
+            saldo_bling = saldos.get(int(item['bling_id']))
+            if saldo_bling is None:
+                continue
+            diferenca = int(item['estoque'] or 0) - saldo_bling
+            if diferenca:
+                ajustes.append({
+                    'produto_id': item['produto_id'],
+                    'bling_id': item['bling_id'],
+                    'diferenca': diferenca
+                })
+        if not ajustes:
+            return
         
-        cur.execute(query, params)
-        produto_ids = [row[0] for row in cur.fetchall()]
+        if 'deposito_id' not in estado:
+            estado['deposito_id'] = _get_default_deposito_id()
+            if not estado['deposito_id']:
+                current_app.logger.warning(
+                    "[sync_products_to_bling_bulk] ⚠️ Depósito não encontrado. Estoque não será ajustado no Bling"
+                )
+        if not estado['deposito_id']:
+            return
+        for ajuste in ajustes:
+            ajuste['deposito_id'] = estado['deposito_id']
+        
+        respostas = run_bling_calls_concurrently(_post_stock_adjustment, ajustes, max_workers)
+        for ajuste, (_, erro) in zip(ajustes, respostas):
+            if erro is not None:
+                current_app.logger.warning(
+                    f"[sync_products_to_bling_bulk] ⚠️ Não foi possível ajustar estoque do produto "
+                    f"{ajuste['produto_id']} (diferença {ajuste['diferenca']:+d}): {getattr(erro, 'message', erro)}"
+                )
+    except Exception as e:
+        current_app.logger.warning(f"[sync_products_to_bling_bulk] ⚠️ Erro ao ajustar estoque do lote: {e}")
+
+
+def _load_pending_marks(cur, produto_ids: List[int]) -> Dict[int, object]:
+    """marcado_em dos produtos do lote que estão no dirty set (vazio sem a migração)"""
+    if not has_table('bling_produtos_pendentes'):
+        return {}
+    cur.execute("""
+        SELECT produto_id, marcado_em
+        FROM bling_produtos_pendentes
+        WHERE produto_id = ANY(%s)
+    """, (list(produto_ids),))
+    return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def _clear_pending_marks(cur, marcas: List[tuple]):
+    """Remove do dirty set os produtos processados, se não foram marcados de novo nesse meio tempo"""
+    if not marcas:
+        return
+    psycopg2.extras.execute_values(cur, """
+        DELETE FROM bling_produtos_pendentes bpp
+        USING (VALUES %s) AS v(produto_id, marcado_em)
+        WHERE bpp.produto_id = v.produto_id
+        AND bpp.marcado_em = v.marcado_em
+    """, marcas, template='(%s::INTEGER, %s::TIMESTAMP)')
+
+
+def _sync_products_batch(cur, ids: List[int], force_update: bool, max_workers: int,
+                         estado_estoque: Dict, contadores: Dict) -> Dict:
+    """
+    Processa um lote de produtos (ver sync_products_to_bling_bulk). A leitura
+    do lote é confirmada antes das chamadas ao Bling; bling_produtos,
+    bling_sync_logs e o dirty set são gravados no cursor depois, sem commit.
+    
+    Returns:
+        Dict com results, enviados, erros e bloqueio (BlingAPIError quando o
+        Bling recusou o lote inteiro; nesse caso nada é gravado)
+    """
+    produtos = load_products_for_bling_sync(ids)
+    pendentes = _load_pending_marks(cur, ids)
+    
+    tarefas, logs, results = [], [], []
+    verificar_estoque = []
+    concluidos = set(ids)
+    for produto_id in ids:
+        produto = produtos.get(produto_id)
+        if not produto:
+            erro = f'Produto {produto_id} não encontrado'
+            results.append({'produto_id': produto_id, 'success': False, 'error': erro})
+            logs.append(_sync_log_row('produto', produto_id, 'error', {'error': erro}))
+            continue
         
-        results = []
-        for produto_id in produto_ids:
-            try:
-                result = sync_product_to_bling(produto_id)
-                results.append({
+        validation_errors = validate_product_for_bling(produto)
+        if validation_errors:
+            results.append({
+                'produto_id': produto_id,
+                'success': False,
+                'error': 'Validação falhou',
+                'details': validation_errors
+            })
+            logs.append(_sync_log_row('produto', produto_id, 'error', {
+                'error': 'Validação falhou',
+                'errors': validation_errors
+            }))
+            continue
+        
+        payload = map_product_to_bling_format(produto)
+        payload_hash = _bling_payload_hash(payload)
+        if not force_update and _is_unchanged_in_bling(produto, payload_hash):
+            # Nada mudou no cadastro: sem PUT. Estoque só é conferido se o produto foi marcado
+            contadores['ignorados'] += 1
+            results.append({
+                'produto_id': produto_id,
+                'success': True,
+                'action': 'skipped',
+                'bling_id': produto['bling_id']
+            })
+            if produto_id in pendentes:
+                verificar_estoque.append({
                     'produto_id': produto_id,
-                    'success': result.get('success', False),
-                    'error': result.get('error')
+                    'bling_id': produto['bling_id'],
+                    'estoque': produto.get('estoque')
                 })
+            continue
+        
+        tarefas.append({
+            'produto': produto,
+            'bling_id': produto.get('bling_id'),
+            'force_update': force_update,
+            'payload': payload,
+            'payload_hash': payload_hash
+        })
+    
+    # Não segurar transação aberta enquanto as threads chamam o Bling
+    cur.connection.commit()
+    respostas = run_bling_calls_concurrently(_push_product_to_bling, tarefas, max_workers)
+    
+    # Bling recusou o lote inteiro (token inválido, rate limit): nada é gravado
+    bloqueios = [
+        erro for _, erro in respostas
+        if isinstance(erro, BlingAPIError)
+        and erro.error_type in (BlingErrorType.AUTHENTICATION_ERROR, BlingErrorType.RATE_LIMIT_ERROR)
+    ]
+    if tarefas and len(bloqueios) == len(tarefas):
+        return {'results': results, 'enviados': 0, 'erros': 0, 'bloqueio': bloqueios[0]}
+    
+    referencias, referencias_erro = [], []
+    for tarefa, (resposta, erro) in zip(tarefas, respostas):
+        produto = tarefa['produto']
+        produto_id = produto['id']
+        if erro is None and not resposta['bling_id']:
+            erro = BlingAPIError('ID do produto Bling não retornado na resposta')
+        
+        if erro is None:
+            referencias.append((produto_id, resposta['bling_id'], produto.get('codigo_sku'), tarefa['payload_hash']))
+            verificar_estoque.append({
+                'produto_id': produto_id,
+                'bling_id': resposta['bling_id'],
+                'estoque': produto.get('estoque')
+            })
+            contadores['criados' if resposta['action'] == 'create' else 'atualizados'] += 1
+            results.append({
+                'produto_id': produto_id,
+                'success': True,
+                'action': resposta['action'],
+                'bling_id': resposta['bling_id']
+            })
+            logs.append(_sync_log_row('produto', produto_id, resposta['action'], {
+                'status': 'success',
+                'bling_id': resposta['bling_id']
+            }))
+        else:
+            # Continua no dirty set para a próxima execução
+            concluidos.discard(produto_id)
+            error_msg = getattr(erro, 'message', None) or str(erro)
+            if tarefa['bling_id']:
+                referencias_erro.append((produto_id, error_msg))
+            results.append({'produto_id': produto_id, 'success': False, 'error': error_msg})
+            logs.append(_sync_log_row('produto', produto_id, 'sync', {
+                'status': 'error',
+                'error': error_msg,
+                'exception_type': type(erro).__name__
+            }))
+    
+    if verificar_estoque:
+        _push_stock_for_batch(verificar_estoque, estado_estoque, max_workers)
+    
+    if referencias:
+        if has_column('bling_produtos', 'payload_hash'):
+            hash_column, hash_update, template = ', payload_hash', 'payload_hash = EXCLUDED.payload_hash,', "(%s, %s, %s, 'sync', NULL, NOW(), %s)"
+        else:
+            referencias = [ref[:3] for ref in referencias]
+            hash_column, hash_update, template = '', '', "(%s, %s, %s, 'sync', NULL, NOW())"
+        psycopg2.extras.execute_values(cur, f"""
+            INSERT INTO bling_produtos (produto_id, bling_id, bling_codigo, status_sincronizacao, erro_ultima_sync, ultima_sincronizacao{hash_column})
+            VALUES %s
+            ON CONFLICT (produto_id) DO UPDATE
+            SET bling_id = EXCLUDED.bling_id,
+                bling_codigo = EXCLUDED.bling_codigo,
+                status_sincronizacao = EXCLUDED.status_sincronizacao,
+                erro_ultima_sync = EXCLUDED.erro_ultima_sync,
+                {hash_update}
+                ultima_sincronizacao = NOW(),
+                updated_at = NOW()
+        """, referencias, template=template)
+    if referencias_erro:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE bling_produtos bp
+            SET status_sincronizacao = 'error',
+                erro_ultima_sync = v.erro,
+                updated_at = NOW()
+            FROM (VALUES %s) AS v(produto_id, erro)
+            WHERE bp.produto_id = v.produto_id
+        """, referencias_erro, template='(%s::INTEGER, %s)')
+    if logs:
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO bling_sync_logs (entity_type, entity_id, action, status, response_data, error_message)
+            VALUES %s
+        """, logs)
+    _clear_pending_marks(cur, [(pid, marcado_em) for pid, marcado_em in pendentes.items() if pid in concluidos])
+    
+    return {
+        'results': results,
+        'enviados': len(referencias),
+        'erros': sum(1 for r in results if not r['success']),
+        'bloqueio': None
+    }
+
+
+def sync_products_to_bling_bulk(limit: int = None, only_active: bool = True, force_update: bool = False,
+                                batch_size: int = None, max_workers: int = None, resume: bool = True,
+                                progress_callback=None) -> Dict:
+    """
+    Envia produtos ao Bling em lote
+    
+    Para cada lote de batch_size produtos:
+    1. Dados de todos os produtos e suas referências em bling_produtos em uma
+       consulta (load_products_for_bling_sync); validação e payloads
+       (map_product_to_bling_format)
+    2. Produtos cujo payload tem o mesmo hash da última sincronização
+       (bling_produtos.payload_hash) são pulados, sem chamada ao Bling
+    3. POST/PUT dos demais em um pool de threads limitado
+       (run_bling_calls_concurrently), dentro do rate limit global do Bling
+    4. Estoque dos produtos enviados ou marcados no dirty set: saldos do lote
+       em uma chamada e lançamentos só para diferenças
+    5. Upsert em bling_produtos, logs em bling_sync_logs, limpeza do dirty set
+       e checkpoint (bling_sync_estado, nome 'produtos') em uma transação
+    
+    Se a execução for interrompida, ou se o Bling recusar o lote inteiro
+    (autenticação ou rate limit), a próxima continua do último lote
+    confirmado (resume=True). Com limit, a execução para após limit produtos
+    e a seguinte continua de onde esta parou.
+    
+    Args:
+        limit: Máximo de produtos nesta execução (None = até o fim)
+        only_active: Sincronizar apenas produtos ativos
+        force_update: Enviar mesmo sem alterações (e criar novamente, via POST, os já vinculados)
+        batch_size: Produtos por lote (padrão: BLING_SYNC_BATCH_SIZE)
+        max_workers: Threads do pool (padrão: BLING_SYNC_MAX_WORKERS)
+        resume: Continuar execução interrompida em vez de recomeçar
+        progress_callback: Função opcional chamada a cada lote com o checkpoint (Dict)
+    
+    Returns:
+        Dict com success (bool: execução concluída), total, synced, errors,
+        created, updated, skipped, progress e results
+    """
+    batch_size = int(batch_size or current_app.config.get('BLING_SYNC_BATCH_SIZE', 50))
+    limit = int(limit) if limit else None
+    conn = get_db()
+    ensure_bling_sync_estado_table(conn)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    
+    if not _try_sync_lock(cur, 'produtos'):
+        cur.close()
+        return {
+            'success': False,
+            'error': 'Sincronização de produtos já em andamento',
+            'total': 0,
+            'results': []
+        }
+    
+    results = []
+    executados = 0
+    contadores = {'criados': 0, 'atualizados': 0, 'ignorados': 0}
+    estado_estoque = {}
+    try:
+        if has_column('produtos', 'ativo'):
+            filtro, filtro_params = 'ativo = %s', [only_active]
+        else:
+            filtro, filtro_params = 'TRUE', []
+        
+        cur.execute(f"SELECT COUNT(*) FROM produtos WHERE {filtro}", filtro_params)
+        progresso = _start_sync_checkpoint(conn, cur, 'produtos', cur.fetchone()[0], resume)
+        
+        while not limit or executados < limit:
+            tamanho_lote = min(batch_size, limit - executados) if limit else batch_size
+            cur.execute(f"""
+                SELECT id FROM produtos
+                WHERE {filtro} AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, filtro_params + [progresso['ultimo_id'], tamanho_lote])
+            ids = [row['id'] for row in cur.fetchall()]
+            if not ids:
+                break
+            
+            with tracer.span('sync_products_to_bling_batch', primeiro_id=ids[0], produtos=len(ids)) as span:
+                lote = _sync_products_batch(cur, ids, force_update, max_workers, estado_estoque, contadores)
                 
-                # Rate limiting (Bling tem limites)
-                time.sleep(0.5)  # 500ms entre requisições
+                if lote['bloqueio'] is not None:
+                    conn.rollback()
+                    span.set_attribute('aborted', lote['bloqueio'].error_type.value)
+                    current_app.logger.error(
+                        f"[sync_products_to_bling_bulk] Lote após produto {progresso['ultimo_id']} recusado pelo Bling: "
+                        f"{lote['bloqueio'].message}"
+                    )
+                    return {
+                        'success': False,
+                        'error': lote['bloqueio'].message,
+                        'total': executados,
+                        'resumable': True,
+                        'progress': progresso,
+                        'results': results + lote['results']
+                    }
                 
-            except Exception as e:
-                current_app.logger.error(f"Erro ao sincronizar produto {produto_id}: {e}")
-                results.append({
-                    'produto_id': produto_id,
-                    'success': False,
-                    'error': str(e)
-                })
+                executados += len(ids)
+                progresso.update(
+                    ultimo_id=ids[-1],
+                    processados=progresso['processados'] + len(ids),
+                    alterados=progresso['alterados'] + lote['enviados'],
+                    erros=progresso['erros'] + lote['erros']
+                )
+                _save_sync_checkpoint(cur, 'produtos', progresso)
+                conn.commit()
+                
+                results.extend(lote['results'])
+                span.set_attributes(enviados=lote['enviados'], erros=lote['erros'])
+            
+            current_app.logger.info(
+                f"[sync_products_to_bling_bulk] {progresso['processados']}/{progresso['total']} produtos "
+                f"({contadores['criados']} criados, {contadores['atualizados']} atualizados, "
+                f"{contadores['ignorados']} sem alterações, {progresso['erros']} erros)"
+            )
+            if progress_callback:
+                progress_callback(dict(progresso))
+        else:
+            # Parou por limit: checkpoint continua em andamento para a próxima execução
+            return _bulk_products_result(results, executados, contadores, progresso)
         
+        _finish_sync_checkpoint(conn, cur, 'produtos')
+        log_sync('produto', 0, 'bulk_sync', {
+            'status': 'success',
+            'total': progresso['total'],
+            'processados': progresso['processados'],
+            'alterados': progresso['alterados'],
+            'ignorados': contadores['ignorados'],
+            'erros': progresso['erros']
+        })
+        return _bulk_products_result(results, executados, contadores, progresso)
+    
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Erro ao sincronizar produtos em lote: {e}", exc_info=True)
         return {
-            'total': len(produto_ids),
-            'success': sum(1 for r in results if r['success']),
-            'errors': sum(1 for r in results if not r['success']),
+            'success': False,
+            'error': str(e),
+            'total': executados,
+            'resumable': True,
             'results': results
         }
+    finally:
+        _release_sync_lock(conn, cur, 'produtos')
+        cur.close()
+
+
+def sync_pending_products_to_bling(batch_size: int = None, max_workers: int = None) -> Dict:
+    """
+    Envia ao Bling apenas os produtos do dirty set (bling_produtos_pendentes)
+    
+    As marcações vêm de triggers (sql/create-bling-produtos-pendentes.sql):
+    edições no Strapi, preço e estoque. O custo em chamadas à API é
+    proporcional ao que mudou. Produtos que falharem continuam marcados para
+    a próxima execução. A marcação 0 ("todos") faz a varredura completa de
+    sync_products_to_bling_bulk, que também pula produtos sem alterações.
+    
+    Sem a migração aplicada, faz a varredura completa.
+    
+    Returns:
+        Dict com success (bool: execução concluída), total, synced, errors,
+        created, updated, skipped e results
+    """
+    if not has_table('bling_produtos_pendentes'):
+        return sync_products_to_bling_bulk(batch_size=batch_size, max_workers=max_workers)
+    
+    batch_size = int(batch_size or current_app.config.get('BLING_SYNC_BATCH_SIZE', 50))
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    
+    cur.execute("SELECT marcado_em FROM bling_produtos_pendentes WHERE produto_id = 0")
+    marca_completa = cur.fetchone()
+    conn.commit()
+    if marca_completa:
+        cur.close()
+        result = sync_products_to_bling_bulk(batch_size=batch_size, max_workers=max_workers)
+        if result.get('success') is not False:
+            cur = conn.cursor()
+            try:
+                _clear_pending_marks(cur, [(0, marca_completa['marcado_em'])])
+                conn.commit()
+            finally:
+                cur.close()
+        return result
+    
+    if not _try_sync_lock(cur, 'produtos'):
+        cur.close()
+        return {
+            'success': False,
+            'error': 'Sincronização de produtos já em andamento',
+            'total': 0,
+            'results': []
+        }
+    
+    results = []
+    executados = 0
+    contadores = {'criados': 0, 'atualizados': 0, 'ignorados': 0}
+    estado_estoque = {}
+    ultimo_id = 0
+    try:
+        while True:
+            cur.execute("""
+                SELECT produto_id
+                FROM bling_produtos_pendentes
+                WHERE produto_id > %s
+                ORDER BY produto_id
+                LIMIT %s
+            """, (ultimo_id, batch_size))
+            ids = [row['produto_id'] for row in cur.fetchall()]
+            if not ids:
+                break
+            
+            with tracer.span('sync_pending_products_to_bling_batch', primeiro_id=ids[0], produtos=len(ids)) as span:
+                lote = _sync_products_batch(cur, ids, False, max_workers, estado_estoque, contadores)
+                if lote['bloqueio'] is not None:
+                    # Marcações permanecem; a próxima execução tenta de novo
+                    conn.rollback()
+                    span.set_attribute('aborted', lote['bloqueio'].error_type.value)
+                    current_app.logger.error(
+                        f"[sync_pending_products_to_bling] Lote recusado pelo Bling: {lote['bloqueio'].message}"
+                    )
+                    return {
+                        'success': False,
+                        'error': lote['bloqueio'].message,
+                        'total': executados,
+                        'resumable': True,
+                        'results': results + lote['results']
+                    }
+                conn.commit()
+                
+                ultimo_id = ids[-1]
+                executados += len(ids)
+                results.extend(lote['results'])
+                span.set_attributes(enviados=lote['enviados'], erros=lote['erros'])
         
+        current_app.logger.info(
+            f"[sync_pending_products_to_bling] {executados} produtos marcados: "
+            f"{contadores['criados']} criados, {contadores['atualizados']} atualizados, "
+            f"{contadores['ignorados']} sem alterações, {sum(1 for r in results if not r['success'])} erros"
+        )
+        return _bulk_products_result(results, executados, contadores)
+    
     except Exception as e:
-        current_app.logger.error(f"Erro ao sincronizar produtos: {e}")
+        conn.rollback()
+        current_app.logger.error(f"Erro ao sincronizar produtos pendentes: {e}", exc_info=True)
         return {
-            'total': 0,
-            'success': 0,
-            'errors': 0,
-            'error': str(e)
+            'success': False,
+            'error': str(e),
+            'total': executados,
+            'resumable': True,
+            'results': results
         }
     finally:
+        _release_sync_lock(conn, cur, 'produtos')
         cur.close()
 
 
+def _bulk_products_result(results: List[Dict], executados: int, contadores: Dict, progresso: Dict = None) -> Dict:
+    result = {
+        'success': True,
+        'total': executados,
+        'synced': sum(1 for r in results if r['success']),
+        'errors': sum(1 for r in results if not r['success']),
+        'created': contadores['criados'],
+        'updated': contadores['atualizados'],
+        'skipped': contadores['ignorados'],
+        'results': results
+    }
+    if progresso is not None:
+        result['progress'] = progresso
+    return result
+
+
 # =====================================================
 # SINCRONIZAÇÃO DE CATEGORIAS DO BLING
 # =====================================================
@@ -2411,7 +2694,9 @@ def sync_stock_from_bling(produto_id: int = None) -> Dict:
     """
     Sincroniza estoque do Bling para o banco local
     
-    Se produto_id for None, sincroniza todos os produtos sincronizados
+    Se produto_id for None, sincroniza todos os produtos sincronizados em lote
+    (ver sync_stock_from_bling_bulk: saldos de vários produtos por chamada a
+    /estoques/saldos, em vez de um GET por produto)
     
     Args:
         produto_id: ID do produto local (None = todos)
@@ -2419,28 +2704,22 @@ def sync_stock_from_bling(produto_id: int = None) -> Dict:
     Returns:
         Dict com resultado da sincronização
     """
+    if not produto_id:
+        # Todos os produtos: reconciliação em lote (/estoques/saldos)
+        return sync_stock_from_bling_bulk()
+    
     conn = get_db()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     
     try:
-        if produto_id:
-            # Buscar apenas um produto
-            cur.execute("""
-                SELECT p.id, bp.bling_id, p.codigo_sku
-                FROM produtos p
-                JOIN bling_produtos bp ON p.id = bp.produto_id
-                WHERE p.id = %s
-            """, (produto_id,))
-            products = cur.fetchall()
-        else:
-            # Buscar todos os produtos sincronizados
-            cur.execute("""
-                SELECT p.id, bp.bling_id, p.codigo_sku
-                FROM produtos p
-                JOIN bling_produtos bp ON p.id = bp.produto_id
-                WHERE bp.status_sincronizacao = 'sync'
-            """)
-            products = cur.fetchall()
+        # Buscar apenas um produto
+        cur.execute("""
+            SELECT p.id, bp.bling_id, p.codigo_sku
+            FROM produtos p
+            JOIN bling_produtos bp ON p.id = bp.produto_id
+            WHERE p.id = %s
+        """, (produto_id,))
+        products = cur.fetchall()
         
         results = []
         
@@ -2551,6 +2830,329 @@ def sync_stock_from_bling(produto_id: int = None) -> Dict:
         cur.close()
 
 
+def ensure_bling_sync_estado_table(conn):
+    """
+    Garante que a tabela bling_sync_estado exista (checkpoints das
+    sincronizações em lote). Ver sql/create-bling-sync-estado.sql.
+    """
+    if has_column('bling_sync_estado', 'marca_dagua'):
+        return
+    
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS bling_sync_estado (
+                nome VARCHAR(50) PRIMARY KEY,
+                status VARCHAR(20) NOT NULL DEFAULT 'concluido',
+                ultimo_id INTEGER NOT NULL DEFAULT 0,
+                total INTEGER NOT NULL DEFAULT 0,
+                processados INTEGER NOT NULL DEFAULT 0,
+                alterados INTEGER NOT NULL DEFAULT 0,
+                erros INTEGER NOT NULL DEFAULT 0,
+                iniciado_em TIMESTAMP,
+                atualizado_em TIMESTAMP DEFAULT NOW(),
+                concluido_em TIMESTAMP,
+                marca_dagua TIMESTAMP
+            )
+        """)
+        # Bancos com a versão anterior da tabela
+        cur.execute("ALTER TABLE bling_sync_estado ADD COLUMN IF NOT EXISTS marca_dagua TIMESTAMP")
+        conn.commit()
+        mark_table_created('bling_sync_estado', (
+            'nome', 'status', 'ultimo_id', 'total', 'processados', 'alterados',
+            'erros', 'iniciado_em', 'atualizado_em', 'concluido_em', 'marca_dagua'
+        ))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def get_bling_sync_estado(nome: str) -> Optional[Dict]:
+    """Retorna o checkpoint de uma sincronização em lote (ex: 'estoque')"""
+    conn = get_db()
+    ensure_bling_sync_estado_table(conn)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute("SELECT * FROM bling_sync_estado WHERE nome = %s", (nome,))
+        row = cur.fetchone()
+        return dict(row) if row else None
+    finally:
+        cur.close()
+
+
+def _try_sync_lock(cur, nome: str) -> bool:
+    """Advisory lock de uma sincronização em lote (uma execução por vez entre workers/scripts)"""
+    cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (f'bling_sync_{nome}',))
+    return bool(cur.fetchone()[0])
+
+
+def _release_sync_lock(conn, cur, nome: str):
+    try:
+        cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (f'bling_sync_{nome}',))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+
+
+def _start_sync_checkpoint(conn, cur, nome: str, total: int, resume: bool) -> Dict:
+    """
+    Abre (ou retoma) o checkpoint de uma sincronização em lote em bling_sync_estado
+    
+    Returns:
+        Dict com total, ultimo_id, processados, alterados e erros
+    """
+    cur.execute("SELECT * FROM bling_sync_estado WHERE nome = %s", (nome,))
+    estado = cur.fetchone()
+    
+    if resume and estado and estado['status'] == 'em_andamento':
+        progresso = {key: estado[key] for key in ('ultimo_id', 'processados', 'alterados', 'erros')}
+        current_app.logger.info(
+            f"[bling_sync_estado] Retomando '{nome}' a partir do id {progresso['ultimo_id']} "
+            f"({progresso['processados']}/{total} já processados)"
+        )
+    else:
+        progresso = {'ultimo_id': 0, 'processados': 0, 'alterados': 0, 'erros': 0}
+    progresso['total'] = total
+    
+    cur.execute("""
+        INSERT INTO bling_sync_estado (nome, status, ultimo_id, total, processados, alterados, erros, iniciado_em, atualizado_em, concluido_em)
+        VALUES (%s, 'em_andamento', %s, %s, %s, %s, %s, NOW(), NOW(), NULL)
+        ON CONFLICT (nome) DO UPDATE SET
+            status = 'em_andamento',
+            ultimo_id = EXCLUDED.ultimo_id,
+            total = EXCLUDED.total,
+            processados = EXCLUDED.processados,
+            alterados = EXCLUDED.alterados,
+            erros = EXCLUDED.erros,
+            iniciado_em = CASE WHEN EXCLUDED.ultimo_id = 0 THEN NOW() ELSE bling_sync_estado.iniciado_em END,
+            atualizado_em = NOW(),
+            concluido_em = NULL
+    """, (nome, progresso['ultimo_id'], total, progresso['processados'], progresso['alterados'], progresso['erros']))
+    conn.commit()
+    return progresso
+
+
+def _save_sync_checkpoint(cur, nome: str, progresso: Dict):
+    """Grava o progresso do lote (o commit fica com o chamador, junto com os dados do lote)"""
+    cur.execute("""
+        UPDATE bling_sync_estado
+        SET ultimo_id = %s, processados = %s, alterados = %s, erros = %s, atualizado_em = NOW()
+        WHERE nome = %s
+    """, (progresso['ultimo_id'], progresso['processados'], progresso['alterados'], progresso['erros'], nome))
+
+
+def _finish_sync_checkpoint(conn, cur, nome: str):
+    cur.execute("""
+        UPDATE bling_sync_estado
+        SET status = 'concluido', concluido_em = NOW(), atualizado_em = NOW()
+        WHERE nome = %s
+    """, (nome,))
+    conn.commit()
+
+
+def _extract_saldo_bling(saldo: Dict) -> Optional[int]:
+    """Extrai o saldo de um item de /estoques/saldos (mesma prioridade de sync_stock_from_bling)"""
+    for key in ('saldoVirtualTotal', 'saldoFisicoTotal'):
+        value = saldo.get(key)
+        if value is not None:
+            try:
+                return int(float(value))
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def fetch_stock_balances_from_bling(bling_ids: List[int]) -> Dict[int, int]:
+    """
+    Busca saldos de estoque de vários produtos em uma única chamada
+    (GET /estoques/saldos?idsProdutos[]=...)
+    
+    Returns:
+        Dict bling_id -> saldo (produtos ausentes na resposta não aparecem)
+    
+    Raises:
+        BlingAPIError: Se a resposta não for 200
+    """
+    response = make_bling_api_request(
+        'GET', '/estoques/saldos',
+        params={'idsProdutos[]': [int(bling_id) for bling_id in bling_ids]}
+    )
+    if response.status_code != 200:
+        raise BlingAPIError(
+            f"Erro ao buscar saldos de estoque no Bling: HTTP {response.status_code}",
+            status_code=response.status_code
+        )
+    
+    saldos = {}
+    for item in response.json().get('data', []) or []:
+        produto = item.get('produto') or {}
+        bling_id = produto.get('id')
+        saldo = _extract_saldo_bling(item)
+        if bling_id is not None and saldo is not None:
+            saldos[int(bling_id)] = saldo
+    return saldos
+
+
+def sync_stock_from_bling_bulk(batch_size: int = None, resume: bool = True,
+                               progress_callback=None) -> Dict:
+    """
+    Reconcilia o estoque local com o Bling em lote
+    
+    Em vez de um GET /produtos/{id} por produto, busca os saldos de até
+    batch_size produtos por chamada em /estoques/saldos, compara com
+    produtos.estoque e aplica só as diferenças em um único UPDATE por lote.
+    
+    Cada lote é gravado junto com o checkpoint (bling_sync_estado, nome
+    'estoque'); se a execução for interrompida, a próxima continua do último
+    produto confirmado (resume=True).
+    
+    Args:
+        batch_size: Produtos por chamada (padrão: BLING_STOCK_BATCH_SIZE)
+        resume: Continuar execução interrompida em vez de recomeçar
+        progress_callback: Função opcional chamada a cada lote com o checkpoint (Dict)
+    
+    Returns:
+        Dict com total, success (processados), errors, changed e results
+        (apenas produtos alterados ou com erro)
+    """
+    batch_size = int(batch_size or current_app.config.get('BLING_STOCK_BATCH_SIZE', 100))
+    conn = get_db()
+    ensure_bling_sync_estado_table(conn)
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    
+    # Apenas uma reconciliação de estoque por vez (entre workers/scripts)
+    if not _try_sync_lock(cur, 'estoque'):
+        cur.close()
+        return {
+            'success': False,
+            'error': 'Sincronização de estoque já em andamento',
+            'total': 0,
+            'results': []
+        }
+    
+    results = []
+    try:
+        cur.execute("""
+            SELECT COUNT(*)
+            FROM bling_produtos bp
+            WHERE bp.status_sincronizacao = 'sync'
+        """)
+        total = cur.fetchone()[0]
+        
+        progresso = _start_sync_checkpoint(conn, cur, 'estoque', total, resume)
+        ultimo_id = progresso['ultimo_id']
+        processados = progresso['processados']
+        alterados = progresso['alterados']
+        erros = progresso['erros']
+        
+        while True:
+            cur.execute("""
+                SELECT p.id, bp.bling_id, p.estoque
+                FROM produtos p
+                JOIN bling_produtos bp ON p.id = bp.produto_id
+                WHERE bp.status_sincronizacao = 'sync'
+                AND p.id > %s
+                ORDER BY p.id
+                LIMIT %s
+            """, (ultimo_id, batch_size))
+            lote = cur.fetchall()
+            if not lote:
+                break
+            
+            try:
+                saldos = fetch_stock_balances_from_bling([row['bling_id'] for row in lote])
+            except Exception as e:
+                # Checkpoint permanece no último lote confirmado; próxima execução retoma daqui
+                conn.rollback()
+                current_app.logger.error(f"[sync_stock_from_bling_bulk] Erro ao buscar lote após produto {ultimo_id}: {e}")
+                return {
+                    'success': False,
+                    'error': str(e),
+                    'total': total,
+                    'processed': processados,
+                    'changed': alterados,
+                    'resumable': True,
+                    'results': results
+                }
+            
+            alteracoes = []
+            for row in lote:
+                saldo = saldos.get(int(row['bling_id']))
+                if saldo is None:
+                    erros += 1
+                    results.append({
+                        'produto_id': row['id'],
+                        'success': False,
+                        'error': f"Produto {row['bling_id']} sem saldo retornado pelo Bling"
+                    })
+                elif saldo != row['estoque']:
+                    alteracoes.append((row['id'], saldo))
+                    results.append({
+                        'produto_id': row['id'],
+                        'success': True,
+                        'estoque_anterior': row['estoque'],
+                        'estoque_novo': saldo
+                    })
+            
+            if alteracoes:
+                psycopg2.extras.execute_values(cur, """
+                    UPDATE produtos p
+                    SET estoque = v.estoque,
+                        atualizado_em = NOW()
+                    FROM (VALUES %s) AS v(id, estoque)
+                    WHERE p.id = v.id
+                    AND p.estoque IS DISTINCT FROM v.estoque
+                """, alteracoes, template='(%s::INTEGER, %s::INTEGER)')
+                alterados += cur.rowcount
+            
+            ultimo_id = lote[-1]['id']
+            processados += len(lote)
+            progresso.update(ultimo_id=ultimo_id, processados=processados, alterados=alterados, erros=erros)
+            _save_sync_checkpoint(cur, 'estoque', progresso)
+            conn.commit()
+            
+            current_app.logger.info(
+                f"[sync_stock_from_bling_bulk] {processados}/{total} produtos "
+                f"({alterados} alterados, {erros} erros)"
+            )
+            if progress_callback:
+                progress_callback(progresso)
+        
+        _finish_sync_checkpoint(conn, cur, 'estoque')
+        
+        log_sync('produto', 0, 'stock_bulk_sync', {
+            'status': 'success',
+            'total': total,
+            'processados': processados,
+            'alterados': alterados,
+            'erros': erros
+        })
+        
+        return {
+            'total': total,
+            'success': processados - erros,
+            'errors': erros,
+            'changed': alterados,
+            'results': results
+        }
+    
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"Erro na sincronização de estoque em lote: {e}", exc_info=True)
+        return {
+            'success': False,
+            'error': str(e),
+            'total': 0,
+            'resumable': True,
+            'results': results
+        }
+    finally:
+        _release_sync_lock(conn, cur, 'estoque')
+        cur.close()
+
+
 def sync_stock_to_bling(produto_id: int = None) -> Dict:
     """
     Sincroniza estoque do banco local para o Bling
@@ -10,6 +10,8 @@ from datetime import datetime
 import psycopg2.extras
 from .db import get_db, execute_query_safely, execute_write_safely
 from .bling_api_service import make_bling_api_request
+from .schema_capabilities import has_column
+from .reference_cache import get_reference_data, invalidate_reference_cache
 
 
 def get_bling_situacao_by_id(situacao_id: int) -> Optional[Dict]:
@@ -207,6 +209,7 @@ def sync_bling_situacoes_to_db() -> Dict:
                     )
             
             conn.commit()
+            invalidate_reference_cache('situacoes')
             
             return {
                 'success': True,
@@ -230,16 +233,8 @@ def sync_bling_situacoes_to_db() -> Dict:
         }
 
 
-def get_situacao_mapping(bling_situacao_id: int) -> Optional[Dict]:
-    """
-    Busca o mapeamento de uma situação do Bling para status do site
-    
-    Args:
-        bling_situacao_id: ID da situação no Bling
-    
-    Returns:
-        Dict com dados da situação e mapeamento ou None
-    """
+def _load_situacoes() -> Dict[int, Dict]:
+    """Carrega bling_situacoes indexado por bling_situacao_id (cache de referência)"""
     conn = get_db()
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     
@@ -252,20 +247,27 @@ def get_situacao_mapping(bling_situacao_id: int) -> Optional[Dict]:
                 status_site,
                 ativo
             FROM bling_situacoes
-            WHERE bling_situacao_id = %s
-        """, (bling_situacao_id,))
-        
-        situacao = cur.fetchone()
-        
-        if situacao:
-            return dict(situacao)
-        
-        return None
-        
+        """)
+        return {row['bling_situacao_id']: dict(row) for row in cur.fetchall()}
     finally:
         cur.close()
 
 
+def get_situacao_mapping(bling_situacao_id: int) -> Optional[Dict]:
+    """
+    Busca o mapeamento de uma situação do Bling para status do site
+    (em memória, via cache de referência 'situacoes')
+    
+    Args:
+        bling_situacao_id: ID da situação no Bling
+    
+    Returns:
+        Dict com dados da situação e mapeamento ou None
+    """
+    situacao = get_reference_data('situacoes', _load_situacoes).get(bling_situacao_id)
+    return dict(situacao) if situacao else None
+
+
 def map_bling_situacao_id_to_status(bling_situacao_id: int) -> Optional[str]:
     """
     Mapeia ID da situação do Bling para status do site
@@ -359,6 +361,7 @@ def update_situacao_mapping(bling_situacao_id: int, status_site: str) -> bool:
         updated = cur.rowcount > 0
         
         if updated:
+            invalidate_reference_cache('situacoes')
             current_app.logger.info(
                 f"✅ Mapeamento atualizado: Situação {bling_situacao_id} → {status_site}"
             )
@@ -531,3 +534,104 @@ def update_pedido_situacao(venda_id: int, bling_situacao_id: int,
         import traceback
         current_app.logger.error(traceback.format_exc())
         return False
+
+
+def update_pedidos_situacao_batch(transicoes: List[Dict]) -> List[int]:
+    """
+    Versão em lote de update_pedido_situacao (reconciliação de status)
+    
+    O mapeamento situação -> status do site é resolvido uma vez por situação
+    e todas as vendas são atualizadas em um único UPDATE. Os dados da NF-e
+    (nota_fiscal, no formato notaFiscal do Bling) são gravados em bling_pedidos
+    na mesma transação.
+    
+    Args:
+        transicoes: Dicts com venda_id, bling_situacao_id, bling_situacao_nome (opcional)
+                    e nota_fiscal (opcional)
+    
+    Returns:
+        IDs das vendas atualizadas
+    """
+    if not transicoes:
+        return []
+    
+    nfe_rows = [
+        (t['venda_id'], t['nota_fiscal'].get('id'), t['nota_fiscal'].get('numero'),
+         t['nota_fiscal'].get('chaveAcesso'), t['nota_fiscal'].get('situacao', ''))
+        for t in transicoes if t.get('nota_fiscal')
+    ]
+    
+    def _update_nfe(cur):
+        if not nfe_rows:
+            return
+        psycopg2.extras.execute_values(cur, """
+            UPDATE bling_pedidos bp
+            SET bling_nfe_id = d.bling_nfe_id,
+                nfe_numero = d.nfe_numero,
+                nfe_chave_acesso = d.nfe_chave_acesso,
+                nfe_status = d.nfe_status,
+                updated_at = NOW()
+            FROM (VALUES %s) AS d(venda_id, bling_nfe_id, nfe_numero, nfe_chave_acesso, nfe_status)
+            WHERE bp.venda_id = d.venda_id
+        """, nfe_rows, template='(%s::INTEGER, %s::BIGINT, %s::INTEGER, %s::VARCHAR, %s::VARCHAR)')
+    
+    if not (has_column('vendas', 'bling_situacao_id') and has_column('vendas', 'bling_situacao_nome')):
+        # Colunas ainda não existem: update_pedido_situacao as cria no primeiro uso
+        atualizados = [
+            t['venda_id'] for t in transicoes
+            if update_pedido_situacao(t['venda_id'], t['bling_situacao_id'], t.get('bling_situacao_nome'))
+        ]
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            _update_nfe(cur)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            current_app.logger.error(f"❌ [UPDATE_PEDIDOS_SITUACAO] Erro ao atualizar NF-e em lote: {e}")
+            raise
+        finally:
+            cur.close()
+        return atualizados
+    
+    situacoes = {}
+    rows = []
+    for t in transicoes:
+        situacao_id = t['bling_situacao_id']
+        if situacao_id not in situacoes:
+            mapping = get_situacao_mapping(situacao_id)
+            situacoes[situacao_id] = (
+                map_bling_situacao_id_to_status(situacao_id),
+                mapping.get('nome') if mapping else None
+            )
+        status_site, nome = situacoes[situacao_id]
+        rows.append((t['venda_id'], situacao_id, t.get('bling_situacao_nome') or nome, status_site))
+    
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        # Sem mapeamento de status: atualiza apenas a situação do Bling (como update_pedido_situacao)
+        atualizados = psycopg2.extras.execute_values(cur, """
+            UPDATE vendas v
+            SET status_pedido = COALESCE(d.status_site, v.status_pedido),
+                bling_situacao_id = d.bling_situacao_id,
+                bling_situacao_nome = d.bling_situacao_nome,
+                atualizado_em = NOW()
+            FROM (VALUES %s) AS d(venda_id, bling_situacao_id, bling_situacao_nome, status_site)
+            WHERE v.id = d.venda_id
+            RETURNING v.id
+        """, rows, template='(%s::INTEGER, %s::INTEGER, %s::VARCHAR, %s::VARCHAR)', fetch=True)
+        _update_nfe(cur)
+        conn.commit()
+        
+        current_app.logger.info(
+            f"✅ [UPDATE_PEDIDOS_SITUACAO] {len(atualizados)} pedidos atualizados em lote "
+            f"({len(situacoes)} situações distintas)"
+        )
+        return [row[0] for row in atualizados]
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"❌ [UPDATE_PEDIDOS_SITUACAO] Erro ao atualizar situações em lote: {e}")
+        raise
+    finally:
+        cur.close()
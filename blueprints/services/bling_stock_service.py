@@ -9,6 +9,7 @@ Gerencia sincronização de estoque considerando:
 """
 from flask import current_app
 from typing import Dict, Optional, List
+import json
 from .db import get_db
 from .bling_product_service import sync_stock_to_bling, sync_stock_from_bling
 import psycopg2.extras
@@ -460,3 +461,130 @@ def ensure_stock_consistency(produto_id: Optional[int] = None) -> Dict:
     return result
 
 
+def apply_stock_webhook_events(events: List[Dict]) -> Dict[int, Dict]:
+    """
+    Aplica um lote de webhooks stock.created/stock.updated do Bling
+    (caixa de entrada, processador em lote).
+    
+    Um ajuste de inventário gera dezenas de eventos por produto em poucos
+    segundos, cada um com o saldo completo (saldoFisicoTotal). Por produto,
+    só o último evento do lote é aplicado; todos os produtos são atualizados
+    em um único UPDATE, e só os que mudaram de fato (as triggers do catálogo
+    e da sincronização com o Bling disparam uma vez por produto).
+    
+    Args:
+        events: Eventos da caixa de entrada (id, payload), em ordem de chegada
+        
+    Returns:
+        Dict {id do evento: resultado}
+    """
+    resultados: Dict[int, Dict] = {}
+    ultimos: Dict = {}  # bling_id -> (id do evento, estoque, evento)
+    coalescidos: Dict = {}  # bling_id -> quantidade de eventos substituídos
+    
+    for event in events:
+        payload = event.get('payload') or {}
+        data = payload.get('data') if isinstance(payload.get('data'), dict) else {}
+        produto = data.get('produto') if isinstance(data.get('produto'), dict) else {}
+        produto_bling_id = produto.get('id')
+        saldo = data.get('saldoFisicoTotal')
+        if saldo is None:
+            saldo = data.get('saldo_fisico_total')
+        
+        try:
+            produto_bling_id = int(produto_bling_id) if produto_bling_id else None
+        except (ValueError, TypeError):
+            produto_bling_id = None
+        if not produto_bling_id:
+            resultados[event['id']] = {'status': 'ignorado', 'message': 'Webhook sem produto ID'}
+            continue
+        if saldo is None:
+            resultados[event['id']] = {'status': 'ignorado', 'message': 'Webhook sem saldoFisicoTotal'}
+            continue
+        try:
+            estoque = int(float(saldo))
+        except (ValueError, TypeError):
+            resultados[event['id']] = {'status': 'ignorado', 'message': 'Erro ao converter saldoFisicoTotal'}
+            continue
+        
+        anterior = ultimos.get(produto_bling_id)
+        if anterior:
+            resultados[anterior[0]] = {'status': 'coalescido', 'aplicado_no_evento': event['id']}
+            coalescidos[produto_bling_id] = coalescidos.get(produto_bling_id, 0) + 1
+        ultimos[produto_bling_id] = (event['id'], estoque, payload)
+    
+    if not ultimos:
+        return resultados
+    
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        # A subconsulta no RETURNING enxerga o snapshot anterior ao UPDATE (estoque anterior)
+        atualizados = psycopg2.extras.execute_values(cur, """
+            UPDATE produtos p
+            SET estoque = v.estoque,
+                updated_at = NOW()
+            FROM (VALUES %s) AS v(bling_id, estoque), bling_produtos bp
+            WHERE bp.bling_id = v.bling_id
+            AND p.id = bp.produto_id
+            AND p.estoque IS DISTINCT FROM v.estoque
+            RETURNING p.id AS produto_id, bp.bling_id, v.estoque AS estoque_novo,
+                      (SELECT o.estoque FROM produtos o WHERE o.id = p.id) AS estoque_anterior
+        """, [
+            (bling_id, estoque) for bling_id, (_, estoque, _) in ultimos.items()
+        ], template="(%s::bigint, %s::integer)", page_size=len(ultimos), fetch=True)
+        atualizados = {row['bling_id']: dict(row) for row in atualizados}
+        
+        # Produtos sem alteração ainda precisam do id local no resultado
+        cur.execute("""
+            SELECT bling_id, produto_id FROM bling_produtos WHERE bling_id = ANY(%s::bigint[])
+        """, ([bling_id for bling_id in ultimos if bling_id not in atualizados],))
+        locais = {row['bling_id']: row['produto_id'] for row in cur.fetchall()}
+        
+        if atualizados:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO bling_sync_logs (entity_type, entity_id, action, status, response_data, created_at)
+                VALUES %s
+            """, [
+                ('produto', row['produto_id'], 'sync', 'success', json.dumps({
+                    'event': ultimos[bling_id][2].get('event'),
+                    'event_id': ultimos[bling_id][2].get('eventId'),
+                    'bling_id': bling_id,
+                    'estoque_anterior': row['estoque_anterior'],
+                    'estoque_novo': row['estoque_novo'],
+                    'eventos_coalescidos': coalescidos.get(bling_id, 0),
+                    'action': 'webhook_stock_update'
+                }))
+                for bling_id, row in atualizados.items()
+            ], template="(%s, %s, %s, %s, %s, NOW())", page_size=len(atualizados))
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    
+    for bling_id, (event_id, estoque, _) in ultimos.items():
+        row = atualizados.get(bling_id)
+        if row:
+            resultados[event_id] = {
+                'status': 'aplicado',
+                'produto_id': row['produto_id'],
+                'estoque_anterior': row['estoque_anterior'],
+                'estoque_novo': row['estoque_novo'],
+                'eventos_coalescidos': coalescidos.get(bling_id, 0)
+            }
+        elif bling_id in locais:
+            resultados[event_id] = {'status': 'sem_alteracao', 'produto_id': locais[bling_id], 'estoque': estoque}
+        else:
+            resultados[event_id] = {
+                'status': 'ignorado',
+                'message': f"Produto bling_id {bling_id} não encontrado localmente"
+            }
+    
+    current_app.logger.info(
+        f"📦 Webhooks de estoque: {len(events)} evento(s), {len(ultimos)} produto(s), "
+        f"{len(atualizados)} estoque(s) atualizado(s) em um UPDATE"
+    )
+    return resultados
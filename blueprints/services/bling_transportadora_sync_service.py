@@ -9,6 +9,7 @@ from flask import current_app
 from typing import Dict, List, Optional
 from .bling_api_service import make_bling_api_request
 from .db import get_db
+from .reference_cache import get_reference_data, invalidate_reference_cache, normalizar_nome, NomeTrie
 import psycopg2.extras
 import re
 import json
@@ -106,6 +107,7 @@ def sync_transportadoras_from_bling(force_refresh: bool = True) -> Dict:
                 result['errors'].append(error_msg)
         
         conn.commit()
+        invalidate_reference_cache('transportadoras')
         result['success'] = True
         
         current_app.logger.info(
@@ -256,6 +258,49 @@ def save_transportadora_to_db(transportadora_bling: Dict, cur) -> Dict:
     return result
 
 
+def _load_transportadoras_index() -> Dict:
+    """
+    Carrega as transportadoras ativas e seus índices (cache de referência)
+    
+    Returns:
+        Dict com 'rows' (da mais recente para a mais antiga), 'normalizados'
+        ((nome, fantasia) por linha), 'por_cnpj', 'por_bling_id' e 'nomes'
+        (NomeTrie de nome e fantasia -> índice em 'rows')
+    """
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    
+    try:
+        cur.execute("""
+            SELECT * FROM transportadoras_bling
+            WHERE situacao = 'A'
+            ORDER BY atualizado_em DESC
+        """)
+        rows = [dict(row) for row in cur.fetchall()]
+    finally:
+        cur.close()
+    
+    indice = {'rows': rows, 'normalizados': [], 'por_cnpj': {}, 'por_bling_id': {}, 'nomes': NomeTrie()}
+    for i, row in enumerate(rows):
+        # Colunas *_normalizado podem não existir (add_transportadora_nome_normalizado.sql)
+        nome_normalizado = row.get('nome_normalizado') or normalizar_nome(row.get('nome'))
+        fantasia_normalizado = row.get('fantasia_normalizado') or normalizar_nome(row.get('fantasia'))
+        indice['normalizados'].append((nome_normalizado, fantasia_normalizado))
+        indice['nomes'].add(nome_normalizado, i)
+        indice['nomes'].add(fantasia_normalizado, i)
+        if row.get('cnpj'):
+            indice['por_cnpj'].setdefault(row['cnpj'], i)
+        if row.get('bling_id') is not None:
+            indice['por_bling_id'].setdefault(row['bling_id'], i)
+    
+    current_app.logger.info(f"📋 {len(rows)} transportadora(s) ativa(s) carregada(s) no cache")
+    return indice
+
+
+def _get_transportadoras_index() -> Dict:
+    return get_reference_data('transportadoras', _load_transportadoras_index)
+
+
 def get_transportadora_by_cnpj(cnpj: str) -> Optional[Dict]:
     """
     Busca transportadora no banco de dados local por CNPJ
@@ -273,27 +318,14 @@ def get_transportadora_by_cnpj(cnpj: str) -> Optional[Dict]:
     if len(cnpj_limpo) != 14:
         return None
     
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
     try:
-        cur.execute("""
-            SELECT * FROM transportadoras_bling
-            WHERE cnpj = %s AND situacao = 'A'
-            ORDER BY atualizado_em DESC
-            LIMIT 1
-        """, (cnpj_limpo,))
-        
-        transportadora = cur.fetchone()
-        if transportadora:
-            return dict(transportadora)
-        return None
+        indice = _get_transportadoras_index()
+        i = indice['por_cnpj'].get(cnpj_limpo)
+        return dict(indice['rows'][i]) if i is not None else None
         
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao buscar transportadora por CNPJ: {e}", exc_info=True)
         return None
-    finally:
-        cur.close()
 
 
 def get_transportadora_by_bling_id(bling_id: int) -> Optional[Dict]:
@@ -306,26 +338,49 @@ def get_transportadora_by_bling_id(bling_id: int) -> Optional[Dict]:
     Returns:
         Dict com dados da transportadora ou None se não encontrada
     """
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
     try:
-        cur.execute("""
-            SELECT * FROM transportadoras_bling
-            WHERE bling_id = %s AND situacao = 'A'
-            LIMIT 1
-        """, (bling_id,))
-        
-        transportadora = cur.fetchone()
-        if transportadora:
-            return dict(transportadora)
-        return None
+        indice = _get_transportadoras_index()
+        i = indice['por_bling_id'].get(bling_id)
+        return dict(indice['rows'][i]) if i is not None else None
         
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao buscar transportadora por Bling ID: {e}", exc_info=True)
         return None
-    finally:
-        cur.close()
+
+
+def _find_transportadora_index_by_nome(indice: Dict, nome_busca: str) -> Optional[int]:
+    """
+    Melhor transportadora para um nome normalizado, com a mesma prioridade
+    da antiga busca por LIKE: nome exato, fantasia exata, nome/fantasia
+    começando com a palavra principal e, por último, nome/fantasia contendo
+    o nome buscado. Empates ficam com a atualizada mais recentemente.
+    """
+    normalizados = indice['normalizados']
+    palavra_principal = nome_busca.split()[0]
+    
+    def corresponde(i):
+        nome_n, fantasia_n = normalizados[i]
+        return nome_busca in nome_n or nome_busca in fantasia_n
+    
+    def prioridade(i):
+        nome_n, fantasia_n = normalizados[i]
+        if nome_n == nome_busca:
+            return 1
+        if fantasia_n == nome_busca:
+            return 2
+        if nome_n.startswith(palavra_principal):
+            return 3
+        if fantasia_n.startswith(palavra_principal):
+            return 4
+        return 5
+    
+    # Prioridades 1-4 começam com a palavra principal: basta o índice de prefixos
+    candidatos = [i for i in indice['nomes'].prefix(palavra_principal) if corresponde(i)]
+    if not candidatos:
+        # Só resta "contém" no meio do nome: varredura em memória (poucas transportadoras)
+        candidatos = [i for i in range(len(normalizados)) if corresponde(i)]
+    
+    return min(candidatos, key=lambda i: (prioridade(i), i), default=None)
 
 
 def get_transportadora_by_nome(nome: str) -> Optional[Dict]:
@@ -341,77 +396,22 @@ def get_transportadora_by_nome(nome: str) -> Optional[Dict]:
     if not nome:
         return None
     
-    conn = get_db()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
-    
     try:
-        # Normalizar o nome de busca usando a mesma função do banco
-        # Isso garante que a busca seja feita com a mesma normalização dos dados
-        nome_busca = nome.strip().upper()
-        
-        # Remover acentos e caracteres especiais (mesma lógica da função SQL)
-        nome_busca = re.sub(r'[ÁÀÂÃ]', 'A', nome_busca)
-        nome_busca = re.sub(r'[ÉÈÊ]', 'E', nome_busca)
-        nome_busca = re.sub(r'[ÍÌÎ]', 'I', nome_busca)
-        nome_busca = re.sub(r'[ÓÒÔÕ]', 'O', nome_busca)
-        nome_busca = re.sub(r'[ÚÙÛ]', 'U', nome_busca)
-        nome_busca = re.sub(r'Ç', 'C', nome_busca)
-        nome_busca = re.sub(r'\s+', ' ', nome_busca).strip()
-        nome_busca = re.sub(r'[^A-Z0-9 ]', '', nome_busca)
+        # Mesma normalização da função normalizar_nome_transportadora do banco
+        nome_busca = normalizar_nome(nome)
         
         # Se o nome for muito curto (menos de 3 caracteres), não buscar
         if len(nome_busca) < 3:
             return None
         
-        # Extrair palavra principal (primeira palavra)
-        palavras_chave = nome_busca.split()
-        palavra_principal = palavras_chave[0] if palavras_chave else nome_busca
+        indice = _get_transportadoras_index()
+        i = _find_transportadora_index_by_nome(indice, nome_busca)
         
-        # Buscar usando nome_normalizado e fantasia_normalizado (mais eficiente com índices)
-        # Priorizar correspondência exata, depois parcial
-        cur.execute("""
-            SELECT * FROM transportadoras_bling
-            WHERE situacao = 'A'
-            AND (
-                nome_normalizado = %s
-                OR fantasia_normalizado = %s
-                OR nome_normalizado LIKE %s
-                OR fantasia_normalizado LIKE %s
-                OR nome_normalizado LIKE %s
-                OR fantasia_normalizado LIKE %s
-            )
-            ORDER BY 
-                CASE 
-                    WHEN nome_normalizado = %s THEN 1
-                    WHEN fantasia_normalizado = %s THEN 2
-                    WHEN nome_normalizado LIKE %s THEN 3
-                    WHEN fantasia_normalizado LIKE %s THEN 4
-                    WHEN nome_normalizado LIKE %s THEN 5
-                    WHEN fantasia_normalizado LIKE %s THEN 6
-                    ELSE 7
-                END,
-                atualizado_em DESC
-            LIMIT 1
-        """, (
-            nome_busca,  # Exato nome_normalizado
-            nome_busca,  # Exato fantasia_normalizado
-            f'{nome_busca}%',  # Começa com nome completo
-            f'{nome_busca}%',  # Começa com fantasia completo
-            f'%{nome_busca}%',  # Contém nome completo
-            f'%{nome_busca}%',  # Contém fantasia completo
-            nome_busca,  # Para ORDER BY
-            nome_busca,  # Para ORDER BY
-            f'{palavra_principal}%',  # Para ORDER BY
-            f'{palavra_principal}%',  # Para ORDER BY
-            f'{nome_busca}%',  # Para ORDER BY
-            f'{nome_busca}%'   # Para ORDER BY
-        ))
-        
-        transportadora = cur.fetchone()
-        if transportadora:
+        if i is not None:
+            transportadora = indice['rows'][i]
             current_app.logger.info(
                 f"✅ Transportadora encontrada por nome: '{nome}' -> '{transportadora.get('nome')}' "
-                f"(nome_normalizado: '{transportadora.get('nome_normalizado')}')"
+                f"(nome_normalizado: '{indice['normalizados'][i][0]}')"
             )
             return dict(transportadora)
         
@@ -423,8 +423,6 @@ def get_transportadora_by_nome(nome: str) -> Optional[Dict]:
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao buscar transportadora por nome: {e}", exc_info=True)
         return None
-    finally:
-        cur.close()
 
 
 def format_transportadora_for_nfe(transportadora_db: Dict) -> Dict:
@@ -1,4 +1,5 @@
 from .db import get_db, execute_query_safely, execute_write_safely
+from .schema_capabilities import has_table, mark_table_created
 from flask import request, jsonify, g
 
 def ensure_carrinhos_table_exists(conn):
@@ -6,28 +7,14 @@ def ensure_carrinhos_table_exists(conn):
     Garante que as tabelas carrinhos e carrinho_itens existam.
     Cria-as se não existirem.
     """
+    # Verifica (via cache do schema) se as tabelas existem
+    carrinhos_exists = has_table('carrinhos')
+    carrinho_itens_exists = has_table('carrinho_itens')
+    if carrinhos_exists and carrinho_itens_exists:
+        return
+    
     cur = conn.cursor()
     try:
-        # Verifica se a tabela carrinhos existe
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'carrinhos'
-            );
-        """)
-        carrinhos_exists = cur.fetchone()[0]
-        
-        # Verifica se a tabela carrinho_itens existe
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = 'carrinho_itens'
-            );
-        """)
-        carrinho_itens_exists = cur.fetchone()[0]
-        
         if not carrinhos_exists or not carrinho_itens_exists:
             print("Criando tabelas de carrinho...")
             
@@ -84,6 +71,8 @@ def ensure_carrinhos_table_exists(conn):
             # Não criar trigger para carrinho_itens pois não tem campo atualizado_em
             
             conn.commit()
+            mark_table_created('carrinhos')
+            mark_table_created('carrinho_itens')
             print("✓ Tabelas 'carrinhos' e 'carrinho_itens' criadas com sucesso.")
     except Exception as e:
         conn.rollback()
@@ -0,0 +1,590 @@
+"""
+Catálogo materializado da loja
+==============================
+
+A listagem /api/base_products lê a tabela catalogo_produtos: uma linha por
+produto base (nome_produto) com preços mínimos, imagem representativa,
+quantidade de variações ativas e arrays de facetas (tamanho, estampa, tecido,
+sexo, categoria) indexados com GIN. catalogo_variacoes guarda as mesmas
+facetas por variação ativa: filtros combinados (tamanho + estampa, estampa +
+preço...) exigem uma variação que tenha todos, como na query original.
+
+A projeção é mantida incrementalmente:
+- Triggers (sql/create-catalogo-produtos.sql) registram em
+  catalogo_produtos_pendentes os produtos base afetados por edições do Strapi,
+  webhooks de estoque do Bling e sincronizações de preço.
+- Antes de ler o catálogo, sync_pending_catalog() reprocessa apenas os
+  pendentes (id 0 = catálogo inteiro) na mesma transação que os consome.
+
+Os filtros da loja (/api/store/filters) são pré-calculados a partir do
+catálogo no mesmo reprocessamento e guardados em catalogo_facetas, com uma
+versão e um ETag; cada processo mantém em memória a última versão lida.
+
+Se as tabelas não existirem, catalog_available() retorna False e a rota usa a
+query original.
+"""
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, List, Optional, Sequence
+
+from .db import get_db
+from .schema_capabilities import has_table, has_column
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Chave do advisory lock que serializa o reprocessamento entre workers
+CATALOG_REFRESH_LOCK_KEY = 7410001
+
+# Valores fixos dos filtros da loja (as quantidades são calculadas no catálogo)
+FILTROS_SEXO = [
+    {'value': 'm', 'label': 'Masculino'},
+    {'value': 'f', 'label': 'Feminino'},
+    {'value': 'u', 'label': 'Unissex'}
+]
+FILTROS_PRECO = [
+    {'label': 'Até R$ 50', 'min': 0, 'max': 50},
+    {'label': 'R$ 50 - R$ 100', 'min': 50, 'max': 100},
+    {'label': 'R$ 100 - R$ 200', 'min': 100, 'max': 200},
+    {'label': 'Acima de R$ 200', 'min': 200, 'max': None}
+]
+
+# Última versão das facetas lida por este processo: (versao, etag, dados)
+_facets_cache: Optional[tuple] = None
+
+_refresh_seconds = metrics.histogram(
+    'catalog_refresh_seconds',
+    'Duração do reprocessamento do catálogo materializado'
+)
+_refreshed_products_total = metrics.counter(
+    'catalog_refreshed_products_total',
+    'Produtos base reprocessados no catálogo materializado'
+)
+
+
+def catalog_available() -> bool:
+    """Verifica (em cache) se a migração do catálogo materializado foi aplicada"""
+    return (has_table('catalogo_produtos') and has_table('catalogo_variacoes')
+            and has_table('catalogo_produtos_pendentes'))
+
+
+def _facet_arrays_sql(produtos: str) -> Dict[str, str]:
+    """
+    Expressões das facetas (tamanho, estampa, tecido, sexo) das variações
+    indicadas por `produtos` (ex: "= ANY(v.produto_ids)" ou "= p.id").
+    Facetas de tecido dependem das tabelas opcionais (tecidos/estampa_tecido_lnk
+    ou o campo legado estampa.tecido).
+    """
+    facetas = {
+        'tamanho_ids': f"""
+            COALESCE((SELECT array_agg(DISTINCT pt.tamanho_id)
+                      FROM produtos_tamanho_lnk pt
+                      WHERE pt.produto_id {produtos}
+                      AND pt.tamanho_id IS NOT NULL), '{{}}')""",
+        'estampa_ids': f"""
+            COALESCE((SELECT array_agg(DISTINCT pe.estampa_id)
+                      FROM produtos_estampa_lnk pe
+                      WHERE pe.produto_id {produtos}
+                      AND pe.estampa_id IS NOT NULL), '{{}}')""",
+        'tecido_ids': "'{}'::INTEGER[]",
+        'tecidos_texto': "'{}'::TEXT[]",
+        'sexos': f"""
+            COALESCE((SELECT array_agg(DISTINCT e.sexo::TEXT)
+                      FROM produtos_estampa_lnk pe
+                      JOIN estampa e ON pe.estampa_id = e.id
+                      WHERE pe.produto_id {produtos}
+                      AND e.sexo IS NOT NULL), '{{}}')""",
+    }
+
+    if has_table('estampa_tecido_lnk'):
+        facetas['tecido_ids'] = f"""
+            COALESCE((SELECT array_agg(DISTINCT etl.tecido_id)
+                      FROM produtos_estampa_lnk pe
+                      JOIN estampa_tecido_lnk etl ON pe.estampa_id = etl.estampa_id
+                      WHERE pe.produto_id {produtos}
+                      AND etl.tecido_id IS NOT NULL), '{{}}')"""
+
+    if has_column('estampa', 'tecido'):
+        facetas['tecidos_texto'] = f"""
+            COALESCE((SELECT array_agg(DISTINCT e.tecido)
+                      FROM produtos_estampa_lnk pe
+                      JOIN estampa e ON pe.estampa_id = e.id
+                      WHERE pe.produto_id {produtos}
+                      AND e.tecido IS NOT NULL), '{{}}')"""
+
+    return facetas
+
+
+def _build_refresh_sql(full: bool) -> str:
+    """Monta o INSERT que recalcula as linhas do catálogo (uma por produto base)"""
+    filtro_ids = "" if full else "AND np.id = ANY(%(ids)s)"
+    facetas = _facet_arrays_sql("= ANY(v.produto_ids)")
+
+    return f"""
+        INSERT INTO catalogo_produtos (
+            nome_produto_id, nome, descricao, categoria_id, categoria_nome, categoria_ids,
+            imagem_url, preco_minimo, preco_minimo_original, precos, variacoes_count,
+            tamanho_ids, estampa_ids, tecido_ids, tecidos_texto, sexos, atualizado_em
+        )
+        SELECT
+            np.id,
+            np.nome,
+            np.descricao,
+            cat.ids[1],
+            cat.nomes[1],
+            COALESCE(cat.ids, '{{}}'),
+            (SELECT ip.url
+             FROM produtos_nome_produto_lnk pnp_img
+             JOIN imagens_produto_produto_lnk ipl ON pnp_img.produto_id = ipl.produto_id
+             JOIN imagens_produto ip ON ipl.imagem_produto_id = ip.id
+             WHERE pnp_img.nome_produto_id = np.id
+             ORDER BY COALESCE(ipl.imagem_produto_ord, ip.ordem, 0) ASC
+             LIMIT 1),
+            v.preco_minimo,
+            v.preco_minimo_original,
+            v.precos,
+            v.variacoes_count,
+            {facetas['tamanho_ids']},
+            {facetas['estampa_ids']},
+            {facetas['tecido_ids']},
+            {facetas['tecidos_texto']},
+            {facetas['sexos']},
+            NOW()
+        FROM nome_produto np
+        JOIN LATERAL (
+            SELECT
+                array_agg(p.id) AS produto_ids,
+                MIN(COALESCE(p.preco_promocional, p.preco_venda)) AS preco_minimo,
+                MIN(p.preco_venda) AS preco_minimo_original,
+                COALESCE(array_agg(DISTINCT COALESCE(p.preco_promocional, p.preco_venda))
+                         FILTER (WHERE COALESCE(p.preco_promocional, p.preco_venda) IS NOT NULL), '{{}}') AS precos,
+                COUNT(*) AS variacoes_count
+            FROM produtos p
+            JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
+            WHERE pnp.nome_produto_id = np.id
+            AND p.ativo = TRUE
+        ) v ON v.variacoes_count > 0
+        LEFT JOIN LATERAL (
+            SELECT array_agg(c.id ORDER BY c.id) AS ids,
+                   array_agg(c.nome ORDER BY c.id) AS nomes
+            FROM nome_produto_categoria_lnk npc
+            JOIN categorias c ON npc.categoria_id = c.id
+            WHERE npc.nome_produto_id = np.id
+        ) cat ON TRUE
+        WHERE np.ativo = TRUE
+        {filtro_ids}
+    """
+
+
+def _build_variations_refresh_sql(full: bool) -> str:
+    """
+    Monta o INSERT das facetas por variação, para os produtos base que estão
+    no catálogo (executado depois de _build_refresh_sql, na mesma transação)
+    """
+    filtro_ids = "" if full else "AND cp.nome_produto_id = ANY(%(ids)s)"
+    facetas = _facet_arrays_sql("= p.id")
+    return f"""
+        INSERT INTO catalogo_variacoes (
+            nome_produto_id, produto_id, preco,
+            tamanho_ids, estampa_ids, tecido_ids, tecidos_texto, sexos
+        )
+        SELECT DISTINCT ON (cp.nome_produto_id, p.id)
+            cp.nome_produto_id,
+            p.id,
+            COALESCE(p.preco_promocional, p.preco_venda),
+            {facetas['tamanho_ids']},
+            {facetas['estampa_ids']},
+            {facetas['tecido_ids']},
+            {facetas['tecidos_texto']},
+            {facetas['sexos']}
+        FROM catalogo_produtos cp
+        JOIN produtos_nome_produto_lnk pnp ON pnp.nome_produto_id = cp.nome_produto_id
+        JOIN produtos p ON p.id = pnp.produto_id
+        WHERE p.ativo = TRUE
+        {filtro_ids}
+    """
+
+
+def refresh_catalog(nome_produto_ids: Optional[Sequence[int]] = None, conn=None) -> int:
+    """
+    Recalcula as linhas do catálogo (sem commit - o chamador controla a transação)
+
+    Args:
+        nome_produto_ids: Produtos base a reprocessar; None = catálogo inteiro
+        conn: Conexão a usar (padrão: conexão da requisição)
+
+    Returns:
+        Quantidade de produtos base presentes no catálogo após o reprocessamento
+    """
+    conn = conn or get_db()
+    full = nome_produto_ids is None
+    ids = [] if full else sorted({int(i) for i in nome_produto_ids})
+    if not full and not ids:
+        return 0
+
+    start = time.perf_counter()
+    cur = conn.cursor()
+    try:
+        # Remover e reinserir: produtos que ficaram sem variações ativas (ou
+        # desativados) saem do catálogo; leitores continuam vendo a versão
+        # anterior até o commit
+        if full:
+            cur.execute("DELETE FROM catalogo_variacoes")
+            cur.execute("DELETE FROM catalogo_produtos")
+        else:
+            cur.execute("DELETE FROM catalogo_variacoes WHERE nome_produto_id = ANY(%(ids)s)", {'ids': ids})
+            cur.execute("DELETE FROM catalogo_produtos WHERE nome_produto_id = ANY(%(ids)s)", {'ids': ids})
+        cur.execute(_build_refresh_sql(full), {'ids': ids})
+        count = cur.rowcount
+        cur.execute(_build_variations_refresh_sql(full), {'ids': ids})
+    finally:
+        cur.close()
+
+    scope = 'full' if full else 'incremental'
+    _refresh_seconds.observe(time.perf_counter() - start, scope=scope)
+    _refreshed_products_total.inc(count, scope=scope)
+    return count
+
+
+def sync_pending_catalog(conn=None) -> Dict:
+    """
+    Consome catalogo_produtos_pendentes e reprocessa os produtos base afetados.
+
+    Apenas um worker reprocessa por vez (advisory lock); os demais seguem
+    lendo a versão já materializada, que no pior caso está defasada pela
+    duração de um reprocessamento.
+
+    Returns:
+        Dict com 'success', 'refreshed' (quantidade) e 'full' (bool)
+    """
+    conn = conn or get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM catalogo_produtos_pendentes)")
+        if not cur.fetchone()[0]:
+            return {'success': True, 'refreshed': 0, 'full': False}
+
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (CATALOG_REFRESH_LOCK_KEY,))
+        if not cur.fetchone()[0]:
+            return {'success': True, 'refreshed': 0, 'full': False, 'skipped': True}
+
+        cur.execute("DELETE FROM catalogo_produtos_pendentes RETURNING nome_produto_id")
+        pending = [row[0] for row in cur.fetchall()]
+        full = 0 in pending
+
+        refreshed = refresh_catalog(None if full else pending, conn=conn)
+        if has_table('catalogo_facetas'):
+            refresh_catalog_facets(conn)
+        conn.commit()
+
+        if full:
+            logger.info(f"📚 Catálogo da loja reprocessado por completo ({refreshed} produtos base)")
+        else:
+            logger.debug(f"Catálogo da loja: {len(pending)} produto(s) base reprocessado(s)")
+        return {'success': True, 'refreshed': refreshed, 'full': full}
+    except Exception as e:
+        logger.error(f"❌ Erro ao reprocessar catálogo da loja: {e}", exc_info=True)
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return {'success': False, 'error': str(e)}
+    finally:
+        cur.close()
+
+
+def _compute_facets(cur) -> Dict:
+    """Calcula os filtros da loja (com quantidade de produtos base) a partir do catálogo"""
+    facetas = {
+        'categorias': [],
+        'tamanhos': [],
+        'estampas': [],
+        'tecidos': [],
+        'sexos': [],
+        'precos': []
+    }
+
+    cur.execute("""
+        SELECT c.id, c.nome, COUNT(*)
+        FROM catalogo_produtos cp
+        CROSS JOIN LATERAL unnest(cp.categoria_ids) AS u(id)
+        JOIN categorias c ON c.id = u.id
+        WHERE c.ativo = TRUE
+        GROUP BY c.id, c.nome
+        ORDER BY c.nome
+    """)
+    facetas['categorias'] = [{'id': row[0], 'nome': row[1], 'quantidade': row[2]} for row in cur.fetchall()]
+
+    cur.execute("""
+        SELECT t.id, t.nome, COUNT(*)
+        FROM catalogo_produtos cp
+        CROSS JOIN LATERAL unnest(cp.tamanho_ids) AS u(id)
+        JOIN tamanho t ON t.id = u.id
+        WHERE t.ativo = TRUE
+        GROUP BY t.id, t.nome, t.ordem_exibicao
+        ORDER BY COALESCE(t.ordem_exibicao, 999), t.nome
+    """)
+    facetas['tamanhos'] = [{'id': row[0], 'nome': row[1], 'quantidade': row[2]} for row in cur.fetchall()]
+
+    # Tecido da estampa: tabela de relacionamento ou campo legado estampa.tecido
+    tecidos_table_exists = has_table('tecidos')
+    tecido_lnk_exists = tecidos_table_exists and has_table('estampa_tecido_lnk')
+    if tecido_lnk_exists:
+        tecido_join = """
+            LEFT JOIN estampa_tecido_lnk etl ON e.id = etl.estampa_id
+            LEFT JOIN tecidos tc ON etl.tecido_id = tc.id"""
+        tecido_cols = "tc.id, tc.nome"
+    elif not tecidos_table_exists and has_column('estampa', 'tecido'):
+        tecido_join = ""
+        tecido_cols = "NULL::INTEGER, e.tecido"
+    else:
+        tecido_join = ""
+        tecido_cols = "NULL::INTEGER, NULL::TEXT"
+
+    cur.execute(f"""
+        SELECT e.id, e.nome, e.imagem_url, {tecido_cols}, e.sexo,
+               COUNT(DISTINCT cp.nome_produto_id)
+        FROM catalogo_produtos cp
+        CROSS JOIN LATERAL unnest(cp.estampa_ids) AS u(id)
+        JOIN estampa e ON e.id = u.id
+        {tecido_join}
+        WHERE e.ativo = TRUE
+        GROUP BY 1, 2, 3, 4, 5, 6, e.ordem_exibicao
+        ORDER BY COALESCE(e.ordem_exibicao, 999), e.nome
+    """)
+    facetas['estampas'] = [{
+        'id': row[0],
+        'nome': row[1],
+        'imagem_url': row[2] if row[2] else '/static/img/placeholder.jpg',
+        'tecido_id': row[3] if row[3] else None,
+        'tecido': row[4] if row[4] else None,
+        'sexo': row[5] if row[5] else 'u',
+        'quantidade': row[6]
+    } for row in cur.fetchall()]
+
+    if tecidos_table_exists:
+        tecidos = []
+        if tecido_lnk_exists:
+            cur.execute("""
+                SELECT tc.id, tc.nome, COUNT(*)
+                FROM catalogo_produtos cp
+                CROSS JOIN LATERAL unnest(cp.tecido_ids) AS u(id)
+                JOIN tecidos tc ON tc.id = u.id
+                WHERE tc.ativo = TRUE
+                GROUP BY tc.id, tc.nome
+                ORDER BY tc.nome
+            """)
+            tecidos = cur.fetchall()
+        if not tecidos:
+            # Nenhum tecido associado a produtos: listar todos os tecidos ativos
+            cur.execute("SELECT id, nome, 0 FROM tecidos WHERE ativo = TRUE ORDER BY nome")
+            tecidos = cur.fetchall()
+        # Quando a tabela tecidos existe, o ID é o value usado na filtragem
+        facetas['tecidos'] = [{'id': row[0], 'value': str(row[0]), 'label': row[1], 'quantidade': row[2]}
+                              for row in tecidos if row[1]]
+    else:
+        cur.execute("""
+            SELECT u.tecido, COUNT(*)
+            FROM catalogo_produtos cp
+            CROSS JOIN LATERAL unnest(cp.tecidos_texto) AS u(tecido)
+            WHERE u.tecido <> ''
+            GROUP BY u.tecido
+            ORDER BY u.tecido
+        """)
+        facetas['tecidos'] = [{'id': None, 'value': row[0], 'label': row[0], 'quantidade': row[1]}
+                              for row in cur.fetchall()]
+
+    cur.execute("""
+        SELECT u.sexo, COUNT(*)
+        FROM catalogo_produtos cp
+        CROSS JOIN LATERAL unnest(cp.sexos) AS u(sexo)
+        GROUP BY u.sexo
+    """)
+    por_sexo = dict(cur.fetchall())
+    facetas['sexos'] = [dict(sexo, quantidade=por_sexo.get(sexo['value'], 0)) for sexo in FILTROS_SEXO]
+
+    # Faixas de preço: produtos com alguma variação dentro da faixa (mesma regra do filtro)
+    filtros_faixa = []
+    params = {}
+    for i, faixa in enumerate(FILTROS_PRECO):
+        condicoes = ["pr >= %(min_{0})s".format(i)]
+        params[f'min_{i}'] = faixa['min']
+        if faixa['max'] is not None:
+            condicoes.append("pr <= %(max_{0})s".format(i))
+            params[f'max_{i}'] = faixa['max']
+        filtros_faixa.append(
+            f"COUNT(*) FILTER (WHERE EXISTS (SELECT 1 FROM unnest(cp.precos) pr WHERE {' AND '.join(condicoes)}))"
+        )
+    cur.execute(f"SELECT {', '.join(filtros_faixa)} FROM catalogo_produtos cp", params)
+    quantidades = cur.fetchone()
+    facetas['precos'] = [dict(faixa, quantidade=quantidades[i]) for i, faixa in enumerate(FILTROS_PRECO)]
+
+    return facetas
+
+
+def refresh_catalog_facets(conn=None) -> str:
+    """
+    Recalcula os filtros da loja e grava em catalogo_facetas com nova versão
+    (sem commit - chamado dentro da transação do reprocessamento do catálogo)
+
+    Returns:
+        ETag da nova versão
+    """
+    conn = conn or get_db()
+    cur = conn.cursor()
+    try:
+        dados = _compute_facets(cur)
+        payload = json.dumps(dados, sort_keys=True, ensure_ascii=False, default=str)
+        etag = hashlib.md5(payload.encode('utf-8')).hexdigest()
+        cur.execute("""
+            INSERT INTO catalogo_facetas (id, versao, dados, etag, gerado_em)
+            VALUES (1, 1, %s::jsonb, %s, NOW())
+            ON CONFLICT (id) DO UPDATE SET
+                versao = catalogo_facetas.versao + 1,
+                dados = EXCLUDED.dados,
+                etag = EXCLUDED.etag,
+                gerado_em = NOW()
+        """, (payload, etag))
+        return etag
+    finally:
+        cur.close()
+
+
+def get_catalog_facets(conn=None) -> Optional[tuple]:
+    """
+    Retorna (versao, etag, dados) dos filtros da loja.
+
+    Cada chamada lê apenas versao/etag (chave primária); o JSON só é lido do
+    banco quando a versão mudou desde a última leitura deste processo.
+    """
+    global _facets_cache
+    conn = conn or get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT versao, etag FROM catalogo_facetas WHERE id = 1")
+        row = cur.fetchone()
+        if row is None:
+            # Migração recém-aplicada: calcular agora
+            refresh_catalog_facets(conn)
+            conn.commit()
+            cur.execute("SELECT versao, etag FROM catalogo_facetas WHERE id = 1")
+            row = cur.fetchone()
+            if row is None:
+                return None
+
+        versao, etag = row
+        cached = _facets_cache
+        if cached is not None and cached[0] == versao and cached[1] == etag:
+            return cached
+
+        cur.execute("SELECT versao, etag, dados FROM catalogo_facetas WHERE id = 1")
+        versao, etag, dados = cur.fetchone()
+        _facets_cache = (versao, etag, dados)
+        return _facets_cache
+    finally:
+        cur.close()
+
+
+def mark_catalog_pending(nome_produto_ids: Optional[Sequence[int]] = None, conn=None):
+    """
+    Marca produtos base para reprocessamento (None = catálogo inteiro).
+    Normalmente os triggers fazem isso; útil para cargas feitas com triggers
+    desabilitados (ex: restore).
+    """
+    conn = conn or get_db()
+    ids = [0] if nome_produto_ids is None else sorted({int(i) for i in nome_produto_ids})
+    if not ids:
+        return
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO catalogo_produtos_pendentes (nome_produto_id)
+            SELECT unnest(%s::INTEGER[])
+            ON CONFLICT (nome_produto_id) DO NOTHING
+        """, (ids,))
+    finally:
+        cur.close()
+
+
+def query_catalog(categoria_ids: Optional[List[int]] = None,
+                  tamanho_ids: Optional[List[int]] = None,
+                  estampa_ids: Optional[List[int]] = None,
+                  tecido_ids: Optional[List[int]] = None,
+                  tecidos_texto: Optional[List[str]] = None,
+                  sexos: Optional[List[str]] = None,
+                  preco_min: Optional[float] = None,
+                  preco_max: Optional[float] = None,
+                  conn=None) -> List[tuple]:
+    """
+    Lista o catálogo materializado aplicando os filtros da loja.
+
+    Filtros de faceta usam sobreposição de arrays (&&) sobre índices GIN.
+    Como na query original, os filtros de variação (tamanho, estampa, tecido,
+    sexo, preço) precisam casar na mesma variação: com mais de um deles, além
+    da pré-filtragem por produto base, exige-se uma linha de
+    catalogo_variacoes que atenda todos. Categoria é do produto base.
+
+    Returns:
+        Linhas (id, nome, descricao, categoria_nome, categoria_id, imagem_url,
+        preco_minimo, preco_minimo_original, variacoes_count)
+    """
+    conn = conn or get_db()
+
+    conditions = []
+    params: Dict = {}
+    if categoria_ids:
+        conditions.append("cp.categoria_ids && %(categoria_ids)s")
+        params['categoria_ids'] = list(categoria_ids)
+
+    # Filtros de variação: o array do produto base pré-filtra (GIN) e, sozinho,
+    # já é exato; combinados, precisam casar na mesma variação
+    variation_conditions = []
+    for column, values in (('tamanho_ids', tamanho_ids),
+                           ('estampa_ids', estampa_ids),
+                           ('tecido_ids', tecido_ids),
+                           ('tecidos_texto', tecidos_texto),
+                           ('sexos', sexos)):
+        if values:
+            conditions.append(f"cp.{column} && %({column})s")
+            variation_conditions.append(f"cv.{column} && %({column})s")
+            params[column] = list(values)
+
+    if preco_min is not None or preco_max is not None:
+        # Algum preço efetivo de variação dentro da faixa
+        price_conditions = []
+        if preco_min is not None:
+            price_conditions.append("{0} >= %(preco_min)s")
+            params['preco_min'] = preco_min
+        if preco_max is not None:
+            price_conditions.append("{0} <= %(preco_max)s")
+            params['preco_max'] = preco_max
+        price_sql = ' AND '.join(price_conditions)
+        conditions.append(f"EXISTS (SELECT 1 FROM unnest(cp.precos) pr WHERE {price_sql.format('pr')})")
+        variation_conditions.append(price_sql.format('cv.preco'))
+
+    if len(variation_conditions) > 1:
+        conditions.append(f"""
+            EXISTS (
+                SELECT 1 FROM catalogo_variacoes cv
+                WHERE cv.nome_produto_id = cp.nome_produto_id
+                AND {' AND '.join(variation_conditions)}
+            )
+        """)
+
+    query = """
+        SELECT cp.nome_produto_id, cp.nome, cp.descricao, cp.categoria_nome, cp.categoria_id, cp.imagem_url,
+               cp.preco_minimo, cp.preco_minimo_original, cp.variacoes_count
+        FROM catalogo_produtos cp
+    """
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY cp.nome"
+
+    cur = conn.cursor()
+    try:
+        cur.execute(query, params)
+        return cur.fetchall()
+    finally:
+        cur.close()
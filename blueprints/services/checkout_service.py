@@ -24,20 +24,45 @@ import json
 from flask import g, current_app
 import datetime
 import os
-import re
 import psycopg2
 import psycopg2.extras
 from typing import Dict, List, Optional, Tuple
 from .db import get_db, execute_query_safely, execute_write_safely
+from .http_client import http_request
+from .schema_capabilities import has_column
+from .stock_reservation_service import reservations_enabled, reserve_stock_for_order
+from .coupon_service import claim_cupom
 
 # --- Funções de interação com o banco de dados ---
+
+# Colunas que o checkout usa e que não existem no schema do Strapi; eram criadas
+# sob demanda no meio do pedido, agora vêm de sql/add-checkout-colunas-pedido.sql
+CHECKOUT_REQUIRED_COLUMNS = (
+    ('vendas', 'usuario_id'),
+    ('itens_venda', 'venda_id'),
+    ('itens_venda', 'produto_id'),
+    ('pagamentos', 'venda_id'),
+    ('pagamentos', 'pagbank_order_id'),
+    ('pagamentos', 'pagbank_charge_id'),
+)
+
+
 def create_order_and_items(user_id: Optional[int], cart_items: List[Dict], shipping_info: Dict, 
                           total_value: float, freight_value: float, discount_value: float, 
                           client_ip: str, user_agent: str, fiscal_data: Optional[Dict] = None, 
-                          cupom_id: Optional[int] = None, shipping_option: Optional[Dict] = None) -> Tuple[int, str]:
+                          cupom_id: Optional[int] = None, shipping_option: Optional[Dict] = None,
+                          payment_method: Optional[str] = None) -> Tuple[int, str]:
     """
     Cria um pedido e seus itens no banco de dados
     
+    Tudo acontece em uma única transação (venda, itens e uso do cupom): se
+    algo falhar, nada fica gravado. O número de comandos não depende do
+    tamanho do carrinho (estoque verificado com uma consulta, itens inseridos
+    com um INSERT de várias linhas).
+    
+    Com sql/create-reservas-estoque.sql aplicado, o estoque dos itens fica
+    reservado até a baixa no Bling (ou até o prazo da forma de pagamento).
+    
     Args:
         user_id: ID do usuário (None se não logado)
         cart_items: Lista de itens do carrinho
@@ -47,317 +72,225 @@ def create_order_and_items(user_id: Optional[int], cart_items: List[Dict], shipp
         discount_value: Valor do desconto
         client_ip: IP do cliente
         user_agent: User agent do navegador
+        payment_method: Forma de pagamento (prazo da reserva de estoque)
         
     Returns:
         Tuple com (venda_id, codigo_pedido)
     """
+    # 1. Sem DDL durante o checkout: as colunas vêm da migração
+    colunas_faltando = [f"{tabela}.{coluna}" for tabela, coluna in CHECKOUT_REQUIRED_COLUMNS
+                        if not has_column(tabela, coluna)]
+    if colunas_faltando:
+        current_app.logger.error(
+            f"❌ Colunas ausentes para o checkout: {', '.join(colunas_faltando)}. "
+            f"Aplique sql/add-checkout-colunas-pedido.sql"
+        )
+        raise Exception(f"Schema desatualizado: colunas ausentes ({', '.join(colunas_faltando)})")
+    
+    # 2. Gerar um código de pedido único
+    codigo_pedido = f"LB-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{os.urandom(4).hex().upper()}"
+
+    # 3. Montar o INSERT em 'vendas'
+    # Verificar se há endereco_id no shipping_info (quando usuário usa endereço salvo)
+    endereco_id = shipping_info.get('endereco_id')
+    
+    # Preparar dados fiscais se fornecidos
+    fiscal_values = []
+    fiscal_columns = ''
+    if fiscal_data:
+        fiscal_columns = """,
+            fiscal_tipo, fiscal_cpf_cnpj, fiscal_nome_razao_social,
+            fiscal_inscricao_estadual, fiscal_inscricao_municipal,
+            fiscal_rua, fiscal_numero, fiscal_complemento,
+            fiscal_bairro, fiscal_cidade, fiscal_estado, fiscal_cep"""
+        endereco_fiscal = fiscal_data.get('endereco', {})
+        fiscal_values = [
+            fiscal_data.get('tipo'),
+            fiscal_data.get('cpf_cnpj'),
+            fiscal_data.get('nome_razao_social'),
+            fiscal_data.get('inscricao_estadual'),
+            fiscal_data.get('inscricao_municipal'),
+            endereco_fiscal.get('rua'),
+            endereco_fiscal.get('numero'),
+            endereco_fiscal.get('complemento'),
+            endereco_fiscal.get('bairro'),
+            endereco_fiscal.get('cidade'),
+            endereco_fiscal.get('estado'),
+            endereco_fiscal.get('cep')
+        ]
+    
+    # Extrair dados da transportadora do shipping_option
+    transportadora_data = {}
+    if shipping_option and shipping_option.get('transportadora'):
+        transportadora_data = shipping_option.get('transportadora', {}).copy()
+        # Os dados da transportadora já vêm completos do checkout (ID do transporte)
+        current_app.logger.info(
+            f"🚚 Dados da transportadora para salvar: "
+            f"Nome={transportadora_data.get('nome', 'N/A')}, "
+            f"CNPJ={transportadora_data.get('cnpj', 'N/A')}, "
+            f"IE={transportadora_data.get('ie', 'N/A')}, "
+            f"UF={transportadora_data.get('uf', 'N/A')}, "
+            f"Município={transportadora_data.get('municipio', 'N/A')}"
+        )
+    else:
+        current_app.logger.warning(
+            f"⚠️ Nenhum dado de transportadora recebido no checkout. "
+            f"shipping_option={shipping_option is not None}, "
+            f"transportadora={shipping_option.get('transportadora') if shipping_option else 'N/A'}"
+        )
+    
+    # Construir query dinamicamente
+    base_columns = """
+        codigo_pedido, usuario_id, valor_total, valor_frete, valor_desconto,
+        endereco_entrega_id, nome_recebedor, rua_entrega, numero_entrega, complemento_entrega, 
+        bairro_entrega, cidade_entrega, estado_entrega, cep_entrega, telefone_entrega, email_entrega,
+        status_pedido, data_venda, cliente_ip, user_agent,
+        transportadora_nome, transportadora_cnpj, transportadora_ie, transportadora_uf,
+        transportadora_municipio, transportadora_endereco, transportadora_numero,
+        transportadora_complemento, transportadora_bairro, transportadora_cep,
+        melhor_envio_service_id, melhor_envio_service_name"""
+    
+    base_values = "%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s"
+    
+    params_list = [
+        codigo_pedido, user_id, total_value, freight_value, discount_value,
+        endereco_id,
+        shipping_info.get('nome_recebedor'), shipping_info.get('rua'), shipping_info.get('numero'),
+        shipping_info.get('complemento'), shipping_info.get('bairro'),
+        shipping_info.get('cidade'), shipping_info.get('estado'), shipping_info.get('cep'),
+        shipping_info.get('telefone'), shipping_info.get('email'),
+        'pendente_pagamento',
+        # data_venda será NOW() no SQL, não precisa passar parâmetro
+        client_ip, user_agent,
+        # Dados da transportadora
+        transportadora_data.get('nome'),
+        transportadora_data.get('cnpj'),
+        transportadora_data.get('ie'),
+        transportadora_data.get('uf'),
+        transportadora_data.get('municipio'),
+        transportadora_data.get('endereco'),
+        transportadora_data.get('numero'),
+        transportadora_data.get('complemento'),
+        transportadora_data.get('bairro'),
+        transportadora_data.get('cep'),
+        # Serviço Melhor Envio
+        shipping_option.get('service') if shipping_option else None,
+        shipping_option.get('name') if shipping_option else None
+    ]
+    
+    # Adicionar cupom_id se fornecido
+    if cupom_id:
+        base_columns += ", cupom_id"
+        base_values += ", %s"
+        params_list.append(cupom_id)
+    
+    fiscal_placeholders = ''.join(', %s' for _ in fiscal_values)
+    query = f"""
+        INSERT INTO vendas (
+            {base_columns}{fiscal_columns}
+        ) VALUES (
+            {base_values}{fiscal_placeholders}
+        )
+        RETURNING id;
+    """
+    params = tuple(params_list) + tuple(fiscal_values)
+    
     conn = get_db()
+    cur = conn.cursor()
+    
+    usar_reservas = reservations_enabled()
     
     try:
-        # 1. Verificar se a coluna usuario_id existe, se não, criar
-        usuario_id_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'vendas' 
-            AND column_name = 'usuario_id'
-        """, fetch_mode='one')
-        usuario_id_exists = usuario_id_result is not None
-        
-        if not usuario_id_exists:
-            current_app.logger.info("Coluna usuario_id não existe na tabela vendas. Criando...")
-            try:
-                execute_write_safely("""
-                    ALTER TABLE vendas 
-                    ADD COLUMN usuario_id INTEGER REFERENCES usuarios(id) ON DELETE SET NULL
-                """, commit=True)
-                execute_write_safely("""
-                    CREATE INDEX IF NOT EXISTS idx_vendas_usuario_id ON vendas (usuario_id)
-                """, commit=True)
-                current_app.logger.info("Coluna usuario_id criada com sucesso")
-            except Exception as alter_error:
-                current_app.logger.warning(f"Erro ao criar coluna usuario_id (pode já existir): {alter_error}")
-        
-        # 2. Gerar um código de pedido único
-        codigo_pedido = f"LB-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}-{os.urandom(4).hex().upper()}"
-
-        # 3. Inserir na tabela 'vendas'
-        # Verificar se há endereco_id no shipping_info (quando usuário usa endereço salvo)
-        endereco_id = shipping_info.get('endereco_id')
-        
-        # Preparar dados fiscais se fornecidos
-        fiscal_values = []
-        fiscal_columns = ''
-        if fiscal_data:
-            fiscal_columns = """,
-                fiscal_tipo, fiscal_cpf_cnpj, fiscal_nome_razao_social,
-                fiscal_inscricao_estadual, fiscal_inscricao_municipal,
-                fiscal_rua, fiscal_numero, fiscal_complemento,
-                fiscal_bairro, fiscal_cidade, fiscal_estado, fiscal_cep"""
-            endereco_fiscal = fiscal_data.get('endereco', {})
-            fiscal_values = [
-                fiscal_data.get('tipo'),
-                fiscal_data.get('cpf_cnpj'),
-                fiscal_data.get('nome_razao_social'),
-                fiscal_data.get('inscricao_estadual'),
-                fiscal_data.get('inscricao_municipal'),
-                endereco_fiscal.get('rua'),
-                endereco_fiscal.get('numero'),
-                endereco_fiscal.get('complemento'),
-                endereco_fiscal.get('bairro'),
-                endereco_fiscal.get('cidade'),
-                endereco_fiscal.get('estado'),
-                endereco_fiscal.get('cep')
-            ]
-        
-        # Extrair dados da transportadora do shipping_option
-        transportadora_data = {}
-        if shipping_option and shipping_option.get('transportadora'):
-            transportadora_data = shipping_option.get('transportadora', {}).copy()
-            current_app.logger.info(
-                f"🚚 Dados da transportadora recebidos no checkout: "
-                f"Nome={transportadora_data.get('nome', 'N/A')}, "
-                f"CNPJ={transportadora_data.get('cnpj', 'N/A')}, "
-                f"IE={transportadora_data.get('ie', 'N/A')}, "
-                f"UF={transportadora_data.get('uf', 'N/A')}"
-            )
-            
-            # REMOVIDO: Lógica de busca de transportadora por CNPJ/nome
-            # Agora usamos apenas os dados que já vêm do checkout (ID do transporte)
-            # Os dados da transportadora já estão completos no shipping_option
-            
-            # Log final dos dados completos
-            current_app.logger.info(
-                f"✅ Dados completos da transportadora para salvar: "
-                f"Nome={transportadora_data.get('nome', 'N/A')}, "
-                f"CNPJ={transportadora_data.get('cnpj', 'N/A')}, "
-                f"IE={transportadora_data.get('ie', 'N/A')}, "
-                f"UF={transportadora_data.get('uf', 'N/A')}, "
-                f"Município={transportadora_data.get('municipio', 'N/A')}"
-            )
-        else:
-            current_app.logger.warning(
-                f"⚠️ Nenhum dado de transportadora recebido no checkout. "
-                f"shipping_option={shipping_option is not None}, "
-                f"transportadora={shipping_option.get('transportadora') if shipping_option else 'N/A'}"
-            )
-        
-        # Construir query dinamicamente
-        base_columns = """
-            codigo_pedido, usuario_id, valor_total, valor_frete, valor_desconto,
-            endereco_entrega_id, nome_recebedor, rua_entrega, numero_entrega, complemento_entrega, 
-            bairro_entrega, cidade_entrega, estado_entrega, cep_entrega, telefone_entrega, email_entrega,
-            status_pedido, data_venda, cliente_ip, user_agent,
-            transportadora_nome, transportadora_cnpj, transportadora_ie, transportadora_uf,
-            transportadora_municipio, transportadora_endereco, transportadora_numero,
-            transportadora_complemento, transportadora_bairro, transportadora_cep,
-            melhor_envio_service_id, melhor_envio_service_name"""
-        
-        base_values = "%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s"
-        
-        # Adicionar cupom_id se fornecido
-        if cupom_id:
-            base_columns += ", cupom_id"
-            base_values += ", %s"
-        
-        if fiscal_data:
-            fiscal_placeholders = ', ' + ', '.join(['%s'] * len(fiscal_values))
-            query = f"""
-                INSERT INTO vendas (
-                    {base_columns}{fiscal_columns}
-                ) VALUES (
-                    {base_values}{fiscal_placeholders}
-                )
-                RETURNING id;
-            """
-            params_list = [
-                codigo_pedido, user_id, total_value, freight_value, discount_value,
-                endereco_id,
-                shipping_info.get('nome_recebedor'), shipping_info.get('rua'), shipping_info.get('numero'),
-                shipping_info.get('complemento'), shipping_info.get('bairro'),
-                shipping_info.get('cidade'), shipping_info.get('estado'), shipping_info.get('cep'),
-                shipping_info.get('telefone'), shipping_info.get('email'),
-                'pendente_pagamento',
-                # data_venda será NOW() no SQL, não precisa passar parâmetro
-                client_ip, user_agent,
-                # Dados da transportadora
-                transportadora_data.get('nome'),
-                transportadora_data.get('cnpj'),
-                transportadora_data.get('ie'),
-                transportadora_data.get('uf'),
-                transportadora_data.get('municipio'),
-                transportadora_data.get('endereco'),
-                transportadora_data.get('numero'),
-                transportadora_data.get('complemento'),
-                transportadora_data.get('bairro'),
-                transportadora_data.get('cep'),
-                # Serviço Melhor Envio
-                shipping_option.get('service') if shipping_option else None,
-                shipping_option.get('name') if shipping_option else None
-            ]
-            if cupom_id:
-                params_list.append(cupom_id)
-            params = tuple(params_list) + tuple(fiscal_values)
-        else:
-            query = f"""
-                INSERT INTO vendas (
-                    {base_columns}
-                ) VALUES (
-                    {base_values}
-                )
-                RETURNING id;
-            """
-            params_list = [
-                codigo_pedido, user_id, total_value, freight_value, discount_value,
-                endereco_id,
-                shipping_info.get('nome_recebedor'), shipping_info.get('rua'), shipping_info.get('numero'),
-                shipping_info.get('complemento'), shipping_info.get('bairro'),
-                shipping_info.get('cidade'), shipping_info.get('estado'), shipping_info.get('cep'),
-                shipping_info.get('telefone'), shipping_info.get('email'),
-                'pendente_pagamento',
-                # data_venda será NOW() no SQL, não precisa passar parâmetro
-                client_ip, user_agent,
-                # Dados da transportadora
-                transportadora_data.get('nome'),
-                transportadora_data.get('cnpj'),
-                transportadora_data.get('ie'),
-                transportadora_data.get('uf'),
-                transportadora_data.get('municipio'),
-                transportadora_data.get('endereco'),
-                transportadora_data.get('numero'),
-                transportadora_data.get('complemento'),
-                transportadora_data.get('bairro'),
-                transportadora_data.get('cep'),
-                # Serviço Melhor Envio
-                shipping_option.get('service') if shipping_option else None,
-                shipping_option.get('name') if shipping_option else None
-            ]
-            if cupom_id:
-                params_list.append(cupom_id)
-            params = tuple(params_list)
-        
-        # 2. Criar venda usando execute_write_safely
-        result = execute_write_safely(query, params, commit=True)
-        if not result:
-            raise Exception("Falha ao criar venda")
-        venda_id = result[0]
-
-        # 3. Verificar se as colunas venda_id e produto_id existem em itens_venda
-        existing_columns_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'itens_venda' 
-            AND column_name IN ('venda_id', 'produto_id')
-        """, fetch_mode='all')
-        existing_columns = [row[0] for row in existing_columns_result] if existing_columns_result else []
-        has_venda_id = 'venda_id' in existing_columns
-        has_produto_id = 'produto_id' in existing_columns
-        
-        if not has_venda_id:
-            current_app.logger.info("Coluna venda_id não existe em itens_venda. Criando...")
-            try:
-                execute_write_safely("""
-                    ALTER TABLE itens_venda 
-                    ADD COLUMN venda_id INTEGER REFERENCES vendas(id) ON DELETE CASCADE
-                """, commit=True)
-                has_venda_id = True
-                current_app.logger.info("Coluna venda_id criada com sucesso")
-            except Exception as alter_error:
-                current_app.logger.warning(f"Erro ao criar coluna venda_id: {alter_error}")
-        
-        if not has_produto_id:
-            current_app.logger.info("Coluna produto_id não existe em itens_venda. Criando...")
-            try:
-                execute_write_safely("""
-                    ALTER TABLE itens_venda 
-                    ADD COLUMN produto_id INTEGER REFERENCES produtos(id) ON DELETE SET NULL
-                """, commit=True)
-                has_produto_id = True
-                current_app.logger.info("Coluna produto_id criada com sucesso")
-            except Exception as alter_error:
-                current_app.logger.warning(f"Erro ao criar coluna produto_id: {alter_error}")
-        
-        # 4. Inserir na tabela 'itens_venda'
+        # 4. Verificar estoque de todos os itens em uma consulta (apenas validação, não decrementa)
         # IMPORTANTE: Estoque NÃO é decrementado aqui - o Bling é responsável por gerenciar o estoque
         # O estoque será atualizado automaticamente quando:
         # 1. O pedido for criado no Bling (Bling abate estoque automaticamente)
         # 2. O webhook do Bling notificar mudanças de estoque (stock.updated)
+        # Com reservas, a verificação é a própria reserva (passo 8)
+        quantidades = {}
         for item in cart_items:
-            # Verificar estoque disponível (apenas para validação, não decrementa)
-            estoque_result = execute_query_safely("""
-                SELECT estoque FROM produtos WHERE id = %s
-            """, (item['produto_id'],), fetch_mode='one')
-            
-            if not estoque_result or estoque_result[0] < item['quantidade']:
-                raise Exception(f"Estoque insuficiente para o produto {item.get('nome_produto_snapshot', 'N/A')}")
+            quantidades[item['produto_id']] = quantidades.get(item['produto_id'], 0) + item['quantidade']
+        
+        if not usar_reservas:
+            cur.execute("""
+                SELECT id, estoque FROM produtos WHERE id = ANY(%s)
+            """, (list(quantidades),))
+            estoques = dict(cur.fetchall())
             
-            # Inserir item da venda usando execute_write_safely
-            execute_write_safely("""
-                INSERT INTO itens_venda (
-                    venda_id, produto_id, quantidade, preco_unitario, subtotal,
-                    nome_produto_snapshot, sku_produto_snapshot, detalhes_produto_snapshot
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
+            for item in cart_items:
+                estoque = estoques.get(item['produto_id'])
+                if estoque is None or estoque < quantidades[item['produto_id']]:
+                    raise Exception(f"Estoque insuficiente para o produto {item.get('nome_produto_snapshot', 'N/A')}")
+        
+        # 5. Criar venda
+        cur.execute(query, params)
+        venda_id = cur.fetchone()[0]
+        
+        # 6. Inserir todos os itens da venda de uma vez
+        psycopg2.extras.execute_values(cur, """
+            INSERT INTO itens_venda (
+                venda_id, produto_id, quantidade, preco_unitario, subtotal,
+                nome_produto_snapshot, sku_produto_snapshot, detalhes_produto_snapshot
+            ) VALUES %s
+        """, [
+            (
                 venda_id, item['produto_id'], item['quantidade'], item['preco_unitario'], item['subtotal'],
-                item['nome_produto_snapshot'], item['sku_produto_snapshot'], 
+                item['nome_produto_snapshot'], item['sku_produto_snapshot'],
                 json.dumps(item.get('detalhes_produto_snapshot', {}))
-            ), commit=True)
-            
-            # IMPORTANTE: Estoque NÃO é decrementado aqui
-            # O estoque será decrementado apenas quando o pedido for para "Logística" no Bling
-            # Isso garante que o estoque só seja abatido quando o pedido realmente for processado
-            current_app.logger.info(
-                f"✅ Item {item.get('nome_produto_snapshot')} adicionado ao pedido. "
-                f"Estoque será decrementado quando pedido for para 'Logística' no Bling."
             )
+            for item in cart_items
+        ], page_size=max(len(cart_items), 1))
+        
+        # IMPORTANTE: Estoque NÃO é decrementado aqui
+        # O estoque será decrementado apenas quando o pedido for para "Logística" no Bling
+        # Isso garante que o estoque só seja abatido quando o pedido realmente for processado
+        current_app.logger.info(
+            f"✅ {len(cart_items)} item(ns) adicionado(s) ao pedido. "
+            f"Estoque será decrementado quando pedido for para 'Logística' no Bling."
+        )
 
-        # 5. Registrar uso do cupom se fornecido
-        if cupom_id and user_id:
-            try:
-                # Buscar CPF do usuário
-                user_cpf_result = execute_query_safely(
-                    "SELECT cpf FROM usuarios WHERE id = %s", 
-                    (user_id,), 
-                    fetch_mode='one'
+        # 7. Reivindicar o uso do cupom (limites globais, por usuário e por CPF
+        # garantidos no mesmo comando). Sem o uso, o desconto não vale: o pedido é desfeito
+        if cupom_id:
+            if not user_id:
+                raise Exception("Cupom disponível apenas para usuários logados")
+            if not claim_cupom(cur, cupom_id, user_id, venda_id, discount_value):
+                raise Exception("Cupom indisponível: limite de uso atingido, expirado ou já utilizado")
+            current_app.logger.info(f"Uso do cupom {cupom_id} registrado para venda {venda_id}")
+        
+        # 8. Reservar o estoque por último: os contadores ficam travados só até o commit
+        if usar_reservas:
+            sem_saldo = reserve_stock_for_order(cur, venda_id, quantidades, payment_method)
+            if sem_saldo:
+                nome = next(
+                    (item.get('nome_produto_snapshot', 'N/A') for item in cart_items if item['produto_id'] == sem_saldo[0]),
+                    'N/A'
                 )
-                user_cpf = None
-                if user_cpf_result and user_cpf_result[0]:
-                    # Limpar CPF (remover formatação)
-                    user_cpf = re.sub(r'[^0-9]', '', user_cpf_result[0])
-                
-                # Registrar uso do cupom
-                execute_write_safely("""
-                    INSERT INTO cupom_usado (cupom_id, usuario_id, venda_id, valor_desconto_aplicado, cpf_usuario)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (cupom_id, user_id, venda_id, discount_value, user_cpf), commit=True)
-                
-                # Atualizar contador de uso do cupom
-                execute_write_safely("""
-                    UPDATE cupom 
-                    SET uso_atual = uso_atual + 1 
-                    WHERE id = %s
-                """, (cupom_id,), commit=True)
-                
-                current_app.logger.info(f"Uso do cupom {cupom_id} registrado para venda {venda_id}")
-            except Exception as cupom_error:
-                current_app.logger.error(f"Erro ao registrar uso do cupom: {cupom_error}")
-                # Não falhar o pedido por erro no registro do cupom
+                raise Exception(f"Estoque insuficiente para o produto {nome}")
+        
+        conn.commit()
         
         current_app.logger.info(f"Pedido {codigo_pedido} criado com sucesso. Venda ID: {venda_id}")
         return venda_id, codigo_pedido
         
     except Exception as e:
-        if conn:
-            try:
-                conn.rollback()
-            except Exception:
-                pass
+        try:
+            conn.rollback()
+        except Exception:
+            pass
         current_app.logger.error(f"Erro ao criar pedido: {e}")
         raise e
+    finally:
+        cur.close()
+
 
 def create_payment_entry(venda_id: int, payment_data: Dict, pagseguro_response: Dict) -> int:
     """
     Cria entrada de pagamento no banco de dados
     
+    As colunas venda_id, pagbank_order_id e pagbank_charge_id vêm de
+    sql/add-checkout-colunas-pedido.sql (conferidas em create_order_and_items).
+    
     Args:
         venda_id: ID da venda
         payment_data: Dados do pagamento enviados
@@ -369,29 +302,6 @@ def create_payment_entry(venda_id: int, payment_data: Dict, pagseguro_response:
     conn = get_db()
     
     try:
-        # Verificar se a coluna venda_id existe, se não, criar
-        venda_id_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'pagamentos' 
-            AND column_name = 'venda_id'
-        """, fetch_mode='one')
-        venda_id_exists = venda_id_result is not None
-        
-        if not venda_id_exists:
-            current_app.logger.info("Coluna venda_id não existe na tabela pagamentos. Criando...")
-            try:
-                execute_write_safely("""
-                    ALTER TABLE pagamentos 
-                    ADD COLUMN venda_id INTEGER REFERENCES vendas(id) ON DELETE CASCADE
-                """, commit=True)
-                execute_write_safely("""
-                    CREATE INDEX IF NOT EXISTS idx_pagamentos_venda_id ON pagamentos (venda_id)
-                """, commit=True)
-                current_app.logger.info("Coluna venda_id criada com sucesso na tabela pagamentos")
-            except Exception as alter_error:
-                current_app.logger.warning(f"Erro ao criar coluna venda_id (pode já existir): {alter_error}")
-        
         # Parse da resposta do PagBank
         order_id = pagseguro_response.get('id')  # ID do pedido (ORDE_...)
         
@@ -525,52 +435,6 @@ def create_payment_entry(venda_id: int, payment_data: Dict, pagseguro_response:
                 card_brand = None
                 installments = 1
 
-        # Verificar se a coluna pagbank_order_id existe, se não, criar
-        order_id_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'pagamentos' 
-            AND column_name = 'pagbank_order_id'
-        """, fetch_mode='one')
-        order_id_col_exists = order_id_result is not None
-        
-        if not order_id_col_exists:
-            current_app.logger.info("Coluna pagbank_order_id não existe na tabela pagamentos. Criando...")
-            try:
-                execute_write_safely("""
-                    ALTER TABLE pagamentos 
-                    ADD COLUMN pagbank_order_id VARCHAR(100)
-                """, commit=True)
-                execute_write_safely("""
-                    CREATE INDEX IF NOT EXISTS idx_pagamentos_order_id ON pagamentos (pagbank_order_id)
-                """, commit=True)
-                current_app.logger.info("Coluna pagbank_order_id criada com sucesso")
-            except Exception as alter_error:
-                current_app.logger.warning(f"Erro ao criar coluna pagbank_order_id (pode já existir): {alter_error}")
-        
-        # Verificar se a coluna pagbank_charge_id existe, se não, criar
-        charge_id_result = execute_query_safely("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'pagamentos' 
-            AND column_name = 'pagbank_charge_id'
-        """, fetch_mode='one')
-        charge_id_col_exists = charge_id_result is not None
-        
-        if not charge_id_col_exists:
-            current_app.logger.info("Coluna pagbank_charge_id não existe na tabela pagamentos. Criando...")
-            try:
-                execute_write_safely("""
-                    ALTER TABLE pagamentos 
-                    ADD COLUMN pagbank_charge_id VARCHAR(100)
-                """, commit=True)
-                execute_write_safely("""
-                    CREATE INDEX IF NOT EXISTS idx_pagamentos_charge_id ON pagamentos (pagbank_charge_id)
-                """, commit=True)
-                current_app.logger.info("Coluna pagbank_charge_id criada com sucesso")
-            except Exception as alter_error:
-                current_app.logger.warning(f"Erro ao criar coluna pagbank_charge_id (pode já existir): {alter_error}")
-        
         # Inserir pagamento com todos os IDs do PagBank
         # pagbank_transaction_id = order_id (para compatibilidade)
         # pagbank_order_id = order_id (ID do pedido)
@@ -677,7 +541,9 @@ def call_pagbank_api(endpoint_url: str, api_token: str, payload: Dict) -> Dict:
         
         while retry_count < max_retries:
             try:
-                response = requests.post(
+                response = http_request(
+                    'pagbank',
+                    'POST',
                     endpoint_url, 
                     headers=headers, 
                     json=payload,  # Usar json= ao invés de data=json.dumps()
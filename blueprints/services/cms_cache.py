@@ -0,0 +1,230 @@
+"""
+Cache do conteúdo das páginas institucionais (CMS / Strapi)
+============================================================
+
+As páginas home, sobre nós, contato, políticas e direitos reservados leem
+tabelas site_* que só mudam quando um editor salva no Strapi. O conteúdo já
+processado (JSON parseado, valores padrão aplicados) fica em memória por
+processo, versionado pelo updated_at das tabelas de origem:
+
+- Dentro de CMS_CACHE_TTL_SECONDS o conteúdo é servido sem tocar no Postgres.
+- Após o TTL (até CMS_CACHE_STALE_SECONDS), a versão em cache continua sendo
+  servida enquanto uma thread revalida em segundo plano (stale-while-revalidate).
+  A revalidação compara apenas MAX(updated_at); o conteúdo só é recarregado
+  se mudou.
+- O webhook do Strapi (/api/webhook/strapi) chama invalidate_cms_cache(), que
+  marca o cache como expirado em todos os workers do host (arquivo de geração
+  em CMS_CACHE_INVALIDATION_FILE, verificado com um stat por requisição).
+
+Uso:
+    conteudo = get_cms_content('home', _carregar_conteudo_home)
+"""
+import os
+import time
+import tempfile
+import threading
+import logging
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+import psycopg2.extras
+from flask import current_app
+
+from .db import get_db
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Chave do cache -> tabelas cujo updated_at versiona o conteúdo
+CMS_TABLES: Dict[str, Tuple[str, ...]] = {
+    'home': ('site_conteudo_home', 'site_informacoes_empresa'),
+    'sobre': ('site_conteudo_sobre',),
+    'contato': ('site_conteudo_contato',),
+    'politica_envio': ('site_politica_envio',),
+    'politica_privacidade': ('site_politica_privacidade',),
+    'direitos_reservados': ('site_direitos_reservados',),
+}
+
+# Content-types do Strapi (campo "model" do webhook) -> chaves do cache
+STRAPI_MODEL_KEYS: Dict[str, Tuple[str, ...]] = {
+    'conteudo-home': ('home',),
+    'informacoes-empresa': ('home',),
+    'conteudo-sobre': ('sobre',),
+    'conteudo-contato': ('contato',),
+    'politica-envio': ('politica_envio',),
+    'politica-privacidade': ('politica_privacidade',),
+    'direitos-reservados': ('direitos_reservados',),
+}
+
+
+class _Entry:
+    __slots__ = ('data', 'version', 'loaded_at')
+
+    def __init__(self, data, version, loaded_at: float):
+        self.data = data
+        self.version = version
+        self.loaded_at = loaded_at
+
+
+_entries: Dict[str, _Entry] = {}
+_entries_lock = threading.Lock()
+_revalidating: set = set()
+_seen_generation: Optional[int] = None
+
+_cache_requests_total = metrics.counter(
+    'cms_cache_requests_total',
+    'Leituras do cache de conteúdo do CMS por resultado (hit, stale, miss)'
+)
+
+
+def _get_setting(key: str, default: float) -> float:
+    try:
+        return float(current_app.config.get(key, default))
+    except RuntimeError:
+        return float(os.environ.get(key, default))
+
+
+def _invalidation_file() -> str:
+    try:
+        path = current_app.config.get('CMS_CACHE_INVALIDATION_FILE')
+    except RuntimeError:
+        path = None
+    return path or os.path.join(tempfile.gettempdir(), 'lhama_cms_cache_generation')
+
+
+def _read_generation() -> int:
+    try:
+        return os.stat(_invalidation_file()).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _expire_entries(keys: Optional[Iterable[str]] = None):
+    """Marca entradas como expiradas (continuam servíveis enquanto revalidam)"""
+    expired_at = time.monotonic() - _get_setting('CMS_CACHE_TTL_SECONDS', 300)
+    with _entries_lock:
+        for key in (list(_entries) if keys is None else keys):
+            entry = _entries.get(key)
+            if entry is not None:
+                entry.loaded_at = min(entry.loaded_at, expired_at)
+
+
+def _check_invalidation():
+    """Detecta invalidações feitas por outros workers (arquivo de geração)"""
+    global _seen_generation
+    generation = _read_generation()
+    if _seen_generation is None:
+        _seen_generation = generation
+    elif generation != _seen_generation:
+        _seen_generation = generation
+        _expire_entries()
+
+
+def _fetch_version(cur, key: str) -> tuple:
+    tables = CMS_TABLES[key]
+    cur.execute("SELECT " + ", ".join(f"(SELECT MAX(updated_at) FROM {table})" for table in tables))
+    return tuple(cur.fetchone())
+
+
+def _load(key: str, loader: Callable) -> _Entry:
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    try:
+        version = _fetch_version(cur, key)
+        data = loader(cur)
+    finally:
+        cur.close()
+    entry = _Entry(data, version, time.monotonic())
+    with _entries_lock:
+        _entries[key] = entry
+    return entry
+
+
+def _revalidate(app, key: str, loader: Callable):
+    try:
+        with app.app_context():
+            current = _entries.get(key)
+            conn = get_db()
+            cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+            try:
+                version = _fetch_version(cur, key)
+                if current is not None and current.version == version:
+                    # Conteúdo não mudou: apenas renovar o TTL
+                    with _entries_lock:
+                        current.loaded_at = time.monotonic()
+                    return
+            finally:
+                cur.close()
+            _load(key, loader)
+            logger.info(f"🔄 Conteúdo do CMS '{key}' recarregado")
+    except Exception as e:
+        logger.warning(f"⚠️ Falha ao revalidar conteúdo do CMS '{key}' (mantendo versão em cache): {e}")
+    finally:
+        with _entries_lock:
+            _revalidating.discard(key)
+
+
+def _revalidate_async(key: str, loader: Callable):
+    with _entries_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+    app = current_app._get_current_object()
+    threading.Thread(target=_revalidate, args=(app, key, loader), daemon=True,
+                     name=f'cms-cache-{key}').start()
+
+
+def get_cms_content(key: str, loader: Callable):
+    """
+    Retorna o conteúdo processado de uma página do CMS, usando o cache.
+
+    Args:
+        key: Chave em CMS_TABLES
+        loader: Função que recebe um cursor (DictCursor) e retorna o conteúdo
+                já processado. Só é chamada em cache miss ou quando o
+                updated_at das tabelas mudou.
+
+    Returns:
+        Conteúdo retornado pelo loader (compartilhado - não modificar)
+    """
+    _check_invalidation()
+
+    entry = _entries.get(key)
+    if entry is not None:
+        age = time.monotonic() - entry.loaded_at
+        ttl = _get_setting('CMS_CACHE_TTL_SECONDS', 300)
+        if age < ttl:
+            _cache_requests_total.inc(key=key, result='hit')
+            return entry.data
+        if age < ttl + _get_setting('CMS_CACHE_STALE_SECONDS', 3600):
+            _cache_requests_total.inc(key=key, result='stale')
+            _revalidate_async(key, loader)
+            return entry.data
+
+    _cache_requests_total.inc(key=key, result='miss')
+    return _load(key, loader).data
+
+
+def invalidate_cms_cache(keys: Optional[Iterable[str]] = None):
+    """
+    Expira o cache do CMS neste processo e sinaliza os demais workers do host.
+
+    Args:
+        keys: Chaves a expirar; None = todas. Nos outros workers todas as
+              chaves são revalidadas (só recarregam as que mudaram).
+    """
+    global _seen_generation
+    _expire_entries(keys)
+    path = _invalidation_file()
+    try:
+        with open(path, 'a'):
+            os.utime(path, None)
+        _seen_generation = _read_generation()
+    except OSError as e:
+        logger.warning(f"⚠️ Não foi possível sinalizar invalidação do CMS para outros workers ({path}): {e}")
+
+
+def keys_for_strapi_model(model: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Chaves do cache afetadas por um content-type do Strapi (None = desconhecido)"""
+    if not model:
+        return None
+    return STRAPI_MODEL_KEYS.get(model)
@@ -0,0 +1,292 @@
+"""
+Service de cupons de desconto
+=============================
+
+- Regras dos cupons (tipo, valor, validade, limites) ficam em memória,
+  indexadas por código (cache de referência 'cupons', invalidado quando o
+  Strapi edita a tabela cupom). A validação só vai ao banco para os usos.
+- calcular_desconto(): desconto calculado no servidor a partir das regras
+  do cupom e do total do carrinho (o valor enviado pelo cliente é ignorado).
+- claim_cupom(): reivindicação atômica no checkout. Um único comando valida
+  o cupom, os limites por usuário/CPF e o limite global e grava cupom_usado.
+  Com sql/create-cupom-uso-slots.sql o limite global é consumido de slots
+  (FOR UPDATE SKIP LOCKED; se todos os slots com saldo estiverem travados
+  por outros checkouts, espera por um deles) em vez da linha de cupom; sem a
+  migração, usa um UPDATE condicional em cupom.uso_atual.
+"""
+from flask import current_app
+from typing import Dict, Optional
+from datetime import datetime
+import re
+import psycopg2
+import psycopg2.extras
+from .db import get_db
+from .reference_cache import get_reference_data
+from .schema_capabilities import has_table
+
+
+def _load_cupons() -> Dict[str, Dict]:
+    """Carrega os cupons ativos indexados por código (cache de referência)"""
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute("""
+            SELECT
+                id, codigo, tipo, valor, valor_minimo_pedido,
+                validade_inicio, validade_fim, uso_maximo, uso_maximo_por_usuario,
+                descricao
+            FROM cupom
+            WHERE ativo = TRUE
+            ORDER BY id
+        """)
+        cupons = {}
+        for row in cur.fetchall():
+            cupons.setdefault(row['codigo'], dict(row))
+        return cupons
+    finally:
+        cur.close()
+
+
+def get_cupom_by_codigo(codigo: str) -> Optional[Dict]:
+    """
+    Busca um cupom ativo pelo código (em memória)
+
+    Returns:
+        Dict com as regras do cupom ou None se não existir/estiver inativo
+    """
+    if not codigo:
+        return None
+    cupom = get_reference_data('cupons', _load_cupons).get(codigo.strip().upper())
+    return dict(cupom) if cupom else None
+
+
+def validar_regras_cupom(cupom: Dict, valor_total: float) -> Optional[str]:
+    """
+    Valida validade e valor mínimo do pedido (regras em memória)
+
+    Returns:
+        Mensagem de erro ou None se o cupom pode ser aplicado ao valor
+    """
+    now = datetime.now()
+    if cupom.get('validade_inicio') and now < cupom['validade_inicio']:
+        return "Este cupom ainda não está válido"
+    if cupom.get('validade_fim') and now > cupom['validade_fim']:
+        return "Este cupom expirou"
+    valor_minimo = cupom.get('valor_minimo_pedido')
+    if valor_minimo and valor_total < float(valor_minimo):
+        return f"Valor mínimo do pedido para este cupom é R$ {float(valor_minimo):.2f}"
+    return None
+
+
+def calcular_desconto(cupom: Dict, valor_total: float) -> float:
+    """
+    Calcula o desconto do cupom sobre o total dos produtos
+
+    Returns:
+        Desconto arredondado em centavos, nunca maior que valor_total
+    """
+    if cupom['tipo'] == 'p':  # Percentual
+        desconto = valor_total * (float(cupom['valor']) / 100)
+    else:  # Valor fixo
+        desconto = float(cupom['valor'])
+    return round(max(0.0, min(desconto, valor_total)), 2)
+
+
+def _slots_enabled() -> bool:
+    return has_table('cupom_uso_slots')
+
+
+def limpar_cpf(cpf: Optional[str]) -> Optional[str]:
+    """CPF só com dígitos (None se vazio)"""
+    if not cpf:
+        return None
+    return re.sub(r'[^0-9]', '', cpf) or None
+
+
+def get_cupom_usage(cupom: Dict, usuario_id: int, cpf: Optional[str]) -> Dict:
+    """
+    Consulta, em um único comando, os usos de um cupom relevantes para um usuário
+
+    Returns:
+        Dict com uso_usuario (int), uso_cpf (bool) e esgotado (bool)
+    """
+    cpf_limpo = limpar_cpf(cpf)
+    if _slots_enabled():
+        esgotado_sql = """
+            %(uso_maximo)s IS NOT NULL AND NOT EXISTS (
+                SELECT 1 FROM cupom_uso_slots
+                WHERE cupom_id = %(cupom_id)s AND usos < limite
+            )
+        """
+    else:
+        esgotado_sql = """
+            EXISTS (
+                SELECT 1 FROM cupom
+                WHERE id = %(cupom_id)s AND uso_maximo IS NOT NULL AND uso_atual >= uso_maximo
+            )
+        """
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            SELECT
+                (SELECT COUNT(*) FROM cupom_usado
+                 WHERE cupom_id = %(cupom_id)s AND usuario_id = %(usuario_id)s),
+                (%(cpf)s::text IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM cupom_usado
+                    WHERE cupom_id = %(cupom_id)s AND cpf_usuario = %(cpf)s
+                )),
+                ({esgotado_sql})
+        """, {
+            'cupom_id': cupom['id'],
+            'usuario_id': usuario_id,
+            'cpf': cpf_limpo,
+            'uso_maximo': cupom.get('uso_maximo'),
+        })
+        uso_usuario, uso_cpf, esgotado = cur.fetchone()
+        return {'uso_usuario': uso_usuario, 'uso_cpf': bool(uso_cpf), 'esgotado': bool(esgotado)}
+    finally:
+        cur.close()
+
+
+def claim_cupom(cur, cupom_id: int, usuario_id: int, venda_id: int, valor_desconto: float) -> bool:
+    """
+    Reivindica um uso do cupom para o pedido, na transação do chamador (sem commit).
+
+    Valida, no mesmo comando, cupom ativo e dentro da validade, limite por
+    usuário, uso único por CPF e limite global; se tudo passar, consome o
+    limite global e grava cupom_usado. Reivindicações do mesmo usuário para o
+    mesmo cupom são serializadas (advisory lock da transação): a contagem de
+    usos por usuário não tem índice único que a proteja.
+
+    Returns:
+        True se o uso foi registrado. False se o cupom não pode ser usado;
+        nesse caso o chamador deve desfazer a transação.
+    """
+    slots = _slots_enabled()
+    if slots:
+        consumo_sql = """
+            slot AS (
+                SELECT s.cupom_id, s.slot
+                FROM cupom_uso_slots s
+                JOIN elegivel e ON e.id = s.cupom_id
+                WHERE e.uso_maximo IS NOT NULL
+                AND s.usos < s.limite
+                LIMIT 1
+                FOR UPDATE OF s {espera}
+            ), consumo AS (
+                UPDATE cupom_uso_slots s
+                SET usos = s.usos + 1
+                FROM slot
+                WHERE s.cupom_id = slot.cupom_id AND s.slot = slot.slot
+                RETURNING s.cupom_id
+            )"""
+        condicao_sql = "e.uso_maximo IS NULL OR EXISTS (SELECT 1 FROM consumo)"
+    else:
+        consumo_sql = """
+            consumo AS (
+                UPDATE cupom c
+                SET uso_atual = c.uso_atual + 1
+                FROM elegivel e
+                WHERE c.id = e.id
+                AND (c.uso_maximo IS NULL OR c.uso_atual < c.uso_maximo)
+                RETURNING c.id
+            )"""
+        condicao_sql = "EXISTS (SELECT 1 FROM consumo)"
+
+    try:
+        # Dois checkouts simultâneos do mesmo usuário: o segundo espera o
+        # primeiro terminar e conta o uso já gravado
+        cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", (cupom_id, usuario_id))
+        sql = f"""
+            WITH usuario AS (
+                SELECT regexp_replace(NULLIF(cpf, ''), '[^0-9]', '', 'g') AS cpf
+                FROM usuarios WHERE id = %(usuario_id)s
+            ), elegivel AS (
+                SELECT c.id, c.uso_maximo
+                FROM cupom c
+                WHERE c.id = %(cupom_id)s
+                AND c.ativo = TRUE
+                AND (c.validade_inicio IS NULL OR c.validade_inicio <= NOW())
+                AND (c.validade_fim IS NULL OR c.validade_fim >= NOW())
+                AND (
+                    SELECT COUNT(*) FROM cupom_usado cu
+                    WHERE cu.cupom_id = c.id AND cu.usuario_id = %(usuario_id)s
+                ) < COALESCE(c.uso_maximo_por_usuario, 1)
+                AND NOT EXISTS (
+                    SELECT 1 FROM cupom_usado cu, usuario u
+                    WHERE cu.cupom_id = c.id AND cu.cpf_usuario = u.cpf
+                )
+            ), {consumo_sql}
+            INSERT INTO cupom_usado (cupom_id, usuario_id, venda_id, valor_desconto_aplicado, cpf_usuario)
+            SELECT e.id, %(usuario_id)s, %(venda_id)s, %(valor_desconto)s, (SELECT cpf FROM usuario)
+            FROM elegivel e
+            WHERE {condicao_sql}
+            RETURNING id
+        """
+        params = {
+            'cupom_id': cupom_id,
+            'usuario_id': usuario_id,
+            'venda_id': venda_id,
+            'valor_desconto': valor_desconto,
+        }
+        cur.execute(sql.replace('{espera}', 'SKIP LOCKED'), params)
+        if cur.fetchone() is not None:
+            return True
+        if not slots:
+            return False
+
+        # Nenhum slot livre: com mais checkouts do cupom em andamento do que
+        # slots, todos podem estar travados ainda com saldo. Nesse caso, esperar
+        # pelos slots travados (cada um é reavaliado ao ser liberado)
+        cur.execute("""
+            SELECT EXISTS (
+                SELECT 1 FROM cupom_uso_slots
+                WHERE cupom_id = %s AND usos < limite
+            )
+        """, (cupom_id,))
+        if not cur.fetchone()[0]:
+            return False
+        cur.execute(sql.replace('{espera}', ''), params)
+        return cur.fetchone() is not None
+    except psycopg2.errors.UniqueViolation:
+        # Outro checkout simultâneo do mesmo CPF registrou o uso primeiro
+        return False
+
+
+def refresh_cupom_uso_atual() -> Dict:
+    """
+    Atualiza cupom.uso_atual (exibido no Strapi) a partir de cupom_usado.
+
+    Com os slots, o checkout não incrementa mais a linha do cupom; este job
+    ('cupom.atualizar_uso_atual') mantém o contador informativo em dia.
+    """
+    if not _slots_enabled():
+        return {'success': True, 'atualizados': 0}
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE cupom c
+            SET uso_atual = u.total
+            FROM (
+                SELECT cupom_id, COUNT(*) AS total
+                FROM cupom_usado
+                GROUP BY cupom_id
+            ) u
+            WHERE c.id = u.cupom_id
+            AND c.uso_atual IS DISTINCT FROM u.total
+        """)
+        atualizados = cur.rowcount
+        conn.commit()
+        if atualizados:
+            current_app.logger.info(f"🎟️ uso_atual atualizado em {atualizados} cupom(ns)")
+        return {'success': True, 'atualizados': atualizados}
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"❌ Erro ao atualizar uso_atual dos cupons: {e}")
+        return {'success': False, 'error': str(e)}
+    finally:
+        cur.close()
@@ -1,30 +1,239 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
 import psycopg2
 import psycopg2.pool
+import psycopg2.extensions
 from flask import g
 import logging
 
+from . import metrics
+from .request_profiler import ProfilingConnection
+
 logger = logging.getLogger(__name__)
 
 connection_pool = None
 _db_config = None
 
-def init_db_pool(db_config: dict):
+_pool_checkout_seconds = metrics.histogram(
+    'db_pool_checkout_seconds',
+    'Tempo para obter uma conexão do pool (inclui espera e health check)',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+_pool_connections = metrics.gauge('db_pool_connections', 'Conexões do pool por estado (in_use, idle, waiting)')
+_pool_timeouts_total = metrics.counter('db_pool_timeouts_total', 'Checkouts que esgotaram o tempo de espera')
+_pool_health_checks_total = metrics.counter('db_pool_health_checks_total', 'Health checks de conexões ociosas por resultado')
+
+
+class PoolTimeoutError(psycopg2.pool.PoolError):
+    """Pool esgotado: nenhuma conexão liberada dentro do tempo de espera"""
+    pass
+
+
+class HealthCheckedPool:
+    """
+    Pool de conexões limitado, thread-safe e seguro para fork.
+    
+    - Conexões são validadas (SELECT 1) apenas se ficaram ociosas por mais de
+      idle_check_seconds; conexões usadas recentemente são entregues direto.
+    - Quando todas as maxconn estão em uso, o checkout aguarda até
+      checkout_timeout segundos e então falha (PoolTimeoutError), em vez de
+      abrir conexões extras sem limite.
+    - Conexões são abertas sob demanda por processo: após o fork do Gunicorn
+      (preload_app) o filho descarta as conexões herdadas do pai.
+    """
+    def __init__(self, maxconn: int, connect_kwargs: dict, checkout_timeout: float = 10.0,
+                 idle_check_seconds: float = 30.0):
+        self.maxconn = maxconn
+        self.checkout_timeout = checkout_timeout
+        self.idle_check_seconds = idle_check_seconds
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []  # LIFO de (conn, último uso em time.monotonic())
+        self._in_use = set()
+        self._opening = 0
+        self._waiting = 0
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        """Descarta estado herdado do processo pai (sem fechar: os sockets são do pai)"""
+        if self._pid != os.getpid():
+            self._idle = []
+            self._in_use = set()
+            self._opening = 0
+            self._waiting = 0
+            self._pid = os.getpid()
+
+    def _total(self) -> int:
+        return len(self._idle) + len(self._in_use) + self._opening
+
+    def _publish_stats(self):
+        _pool_connections.set(len(self._in_use), state='in_use')
+        _pool_connections.set(len(self._idle), state='idle')
+        _pool_connections.set(self._waiting, state='waiting')
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def getconn(self, timeout: float = None):
+        """Obtém uma conexão, aguardando no máximo `timeout` segundos se o pool estiver cheio"""
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn = None
+            last_used = None
+            with self._cond:
+                self._check_fork()
+                while not self._idle and self._total() >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        _pool_timeouts_total.inc()
+                        raise PoolTimeoutError(
+                            f"Pool de conexões esgotado ({self.maxconn} em uso) após {timeout:.1f}s de espera"
+                        )
+                    self._waiting += 1
+                    self._publish_stats()
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use.add(conn)
+                else:
+                    self._opening += 1
+                self._publish_stats()
+
+            if conn is None:
+                # Abrir conexão nova fora do lock
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._opening -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._opening -= 1
+                    self._in_use.add(conn)
+                    self._publish_stats()
+                break
+
+            # Health check apenas para conexões ociosas há muito tempo
+            if conn.closed:
+                self._discard(conn)
+                continue
+            if time.monotonic() - last_used > self.idle_check_seconds:
+                if not _is_connection_valid(conn):
+                    _pool_health_checks_total.inc(result='invalid')
+                    logger.warning("Conexão ociosa inválida descartada do pool")
+                    self._discard(conn)
+                    continue
+                _pool_health_checks_total.inc(result='ok')
+            break
+
+        _pool_checkout_seconds.observe(time.monotonic() - start)
+        return conn
+
+    def _discard(self, conn):
+        with self._cond:
+            self._in_use.discard(conn)
+            self._cond.notify()
+            self._publish_stats()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def putconn(self, conn, close: bool = False):
+        """Devolve a conexão ao pool (ou fecha, se `close` ou se estiver quebrada)"""
+        with self._cond:
+            if self._pid != os.getpid() or conn not in self._in_use:
+                # Conexão de outro processo ou não pertencente ao pool
+                foreign = True
+            else:
+                foreign = False
+        if foreign:
+            try:
+                conn.close()
+            except Exception:
+                pass
+            return
+
+        if not close and not conn.closed:
+            try:
+                status = conn.info.transaction_status
+                if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                    status = conn.info.transaction_status
+                close = status != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+            except Exception:
+                close = True
+
+        if close or conn.closed:
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._in_use.discard(conn)
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+            self._publish_stats()
+
+    def closeall(self):
+        """Fecha as conexões ociosas deste processo"""
+        with self._cond:
+            self._check_fork()
+            idle, self._idle = self._idle, []
+            self._publish_stats()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def get_stats(self) -> dict:
+        """Situação do pool neste processo"""
+        with self._cond:
+            self._check_fork()
+            return {
+                'pid': self._pid,
+                'max_connections': self.maxconn,
+                'in_use': len(self._in_use),
+                'idle': len(self._idle),
+                'opening': self._opening,
+                'waiting': self._waiting,
+            }
+
+
+def init_db_pool(db_config: dict, maxconn: int = None, checkout_timeout: float = None,
+                 idle_check_seconds: float = None):
     """
     Inicializa o pool de conexões com o banco de dados.
     Esta função deve ser chamada uma única vez na inicialização da aplicação.
     Recebe as configurações do DB via dicionário.
+    
+    O tamanho do pool é por processo; o padrão acompanha GUNICORN_THREADS
+    (uma conexão por thread de requisição + folga para tarefas em segundo plano),
+    de forma que o total fique em workers × (threads + 2).
     """
     global connection_pool, _db_config
     _db_config = db_config
     if connection_pool is None:  
+        if maxconn is None:
+            maxconn = int(os.environ.get('GUNICORN_THREADS', 2)) + 2
         try:
-            connection_pool = psycopg2.pool.ThreadedConnectionPool(
-                minconn=1,
-                maxconn=20, 
+            connect_kwargs = dict(
                 host=db_config.get("host"),
                 dbname=db_config.get("dbname"),
                 user=db_config.get("user"),
                 password=db_config.get("password"),
+                port=db_config.get("port"),
+                # Cursores instrumentados (consultas por requisição, Server-Timing)
+                connection_factory=ProfilingConnection,
                 # Configurações para melhor gerenciamento de conexões
                 connect_timeout=10,
                 keepalives=1,
@@ -32,16 +241,31 @@ def init_db_pool(db_config: dict):
                 keepalives_interval=10,
                 keepalives_count=5
             )
-            print("Database connection pool initialized successfully.")
+            # Verificar se o banco está acessível (sem manter a conexão: o Gunicorn
+            # faz fork depois daqui e conexões não podem ser compartilhadas)
+            psycopg2.connect(**connect_kwargs).close()
+            connection_pool = HealthCheckedPool(
+                maxconn=maxconn,
+                connect_kwargs=connect_kwargs,
+                checkout_timeout=checkout_timeout if checkout_timeout is not None else 10.0,
+                idle_check_seconds=idle_check_seconds if idle_check_seconds is not None else 30.0
+            )
+            print(f"Database connection pool initialized successfully (max {maxconn} conexões por processo).")
         except Exception as e:
             print(f"Erro ao inicializar o pool de conexões do banco de dados: {e}")
             raise 
 
+def get_pool_stats() -> dict:
+    """Retorna métricas do pool de conexões deste processo"""
+    if connection_pool is None:
+        return {}
+    return connection_pool.get_stats()
+
 def _is_connection_valid(conn):
     """
     Verifica se uma conexão está válida e ativa.
     """
-    if conn is None:
+    if conn is None or conn.closed:
         return False
     try:
         # Tentar executar uma query simples para verificar se a conexão está viva
@@ -49,6 +273,7 @@ def _is_connection_valid(conn):
         cur.execute("SELECT 1")
         cur.fetchone()
         cur.close()
+        conn.rollback()
         return True
     except (psycopg2.OperationalError, psycopg2.InterfaceError, psycopg2.DatabaseError):
         return False
@@ -59,99 +284,117 @@ def _is_connection_valid(conn):
 
 def _get_new_connection():
     """
-    Obtém uma nova conexão diretamente do pool ou cria uma nova se necessário.
+    Obtém uma conexão do pool.
+    Se o pool estiver esgotado, aguarda a liberação de uma conexão por até
+    DB_POOL_CHECKOUT_TIMEOUT segundos e então levanta PoolTimeoutError.
     """
-    global connection_pool, _db_config
+    global connection_pool
     
     if connection_pool is None:
         raise RuntimeError("Connection pool not initialized. Call init_db_pool() first.")
     
+    return connection_pool.getconn()
+
+def _release_connection(conn, close: bool = False):
+    """Devolve a conexão ao pool (fechando-a se `close`)"""
+    if conn is None:
+        return
     try:
-        # Tentar obter do pool
-        conn = connection_pool.getconn()
-        # Verificar se a conexão está válida
-        if _is_connection_valid(conn):
-            return conn
+        if connection_pool is not None:
+            connection_pool.putconn(conn, close=close)
         else:
-            # Conexão inválida, tentar fechar e obter nova
-            try:
-                connection_pool.putconn(conn, close=True)
-            except Exception:
-                pass
-            # Tentar obter nova conexão
-            conn = connection_pool.getconn()
-            if _is_connection_valid(conn):
-                return conn
-            else:
-                # Se ainda estiver inválida, criar conexão direta como fallback
-                logger.warning("Pool retornou conexão inválida, criando conexão direta")
-                return psycopg2.connect(
-                    host=_db_config.get("host"),
-                    dbname=_db_config.get("dbname"),
-                    user=_db_config.get("user"),
-                    password=_db_config.get("password"),
-                    connect_timeout=10
-                )
-    except psycopg2.pool.PoolError:
-        # Pool esgotado ou erro, criar conexão direta como fallback
-        logger.warning("Pool esgotado ou erro, criando conexão direta")
-        return psycopg2.connect(
-            host=_db_config.get("host"),
-            dbname=_db_config.get("dbname"),
-            user=_db_config.get("user"),
-            password=_db_config.get("password"),
-            connect_timeout=10
-        )
+            conn.close()
+    except Exception as e:
+        logger.error(f"Erro ao devolver conexão ao pool: {e}")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def discard_db_connection(conn=None):
+    """Remove a conexão (quebrada) de `g` e a descarta do pool"""
+    if "db" in g and (conn is None or g.db is conn):
+        _release_connection(g.pop('db'), close=True)
+
+def open_dedicated_connection(autocommit: bool = True):
+    """
+    Abre uma conexão própria, fora do pool e não associada a `g`.
+    Usada por componentes de longa duração que não pertencem a uma requisição
+    (ex: rate limiter compartilhado do Bling). O chamador é responsável por fechá-la.
+    """
+    global _db_config
+
+    if _db_config is None:
+        raise RuntimeError("Database config not initialized. Call init_db_pool() first.")
+
+    conn = psycopg2.connect(
+        host=_db_config.get("host"),
+        dbname=_db_config.get("dbname"),
+        user=_db_config.get("user"),
+        password=_db_config.get("password"),
+        port=_db_config.get("port"),
+        connect_timeout=10,
+        keepalives=1,
+        keepalives_idle=30,
+        keepalives_interval=10,
+        keepalives_count=5
+    )
+    conn.autocommit = autocommit
+    return conn
 
 def get_db():
     """
     Obtém uma conexão do pool e a armazena em `g`.
     Garante que cada requisição tenha sua própria conexão.
-    Verifica se a conexão está válida e reconecta se necessário.
-    Sempre faz rollback antes de retornar para garantir transação limpa.
+    
+    A conexão é validada pelo pool apenas quando estava ociosa há algum
+    tempo; chamadas seguintes na mesma requisição reutilizam a conexão sem
+    nenhum round trip. Se a transação anterior falhou (estado INERROR),
+    faz rollback para que a conexão volte a ser utilizável.
     """
+    if "db" in g and g.db.closed:
+        logger.warning("Conexão existente fechada, obtendo nova conexão")
+        discard_db_connection()
+    
     if "db" not in g: 
         g.db = _get_new_connection()
-    else:
-        # Verificar se a conexão existente ainda está válida
-        if not _is_connection_valid(g.db):
-            logger.warning("Conexão existente inválida, obtendo nova conexão")
-            try:
-                # Tentar fechar a conexão antiga
-                try:
-                    connection_pool.putconn(g.db, close=True)
-                except Exception:
-                    try:
-                        g.db.close()
-                    except Exception:
-                        pass
-            except Exception:
-                pass
+        return g.db
+    
+    # Transação abortada por erro anterior: nenhum comando funcionaria até o rollback
+    if g.db.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+        try:
+            g.db.rollback()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            logger.warning("Conexão fechada durante rollback, obtendo nova")
+            discard_db_connection()
             g.db = _get_new_connection()
     
-    # Sempre fazer rollback antes de usar a conexão para garantir transação limpa
+    return g.db
+
+@contextmanager
+def savepoint(conn, name: str):
+    """
+    Executa um trecho dentro de um SAVEPOINT da transação em andamento.
+    
+    Para consultas auxiliares (caches, introspecção) feitas na conexão da
+    requisição: em erro, só o trecho é desfeito (ROLLBACK TO SAVEPOINT) e a
+    exceção é propagada; o que o chamador ainda não confirmou é preservado e a
+    transação continua aberta. Em conexões autocommit não há o que proteger.
+    """
+    if conn.autocommit:
+        yield
+        return
+    cur = conn.cursor()
     try:
-        g.db.rollback()
-    except (psycopg2.OperationalError, psycopg2.InterfaceError):
-        # Conexão foi fechada, obter nova
-        logger.warning("Conexão fechada durante rollback, obtendo nova")
+        cur.execute(f"SAVEPOINT {name}")
         try:
-            if "db" in g:
-                try:
-                    connection_pool.putconn(g.db, close=True)
-                except Exception:
-                    try:
-                        g.db.close()
-                    except Exception:
-                        pass
+            yield
         except Exception:
-            pass
-        g.db = _get_new_connection()
-    except Exception:
-        # Outros erros podem ser ignorados (ex: autocommit)
-        pass
-    
-    return g.db
+            cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            raise
+        cur.execute(f"RELEASE SAVEPOINT {name}")
+    finally:
+        cur.close()
 
 def execute_query_safely(query, params=None, max_retries=3, fetch_mode='all'):
     """
@@ -173,18 +416,7 @@ def execute_query_safely(query, params=None, max_retries=3, fetch_mode='all'):
         try:
             conn = get_db()
             
-            # Garantir rollback antes de executar
-            try:
-                conn.rollback()
-            except Exception:
-                # Se rollback falhar, tentar obter nova conexão
-                if "db" in g:
-                    try:
-                        g.pop('db').close()
-                    except Exception:
-                        pass
-                conn = get_db()
-            
+            # get_db() já faz rollback se a transação anterior estiver abortada
             cur = conn.cursor()
             cur.execute(query, params)
             
@@ -211,11 +443,7 @@ def execute_query_safely(query, params=None, max_retries=3, fetch_mode='all'):
                 except Exception:
                     pass
                 # Remover conexão inválida do contexto
-                if "db" in g and g.db == conn:
-                    try:
-                        g.pop('db').close()
-                    except Exception:
-                        pass
+                discard_db_connection(conn)
             
             if attempt < max_retries - 1:
                 import time
@@ -261,18 +489,7 @@ def execute_write_safely(query, params=None, max_retries=3, commit=True):
         try:
             conn = get_db()
             
-            # Garantir rollback antes de executar
-            try:
-                conn.rollback()
-            except Exception:
-                # Se rollback falhar, tentar obter nova conexão
-                if "db" in g:
-                    try:
-                        g.pop('db').close()
-                    except Exception:
-                        pass
-                conn = get_db()
-            
+            # get_db() já faz rollback se a transação anterior estiver abortada
             cur = conn.cursor()
             cur.execute(query, params)
             
@@ -304,11 +521,7 @@ def execute_write_safely(query, params=None, max_retries=3, commit=True):
                 except Exception:
                     pass
                 # Remover conexão inválida do contexto
-                if "db" in g and g.db == conn:
-                    try:
-                        g.pop('db').close()
-                    except Exception:
-                        pass
+                discard_db_connection(conn)
             
             if attempt < max_retries - 1:
                 import time
@@ -341,84 +554,29 @@ def close_db_connection(exception=None):
     Sempre devolve a conexão ao pool, mesmo em caso de erro.
     """
     db_conn = g.pop("db", None) 
-    if db_conn is not None:
+    if db_conn is None:
+        return
+    
+    broken = db_conn.closed != 0
+    try:
+        if not broken and not db_conn.autocommit:
+            status = db_conn.info.transaction_status
+            if exception is not None or status == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                db_conn.rollback()
+            elif status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+                db_conn.commit()
+    except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+        # Conexão foi fechada/perdida - não devolver ao pool
+        logger.warning(f"Erro operacional ao finalizar conexão: {e}")
+        broken = True
+    except psycopg2.Error as e:
+        logger.warning(f"Erro ao commitar na finalização da requisição: {e}")
         try:
-            # Verificar se a conexão ainda está válida antes de tentar commit/rollback
-            if not _is_connection_valid(db_conn):
-                logger.warning("Conexão inválida detectada no teardown, fechando diretamente")
-                try:
-                    db_conn.close()
-                except Exception:
-                    pass
-                return
-            
-            # Verificar se está em autocommit
-            # psycopg2 não expõe autocommit diretamente, então tentamos fazer commit/rollback
-            # e ignoramos erros se estiver em autocommit
-            if exception is not None: 
-                try:
-                    db_conn.rollback()
-                except (psycopg2.OperationalError, psycopg2.InterfaceError):
-                    # Conexão foi fechada, apenas fechar
-                    try:
-                        db_conn.close()
-                    except Exception:
-                        pass
-                    return
-                except Exception:
-                    # Ignorar erro se estiver em autocommit
-                    pass
-            else: 
-                try:
-                    db_conn.commit() 
-                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-                    # Conexão foi fechada, apenas fechar
-                    logger.warning(f"Conexão fechada durante commit: {e}")
-                    try:
-                        db_conn.close()
-                    except Exception:
-                        pass
-                    return
-                except psycopg2.Error as e:
-                    # Se o erro for relacionado a autocommit ou transação, apenas logar
-                    error_str = str(e).lower()
-                    if 'autocommit' in error_str or 'no transaction' in error_str or 'tuples_ok' in error_str:
-                        # Está em autocommit ou não há transação - isso é normal
-                        pass
-                    else:
-                        logger.warning(f"Erro ao commitar na finalização da requisição: {e}")
-                        try:
-                            db_conn.rollback()
-                        except Exception:
-                            pass
-                except Exception as e:
-                    # Outros erros podem ser ignorados se estiver em autocommit
-                    pass
-        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
-            logger.warning(f"Erro operacional ao fechar conexão: {e}")
-            try:
-                db_conn.close()
-            except Exception:
-                pass
-            return
-        except Exception as e:
-            logger.warning(f"Erro ao fechar conexão: {e}")
-        finally:
-            # Sempre devolve a conexão ao pool, mesmo em caso de erro
-            try:
-                # Verificar se a conexão ainda está válida antes de devolver ao pool
-                if _is_connection_valid(db_conn):
-                    connection_pool.putconn(db_conn)
-                else:
-                    # Conexão inválida, fechar e não devolver ao pool
-                    try:
-                        db_conn.close()
-                    except Exception:
-                        pass
-            except Exception as e:
-                logger.error(f"Erro crítico ao devolver conexão ao pool: {e}")
-                # Tentar fechar a conexão se não conseguir devolver ao pool
-                try:
-                    db_conn.close()
-                except Exception:
-                    pass
\ No newline at end of file
+            db_conn.rollback()
+        except Exception:
+            broken = True
+    except Exception as e:
+        logger.warning(f"Erro ao finalizar conexão: {e}")
+    finally:
+        # Sempre devolve a conexão ao pool (o pool descarta conexões quebradas)
+        _release_connection(db_conn, close=broken)
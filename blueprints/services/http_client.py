@@ -0,0 +1,188 @@
+"""
+Cliente HTTP compartilhado para integrações externas
+====================================================
+
+Mantém uma requests.Session por integração (Bling, PagBank, Melhor Envio,
+ViaCEP, Strapi) com pool de conexões keep-alive, evitando um handshake
+TCP+TLS novo a cada chamada.
+
+- Pool e timeouts configuráveis (HTTP_CLIENT_* no config/ambiente)
+- Retry automático apenas de falhas de CONEXÃO (a requisição não chegou a ser
+  enviada, então é seguro até para POST). Retries de status/timeout de leitura
+  continuam com cada serviço, que conhece a semântica da API.
+- Sessões sem cookies persistentes (são compartilhadas entre requisições)
+- Histograma de latência por integração (métrica http_client_request_seconds)
+  e registro no profiler da requisição atual (Server-Timing)
+
+Uso:
+    from .http_client import http_request
+
+    response = http_request('bling', 'GET', url, headers=headers, timeout=30)
+"""
+import os
+import time
+import threading
+import http.cookiejar
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from flask import current_app
+
+from . import metrics
+from .request_profiler import record_external_call
+
+
+# Padrões específicos por integração; demais valores vêm de HTTP_CLIENT_* no config
+INTEGRATION_DEFAULTS = {
+    'bling': {'read_timeout': 30.0},
+    'pagbank': {'read_timeout': 30.0},
+    'melhor_envio': {'read_timeout': 30.0},
+    'viacep': {'connect_timeout': 3.0, 'read_timeout': 10.0},
+    'strapi': {'connect_timeout': 3.0, 'read_timeout': 30.0},
+}
+
+GLOBAL_DEFAULTS = {'pool_maxsize': 10, 'connect_timeout': 5.0, 'read_timeout': 30.0, 'connect_retries': 2}
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_pid: Optional[int] = None
+_sessions_lock = threading.Lock()
+
+_request_seconds = metrics.histogram(
+    'http_client_request_seconds',
+    'Latência das chamadas HTTP externas por integração (até receber os headers)'
+)
+_request_errors_total = metrics.counter(
+    'http_client_errors_total',
+    'Falhas de rede/timeout nas chamadas HTTP externas por integração'
+)
+
+
+def _get_setting(integration: str, key: str):
+    """
+    Configuração da integração, em ordem de prioridade:
+    HTTP_CLIENT_<INTEGRACAO>_<CHAVE> (ambiente) > padrão da integração >
+    HTTP_CLIENT_<CHAVE> (config) > padrão global
+    """
+    value = os.environ.get(f'HTTP_CLIENT_{integration.upper()}_{key.upper()}')
+    if value:
+        return value
+    defaults = INTEGRATION_DEFAULTS.get(integration, {})
+    if key in defaults:
+        return defaults[key]
+    try:
+        value = current_app.config.get(f'HTTP_CLIENT_{key.upper()}')
+    except RuntimeError:
+        # Fora de app context: usar padrões
+        value = None
+    return value if value is not None else GLOBAL_DEFAULTS[key]
+
+
+class _NoCookiesPolicy(http.cookiejar.DefaultCookiePolicy):
+    """Sessões são compartilhadas entre usuários - nunca guardar nem reenviar cookies"""
+    def set_ok(self, cookie, request):
+        return False
+
+    def return_ok(self, cookie, request):
+        return False
+
+
+def _build_session(integration: str) -> requests.Session:
+    pool_maxsize = int(_get_setting(integration, 'pool_maxsize'))
+    connect_retries = int(_get_setting(integration, 'connect_retries'))
+
+    retry = Retry(
+        total=connect_retries,
+        connect=connect_retries,
+        read=0,
+        status=0,
+        redirect=0,
+        other=0,
+        backoff_factor=0.2,
+        allowed_methods=None,  # Só falhas de conexão são retentadas (qualquer método)
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, pool_block=False, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.cookies.set_policy(_NoCookiesPolicy())
+    return session
+
+
+def get_session(integration: str) -> requests.Session:
+    """
+    Retorna a sessão HTTP compartilhada da integração.
+    As sessões são recriadas após fork (Gunicorn com preload_app).
+    """
+    global _sessions_pid
+
+    pid = os.getpid()
+    if _sessions_pid == pid:
+        session = _sessions.get(integration)
+        if session is not None:
+            return session
+
+    with _sessions_lock:
+        if _sessions_pid != pid:
+            # Processo filho: não reutilizar sockets herdados do processo pai
+            _sessions.clear()
+            _sessions_pid = pid
+        session = _sessions.get(integration)
+        if session is None:
+            session = _build_session(integration)
+            _sessions[integration] = session
+        return session
+
+
+def reset_sessions():
+    """Fecha todas as sessões (ex: após mudar configurações de pool)"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            try:
+                session.close()
+            except Exception:
+                pass
+        _sessions.clear()
+
+
+def http_request(integration: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Faz uma requisição HTTP usando a sessão (pool keep-alive) da integração
+
+    Args:
+        integration: 'bling', 'pagbank', 'melhor_envio', 'viacep', 'strapi'
+        method: Método HTTP
+        url: URL completa
+        **kwargs: Argumentos do requests. `timeout` numérico é tratado como
+                  timeout de leitura; o de conexão vem da configuração.
+
+    Returns:
+        Response object da requisição
+    """
+    timeout = kwargs.pop('timeout', None)
+    connect_timeout = float(_get_setting(integration, 'connect_timeout'))
+    if timeout is None:
+        timeout = (connect_timeout, float(_get_setting(integration, 'read_timeout')))
+    elif not isinstance(timeout, tuple):
+        timeout = (min(connect_timeout, float(timeout)), float(timeout))
+
+    session = get_session(integration)
+    method = method.upper()
+    start = time.perf_counter()
+    try:
+        response = session.request(method, url, timeout=timeout, **kwargs)
+    except requests.exceptions.RequestException as e:
+        elapsed = time.perf_counter() - start
+        record_external_call(integration, elapsed)
+        _request_seconds.observe(elapsed, integration=integration, method=method, status='error')
+        _request_errors_total.inc(integration=integration, error=type(e).__name__)
+        raise
+
+    elapsed = time.perf_counter() - start
+    record_external_call(integration, elapsed)
+    _request_seconds.observe(elapsed, integration=integration, method=method,
+                             status=f'{response.status_code // 100}xx')
+    return response
@@ -0,0 +1,518 @@
+"""
+Service de fila de jobs em segundo plano
+========================================
+
+Fila durável baseada em PostgreSQL (tabela fila_jobs) para tirar das
+requisições HTTP o trabalho lento com o Bling: criação de pedidos, emissão de
+NF-e, contas a receber e envio de estoque.
+
+- enqueue_job(): grava o job (com chave de idempotência opcional)
+- process_next_job(): reserva um job com FOR UPDATE SKIP LOCKED e executa
+- run_worker(): loop do worker (entry point: scripts/job_worker.py), que
+  também enfileira os jobs periódicos (_PERIODIC_JOBS)
+
+Retries usam backoff exponencial; após max_tentativas o job vai para a
+dead-letter (status 'morto') e pode ser reenfileirado com requeue_dead_job().
+
+Configuração (config.py):
+- JOB_QUEUE_MODE: 'async' (padrão, executa no worker) ou 'inline'
+  (executa na hora, útil em desenvolvimento sem worker)
+- JOB_QUEUE_MAX_ATTEMPTS, JOB_QUEUE_LEASE_SECONDS, JOB_QUEUE_POLL_INTERVAL
+"""
+from flask import current_app
+from typing import Dict, Optional, Callable, Any
+from datetime import datetime
+import json
+import os
+import signal
+import socket
+import time
+import traceback
+import psycopg2
+import psycopg2.extras
+from .db import get_db
+
+
+# Registro de handlers: tipo do job -> função(payload) -> Dict
+_JOB_HANDLERS: Dict[str, Callable[[Dict], Any]] = {}
+
+# Backoff entre tentativas (segundos): 30s, 60s, 120s, ... até 1h
+_RETRY_BASE_DELAY_SECONDS = 30
+_RETRY_MAX_DELAY_SECONDS = 3600
+
+
+def register_job_handler(tipo: str):
+    """
+    Decorator para registrar o handler de um tipo de job.
+
+    O handler recebe o payload (dict) e deve retornar um dict. Se o retorno
+    tiver 'success': False, o job é considerado falho e entra em retry.
+    """
+    def decorator(func: Callable[[Dict], Any]):
+        _JOB_HANDLERS[tipo] = func
+        return func
+    return decorator
+
+
+def get_job_handler(tipo: str) -> Optional[Callable[[Dict], Any]]:
+    """Retorna o handler registrado para o tipo de job (ou None)"""
+    return _JOB_HANDLERS.get(tipo)
+
+
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _retry_delay_seconds(tentativas: int) -> int:
+    """Backoff exponencial a partir do número de tentativas já feitas"""
+    delay = _RETRY_BASE_DELAY_SECONDS * (2 ** max(tentativas - 1, 0))
+    return min(delay, _RETRY_MAX_DELAY_SECONDS)
+
+
+def _run_handler(tipo: str, payload: Dict) -> Dict:
+    """
+    Executa o handler de um job e normaliza o resultado.
+
+    Raises:
+        ValueError: Se não houver handler para o tipo
+        RuntimeError: Se o handler retornar success=False
+    """
+    handler = get_job_handler(tipo)
+    if handler is None:
+        raise ValueError(f"Nenhum handler registrado para o job '{tipo}'")
+
+    result = handler(payload or {})
+    if result is None:
+        result = {'success': True}
+    elif not isinstance(result, dict):
+        result = {'success': True, 'result': result}
+
+    if result.get('success') is False:
+        raise RuntimeError(result.get('error') or f"Job '{tipo}' retornou success=False")
+
+    return result
+
+
+def enqueue_job(tipo: str, payload: Dict = None, chave_idempotencia: str = None,
+                executar_em: datetime = None, max_tentativas: int = None,
+                conn=None) -> Optional[int]:
+    """
+    Enfileira um job para execução em segundo plano.
+
+    Args:
+        tipo: Tipo do job (ex: 'bling.sync_order')
+        payload: Dados do job (serializável em JSON)
+        chave_idempotencia: Se informada, ignora o job caso já exista um job
+            ativo (pendente/executando) com a mesma chave
+        executar_em: Agenda a primeira execução (padrão: agora)
+        max_tentativas: Tentativas antes da dead-letter (padrão: JOB_QUEUE_MAX_ATTEMPTS)
+        conn: Conexão de uma transação em andamento. Se informada, o INSERT
+            participa da transação do chamador e o commit fica a cargo dele.
+
+    Returns:
+        ID do job criado, ou None se foi deduplicado/executado inline
+    """
+    payload = payload or {}
+
+    if get_job_handler(tipo) is None:
+        raise ValueError(f"Nenhum handler registrado para o job '{tipo}'")
+
+    if current_app.config.get('JOB_QUEUE_MODE', 'async') == 'inline':
+        current_app.logger.info(f"⚙️ [JOBS] Executando job '{tipo}' inline (JOB_QUEUE_MODE=inline)")
+        try:
+            _run_handler(tipo, payload)
+        except Exception as e:
+            current_app.logger.error(f"❌ [JOBS] Erro no job inline '{tipo}': {e}", exc_info=True)
+        return None
+
+    if max_tentativas is None:
+        max_tentativas = current_app.config.get('JOB_QUEUE_MAX_ATTEMPTS', 5)
+
+    owns_transaction = conn is None
+    if owns_transaction:
+        conn = get_db()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("""
+            INSERT INTO fila_jobs (tipo, payload, chave_idempotencia, max_tentativas, executar_em)
+            VALUES (%s, %s::jsonb, %s, %s, COALESCE(%s, NOW()))
+            ON CONFLICT (chave_idempotencia) WHERE status IN ('pendente', 'executando')
+            DO NOTHING
+            RETURNING id
+        """, (tipo, json.dumps(payload, default=str), chave_idempotencia, max_tentativas, executar_em))
+
+        row = cur.fetchone()
+        if owns_transaction:
+            conn.commit()
+
+        if row:
+            current_app.logger.info(f"📥 [JOBS] Job {row[0]} '{tipo}' enfileirado (chave: {chave_idempotencia or '-'})")
+            return row[0]
+
+        current_app.logger.info(
+            f"ℹ️ [JOBS] Job '{tipo}' ignorado: já existe job ativo com a chave {chave_idempotencia}"
+        )
+        return None
+
+    except psycopg2.errors.UndefinedTable:
+        # Migração sql/create-fila-jobs.sql ainda não aplicada: não perder o trabalho
+        if owns_transaction:
+            conn.rollback()
+        else:
+            raise
+        current_app.logger.warning(
+            f"⚠️ [JOBS] Tabela fila_jobs não existe. Executando job '{tipo}' inline. "
+            f"Aplique sql/create-fila-jobs.sql."
+        )
+        try:
+            _run_handler(tipo, payload)
+        except Exception as e:
+            current_app.logger.error(f"❌ [JOBS] Erro no job inline '{tipo}': {e}", exc_info=True)
+        return None
+    except Exception:
+        if owns_transaction:
+            conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _claim_next_job(worker_id: str) -> Optional[Dict]:
+    """
+    Reserva o próximo job elegível (pendente vencido ou lease expirado).
+
+    FOR UPDATE SKIP LOCKED permite vários workers concorrentes sem disputa.
+    """
+    lease_seconds = current_app.config.get('JOB_QUEUE_LEASE_SECONDS', 300)
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        cur.execute("""
+            UPDATE fila_jobs
+            SET status = 'executando',
+                tentativas = tentativas + 1,
+                bloqueado_ate = NOW() + make_interval(secs => %s),
+                bloqueado_por = %s,
+                atualizado_em = NOW()
+            WHERE id = (
+                SELECT id
+                FROM fila_jobs
+                WHERE (status = 'pendente' AND executar_em <= NOW())
+                   OR (status = 'executando' AND bloqueado_ate < NOW())
+                ORDER BY executar_em, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, tipo, payload, tentativas, max_tentativas, chave_idempotencia
+        """, (lease_seconds, worker_id))
+
+        job = cur.fetchone()
+        conn.commit()
+        return dict(job) if job else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _mark_job_done(job_id: int, result: Dict):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE fila_jobs
+            SET status = 'concluido',
+                resultado = %s::jsonb,
+                ultimo_erro = NULL,
+                bloqueado_ate = NULL,
+                concluido_em = NOW(),
+                atualizado_em = NOW()
+            WHERE id = %s
+        """, (json.dumps(result, default=str), job_id))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _mark_job_failed(job: Dict, error: str):
+    """Agenda retry com backoff ou move o job para a dead-letter"""
+    is_dead = job['tentativas'] >= job['max_tentativas']
+    delay = _retry_delay_seconds(job['tentativas'])
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        if is_dead:
+            cur.execute("""
+                UPDATE fila_jobs
+                SET status = 'morto',
+                    ultimo_erro = %s,
+                    bloqueado_ate = NULL,
+                    atualizado_em = NOW()
+                WHERE id = %s
+            """, (error, job['id']))
+        else:
+            cur.execute("""
+                UPDATE fila_jobs
+                SET status = 'pendente',
+                    ultimo_erro = %s,
+                    executar_em = NOW() + make_interval(secs => %s),
+                    bloqueado_ate = NULL,
+                    atualizado_em = NOW()
+                WHERE id = %s
+            """, (error, delay, job['id']))
+        conn.commit()
+    finally:
+        cur.close()
+
+    if is_dead:
+        current_app.logger.error(
+            f"☠️ [JOBS] Job {job['id']} '{job['tipo']}' movido para dead-letter após "
+            f"{job['tentativas']} tentativa(s): {error}"
+        )
+    else:
+        current_app.logger.warning(
+            f"🔁 [JOBS] Job {job['id']} '{job['tipo']}' falhou (tentativa {job['tentativas']}/"
+            f"{job['max_tentativas']}). Nova tentativa em {delay}s: {error}"
+        )
+
+
+def process_next_job(worker_id: str = None) -> bool:
+    """
+    Reserva e executa um único job.
+
+    Deve ser chamado dentro de um app context.
+
+    Returns:
+        True se um job foi processado, False se a fila estava vazia
+    """
+    worker_id = worker_id or _worker_id()
+    job = _claim_next_job(worker_id)
+
+    if not job:
+        return False
+
+    # Lease expirado de um job que já esgotou as tentativas (worker caiu repetidamente)
+    if job['tentativas'] > job['max_tentativas']:
+        _mark_job_failed(job, job.get('ultimo_erro') or 'Lease expirado após esgotar tentativas')
+        return True
+
+    started = time.time()
+    current_app.logger.info(
+        f"▶️ [JOBS] Executando job {job['id']} '{job['tipo']}' "
+        f"(tentativa {job['tentativas']}/{job['max_tentativas']})"
+    )
+
+    try:
+        result = _run_handler(job['tipo'], job['payload'])
+    except Exception as e:
+        current_app.logger.debug(traceback.format_exc())
+        try:
+            get_db().rollback()
+        except Exception:
+            pass
+        _mark_job_failed(job, str(e) or e.__class__.__name__)
+        return True
+
+    _mark_job_done(job['id'], result)
+    current_app.logger.info(
+        f"✅ [JOBS] Job {job['id']} '{job['tipo']}' concluído em {time.time() - started:.2f}s"
+    )
+    return True
+
+
+def requeue_dead_job(job_id: int) -> bool:
+    """
+    Reenfileira um job da dead-letter, zerando as tentativas.
+
+    Returns:
+        True se o job foi reenfileirado
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE fila_jobs
+            SET status = 'pendente',
+                tentativas = 0,
+                executar_em = NOW(),
+                atualizado_em = NOW()
+            WHERE id = %s AND status = 'morto'
+        """, (job_id,))
+        requeued = cur.rowcount > 0
+        conn.commit()
+        return requeued
+    except psycopg2.errors.UniqueViolation:
+        # Já existe um job ativo com a mesma chave de idempotência
+        conn.rollback()
+        return False
+    finally:
+        cur.close()
+
+
+def get_queue_stats() -> Dict:
+    """Retorna contagem de jobs por status e tipo"""
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    try:
+        cur.execute("""
+            SELECT tipo, status, COUNT(*) AS total, MIN(executar_em) AS mais_antigo
+            FROM fila_jobs
+            WHERE status <> 'concluido'
+            GROUP BY tipo, status
+            ORDER BY tipo, status
+        """)
+        return {'success': True, 'jobs': [dict(row) for row in cur.fetchall()]}
+    finally:
+        cur.close()
+
+
+# Jobs periódicos enfileirados pelo próprio worker: tipo -> (config do intervalo em segundos, padrão)
+# A chave de idempotência é o tipo: vários workers não duplicam o job pendente
+_PERIODIC_JOBS = {
+    'estoque.expirar_reservas': ('STOCK_RESERVATION_SWEEP_SECONDS', 60),
+    'cupom.atualizar_uso_atual': ('CUPOM_USO_SYNC_SECONDS', 60),
+    'webhook.limpar_inbox': ('WEBHOOK_INBOX_PURGE_SECONDS', 3600),
+}
+
+
+def _enqueue_due_periodic_jobs(app, last_run: Dict[str, float]):
+    """Enfileira os jobs periódicos cujo intervalo venceu neste worker"""
+    now = time.monotonic()
+    for tipo, (config_key, default) in _PERIODIC_JOBS.items():
+        interval = float(app.config.get(config_key, default))
+        if interval <= 0 or (tipo in last_run and now - last_run[tipo] < interval):
+            continue
+        last_run[tipo] = now
+        try:
+            with app.app_context():
+                enqueue_job(tipo, {}, chave_idempotencia=tipo, max_tentativas=1)
+        except Exception as e:
+            app.logger.warning(f"⚠️ [JOBS] Não foi possível enfileirar o job periódico '{tipo}': {e}")
+
+
+def run_worker(app, poll_interval: float = None, once: bool = False) -> int:
+    """
+    Loop principal do worker de jobs.
+
+    Cada job roda em um app context próprio, de forma que a conexão do banco
+    é devolvida ao pool (teardown) entre um job e outro. O mesmo loop drena
+    a caixa de entrada de webhooks (webhook_inbox_service).
+
+    Args:
+        app: Aplicação Flask
+        poll_interval: Intervalo de espera quando a fila está vazia (segundos)
+        once: Se True, processa os jobs disponíveis e encerra
+
+    Returns:
+        Quantidade de jobs processados
+    """
+    from .webhook_inbox_service import process_next_webhook, process_next_webhook_batch
+
+    if poll_interval is None:
+        poll_interval = app.config.get('JOB_QUEUE_POLL_INTERVAL', 2.0)
+
+    worker_id = _worker_id()
+    stop = {'requested': False}
+
+    def _request_stop(signum, frame):
+        app.logger.info(f"🛑 [JOBS] Sinal {signum} recebido. Encerrando após o job atual...")
+        stop['requested'] = True
+
+    signal.signal(signal.SIGTERM, _request_stop)
+    signal.signal(signal.SIGINT, _request_stop)
+
+    app.logger.info(f"🚀 [JOBS] Worker {worker_id} iniciado (poll: {poll_interval}s)")
+    processed = 0
+    periodic_last_run: Dict[str, float] = {}
+
+    while not stop['requested']:
+        _enqueue_due_periodic_jobs(app, periodic_last_run)
+        try:
+            with app.app_context():
+                # Webhooks recebidos (caixa de entrada) antes dos jobs: são os eventos de pagamento/pedido
+                had_job = (
+                    process_next_webhook_batch(worker_id)
+                    or process_next_webhook(worker_id)
+                    or process_next_job(worker_id)
+                )
+        except Exception as e:
+            app.logger.error(f"❌ [JOBS] Erro no loop do worker: {e}", exc_info=True)
+            had_job = False
+            time.sleep(poll_interval)
+
+        if had_job:
+            processed += 1
+            continue
+
+        if once:
+            break
+        time.sleep(poll_interval)
+
+    app.logger.info(f"👋 [JOBS] Worker {worker_id} encerrado ({processed} job(s) processado(s))")
+    return processed
+
+
+# =====================================================
+# HANDLERS PADRÃO (Bling)
+# =====================================================
+
+@register_job_handler('bling.sync_order')
+def _handle_sync_order(payload: Dict) -> Dict:
+    from .bling_order_service import sync_order_to_bling
+    return sync_order_to_bling(int(payload['venda_id']))
+
+
+@register_job_handler('bling.emit_nfe')
+def _handle_emit_nfe(payload: Dict) -> Dict:
+    from .bling_nfe_service import emit_nfe_if_not_associated
+    return emit_nfe_if_not_associated(int(payload['venda_id']))
+
+
+@register_job_handler('bling.conta_receber')
+def _handle_conta_receber(payload: Dict) -> Dict:
+    from .bling_financial_service import create_account_receivable_for_order
+    return create_account_receivable_for_order(int(payload['venda_id']), payload.get('pagamento_id'))
+
+
+@register_job_handler('bling.sync_stock_to_bling')
+def _handle_sync_stock_to_bling(payload: Dict) -> Dict:
+    from .bling_product_service import sync_stock_to_bling
+    result = sync_stock_to_bling(produto_id=int(payload['produto_id']))
+    # sync_stock_to_bling retorna 'success'/'errors' como contagens
+    if 'errors' in result:
+        result['success'] = result['errors'] == 0
+    return result
+
+
+# =====================================================
+# HANDLERS PADRÃO (Estoque)
+# =====================================================
+
+@register_job_handler('estoque.expirar_reservas')
+def _handle_expirar_reservas(payload: Dict) -> Dict:
+    from .stock_reservation_service import expire_stock_reservations
+    return expire_stock_reservations(int(payload.get('limite', 200)))
+
+
+# =====================================================
+# HANDLERS PADRÃO (Cupons)
+# =====================================================
+
+@register_job_handler('cupom.atualizar_uso_atual')
+def _handle_atualizar_uso_cupons(payload: Dict) -> Dict:
+    from .coupon_service import refresh_cupom_uso_atual
+    return refresh_cupom_uso_atual()
+
+
+# =====================================================
+# HANDLERS PADRÃO (Webhooks)
+# =====================================================
+
+@register_job_handler('webhook.limpar_inbox')
+def _handle_limpar_inbox(payload: Dict) -> Dict:
+    from .webhook_inbox_service import purge_processed_webhooks
+    return purge_processed_webhooks()
@@ -3,15 +3,19 @@ import json
 from flask import current_app
 from typing import Dict, List, Optional, Tuple
 from .db import get_db
+from .http_client import http_request
 
 class LabelService:
     """Serviço para criação e gerenciamento de etiquetas de frete via Melhor Envio"""
     
     def __init__(self):
-        self.api_base_url = "https://melhorenvio.com.br/api/v2/me"
         self._token = None
         self._cep_origem = None
     
+    @property
+    def api_base_url(self) -> str:
+        return current_app.config.get('MELHOR_ENVIO_API_URL', "https://melhorenvio.com.br/api/v2/me").rstrip('/')
+    
     def _get_config(self) -> Tuple[str, str]:
         """Carrega configurações do Melhor Envio dinamicamente"""
         try:
@@ -107,7 +111,9 @@ class LabelService:
             
             current_app.logger.info(f"Criando envio no Melhor Envio para venda {venda_id}")
             
-            response = requests.post(
+            response = http_request(
+                'melhor_envio',
+                'POST',
                 f"{self.api_base_url}/shipment",
                 json=payload,
                 headers=self._get_headers(),
@@ -144,7 +150,9 @@ class LabelService:
         try:
             current_app.logger.info(f"Fazendo checkout do envio {shipment_id} no Melhor Envio")
             
-            response = requests.post(
+            response = http_request(
+                'melhor_envio',
+                'POST',
                 f"{self.api_base_url}/shipment/checkout",
                 json={"orders": [shipment_id]},
                 headers=self._get_headers(),
@@ -181,7 +189,9 @@ class LabelService:
         try:
             current_app.logger.info(f"Gerando link de impressão para envio {shipment_id}")
             
-            response = requests.get(
+            response = http_request(
+                'melhor_envio',
+                'GET',
                 f"{self.api_base_url}/shipment/print",
                 params={"orders[]": shipment_id},
                 headers=self._get_headers(),
@@ -214,7 +224,9 @@ class LabelService:
             Dados de rastreamento do envio
         """
         try:
-            response = requests.get(
+            response = http_request(
+                'melhor_envio',
+                'GET',
                 f"{self.api_base_url}/shipment/{shipment_id}/tracking",
                 headers=self._get_headers(),
                 timeout=30
@@ -248,7 +260,9 @@ class LabelService:
         try:
             current_app.logger.info(f"Cancelando envio {shipment_id}")
             
-            response = requests.post(
+            response = http_request(
+                'melhor_envio',
+                'POST',
                 f"{self.api_base_url}/shipment/cancel",
                 json={"id": shipment_id},
                 headers=self._get_headers(),
@@ -0,0 +1,392 @@
+"""
+Métricas internas da aplicação
+==============================
+
+Registro leve (sem dependências externas) de contadores e histogramas em
+memória, no formato de exposição do Prometheus.
+
+Uso:
+    from .metrics import counter, histogram
+
+    histogram('bling_rate_limit_wait_seconds', 'Espera no rate limiter').observe(0.2, bucket='bling_api')
+    counter('bling_api_requests_total', 'Requisições ao Bling').inc(endpoint='/produtos')
+
+Os valores são por processo; render_prometheus() gera o texto de exposição.
+
+Modo multiprocesso (Gunicorn com vários workers): com METRICS_MULTIPROC_DIR
+(ou PROMETHEUS_MULTIPROC_DIR) definido, cada processo grava periodicamente um
+snapshot em <dir>/metrics_<pid>.json (flush_if_due) e render_prometheus()
+soma os snapshots de todos os processos. Contadores e histogramas de workers
+encerrados são consolidados em metrics_archive.json (continuam monotônicos);
+gauges consideram apenas processos vivos.
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, Tuple, List, Optional
+
+
+# Buckets padrão (segundos) - cobrem desde queries rápidas até chamadas externas lentas
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: Dict[str, 'Metric'] = {}
+_registry_lock = threading.Lock()
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = [f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"' for k, v in pairs]
+    return '{' + ','.join(escaped) + '}'
+
+
+class Metric:
+    """Base de métricas com labels"""
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str = ''):
+        self.name = name
+        self.description = description
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict:
+        raise NotImplementedError
+
+    def render(self, snapshot: Optional[Dict] = None) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Contador monotônico"""
+    kind = 'counter'
+
+    def __init__(self, name: str, description: str = ''):
+        super().__init__(name, description)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'values': {key: value for key, value in self._values.items()}}
+
+    def render(self, snapshot: Optional[Dict] = None) -> List[str]:
+        lines = []
+        for key, value in sorted((snapshot or self.snapshot())['values'].items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge(Metric):
+    """Valor instantâneo"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, description: str = ''):
+        super().__init__(name, description)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {'values': {key: value for key, value in self._values.items()}}
+
+    def render(self, snapshot: Optional[Dict] = None) -> List[str]:
+        lines = []
+        for key, value in sorted((snapshot or self.snapshot())['values'].items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram(Metric):
+    """Histograma com buckets cumulativos (compatível com Prometheus)"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str = '', buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, description)
+        self.buckets = tuple(sorted(buckets))
+        # label_key -> [contagens por bucket..., soma, total]
+        self._series: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'buckets': list(self.buckets),
+                'series': {key: list(series) for key, series in self._series.items()}
+            }
+
+    def render(self, snapshot: Optional[Dict] = None) -> List[str]:
+        lines = []
+        for key, series in sorted((snapshot or self.snapshot())['series'].items()):
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+def _get_or_create(cls, name: str, description: str, **kwargs) -> Metric:
+    metric = _registry.get(name)
+    if metric is not None:
+        return metric
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = cls(name, description, **kwargs)
+            _registry[name] = metric
+        return metric
+
+
+def counter(name: str, description: str = '') -> Counter:
+    """Obtém (ou cria) um contador pelo nome"""
+    return _get_or_create(Counter, name, description)
+
+
+def gauge(name: str, description: str = '') -> Gauge:
+    """Obtém (ou cria) um gauge pelo nome"""
+    return _get_or_create(Gauge, name, description)
+
+
+def histogram(name: str, description: str = '', buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    """Obtém (ou cria) um histograma pelo nome"""
+    return _get_or_create(Histogram, name, description, buckets=buckets)
+
+
+def get_registry() -> Dict[str, Metric]:
+    """Retorna uma cópia do registro de métricas do processo"""
+    with _registry_lock:
+        return dict(_registry)
+
+
+def _render_lines(name: str, kind: str, description: str, lines: List[str]) -> List[str]:
+    header = [f"# HELP {name} {description}"] if description else []
+    return header + [f"# TYPE {name} {kind}"] + lines
+
+
+def render_prometheus() -> str:
+    """
+    Gera o texto de exposição do Prometheus.
+    
+    Em modo multiprocesso, agrega os snapshots de todos os workers;
+    caso contrário, apenas as métricas deste processo.
+    """
+    if multiproc_dir():
+        return _render_multiprocess()
+    lines = []
+    for name, metric in sorted(get_registry().items()):
+        lines.extend(_render_lines(name, metric.kind, metric.description, metric.render()))
+    return '\n'.join(lines) + '\n'
+
+
+# =====================================================
+# Modo multiprocesso (diretório compartilhado)
+# =====================================================
+
+_METRIC_CLASSES = {'counter': Counter, 'gauge': Gauge, 'histogram': Histogram}
+_ARCHIVE_FILE = 'metrics_archive.json'
+_last_flush = 0.0
+_flush_lock = threading.Lock()
+
+
+def multiproc_dir() -> Optional[str]:
+    """Diretório compartilhado entre os workers (None = métricas só do processo)"""
+    return os.environ.get('METRICS_MULTIPROC_DIR') or os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None
+
+
+def _serialize_registry() -> Dict:
+    data = {}
+    for name, metric in get_registry().items():
+        snapshot = metric.snapshot()
+        entry = {'kind': metric.kind, 'description': metric.description}
+        if metric.kind == 'histogram':
+            entry['buckets'] = snapshot['buckets']
+            entry['series'] = [[list(map(list, key)), series] for key, series in snapshot['series'].items()]
+        else:
+            entry['values'] = [[list(map(list, key)), value] for key, value in snapshot['values'].items()]
+        data[name] = entry
+    return data
+
+
+def _write_json(path: str, data: Dict):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def flush(directory: Optional[str] = None):
+    """Grava o snapshot deste processo no diretório compartilhado"""
+    global _last_flush
+    directory = directory or multiproc_dir()
+    if not directory:
+        return
+    with _flush_lock:
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, f"metrics_{os.getpid()}.json"), _serialize_registry())
+        _last_flush = time.monotonic()
+
+
+def flush_if_due(interval: float = 1.0):
+    """Grava o snapshot se o último tiver mais de `interval` segundos (chamado ao fim de cada requisição)"""
+    if multiproc_dir() and time.monotonic() - _last_flush >= interval:
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(target: Dict, source: Dict, include_gauges: bool = True):
+    """Soma o snapshot `source` em `target` (mesmo formato de _serialize_registry)"""
+    for name, entry in source.items():
+        if entry['kind'] == 'gauge' and not include_gauges:
+            continue
+        merged = target.setdefault(name, {
+            'kind': entry['kind'], 'description': entry.get('description', ''),
+            'buckets': entry.get('buckets'), 'values': {}, 'series': {}
+        })
+        if entry['kind'] == 'histogram':
+            if merged['buckets'] != entry.get('buckets'):
+                # Buckets mudaram entre versões: descartar a série antiga
+                continue
+            for key, series in entry.get('series', []):
+                key = tuple(map(tuple, key))
+                current = merged['series'].get(key)
+                merged['series'][key] = series if current is None else [a + b for a, b in zip(current, series)]
+        else:
+            for key, value in entry.get('values', []):
+                key = tuple(map(tuple, key))
+                merged['values'][key] = merged['values'].get(key, 0.0) + value
+
+
+def _to_serialized(merged: Dict) -> Dict:
+    data = {}
+    for name, entry in merged.items():
+        if entry['kind'] == 'gauge':
+            continue
+        out = {'kind': entry['kind'], 'description': entry['description']}
+        if entry['kind'] == 'histogram':
+            out['buckets'] = entry['buckets']
+            out['series'] = [[list(map(list, k)), v] for k, v in entry['series'].items()]
+        else:
+            out['values'] = [[list(map(list, k)), v] for k, v in entry['values'].items()]
+        data[name] = out
+    return data
+
+
+def _archive_dead_processes(directory: str):
+    """Consolida contadores/histogramas de workers encerrados em metrics_archive.json"""
+    try:
+        import fcntl
+    except ImportError:
+        return
+    dead = []
+    for filename in os.listdir(directory):
+        if filename.startswith('metrics_') and filename.endswith('.json') and filename != _ARCHIVE_FILE:
+            pid = filename[len('metrics_'):-len('.json')]
+            if pid.isdigit() and not _pid_alive(int(pid)):
+                dead.append(os.path.join(directory, filename))
+    if not dead:
+        return
+
+    with open(os.path.join(directory, '.lock'), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            archive_path = os.path.join(directory, _ARCHIVE_FILE)
+            merged = {}
+            _merge(merged, _read_json(archive_path) or {}, include_gauges=False)
+            for path in dead:
+                data = _read_json(path)
+                if data is None and not os.path.exists(path):
+                    continue  # Já consolidado por outro worker
+                _merge(merged, data or {}, include_gauges=False)
+            _write_json(archive_path, _to_serialized(merged))
+            for path in dead:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _render_multiprocess() -> str:
+    directory = multiproc_dir()
+    flush(directory)
+    try:
+        _archive_dead_processes(directory)
+    except OSError:
+        pass
+
+    merged = {}
+    for filename in sorted(os.listdir(directory)):
+        if not (filename.startswith('metrics_') and filename.endswith('.json')):
+            continue
+        data = _read_json(os.path.join(directory, filename))
+        if data:
+            _merge(merged, data, include_gauges=filename != _ARCHIVE_FILE)
+
+    lines = []
+    for name, entry in sorted(merged.items()):
+        cls = _METRIC_CLASSES.get(entry['kind'])
+        if cls is None:
+            continue
+        metric = cls(name, entry['description'], buckets=tuple(float(b) for b in entry['buckets'])) if cls is Histogram \
+            else cls(name, entry['description'])
+        snapshot = {'buckets': entry['buckets'], 'series': entry['series']} if cls is Histogram \
+            else {'values': entry['values']}
+        lines.extend(_render_lines(name, entry['kind'], entry['description'], metric.render(snapshot)))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,203 @@
+"""
+Eventos de status de pedido (PostgreSQL LISTEN/NOTIFY)
+======================================================
+
+As páginas de PIX/boleto/status esperam a mudança de status do pedido. Em vez
+de cada navegador consultar o banco a cada poucos segundos:
+
+- Quem altera orders.status (update_order_status, sync_order_status_from_venda,
+  chamados pelos webhooks do PagBank e do Bling) publica a transição com
+  publish_order_status(), que faz pg_notify no canal 'order_status'. A
+  notificação só é entregue no commit da transação.
+- Cada processo mantém UMA conexão dedicada em LISTEN (thread em segundo
+  plano) e acorda as requisições que esperam aquele token.
+- O endpoint SSE (/api/orders/<token>/events) espera sem segurar conexão do
+  pool. Se o listener estiver indisponível, cai para a consulta leve de
+  status (get_order_status_by_token) em intervalos.
+
+Uso:
+    from .order_events import publish_order_status, wait_for_order_status
+
+    publish_order_status(cur, public_token, 'PAGO')  # antes do commit
+    novo_status = wait_for_order_status(token, 'PENDENTE', timeout=15)
+"""
+import os
+import json
+import time
+import select
+import threading
+import logging
+from typing import Dict, Optional, Tuple
+
+from .db import open_dedicated_connection
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+ORDER_STATUS_CHANNEL = 'order_status'
+
+# Status após os quais a página de pagamento não precisa mais esperar
+FINAL_ORDER_STATUSES = frozenset({'PAGO', 'APROVADO', 'NA TRANSPORTADORA', 'ENTREGUE', 'CANCELADO', 'EXPIRADO'})
+
+# Por quanto tempo a última transição de cada token fica guardada em memória
+# (cobre a janela entre a consulta inicial do cliente e o início da espera)
+_EVENT_RETENTION_SECONDS = 600
+
+_stream_waiting = metrics.gauge(
+    'order_status_streams',
+    'Conexões SSE aguardando status de pedido neste processo'
+)
+_notifications_total = metrics.counter(
+    'order_status_notifications_total',
+    'Notificações de status de pedido recebidas via LISTEN'
+)
+
+
+def publish_order_status(cur, public_token: Optional[str], status: str):
+    """
+    Publica a transição de status de um pedido (pg_notify).
+    Deve ser chamada com o cursor da transação que alterou o status; a
+    notificação é entregue aos listeners somente no commit.
+    """
+    if not public_token:
+        return
+    payload = json.dumps({'token': str(public_token), 'status': status})
+    cur.execute("SELECT pg_notify(%s, %s)", (ORDER_STATUS_CHANNEL, payload))
+
+
+class _OrderStatusHub:
+    """Listener por processo + registro das últimas transições por token"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._events: Dict[str, Tuple[str, float]] = {}
+        self._pid: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._healthy = False
+        self._streams = 0
+
+    @property
+    def healthy(self) -> bool:
+        return self._healthy and self._pid == os.getpid()
+
+    def ensure_listener(self):
+        """Inicia o listener neste processo (recriado após fork do Gunicorn)"""
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._healthy = False
+            self._events.clear()
+            self._streams = 0
+            self._thread = threading.Thread(target=self._run, daemon=True, name='order-status-listener')
+            self._thread.start()
+
+    def _run(self):
+        backoff = 1.0
+        while True:
+            conn = None
+            try:
+                conn = open_dedicated_connection(autocommit=True)
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {ORDER_STATUS_CHANNEL}")
+                cur.close()
+                self._healthy = True
+                backoff = 1.0
+                logger.info(f"📡 Listener de status de pedidos ativo (pid {os.getpid()})")
+
+                while True:
+                    if select.select([conn], [], [], 30) == ([], [], []):
+                        # Timeout: validar a conexão periodicamente
+                        conn.poll()
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                self._healthy = False
+                logger.warning(f"⚠️ Listener de status de pedidos caiu: {e}; reconectando em {backoff:.0f}s")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, payload: str):
+        try:
+            data = json.loads(payload)
+            token, status = data['token'], data['status']
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Notificação de status inválida ignorada: {payload!r}")
+            return
+        _notifications_total.inc()
+        now = time.monotonic()
+        with self._cond:
+            self._events[token] = (status, now)
+            if len(self._events) > 1000:
+                limite = now - _EVENT_RETENTION_SECONDS
+                self._events = {k: v for k, v in self._events.items() if v[1] >= limite}
+            self._cond.notify_all()
+
+    def wait_for_change(self, token: str, known_status: str, timeout: float) -> Optional[str]:
+        """Bloqueia até o token mudar de known_status (retorna o novo) ou timeout (None)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                event = self._events.get(token)
+                if event is not None and event[0] != known_status:
+                    return event[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def try_acquire_stream(self, max_streams: int) -> bool:
+        with self._cond:
+            if self._streams >= max_streams:
+                return False
+            self._streams += 1
+        _stream_waiting.inc()
+        return True
+
+    def release_stream(self):
+        with self._cond:
+            self._streams = max(0, self._streams - 1)
+        _stream_waiting.dec()
+
+
+_hub = _OrderStatusHub()
+
+
+def ensure_order_status_listener():
+    """Garante que o listener LISTEN/NOTIFY deste processo está rodando"""
+    _hub.ensure_listener()
+
+
+def order_status_listener_healthy() -> bool:
+    """Indica se as notificações estão chegando (senão usar consulta leve periódica)"""
+    return _hub.healthy
+
+
+def wait_for_order_status(token: str, known_status: str, timeout: float) -> Optional[str]:
+    """
+    Espera uma transição de status do pedido publicada via NOTIFY.
+
+    Returns:
+        Novo status, ou None se nada mudou dentro do timeout
+    """
+    return _hub.wait_for_change(str(token), known_status, timeout)
+
+
+def try_acquire_stream(max_streams: int) -> bool:
+    """Reserva uma vaga de stream SSE neste processo (cada stream ocupa uma thread)"""
+    return _hub.try_acquire_stream(max_streams)
+
+
+def release_stream():
+    _hub.release_stream()
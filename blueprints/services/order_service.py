@@ -14,6 +14,8 @@ import psycopg2.extras
 from typing import Optional, Dict
 from flask import g, current_app
 from .db import get_db
+from .schema_capabilities import has_table, mark_table_created
+from .order_events import publish_order_status
 
 
 def map_venda_status_to_order_status(venda_status: str, status_pagamento: Optional[str] = None) -> str:
@@ -98,14 +100,8 @@ def create_order(venda_id: int, valor: float, status: str = 'PENDENTE') -> Dict:
     cur = conn.cursor()
     
     try:
-        # Verificar se a tabela orders existe, se não, criar
-        cur.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'orders'
-            )
-        """)
-        table_exists = cur.fetchone()[0]
+        # Verificar se a tabela orders existe (cache do schema), se não, criar
+        table_exists = has_table('orders')
         
         if not table_exists:
             current_app.logger.info("Tabela orders não existe. Criando...")
@@ -138,6 +134,7 @@ def create_order(venda_id: int, valor: float, status: str = 'PENDENTE') -> Dict:
                     CREATE INDEX IF NOT EXISTS idx_orders_public_token ON orders (public_token)
                 """)
                 conn.commit()
+                mark_table_created('orders')
                 current_app.logger.info("Tabela orders criada com sucesso")
             except Exception as create_error:
                 conn.rollback()
@@ -189,23 +186,9 @@ def get_order_by_token(public_token: str) -> Optional[Dict]:
     cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
     
     try:
-        # Verificar se a tabela etiquetas_frete e a tabela de link existem
-        cur.execute("""
-            SELECT 
-                EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'etiquetas_frete'
-                ) as tabela_existe,
-                EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_schema = 'public' 
-                    AND table_name = 'etiquetas_frete_venda_lnk'
-                ) as link_existe
-        """)
-        result_check = cur.fetchone()
-        etiquetas_table_exists = result_check[0] if result_check else False
-        link_table_exists = result_check[1] if result_check else False
+        # Verificar se a tabela etiquetas_frete e a tabela de link existem (cache do schema)
+        etiquetas_table_exists = has_table('etiquetas_frete')
+        link_table_exists = has_table('etiquetas_frete_venda_lnk')
         
         # Construir a query base
         base_query = """
@@ -327,6 +310,7 @@ def get_order_by_token(public_token: str) -> Optional[Dict]:
                     SET status = %s, atualizado_em = NOW()
                     WHERE public_token = %s
                 """, (status_mapped, public_token))
+                publish_order_status(cur, public_token, status_mapped)
                 conn.commit()
             except Exception as sync_error:
                 current_app.logger.warning(f"Erro ao sincronizar status: {sync_error}")
@@ -404,6 +388,55 @@ def get_order_by_token(public_token: str) -> Optional[Dict]:
         cur.close()
 
 
+def get_order_status_by_token(public_token: str) -> Optional[str]:
+    """
+    Consulta leve do status de um pedido pelo token público (polling/SSE).
+    Mesmo mapeamento de get_order_by_token, sem carregar pagamento/etiquetas.
+    
+    Returns:
+        Status mapeado ou None se o pedido não existir
+    """
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.DictCursor)
+    
+    try:
+        cur.execute("""
+            SELECT o.status, v.status_pedido,
+                   (SELECT p.status_pagamento FROM pagamentos p
+                    WHERE p.venda_id = v.id
+                    ORDER BY p.criado_em DESC
+                    LIMIT 1) AS status_pagamento
+            FROM orders o
+            LEFT JOIN vendas v ON o.venda_id = v.id
+            WHERE o.public_token = %s
+        """, (public_token,))
+        result = cur.fetchone()
+        if not result:
+            return None
+        
+        status_mapped = map_venda_status_to_order_status(
+            result['status_pedido'] or 'PENDENTE', result['status_pagamento']
+        )
+        
+        # Se o status na tabela orders estiver desatualizado, sincronizar (e notificar)
+        if result['status'] != status_mapped:
+            try:
+                cur.execute("""
+                    UPDATE orders
+                    SET status = %s, atualizado_em = NOW()
+                    WHERE public_token = %s
+                """, (status_mapped, public_token))
+                publish_order_status(cur, public_token, status_mapped)
+                conn.commit()
+            except Exception as sync_error:
+                current_app.logger.warning(f"Erro ao sincronizar status: {sync_error}")
+                conn.rollback()
+        
+        return status_mapped
+    finally:
+        cur.close()
+
+
 def update_order_status(public_token: str, status: str) -> bool:
     """
     Atualiza o status de um pedido
@@ -427,6 +460,8 @@ def update_order_status(public_token: str, status: str) -> bool:
         """, (status, public_token))
         
         result = cur.fetchone()
+        if result:
+            publish_order_status(cur, public_token, status)
         conn.commit()
         
         if result:
@@ -543,6 +578,7 @@ def sync_order_status_from_venda(venda_id: int) -> bool:
                 SET status = %s, atualizado_em = NOW()
                 WHERE public_token = %s
             """, (status_mapped, order_result['public_token']))
+            publish_order_status(cur, order_result['public_token'], status_mapped)
             conn.commit()
             current_app.logger.info(
                 f"🔄 Status do order sincronizado: venda {venda_id}, "
@@ -0,0 +1,252 @@
+"""
+Cache de dados de referência (situações, transportadoras, formas de pagamento)
+==============================================================================
+
+Situações do Bling, transportadoras, formas de pagamento e serviços de
+logística mudam raramente, mas eram consultados (no banco ou na API do Bling)
+a cada webhook de pedido, sincronização e emissão de NF-e. Cada conjunto é
+carregado uma vez por processo e mantido em memória, já indexado:
+
+- Versionado: cache_referencia_versoes guarda um contador por conjunto
+  (incrementado por triggers nas tabelas de origem e por
+  invalidate_reference_cache()). Cada worker compara os contadores a cada
+  REFERENCE_CACHE_CHECK_SECONDS, com uma única query, e recarrega só os
+  conjuntos que mudaram. Ver sql/create-cache-referencia.sql.
+- Sem a tabela de versões, o conjunto expira por REFERENCE_CACHE_TTL_SECONDS.
+- As sincronizações (sync_bling_situacoes_to_db,
+  sync_transportadoras_from_bling, ...) chamam invalidate_reference_cache()
+  após o commit: o próprio worker recarrega na hora e os demais na próxima
+  verificação.
+
+Busca por nome: NomeTrie indexa nomes normalizados (mesma normalização de
+normalizar_nome_transportadora no banco) por prefixo, em memória.
+
+Uso:
+    situacoes = get_reference_data('situacoes', _carregar_situacoes)
+"""
+import os
+import re
+import time
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from flask import current_app
+
+from .db import get_db, savepoint
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_TABLE = 'cache_referencia_versoes'
+
+
+class _Entry:
+    __slots__ = ('data', 'version', 'loaded_at')
+
+    def __init__(self, data, version: Optional[int], loaded_at: float):
+        self.data = data
+        self.version = version
+        self.loaded_at = loaded_at
+
+
+_entries: Dict[str, _Entry] = {}
+_entries_lock = threading.Lock()
+_load_locks: Dict[str, threading.Lock] = {}
+_versions: Dict[str, int] = {}
+_versions_checked_at = 0.0
+
+_cache_requests_total = metrics.counter(
+    'reference_cache_requests_total',
+    'Leituras do cache de dados de referência por conjunto e resultado (hit, miss)'
+)
+
+
+def _get_setting(key: str, default: float) -> float:
+    try:
+        return float(current_app.config.get(key, default))
+    except RuntimeError:
+        return float(os.environ.get(key, default))
+
+
+def _versions_table_exists() -> bool:
+    from .schema_capabilities import has_table
+    return has_table(VERSIONS_TABLE)
+
+
+def _check_versions():
+    """Descarta conjuntos cuja versão no banco mudou (no máximo uma query por intervalo)"""
+    global _versions_checked_at
+    now = time.monotonic()
+    if now - _versions_checked_at < _get_setting('REFERENCE_CACHE_CHECK_SECONDS', 10):
+        return
+    with _entries_lock:
+        if now - _versions_checked_at < _get_setting('REFERENCE_CACHE_CHECK_SECONDS', 10):
+            return
+        _versions_checked_at = now
+
+    if not _versions_table_exists():
+        return
+
+    # Conexão da requisição: chamado no meio de transações (webhooks, checkout,
+    # sincronizações); o SAVEPOINT isola a consulta sem encerrar a transação
+    conn = get_db()
+    try:
+        with savepoint(conn, 'cache_referencia_versoes'):
+            cur = conn.cursor()
+            try:
+                cur.execute(f"SELECT nome, versao FROM {VERSIONS_TABLE}")
+                versions = dict(cur.fetchall())
+            finally:
+                cur.close()
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível verificar versões do cache de referência: {e}")
+        return
+
+    with _entries_lock:
+        for nome, version in versions.items():
+            entry = _entries.get(nome)
+            if entry is not None and entry.version != version:
+                del _entries[nome]
+                logger.info(f"🔄 Cache de referência '{nome}' expirado (versão {entry.version} -> {version})")
+        _versions.update(versions)
+
+
+def get_reference_data(nome: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+    """
+    Retorna um conjunto de dados de referência, carregando-o se necessário.
+
+    Args:
+        nome: Nome do conjunto (mesmo de cache_referencia_versoes)
+        loader: Função sem argumentos que carrega e indexa o conjunto. Se
+                levantar exceção, nada é guardado e a exceção é propagada.
+        ttl: Idade máxima em segundos (padrão: REFERENCE_CACHE_TTL_SECONDS)
+
+    Returns:
+        Dados retornados pelo loader (compartilhados - não modificar)
+    """
+    _check_versions()
+    max_age = ttl if ttl is not None else _get_setting('REFERENCE_CACHE_TTL_SECONDS', 3600)
+
+    entry = _entries.get(nome)
+    if entry is not None and time.monotonic() - entry.loaded_at < max_age:
+        _cache_requests_total.inc(nome=nome, result='hit')
+        return entry.data
+
+    with _entries_lock:
+        load_lock = _load_locks.setdefault(nome, threading.Lock())
+
+    # Uma carga por conjunto de cada vez; as demais threads esperam o resultado
+    with load_lock:
+        entry = _entries.get(nome)
+        if entry is not None and time.monotonic() - entry.loaded_at < max_age:
+            _cache_requests_total.inc(nome=nome, result='hit')
+            return entry.data
+
+        # Versão lida antes da carga: uma alteração durante a carga força nova carga depois
+        version = _versions.get(nome)
+        data = loader()
+        with _entries_lock:
+            _entries[nome] = _Entry(data, version, time.monotonic())
+
+    _cache_requests_total.inc(nome=nome, result='miss')
+    return data
+
+
+def invalidate_reference_cache(nome: str):
+    """
+    Descarta um conjunto neste processo e incrementa sua versão no banco
+    (os demais workers recarregam na próxima verificação).
+
+    Deve ser chamada após o commit da alteração dos dados de origem.
+    """
+    with _entries_lock:
+        _entries.pop(nome, None)
+
+    if not _versions_table_exists():
+        return
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute(f"""
+            INSERT INTO {VERSIONS_TABLE} (nome, versao, atualizado_em)
+            VALUES (%s, 1, NOW())
+            ON CONFLICT (nome) DO UPDATE SET
+                versao = {VERSIONS_TABLE}.versao + 1,
+                atualizado_em = NOW()
+            RETURNING versao
+        """, (nome,))
+        version = cur.fetchone()[0]
+        conn.commit()
+        with _entries_lock:
+            _versions[nome] = version
+    except Exception as e:
+        conn.rollback()
+        logger.warning(f"⚠️ Não foi possível sinalizar invalidação do cache de referência '{nome}': {e}")
+    finally:
+        cur.close()
+
+
+# =====================================================
+# Busca por nome normalizado
+# =====================================================
+
+_ACENTOS = str.maketrans('ÁÀÂÃÉÈÊÍÌÎÓÒÔÕÚÙÛÇ', 'AAAAEEEIIIOOOOUUUC')
+
+
+def normalizar_nome(texto: Optional[str]) -> str:
+    """Mesma normalização de normalizar_nome_transportadora (SQL): maiúsculas, sem acentos e símbolos"""
+    if not texto:
+        return ''
+    texto = str(texto).upper().translate(_ACENTOS)
+    texto = re.sub(r'\s+', ' ', texto).strip()
+    return re.sub(r'[^A-Z0-9 ]', '', texto)
+
+
+class NomeTrie:
+    """Índice de prefixos sobre nomes normalizados (cada nome aponta para itens)"""
+
+    __slots__ = ('_root',)
+
+    _ITEMS = ''  # chave dos itens no nó (nenhum caractere é a string vazia)
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+
+    def add(self, nome: str, item):
+        if not nome:
+            return
+        node = self._root
+        for char in nome:
+            node = node.setdefault(char, {})
+        node.setdefault(self._ITEMS, []).append(item)
+
+    def _find(self, prefixo: str) -> Optional[Dict]:
+        node = self._root
+        for char in prefixo:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    def exact(self, nome: str) -> List:
+        """Itens cujo nome é exatamente `nome`"""
+        node = self._find(nome)
+        return list(node.get(self._ITEMS, ())) if node else []
+
+    def prefix(self, prefixo: str) -> List:
+        """Itens cujo nome começa com `prefixo`"""
+        node = self._find(prefixo)
+        if node is None:
+            return []
+        items = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            for char, child in current.items():
+                if char == self._ITEMS:
+                    items.extend(child)
+                else:
+                    stack.append(child)
+        return items
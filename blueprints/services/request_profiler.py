@@ -0,0 +1,277 @@
+"""
+Profiler por requisição
+=======================
+
+Mede, para cada requisição, onde o tempo foi gasto:
+
+- Consultas SQL: os cursores das conexões do pool (get_db(),
+  execute_query_safely, etc.) são instrumentados via connection_factory,
+  inclusive DictCursor/RealDictCursor. Conta consultas, tempo total no banco
+  e guarda a consulta mais lenta.
+- Chamadas HTTP externas: http_client.http_request registra a latência por
+  integração (bling, pagbank, melhor_envio, viacep, strapi).
+
+Ao fim da requisição:
+- header Server-Timing (visível no DevTools do navegador; só com
+  REQUEST_PROFILING_SERVER_TIMING ligado)
+- uma linha de log JSON (logger 'request_profile') para requisições a partir
+  de REQUEST_PROFILE_LOG_MIN_MS
+- histogramas por endpoint no /metrics (formato Prometheus; com
+  METRICS_MULTIPROC_DIR agrega todos os workers do Gunicorn)
+
+Fora de uma requisição (jobs, threads de segundo plano) o registro é no-op.
+"""
+import re
+import sys
+import json
+import time
+import logging
+import hmac
+import threading
+from typing import Dict, Optional
+
+import psycopg2.extensions
+from flask import g, request, has_app_context, Response, current_app
+
+from . import metrics
+
+logger = logging.getLogger('request_profile')
+
+_SQL_TEXT_LIMIT = 300
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_request_seconds = metrics.histogram(
+    'http_server_request_seconds',
+    'Duração das requisições por endpoint, método e classe de status'
+)
+_request_db_queries = metrics.histogram(
+    'http_server_request_db_queries',
+    'Consultas SQL por requisição, por endpoint',
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+_request_db_seconds = metrics.histogram(
+    'http_server_request_db_seconds',
+    'Tempo total no banco por requisição, por endpoint'
+)
+_request_external_seconds = metrics.histogram(
+    'http_server_request_external_seconds',
+    'Tempo em chamadas HTTP externas por requisição, por endpoint e integração'
+)
+
+
+class RequestProfile:
+    """Acumuladores da requisição atual (guardados em g._request_profile)"""
+
+    __slots__ = ('start', 'db_queries', 'db_seconds', 'slowest_seconds', 'slowest_sql', 'external')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_sql = None
+        self.external: Dict[str, list] = {}  # integração -> [chamadas, segundos]
+
+
+def current_profile() -> Optional[RequestProfile]:
+    """Profile da requisição atual (None fora de requisição ou com profiling desligado)"""
+    if not has_app_context():
+        return None
+    return g.get('_request_profile')
+
+
+def _sql_text(query, cursor) -> str:
+    if isinstance(query, bytes):
+        text = query.decode('utf-8', 'replace')
+    elif isinstance(query, str):
+        text = query
+    else:
+        # psycopg2.sql.Composed
+        try:
+            text = query.as_string(cursor.connection)
+        except Exception:
+            text = repr(query)
+    return _WHITESPACE_RE.sub(' ', text).strip()[:_SQL_TEXT_LIMIT]
+
+
+def record_query(query, elapsed: float, cursor=None):
+    """Registra uma consulta SQL na requisição atual"""
+    profile = current_profile()
+    if profile is None:
+        return
+    profile.db_queries += 1
+    profile.db_seconds += elapsed
+    if elapsed > profile.slowest_seconds:
+        profile.slowest_seconds = elapsed
+        # Sem parâmetros (podem conter dados pessoais)
+        profile.slowest_sql = _sql_text(query, cursor)
+
+
+def record_external_call(integration: str, elapsed: float):
+    """Registra uma chamada HTTP externa na requisição atual"""
+    profile = current_profile()
+    if profile is None:
+        return
+    totals = profile.external.get(integration)
+    if totals is None:
+        profile.external[integration] = [1, elapsed]
+    else:
+        totals[0] += 1
+        totals[1] += elapsed
+
+
+# =====================================================
+# Instrumentação dos cursores do psycopg2
+# =====================================================
+
+class _ProfilingCursorMixin:
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            record_query(query, time.perf_counter() - start, self)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            record_query(query, time.perf_counter() - start, self)
+
+    def callproc(self, procname, parameters=None):
+        start = time.perf_counter()
+        try:
+            return super().callproc(procname, parameters)
+        finally:
+            record_query(f"CALL {procname}", time.perf_counter() - start, self)
+
+
+_cursor_classes: Dict[type, type] = {}
+_cursor_classes_lock = threading.Lock()
+
+
+def _profiling_cursor_class(base: type) -> type:
+    cls = _cursor_classes.get(base)
+    if cls is None:
+        with _cursor_classes_lock:
+            cls = _cursor_classes.get(base)
+            if cls is None:
+                cls = type(f"Profiling{base.__name__}", (_ProfilingCursorMixin, base), {})
+                _cursor_classes[base] = cls
+    return cls
+
+
+class ProfilingConnection(psycopg2.extensions.connection):
+    """
+    Conexão cujos cursores registram cada consulta no profile da requisição.
+    Usada como connection_factory do pool; o cursor_factory escolhido pelo
+    chamador (DictCursor, RealDictCursor...) é preservado.
+    """
+
+    def cursor(self, *args, **kwargs):
+        if len(args) < 2:
+            base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+            kwargs['cursor_factory'] = _profiling_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+# =====================================================
+# Integração com o Flask
+# =====================================================
+
+def _endpoint_label() -> str:
+    rule = request.url_rule
+    return rule.rule if rule is not None else '<sem rota>'
+
+
+def _server_timing(profile: RequestProfile, total_seconds: float) -> str:
+    parts = [f'db;dur={profile.db_seconds * 1000:.1f};desc="{profile.db_queries} consultas"']
+    if profile.db_queries:
+        parts.append(f'db-max;dur={profile.slowest_seconds * 1000:.1f};desc="consulta mais lenta"')
+    for integration, (calls, seconds) in sorted(profile.external.items()):
+        parts.append(f'ext-{integration};dur={seconds * 1000:.1f};desc="{calls} chamadas"')
+    parts.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def _before_request():
+    if request.endpoint in ('static', 'metrics'):
+        return
+    g._request_profile = RequestProfile()
+
+
+def _after_request(response):
+    profile = g.pop('_request_profile', None)
+    if profile is None:
+        return response
+
+    total = time.perf_counter() - profile.start
+    endpoint = _endpoint_label()
+    config = current_app.config
+
+    try:
+        _request_seconds.observe(total, endpoint=endpoint, method=request.method,
+                                 status=f'{response.status_code // 100}xx')
+        _request_db_queries.observe(profile.db_queries, endpoint=endpoint)
+        _request_db_seconds.observe(profile.db_seconds, endpoint=endpoint)
+        for integration, (calls, seconds) in profile.external.items():
+            _request_external_seconds.observe(seconds, endpoint=endpoint, integration=integration)
+
+        if config.get('REQUEST_PROFILING_SERVER_TIMING', False):
+            response.headers['Server-Timing'] = _server_timing(profile, total)
+
+        if total * 1000 >= float(config.get('REQUEST_PROFILE_LOG_MIN_MS', 500)):
+            logger.info(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'endpoint': endpoint,
+                'status': response.status_code,
+                'duration_ms': round(total * 1000, 1),
+                'db_queries': profile.db_queries,
+                'db_ms': round(profile.db_seconds * 1000, 1),
+                'db_slowest_ms': round(profile.slowest_seconds * 1000, 1),
+                'db_slowest_sql': profile.slowest_sql,
+                'external': {
+                    integration: {'calls': calls, 'ms': round(seconds * 1000, 1)}
+                    for integration, (calls, seconds) in profile.external.items()
+                },
+            }, ensure_ascii=False))
+    except Exception as e:
+        # Instrumentação nunca deve derrubar a resposta
+        current_app.logger.warning(f"Erro no profiler da requisição: {e}")
+
+    metrics.flush_if_due(float(config.get('METRICS_FLUSH_INTERVAL_SECONDS', 1.0)))
+    return response
+
+
+def _metrics_allowed() -> bool:
+    # Sem token o endpoint fica fechado: atrás do Nginx (sem ProxyFix) remote_addr é
+    # sempre o IP interno do proxy, então não serve para restringir por rede
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+
+
+def metrics_view():
+    """Métricas no formato de exposição do Prometheus"""
+    if not _metrics_allowed():
+        return Response('forbidden\n', status=403, mimetype='text/plain')
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_request_profiler(app):
+    """Registra os hooks do profiler e a rota /metrics"""
+    if app.config.get('REQUEST_PROFILING_ENABLED', True):
+        app.before_request(_before_request)
+        app.after_request(_after_request)
+
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter('%(asctime)s [request_profile] %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
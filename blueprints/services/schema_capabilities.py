@@ -0,0 +1,149 @@
+"""
+Capacidades do schema do banco (cache de information_schema)
+============================================================
+
+Vários fluxos verificam se tabelas/colunas opcionais existem (colunas de MFA,
+tabelas tecidos/estampa_tecido_lnk, colunas criadas sob demanda em vendas e
+pagamentos...). Em vez de consultar information_schema a cada requisição, o
+schema é carregado uma vez por processo com uma única query e mantido em
+memória.
+
+- O cache é recarregado após SCHEMA_CACHE_TTL_SECONDS (padrão 300s), para
+  que migrações aplicadas com a aplicação no ar sejam percebidas sem restart.
+- Quem cria tabela/coluna sob demanda registra a mudança com
+  mark_table_created()/mark_column_added(), sem precisar recarregar.
+- Se o schema nunca foi carregado e a consulta falha, as verificações
+  levantam SchemaUnavailableError em vez de responder False.
+
+Uso:
+    from .schema_capabilities import has_table, has_column
+
+    if has_column('usuarios', 'mfa_enabled'):
+        ...
+"""
+import os
+import time
+import threading
+import logging
+from typing import Dict, FrozenSet, Optional
+
+from .db import get_db, savepoint
+
+logger = logging.getLogger(__name__)
+
+_schema: Optional[Dict[str, FrozenSet[str]]] = None
+_loaded_at = 0.0
+_schema_lock = threading.Lock()
+
+
+def _get_ttl() -> float:
+    try:
+        from flask import current_app
+        return float(current_app.config.get('SCHEMA_CACHE_TTL_SECONDS', 300))
+    except RuntimeError:
+        return float(os.environ.get('SCHEMA_CACHE_TTL_SECONDS', 300))
+
+
+class SchemaUnavailableError(RuntimeError):
+    """O schema nunca foi carregado neste processo e a consulta falhou"""
+    pass
+
+
+def _load_schema() -> Dict[str, FrozenSet[str]]:
+    """
+    Carrega todas as tabelas/views do schema public e suas colunas (uma query)
+
+    Usa a conexão da requisição dentro de um SAVEPOINT: se a consulta falhar,
+    só ela é desfeita, sem descartar o que o chamador ainda não confirmou.
+    """
+    conn = get_db()
+    with savepoint(conn, 'schema_capabilities'):
+        cur = conn.cursor()
+        try:
+            cur.execute("""
+                SELECT t.table_name, c.column_name
+                FROM information_schema.tables t
+                LEFT JOIN information_schema.columns c
+                    ON c.table_schema = t.table_schema
+                    AND c.table_name = t.table_name
+                WHERE t.table_schema = 'public'
+            """)
+            schema: Dict[str, set] = {}
+            for table_name, column_name in cur.fetchall():
+                columns = schema.setdefault(table_name, set())
+                if column_name:
+                    columns.add(column_name)
+        finally:
+            cur.close()
+    return {table: frozenset(columns) for table, columns in schema.items()}
+
+
+def _get_schema() -> Dict[str, FrozenSet[str]]:
+    """
+    Schema em cache, recarregado após o TTL.
+
+    Raises:
+        SchemaUnavailableError: Se o schema nunca foi carregado e a consulta
+            falhou. Responder "não existe" nesse caso desligaria recursos
+            (ex: MFA) ou dispararia criação de colunas sob demanda.
+    """
+    global _schema, _loaded_at
+
+    schema = _schema
+    if schema is not None and time.monotonic() - _loaded_at < _get_ttl():
+        return schema
+
+    with _schema_lock:
+        if _schema is not None and time.monotonic() - _loaded_at < _get_ttl():
+            return _schema
+        try:
+            loaded = _load_schema()
+        except Exception as e:
+            if _schema is None:
+                logger.error(f"Erro ao carregar capacidades do schema: {e}")
+                raise SchemaUnavailableError(f"Capacidades do schema indisponíveis: {e}") from e
+            # Recarga falhou: manter o cache anterior e tentar de novo na próxima chamada
+            logger.warning(f"Erro ao recarregar capacidades do schema (mantendo cache anterior): {e}")
+            return _schema
+        _schema = loaded
+        _loaded_at = time.monotonic()
+        logger.info(f"Capacidades do schema carregadas ({len(loaded)} tabelas)")
+        return _schema
+
+
+def has_table(table_name: str) -> bool:
+    """Verifica (em cache) se a tabela/view existe no schema public"""
+    return table_name in _get_schema()
+
+
+def has_column(table_name: str, column_name: str) -> bool:
+    """Verifica (em cache) se a coluna existe na tabela"""
+    return column_name in _get_schema().get(table_name, frozenset())
+
+
+def get_columns(table_name: str) -> FrozenSet[str]:
+    """Retorna (em cache) as colunas da tabela; vazio se ela não existir"""
+    return _get_schema().get(table_name, frozenset())
+
+
+def mark_table_created(table_name: str, columns=()):
+    """Registra no cache uma tabela criada sob demanda por este processo"""
+    global _schema
+    with _schema_lock:
+        if _schema is None:
+            return
+        schema = dict(_schema)
+        schema[table_name] = frozenset(schema.get(table_name, frozenset()) | set(columns))
+        _schema = schema
+
+
+def mark_column_added(table_name: str, column_name: str):
+    """Registra no cache uma coluna criada sob demanda por este processo"""
+    mark_table_created(table_name, (column_name,))
+
+
+def refresh_schema_capabilities():
+    """Força recarregar o schema na próxima consulta (ex: após aplicar uma migração)"""
+    global _loaded_at
+    with _schema_lock:
+        _loaded_at = float('-inf')
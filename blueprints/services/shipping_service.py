@@ -1,18 +1,26 @@
 import requests
 import json
 from flask import current_app
+from .http_client import http_request
 from typing import Dict, List, Optional
 
 class ShippingService:
     """Serviço para cálculo de frete usando APIs de transporte"""
     
     def __init__(self):
-        self.correios_api_url = "https://viacep.com.br/ws/{cep}/json/"
-        self.melhor_envio_api_url = "https://melhorenvio.com.br/api/v2/me/shipment/calculate"
         # Configurações serão carregadas dinamicamente quando necessário
         self._melhor_envio_token = None
         self._cep_origem = None
     
+    @property
+    def correios_api_url(self) -> str:
+        return current_app.config.get('VIACEP_API_URL', "https://viacep.com.br/ws/{cep}/json/")
+    
+    @property
+    def melhor_envio_api_url(self) -> str:
+        base_url = current_app.config.get('MELHOR_ENVIO_API_URL', "https://melhorenvio.com.br/api/v2/me")
+        return f"{base_url.rstrip('/')}/shipment/calculate"
+    
     def _get_config(self):
         """Carrega configurações do Melhor Envio dinamicamente"""
         try:
@@ -86,7 +94,7 @@ class ShippingService:
         """Busca informações do CEP via ViaCEP"""
         try:
             cep_clean = cep.replace('-', '').replace(' ', '')
-            response = requests.get(self.correios_api_url.format(cep=cep_clean), timeout=10)
+            response = http_request('viacep', 'GET', self.correios_api_url.format(cep=cep_clean), timeout=10)
             
             if response.status_code == 200:
                 data = response.json()
@@ -245,7 +253,9 @@ class ShippingService:
             
             current_app.logger.info(f"Calculando frete Melhor Envio: {cep_origem_clean} -> {cep_destino_clean}")
             
-            response = requests.post(
+            response = http_request(
+                'melhor_envio',
+                'POST',
                 self.melhor_envio_api_url,
                 json=payload,
                 headers=headers,
@@ -0,0 +1,200 @@
+"""
+Service de reservas de estoque
+==============================
+
+O estoque só é baixado quando o pedido vai para "Logística" no Bling. Entre
+o checkout e essa baixa, as unidades ficam reservadas em reservas_estoque,
+com um contador por produto em estoque_reservado
+(disponível = produtos.estoque - reservado). Ver sql/create-reservas-estoque.sql.
+
+- reserve_stock_for_order(): dentro da transação do checkout, reserva todos os
+  itens com um único UPDATE condicional no contador (sem SELECT + UPDATE, sem
+  travar a linha de produtos). Se algum produto não tiver saldo, nada é
+  reservado e o pedido inteiro é desfeito.
+- consume_order_reservations(): na baixa do estoque (Logística)
+- release_order_reservations(): falha na criação do pagamento
+- expire_stock_reservations(): job 'estoque.expirar_reservas', enfileirado
+  pelo worker a cada STOCK_RESERVATION_SWEEP_SECONDS
+
+Cancelamentos, devoluções e pagamento confirmado são tratados por trigger em
+vendas.status_pedido (qualquer origem: webhook PagBank/Bling, admin).
+
+Prazo da reserva por forma de pagamento (minutos, config.py):
+STOCK_RESERVATION_TTL_MINUTES (cartão/padrão), _PIX e _BOLETO.
+"""
+from flask import current_app
+from typing import Dict, List, Optional
+import psycopg2.extras
+from .db import get_db
+from .schema_capabilities import has_table
+
+
+def reservations_enabled() -> bool:
+    """True se a migração sql/create-reservas-estoque.sql foi aplicada"""
+    return has_table('reservas_estoque') and has_table('estoque_reservado')
+
+
+def _ttl_minutes(payment_method: Optional[str]) -> int:
+    method = (payment_method or '').upper()
+    default = current_app.config.get('STOCK_RESERVATION_TTL_MINUTES', 30)
+    if method == 'PIX':
+        return current_app.config.get('STOCK_RESERVATION_TTL_MINUTES_PIX', default)
+    if method == 'BOLETO':
+        return current_app.config.get('STOCK_RESERVATION_TTL_MINUTES_BOLETO', default)
+    return default
+
+
+def reserve_stock_for_order(cur, venda_id: int, quantidades: Dict[int, int],
+                            payment_method: Optional[str] = None) -> List[int]:
+    """
+    Reserva o estoque de um pedido na transação do chamador (sem commit).
+
+    Args:
+        cur: Cursor da transação do checkout
+        venda_id: ID da venda
+        quantidades: produto_id -> quantidade total no carrinho
+        payment_method: Forma de pagamento (define o prazo da reserva)
+
+    Returns:
+        IDs dos produtos sem saldo disponível (lista vazia = tudo reservado).
+        Se não estiver vazia, o chamador deve desfazer a transação.
+    """
+    produto_ids = sorted(quantidades)
+    if not produto_ids:
+        return []
+
+    cur.execute("""
+        INSERT INTO estoque_reservado (produto_id)
+        SELECT unnest(%s::int[])
+        ON CONFLICT (produto_id) DO NOTHING
+    """, (produto_ids,))
+
+    if len(produto_ids) > 1:
+        # Contadores travados sempre na mesma ordem: carrinhos com os mesmos
+        # produtos esperam um pelo outro em vez de entrar em deadlock
+        cur.execute("""
+            SELECT produto_id FROM estoque_reservado
+            WHERE produto_id = ANY(%s)
+            ORDER BY produto_id
+            FOR UPDATE
+        """, (produto_ids,))
+
+    cur.execute("""
+        UPDATE estoque_reservado e
+        SET reservado = e.reservado + r.quantidade,
+            atualizado_em = NOW()
+        FROM unnest(%s::int[], %s::int[]) AS r(produto_id, quantidade), produtos p
+        WHERE e.produto_id = r.produto_id
+        AND p.id = r.produto_id
+        AND COALESCE(p.estoque, 0) - e.reservado >= r.quantidade
+        RETURNING e.produto_id
+    """, (produto_ids, [quantidades[produto_id] for produto_id in produto_ids]))
+    reservados = {row[0] for row in cur.fetchall()}
+
+    sem_saldo = [produto_id for produto_id in produto_ids if produto_id not in reservados]
+    if sem_saldo:
+        return sem_saldo
+
+    ttl = _ttl_minutes(payment_method)
+    psycopg2.extras.execute_values(cur, """
+        INSERT INTO reservas_estoque (venda_id, produto_id, quantidade, expira_em)
+        VALUES %s
+    """, [
+        (venda_id, produto_id, quantidades[produto_id], ttl)
+        for produto_id in produto_ids
+    ], template="(%s, %s, %s, NOW() + make_interval(mins => %s))", page_size=len(produto_ids))
+
+    return []
+
+
+def consume_order_reservations(cur, venda_id: int) -> int:
+    """
+    Marca as reservas do pedido como consumidas (estoque baixado), na
+    transação do chamador.
+
+    Returns:
+        Quantidade de produtos cujo contador foi atualizado
+    """
+    if not reservations_enabled():
+        return 0
+    cur.execute("SELECT reservas_estoque_finalizar(%s, 'consumida')", (venda_id,))
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def release_order_reservations(venda_id: int) -> bool:
+    """
+    Libera as reservas ativas do pedido (ex: falha ao criar o pagamento).
+
+    Returns:
+        True se a liberação foi gravada (ou não há reservas), False em erro
+    """
+    if not reservations_enabled():
+        return True
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT reservas_estoque_finalizar(%s, 'liberada')", (venda_id,))
+        conn.commit()
+        current_app.logger.info(f"🔓 Reservas de estoque do pedido {venda_id} liberadas")
+        return True
+    except Exception as e:
+        conn.rollback()
+        current_app.logger.error(f"❌ Erro ao liberar reservas de estoque do pedido {venda_id}: {e}")
+        return False
+    finally:
+        cur.close()
+
+
+def expire_stock_reservations(limit: int = 200) -> Dict:
+    """
+    Expira reservas não pagas com prazo vencido e devolve as unidades.
+
+    Cada pedido é finalizado em sua própria transação curta; pedidos sendo
+    alterados por outra transação (pagamento chegando) são pulados e ficam
+    para a próxima execução.
+
+    Returns:
+        Dict com success, pedidos (quantidade de pedidos expirados) e errors
+    """
+    if not reservations_enabled():
+        return {'success': True, 'pedidos': 0, 'errors': 0}
+
+    conn = get_db()
+    cur = conn.cursor()
+    expirados = 0
+    errors = 0
+    try:
+        cur.execute("""
+            SELECT DISTINCT venda_id
+            FROM reservas_estoque
+            WHERE status = 'ativa'
+            AND expira_em < NOW()
+            LIMIT %s
+        """, (limit,))
+        venda_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+
+        for venda_id in venda_ids:
+            try:
+                cur.execute("""
+                    SELECT 1 FROM vendas WHERE id = %s FOR UPDATE SKIP LOCKED
+                """, (venda_id,))
+                if cur.fetchone() is None:
+                    conn.rollback()
+                    continue
+                # Só o que ainda está vencido: o pagamento pode ter sido confirmado
+                cur.execute("SELECT reservas_estoque_finalizar(%s, 'expirada', TRUE)", (venda_id,))
+                conn.commit()
+                expirados += 1
+            except Exception as e:
+                conn.rollback()
+                errors += 1
+                current_app.logger.error(f"❌ Erro ao expirar reservas do pedido {venda_id}: {e}")
+    finally:
+        cur.close()
+
+    if expirados:
+        current_app.logger.info(f"⏰ Reservas de estoque expiradas: {expirados} pedido(s)")
+    return {'success': errors == 0, 'pedidos': expirados, 'errors': errors}
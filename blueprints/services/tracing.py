@@ -0,0 +1,334 @@
+"""
+Tracing leve por spans
+======================
+
+Substitui logs de depuração gravados em arquivo dentro de loops: cada span
+(nome, atributos, eventos, duração) vai para um buffer circular em memória e
+é exportado em lotes por uma thread de segundo plano. O código instrumentado
+nunca faz I/O.
+
+- Desligado por padrão (TRACING_ENABLED). Desligado ou fora da amostra, o
+  span é um objeto no-op compartilhado: custo de uma chamada de função.
+- Amostragem por módulo: TRACING_SAMPLE_RATE (padrão) e TRACING_MODULES
+  ("bling_product_service=1.0,bling_order_service=0.1"; 0 desliga o módulo).
+  A decisão é tomada no span raiz e herdada pelos spans filhos.
+- Buffer limitado (TRACING_BUFFER_SIZE): se a exportação atrasar, os spans
+  mais antigos são descartados (contador tracing_spans_dropped_total).
+- Exportadores: 'log' (logger 'tracing', uma linha JSON por span) ou 'file'
+  (JSONL em TRACING_EXPORT_FILE, um append por lote).
+
+Uso:
+    from .tracing import get_tracer
+
+    tracer = get_tracer(__name__)
+
+    with tracer.span('get_product_for_bling_sync', produto_id=produto_id) as span:
+        ...
+        span.set_attribute('found', produto is not None)
+        span.add_event('query_executed')
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from collections import deque
+from typing import Dict, Optional
+
+from . import metrics
+
+logger = logging.getLogger('tracing')
+
+_spans_dropped_total = metrics.counter('tracing_spans_dropped_total', 'Spans descartados por buffer cheio')
+_spans_exported_total = metrics.counter('tracing_spans_exported_total', 'Spans exportados por exportador')
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('tracing_current_span', default=None)
+
+
+class _Settings:
+    enabled = False
+    sample_rate = 1.0
+    module_rates: Dict[str, float] = {}
+    buffer_size = 2048
+    export_interval = 5.0
+    exporter = 'log'
+    export_file = ''
+    version = 0
+
+
+_settings = _Settings()
+
+
+def _parse_module_rates(value: str) -> Dict[str, float]:
+    rates = {}
+    for item in (value or '').split(','):
+        if '=' not in item:
+            continue
+        name, rate = item.split('=', 1)
+        try:
+            rates[name.strip()] = max(0.0, min(1.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
+def configure(enabled: bool = False, sample_rate: float = 1.0, modules: str = '', buffer_size: int = 2048,
+              export_interval: float = 5.0, exporter: str = 'log', export_file: str = ''):
+    """(Re)configura o tracing deste processo"""
+    _settings.enabled = bool(enabled)
+    _settings.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+    _settings.module_rates = _parse_module_rates(modules)
+    _settings.buffer_size = max(16, int(buffer_size))
+    _settings.export_interval = max(0.1, float(export_interval))
+    _settings.exporter = exporter or 'log'
+    _settings.export_file = export_file or ''
+    _settings.version += 1
+    _buffer.resize(_settings.buffer_size)
+
+
+def init_tracing(app):
+    """Lê a configuração TRACING_* da aplicação"""
+    configure(
+        enabled=app.config.get('TRACING_ENABLED', False),
+        sample_rate=app.config.get('TRACING_SAMPLE_RATE', 1.0),
+        modules=app.config.get('TRACING_MODULES', ''),
+        buffer_size=app.config.get('TRACING_BUFFER_SIZE', 2048),
+        export_interval=app.config.get('TRACING_EXPORT_INTERVAL_SECONDS', 5.0),
+        exporter=app.config.get('TRACING_EXPORTER', 'log'),
+        export_file=app.config.get('TRACING_EXPORT_FILE', ''),
+    )
+    if _settings.enabled and not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter('%(asctime)s [tracing] %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+# =====================================================
+# Spans
+# =====================================================
+
+class _NoopSpan:
+    """Span fora da amostra: todas as operações são no-op"""
+    sampled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+    def add_event(self, name, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _UnsampledRoot(_NoopSpan):
+    """Raiz rejeitada pela amostragem: marca o contexto para os filhos também não serem amostrados"""
+    __slots__ = ('_token',)
+
+    def __enter__(self):
+        self._token = _current_span.set(_NOOP_SPAN)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        return False
+
+
+class Span:
+    """Span amostrado; registrado no buffer ao sair do bloco `with`"""
+    sampled = True
+
+    __slots__ = ('name', 'module', 'trace_id', 'span_id', 'parent_id', 'attributes', 'events',
+                 'start_time', '_start', 'duration_ms', 'status', 'error', '_token')
+
+    def __init__(self, name: str, module: str, parent: Optional['Span'], attributes: Dict):
+        self.name = name
+        self.module = module
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = attributes
+        self.events = []
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.status = 'ok'
+        self.error = None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000.0
+        if exc is not None:
+            self.status = 'error'
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        _buffer.append(self)
+        return False
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add_event(self, name, **attributes):
+        offset_ms = round((time.perf_counter() - self._start) * 1000.0, 3)
+        self.events.append({'name': name, 'offset_ms': offset_ms, 'attributes': attributes})
+
+    def to_dict(self) -> Dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'module': self.module,
+            'start': self.start_time,
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+            'events': self.events,
+        }
+
+
+class Tracer:
+    """Cria spans de um módulo (amostragem própria via TRACING_MODULES)"""
+
+    def __init__(self, module: str):
+        self.module = module
+        self._short_name = module.rsplit('.', 1)[-1]
+        self._rate = 0.0
+        self._version = -1
+
+    def _sample_rate(self) -> float:
+        if self._version != _settings.version:
+            rates = _settings.module_rates
+            rate = rates.get(self.module, rates.get(self._short_name, _settings.sample_rate))
+            self._rate = rate if _settings.enabled else 0.0
+            self._version = _settings.version
+        return self._rate
+
+    def span(self, name: str, **attributes):
+        """Context manager do span; filho do span atual, se houver"""
+        parent = _current_span.get()
+        if parent is not None:
+            # Decisão de amostragem herdada do span raiz
+            return Span(name, self.module, parent, attributes) if parent.sampled else _NOOP_SPAN
+        rate = self._sample_rate()
+        if rate <= 0.0:
+            return _NOOP_SPAN
+        if rate < 1.0 and random.random() >= rate:
+            return _UnsampledRoot()
+        return Span(name, self.module, None, attributes)
+
+
+_tracers: Dict[str, Tracer] = {}
+_tracers_lock = threading.Lock()
+
+
+def get_tracer(module: str) -> Tracer:
+    """Tracer do módulo (use __name__)"""
+    tracer = _tracers.get(module)
+    if tracer is None:
+        with _tracers_lock:
+            tracer = _tracers.setdefault(module, Tracer(module))
+    return tracer
+
+
+def current_span():
+    """Span ativo (ou o no-op, fora de span/amostra)"""
+    return _current_span.get() or _NOOP_SPAN
+
+
+# =====================================================
+# Buffer circular e exportação em lotes
+# =====================================================
+
+class _RingBuffer:
+    def __init__(self, size: int):
+        self._spans = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._exporter_pid = None
+
+    def resize(self, size: int):
+        with self._lock:
+            if self._spans.maxlen != size:
+                self._spans = deque(self._spans, maxlen=size)
+
+    def append(self, span: Span):
+        with self._lock:
+            if len(self._spans) == self._spans.maxlen:
+                _spans_dropped_total.inc()
+            self._spans.append(span)
+        self._ensure_exporter()
+
+    def drain(self):
+        with self._lock:
+            spans = list(self._spans)
+            self._spans.clear()
+        return spans
+
+    def _ensure_exporter(self):
+        # Uma thread por processo (recriada após o fork do Gunicorn)
+        pid = os.getpid()
+        if self._exporter_pid == pid:
+            return
+        with self._lock:
+            if self._exporter_pid == pid:
+                return
+            self._exporter_pid = pid
+        thread = threading.Thread(target=_export_loop, name='tracing-exporter', daemon=True)
+        thread.start()
+
+
+_buffer = _RingBuffer(_settings.buffer_size)
+
+
+def _export_batch(spans):
+    if not spans:
+        return
+    lines = [json.dumps(span.to_dict(), ensure_ascii=False, default=str) for span in spans]
+    if _settings.exporter == 'file' and _settings.export_file:
+        with open(_settings.export_file, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+    else:
+        for line in lines:
+            logger.info(line)
+    _spans_exported_total.inc(len(spans), exporter=_settings.exporter)
+
+
+def flush():
+    """Exporta imediatamente os spans pendentes (ex: ao fim de um script)"""
+    try:
+        _export_batch(_buffer.drain())
+    except Exception as e:
+        logger.warning(f"Falha ao exportar spans: {e}")
+
+
+def _export_loop():
+    while True:
+        time.sleep(_settings.export_interval)
+        flush()
+
+
+atexit.register(flush)
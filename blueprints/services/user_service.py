@@ -1,4 +1,5 @@
-from .db import get_db
+from .db import get_db, discard_db_connection
+from .schema_capabilities import has_column
 from functools import wraps
 from flask import session, redirect, url_for, flash, g
 import psycopg2
@@ -24,21 +25,9 @@ def get_user_by_firebase_uid(firebase_uid, max_retries=2):
             
             cur = conn.cursor()
             
-            # Verificar se colunas MFA existem
-            try:
-                cur.execute("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'usuarios' 
-                    AND column_name IN ('mfa_enabled', 'mfa_secret')
-                """)
-                mfa_columns_result = cur.fetchall()
-                mfa_columns = [row[0] for row in mfa_columns_result] if mfa_columns_result else []
-            except Exception as e:
-                logger.warning(f"Erro ao verificar colunas MFA: {e}")
-                mfa_columns = []
-            has_mfa_enabled = 'mfa_enabled' in mfa_columns
-            has_mfa_secret = 'mfa_secret' in mfa_columns
+            # Verificar se colunas MFA existem (cache do schema)
+            has_mfa_enabled = has_column('usuarios', 'mfa_enabled')
+            has_mfa_secret = has_column('usuarios', 'mfa_secret')
             
             # Query principal sem MFA
             cur.execute("""
@@ -94,11 +83,7 @@ def get_user_by_firebase_uid(firebase_uid, max_retries=2):
             logger.warning(f"Erro de conexão ao buscar usuário (tentativa {attempt + 1}/{max_retries + 1}): {e}")
             if attempt < max_retries:
                 # Limpar conexão inválida do g para forçar nova conexão
-                if 'db' in g:
-                    try:
-                        g.pop('db').close()
-                    except Exception:
-                        pass
+                discard_db_connection()
                 # Aguardar um pouco antes de tentar novamente
                 import time
                 time.sleep(0.1 * (attempt + 1))  # Backoff exponencial simples
@@ -457,149 +442,283 @@ def update_user_address(user_id, address_id, address_data):
         print(f"Erro ao atualizar endereço: {e}")
         return False, f"Erro ao atualizar endereço: {str(e)}"
 
-def get_user_orders(user_id):
-    """Busca todos os pedidos de um usuário com seus itens."""
+# Mapear status para português (tabela vendas)
+_STATUS_MAP_VENDAS = {
+    'pendente': 'Pendente',
+    'pendente_pagamento': 'Aguardando Pagamento',
+    'processando_envio': 'Processando Envio',
+    'enviado': 'Enviado',
+    'entregue': 'Entregue',
+    'cancelado_pelo_cliente': 'Cancelado',
+    'cancelado_pelo_vendedor': 'Cancelado',
+    'devolvido': 'Devolvido',
+    'reembolsado': 'Reembolsado'
+}
+
+# Mapear status da tabela orders
+_STATUS_MAP_ORDERS = {
+    'CRIADO': 'Criado',
+    'PENDENTE': 'Aguardando Pagamento',
+    'PAGO': 'Pago',
+    'APROVADO': 'Aprovado',
+    'CANCELADO': 'Cancelado',
+    'EXPIRADO': 'Expirado',
+    'NA TRANSPORTADORA': 'Em Trânsito',
+    'ENTREGUE': 'Entregue'
+}
+
+USER_ORDERS_DEFAULT_LIMIT = 10
+USER_ORDERS_MAX_LIMIT = 50
+
+
+def _format_date_with_timezone(date_value):
+    """Formata uma data do PostgreSQL para ISO string com timezone do Brasil (UTC-3)"""
+    from datetime import datetime, timezone, timedelta
+    if not date_value:
+        return None
+    try:
+        # Timezone do Brasil (UTC-3)
+        tz_brasil = timezone(timedelta(hours=-3))
+        
+        # Se é datetime do psycopg2, já vem como datetime
+        if hasattr(date_value, 'isoformat'):
+            dt = date_value
+        elif isinstance(date_value, str):
+            # Se já é string, tentar converter para datetime
+            # Remover 'Z' e substituir por +00:00 se necessário
+            date_str = date_value.replace('Z', '+00:00')
+            # Tentar parse ISO primeiro
+            try:
+                dt = datetime.fromisoformat(date_str)
+            except:
+                # Se falhar, tentar parse direto
+                dt = datetime.fromisoformat(date_str.replace(' ', 'T'))
+        else:
+            dt = date_value
+        
+        # Se não tem timezone, assumir UTC (PostgreSQL retorna em UTC)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        
+        # Converter para timezone do Brasil
+        dt_brasil = dt.astimezone(tz_brasil)
+        return dt_brasil.isoformat()
+    except Exception as e:
+        # Se houver erro, tentar retornar como string simples ou isoformat se for datetime
+        try:
+            if hasattr(date_value, 'isoformat'):
+                return date_value.isoformat()
+            return str(date_value) if date_value else None
+        except:
+            return None
+
+
+def encode_orders_cursor(sort_key, venda_id):
+    """Gera o cursor opaco (base64) a partir da chave de ordenação do último pedido da página."""
+    import json
+    import base64
+    raw = json.dumps({'d': sort_key, 'id': venda_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_orders_cursor(cursor):
+    """
+    Decodifica o cursor recebido do cliente.
+    
+    Returns:
+        Tupla (data_venda, venda_id); data_venda None quando a página anterior
+        terminou nos pedidos antigos sem data_venda
+    
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    import json
+    import base64
+    from datetime import datetime
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        data = json.loads(raw)
+        sort_key, venda_id = data['d'], int(data['id'])
+        if sort_key == '-infinity':
+            # Cursores gerados antes da separação dos pedidos sem data_venda
+            sort_key = None
+        if sort_key is not None:
+            if not isinstance(sort_key, str):
+                raise ValueError('chave de data inválida')
+            # Validar antes de enviar ao banco (o valor é convertido com ::timestamp)
+            datetime.fromisoformat(sort_key)
+    except (ValueError, TypeError, KeyError, UnicodeDecodeError) as e:
+        raise ValueError(f"Cursor de paginação inválido: {e}")
+    return sort_key, venda_id
+
+
+def get_user_orders_page(user_id, limit=USER_ORDERS_DEFAULT_LIMIT, cursor=None):
+    """
+    Busca uma página do histórico de pedidos do usuário com seus itens.
+    
+    Pedidos e itens vêm em uma única consulta (itens agregados com json_agg).
+    A paginação é por keyset em (data_venda, id), do mais recente para o mais
+    antigo: o cursor guarda a chave do último pedido retornado, então páginas
+    seguintes não dependem de OFFSET nem repetem pedidos criados no meio tempo.
+    A busca usa direto idx_vendas_usuario_data_venda (sem ordenar todos os
+    pedidos do usuário). Pedidos antigos sem data_venda vêm depois de todos os
+    outros, por id decrescente.
+    
+    Args:
+        user_id: ID do usuário
+        limit: Pedidos por página (None = todos; limitado a USER_ORDERS_MAX_LIMIT)
+        cursor: Cursor retornado em next_cursor da página anterior
+    
+    Returns:
+        Dict com 'orders' (lista) e 'next_cursor' (None na última página)
+    
+    Raises:
+        ValueError: Se o cursor for inválido
+    """
+    after = decode_orders_cursor(cursor) if cursor else None
+    if limit is not None:
+        limit = max(1, min(int(limit), USER_ORDERS_MAX_LIMIT))
+    
     conn = get_db()
     cur = conn.cursor()
     try:
-        cur.execute("""
+        # Duas faixas, cada uma servida por idx_vendas_usuario_data_venda já na
+        # ordem da paginação: pedidos com data_venda (keyset em data_venda, id) e,
+        # depois deles, os antigos sem data_venda (keyset em id). O LIMIT vale
+        # dentro de cada faixa, antes de juntar orders e itens.
+        limit_sql = " LIMIT %s" if limit is not None else ""
+        faixas = []
+        params = []
+        if after is None or after[0] is not None:
+            condicao = " AND (v.data_venda, v.id) < (%s::timestamp, %s)" if after else ""
+            faixas.append(f"""
+                (SELECT v.id, 0 AS faixa FROM vendas v
+                 WHERE v.usuario_id = %s AND v.data_venda IS NOT NULL{condicao}
+                 ORDER BY v.data_venda DESC, v.id DESC{limit_sql})
+            """)
+            params.append(user_id)
+            if after:
+                params.extend(after)
+            if limit is not None:
+                params.append(limit + 1)
+        condicao = " AND v.id < %s" if after and after[0] is None else ""
+        faixas.append(f"""
+            (SELECT v.id, 1 AS faixa FROM vendas v
+             WHERE v.usuario_id = %s AND v.data_venda IS NULL{condicao}
+             ORDER BY v.id DESC{limit_sql})
+        """)
+        params.append(user_id)
+        if condicao:
+            params.append(after[1])
+        if limit is not None:
+            params.append(limit + 1)
+        
+        # Sem data_venda, a data exibida é a de criação do order. A chave vai
+        # como texto para o cursor voltar ao banco sem perda de precisão.
+        query = f"""
+            WITH pagina AS (
+                {' UNION ALL '.join(faixas)}
+            ), pedidos AS (
+                SELECT 
+                    v.id,
+                    v.codigo_pedido,
+                    COALESCE(v.data_venda, o.criado_em) as data_venda,
+                    v.valor_total,
+                    v.valor_frete,
+                    v.valor_desconto,
+                    v.status_pedido,
+                    v.rua_entrega,
+                    v.numero_entrega,
+                    v.complemento_entrega,
+                    v.bairro_entrega,
+                    v.cidade_entrega,
+                    v.estado_entrega,
+                    v.cep_entrega,
+                    v.data_envio,
+                    v.data_entrega_estimada,
+                    v.data_entrega_real,
+                    v.observacoes_cliente,
+                    o.public_token,
+                    o.status as order_status,
+                    v.data_venda as chave_data,
+                    pg.faixa
+                FROM pagina pg
+                JOIN vendas v ON v.id = pg.id
+                LEFT JOIN orders o ON o.venda_id = v.id
+            )
             SELECT 
-                v.id,
-                v.codigo_pedido,
-                COALESCE(v.data_venda, o.criado_em) as data_venda,
-                v.valor_total,
-                v.valor_frete,
-                v.valor_desconto,
-                v.status_pedido,
-                v.rua_entrega,
-                v.numero_entrega,
-                v.complemento_entrega,
-                v.bairro_entrega,
-                v.cidade_entrega,
-                v.estado_entrega,
-                v.cep_entrega,
-                v.data_envio,
-                v.data_entrega_estimada,
-                v.data_entrega_real,
-                v.observacoes_cliente,
-                o.public_token,
-                o.status as order_status
-            FROM vendas v
-            LEFT JOIN orders o ON o.venda_id = v.id
-            WHERE v.usuario_id = %s
-            ORDER BY COALESCE(v.data_venda, o.criado_em) DESC NULLS LAST
-        """, (user_id,))
+                p.id,
+                p.codigo_pedido,
+                p.data_venda,
+                p.valor_total,
+                p.valor_frete,
+                p.valor_desconto,
+                p.status_pedido,
+                p.rua_entrega,
+                p.numero_entrega,
+                p.complemento_entrega,
+                p.bairro_entrega,
+                p.cidade_entrega,
+                p.estado_entrega,
+                p.cep_entrega,
+                p.data_envio,
+                p.data_entrega_estimada,
+                p.data_entrega_real,
+                p.observacoes_cliente,
+                p.public_token,
+                p.order_status,
+                p.chave_data::text,
+                COALESCE((
+                    SELECT json_agg(json_build_object(
+                        'id', iv.id,
+                        'quantidade', iv.quantidade,
+                        'preco_unitario', iv.preco_unitario,
+                        'subtotal', iv.subtotal,
+                        'nome_produto', iv.nome_produto_snapshot,
+                        'sku', iv.sku_produto_snapshot,
+                        'detalhes', iv.detalhes_produto_snapshot
+                    ) ORDER BY iv.id ASC)
+                    FROM itens_venda iv
+                    WHERE iv.venda_id = p.id
+                ), '[]'::json) as itens
+            FROM pedidos p
+        """
+        query += " ORDER BY p.faixa, p.chave_data DESC, p.id DESC"
+        if limit is not None:
+            # Um a mais para saber se existe próxima página
+            query += " LIMIT %s"
+            params.append(limit + 1)
         
+        cur.execute(query, params)
         orders = cur.fetchall()
         
+        next_cursor = None
+        if limit is not None and len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = encode_orders_cursor(orders[-1][20], orders[-1][0])
+        
         result = []
         for order in orders:
-            # Buscar itens do pedido
-            cur.execute("""
-                SELECT 
-                    iv.id,
-                    iv.quantidade,
-                    iv.preco_unitario,
-                    iv.subtotal,
-                    iv.nome_produto_snapshot,
-                    iv.sku_produto_snapshot,
-                    iv.detalhes_produto_snapshot
-                FROM itens_venda iv
-                WHERE iv.venda_id = %s
-                ORDER BY iv.id ASC
-            """, (order[0],))
-            
-            items = cur.fetchall()
             order_items = []
-            for item in items:
+            for item in order[21] or []:
                 order_items.append({
-                    'id': item[0],
-                    'quantidade': item[1],
-                    'preco_unitario': float(item[2]),
-                    'subtotal': float(item[3]),
-                    'nome_produto': item[4],
-                    'sku': item[5],
-                    'detalhes': item[6] if item[6] else {}
+                    'id': item['id'],
+                    'quantidade': item['quantidade'],
+                    'preco_unitario': float(item['preco_unitario'] or 0),
+                    'subtotal': float(item['subtotal'] or 0),
+                    'nome_produto': item['nome_produto'],
+                    'sku': item['sku'],
+                    'detalhes': item['detalhes'] if item['detalhes'] else {}
                 })
             
-            # Mapear status para português (tabela vendas)
-            status_map_vendas = {
-                'pendente': 'Pendente',
-                'pendente_pagamento': 'Aguardando Pagamento',
-                'processando_envio': 'Processando Envio',
-                'enviado': 'Enviado',
-                'entregue': 'Entregue',
-                'cancelado_pelo_cliente': 'Cancelado',
-                'cancelado_pelo_vendedor': 'Cancelado',
-                'devolvido': 'Devolvido',
-                'reembolsado': 'Reembolsado'
-            }
-            
-            # Mapear status da tabela orders
-            status_map_orders = {
-                'CRIADO': 'Criado',
-                'PENDENTE': 'Aguardando Pagamento',
-                'PAGO': 'Pago',
-                'APROVADO': 'Aprovado',
-                'CANCELADO': 'Cancelado',
-                'EXPIRADO': 'Expirado',
-                'NA TRANSPORTADORA': 'Em Trânsito',
-                'ENTREGUE': 'Entregue'
-            }
-            
             # Usar status da tabela orders se disponível, senão usar status_pedido
             order_status = order[19] if order[19] else order[6]
-            status_display = status_map_orders.get(order_status, status_map_vendas.get(order_status, order_status))
-            
-            # Formatar data_venda como ISO string com timezone
-            from datetime import datetime, timezone, timedelta
-            
-            def format_date_with_timezone(date_value):
-                """Formata uma data do PostgreSQL para ISO string com timezone do Brasil (UTC-3)"""
-                if not date_value:
-                    return None
-                try:
-                    # Timezone do Brasil (UTC-3)
-                    tz_brasil = timezone(timedelta(hours=-3))
-                    
-                    # Se é datetime do psycopg2, já vem como datetime
-                    if hasattr(date_value, 'isoformat'):
-                        dt = date_value
-                    elif isinstance(date_value, str):
-                        # Se já é string, tentar converter para datetime
-                        # Remover 'Z' e substituir por +00:00 se necessário
-                        date_str = date_value.replace('Z', '+00:00')
-                        # Tentar parse ISO primeiro
-                        try:
-                            dt = datetime.fromisoformat(date_str)
-                        except:
-                            # Se falhar, tentar parse direto
-                            dt = datetime.fromisoformat(date_str.replace(' ', 'T'))
-                    else:
-                        dt = date_value
-                    
-                    # Se não tem timezone, assumir UTC (PostgreSQL retorna em UTC)
-                    if dt.tzinfo is None:
-                        dt = dt.replace(tzinfo=timezone.utc)
-                    
-                    # Converter para timezone do Brasil
-                    dt_brasil = dt.astimezone(tz_brasil)
-                    return dt_brasil.isoformat()
-                except Exception as e:
-                    # Se houver erro, tentar retornar como string simples ou isoformat se for datetime
-                    try:
-                        if hasattr(date_value, 'isoformat'):
-                            return date_value.isoformat()
-                        return str(date_value) if date_value else None
-                    except:
-                        return None
-            
-            data_venda_str = format_date_with_timezone(order[2])
+            status_display = _STATUS_MAP_ORDERS.get(order_status, _STATUS_MAP_VENDAS.get(order_status, order_status))
             
             result.append({
                 'id': order[0],
                 'codigo_pedido': order[1],
-                'data_venda': data_venda_str,
+                'data_venda': _format_date_with_timezone(order[2]),
                 'valor_total': float(order[3]),
                 'valor_frete': float(order[4]),
                 'valor_desconto': float(order[5]),
@@ -614,9 +733,9 @@ def get_user_orders(user_id):
                     'estado': order[12],
                     'cep': order[13]
                 },
-                'data_envio': format_date_with_timezone(order[14]),
-                'data_entrega_estimada': format_date_with_timezone(order[15]),
-                'data_entrega_real': format_date_with_timezone(order[16]),
+                'data_envio': _format_date_with_timezone(order[14]),
+                'data_entrega_estimada': _format_date_with_timezone(order[15]),
+                'data_entrega_real': _format_date_with_timezone(order[16]),
                 'observacoes': order[17] or '',
                 'public_token': str(order[18]) if order[18] else None,
                 'order_status': order[19] if order[19] else None,
@@ -624,13 +743,18 @@ def get_user_orders(user_id):
             })
         
         cur.close()
-        return result
+        return {'orders': result, 'next_cursor': next_cursor}
     except Exception as e:
         print(f"Erro ao buscar pedidos do usuário {user_id}: {e}")
         import traceback
         traceback.print_exc()
         cur.close()
-        return []
+        return {'orders': [], 'next_cursor': None}
+
+
+def get_user_orders(user_id):
+    """Busca todos os pedidos de um usuário com seus itens."""
+    return get_user_orders_page(user_id, limit=None)['orders']
 
 def delete_user_address(user_id, address_id):
     """Remove (desativa) um endereço do usuário."""
@@ -0,0 +1,482 @@
+"""
+Service da caixa de entrada de webhooks
+=======================================
+
+Os webhooks do Bling e do PagBank eram processados dentro da requisição
+(consultas, chamadas às APIs, emissão de NF-e) enquanto o remetente
+esperava; rajadas de reentrega após uma queda do Bling ocupavam todos os
+workers do gunicorn. Agora:
+
+- store_webhook(): o endpoint valida a origem, grava o payload bruto em
+  webhook_inbox (ON CONFLICT (event_id) DO NOTHING) e responde 200.
+- process_next_webhook(): o worker (run_worker em job_queue_service)
+  reserva o próximo evento com FOR UPDATE SKIP LOCKED e executa o
+  processador registrado para a origem. Eventos da mesma entidade (pedido,
+  produto) só são reservados depois que os anteriores terminaram.
+- Falhas entram em retry com backoff; após WEBHOOK_INBOX_MAX_ATTEMPTS o
+  evento fica com status 'erro' (reprocessável com requeue_webhook()).
+- Eventos com processador em lote (register_webhook_batch_processor, ex:
+  stock.* do Bling) são gravados com uma janela de espera e reservados
+  juntos (process_next_webhook_batch): todos os eventos pendentes de cada
+  entidade vão para o mesmo lote, e o processador aplica só o último.
+
+Sem a tabela (sql/create-webhook-inbox.sql), store_webhook() retorna None
+e o endpoint processa na hora, como antes.
+"""
+from flask import current_app
+from typing import Dict, List, Optional, Callable, Any, Tuple
+import json
+import time
+import traceback
+import psycopg2
+import psycopg2.extras
+from .db import get_db
+from .schema_capabilities import has_table
+from .job_queue_service import _retry_delay_seconds, _worker_id
+
+
+# Processadores: origem ('bling', 'pagbank') -> função(payload) -> Dict
+_WEBHOOK_PROCESSORS: Dict[str, Callable[[Dict], Any]] = {}
+
+# Processadores em lote: (origem, eventos) -> função(lista de eventos) -> {id: resultado}
+_WEBHOOK_BATCH_PROCESSORS: Dict[Tuple[str, Tuple[str, ...]], Callable[[List[Dict]], Dict[int, Dict]]] = {}
+
+# Chave do advisory lock que serializa a reserva de lotes entre workers
+WEBHOOK_BATCH_CLAIM_LOCK_KEY = 7410002
+
+
+def register_webhook_processor(origem: str):
+    """
+    Decorator para registrar o processador dos webhooks de uma origem.
+
+    O processador recebe o payload gravado e retorna um dict (gravado em
+    resultado). Exceções fazem o evento entrar em retry.
+    """
+    def decorator(func: Callable[[Dict], Any]):
+        _WEBHOOK_PROCESSORS[origem] = func
+        return func
+    return decorator
+
+
+def register_webhook_batch_processor(origem: str, eventos: Tuple[str, ...]):
+    """
+    Decorator para registrar um processador em lote para eventos de uma origem.
+
+    O processador recebe a lista de eventos reservados (id, entidade, evento,
+    payload), em ordem de chegada, e retorna {id do evento: resultado}.
+    Exceções fazem todos os eventos do lote entrarem em retry.
+    """
+    def decorator(func: Callable[[List[Dict]], Dict[int, Dict]]):
+        _WEBHOOK_BATCH_PROCESSORS[(origem, tuple(eventos))] = func
+        return func
+    return decorator
+
+
+def _batch_exclusion_sql(alias: str) -> Tuple[str, list]:
+    """Condição SQL que exclui os eventos tratados em lote (e seus parâmetros)"""
+    conditions = []
+    params = []
+    for origem, eventos in _WEBHOOK_BATCH_PROCESSORS:
+        conditions.append(f"NOT ({alias}.origem = %s AND COALESCE({alias}.evento, '') = ANY(%s))")
+        params.extend([origem, list(eventos)])
+    return (' AND ' + ' AND '.join(conditions) if conditions else ''), params
+
+
+def store_webhook(origem: str, event_id: str, evento: Optional[str],
+                  entidade: Optional[str], payload: Dict,
+                  atraso_segundos: float = 0) -> Optional[bool]:
+    """
+    Grava um webhook recebido na caixa de entrada.
+
+    Args:
+        atraso_segundos: Janela antes do processamento (eventos agrupáveis
+            que chegam nesse intervalo são processados juntos)
+
+    Returns:
+        True se gravado, False se o evento já tinha sido recebido (reentrega),
+        None se a caixa de entrada não existe (o chamador deve processar na hora)
+    """
+    if not has_table('webhook_inbox'):
+        return None
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            INSERT INTO webhook_inbox (origem, event_id, evento, entidade, payload, processar_em)
+            VALUES (%s, %s, %s, %s, %s::jsonb, NOW() + make_interval(secs => %s))
+            ON CONFLICT (event_id) DO NOTHING
+            RETURNING id
+        """, (origem, event_id, evento, entidade, json.dumps(payload, default=str), atraso_segundos))
+        row = cur.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    if row:
+        current_app.logger.info(
+            f"📥 [WEBHOOK] Evento {row[0]} '{evento or '-'}' ({origem}) gravado na caixa de entrada "
+            f"(entidade: {entidade or '-'})"
+        )
+        return True
+
+    current_app.logger.info(f"ℹ️ [WEBHOOK] Evento {event_id} já recebido. Reentrega ignorada")
+    return False
+
+
+def _claim_next_webhook(worker_id: str) -> Optional[Dict]:
+    """
+    Reserva o próximo evento elegível.
+
+    Um evento só é elegível se nenhum evento anterior da mesma entidade
+    estiver pendente ou em processamento (ordem por entidade).
+    """
+    lease_seconds = current_app.config.get('JOB_QUEUE_LEASE_SECONDS', 300)
+    # Eventos com processador em lote só são reservados por _claim_webhook_batch
+    exclusion_sql, exclusion_params = _batch_exclusion_sql('w')
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        cur.execute(f"""
+            UPDATE webhook_inbox
+            SET status = 'processando',
+                tentativas = tentativas + 1,
+                bloqueado_ate = NOW() + make_interval(secs => %s),
+                bloqueado_por = %s
+            WHERE id = (
+                SELECT w.id
+                FROM webhook_inbox w
+                WHERE (
+                    (w.status = 'pendente' AND w.processar_em <= NOW())
+                    OR (w.status = 'processando' AND w.bloqueado_ate < NOW())
+                )
+                AND (
+                    w.entidade IS NULL
+                    OR NOT EXISTS (
+                        SELECT 1 FROM webhook_inbox a
+                        WHERE a.entidade = w.entidade
+                        AND a.id < w.id
+                        AND a.status IN ('pendente', 'processando')
+                    )
+                ){exclusion_sql}
+                ORDER BY w.id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, origem, event_id, evento, entidade, payload, tentativas, ultimo_erro
+        """, (lease_seconds, worker_id, *exclusion_params))
+
+        event = cur.fetchone()
+        conn.commit()
+        return dict(event) if event else None
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _mark_webhook_done(event_id: int, result: Dict):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE webhook_inbox
+            SET status = 'processado',
+                resultado = %s::jsonb,
+                ultimo_erro = NULL,
+                bloqueado_ate = NULL,
+                processado_em = NOW()
+            WHERE id = %s
+        """, (json.dumps(result, default=str), event_id))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _mark_webhook_failed(event: Dict, error: str):
+    """Agenda retry com backoff ou marca o evento como 'erro'"""
+    max_attempts = current_app.config.get('WEBHOOK_INBOX_MAX_ATTEMPTS', 5)
+    is_dead = event['tentativas'] >= max_attempts
+    delay = _retry_delay_seconds(event['tentativas'])
+
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE webhook_inbox
+            SET status = %s,
+                ultimo_erro = %s,
+                processar_em = NOW() + make_interval(secs => %s),
+                bloqueado_ate = NULL
+            WHERE id = %s
+        """, ('erro' if is_dead else 'pendente', error, delay, event['id']))
+        conn.commit()
+    finally:
+        cur.close()
+
+    if is_dead:
+        current_app.logger.error(
+            f"☠️ [WEBHOOK] Evento {event['id']} '{event['evento']}' com erro após "
+            f"{event['tentativas']} tentativa(s): {error}"
+        )
+    else:
+        current_app.logger.warning(
+            f"🔁 [WEBHOOK] Evento {event['id']} '{event['evento']}' falhou (tentativa "
+            f"{event['tentativas']}/{max_attempts}). Nova tentativa em {delay}s: {error}"
+        )
+
+
+def process_next_webhook(worker_id: str = None) -> bool:
+    """
+    Reserva e processa um único evento da caixa de entrada.
+
+    Deve ser chamado dentro de um app context.
+
+    Returns:
+        True se um evento foi processado, False se não havia evento elegível
+    """
+    if not has_table('webhook_inbox'):
+        return False
+
+    worker_id = worker_id or _worker_id()
+    event = _claim_next_webhook(worker_id)
+
+    if not event:
+        return False
+
+    # Lease expirado de um evento que já esgotou as tentativas
+    if event['tentativas'] > current_app.config.get('WEBHOOK_INBOX_MAX_ATTEMPTS', 5):
+        _mark_webhook_failed(event, event.get('ultimo_erro') or 'Lease expirado após esgotar tentativas')
+        return True
+
+    processor = _WEBHOOK_PROCESSORS.get(event['origem'])
+    if processor is None:
+        _mark_webhook_failed(event, f"Nenhum processador registrado para a origem '{event['origem']}'")
+        return True
+
+    started = time.time()
+    try:
+        result = processor(event['payload'] or {})
+    except Exception as e:
+        current_app.logger.debug(traceback.format_exc())
+        try:
+            get_db().rollback()
+        except Exception:
+            pass
+        _mark_webhook_failed(event, str(e) or e.__class__.__name__)
+        return True
+
+    _mark_webhook_done(event['id'], result if isinstance(result, dict) else {'result': result})
+    current_app.logger.info(
+        f"✅ [WEBHOOK] Evento {event['id']} '{event['evento'] or '-'}' ({event['origem']}) "
+        f"processado em {time.time() - started:.2f}s"
+    )
+    return True
+
+
+def _claim_webhook_batch(worker_id: str, origem: str, eventos: Tuple[str, ...]) -> List[Dict]:
+    """
+    Reserva, de uma vez, todos os eventos agrupáveis pendentes das entidades
+    que têm algum evento vencido (no máximo WEBHOOK_INBOX_BATCH_SIZE entidades).
+
+    Uma entidade só entra no lote se não houver evento anterior dela de
+    outro tipo ainda aberto. O advisory lock garante que dois workers não
+    dividam os eventos de uma entidade entre lotes concorrentes. Eventos
+    vencidos sem entidade (sem ordem a respeitar) entram junto, para que o
+    processador do lote os conclua; process_next_webhook não os pega.
+    """
+    lease_seconds = current_app.config.get('JOB_QUEUE_LEASE_SECONDS', 300)
+    batch_size = current_app.config.get('WEBHOOK_INBOX_BATCH_SIZE', 500)
+    conn = get_db()
+    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    try:
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (WEBHOOK_BATCH_CLAIM_LOCK_KEY,))
+        if not cur.fetchone()['locked']:
+            conn.rollback()
+            return []
+
+        params = {
+            'origem': origem,
+            'eventos': list(eventos),
+            'lease': lease_seconds,
+            'worker': worker_id,
+            'limite': batch_size,
+        }
+        # Agrupável: do tipo do lote e pendente (ou com lease expirado)
+        agrupavel = """
+            {a}.origem = %(origem)s AND COALESCE({a}.evento, '') = ANY(%(eventos)s)
+            AND ({a}.status = 'pendente' OR ({a}.status = 'processando' AND {a}.bloqueado_ate < NOW()))
+        """
+        cur.execute(f"""
+            UPDATE webhook_inbox
+            SET status = 'processando',
+                tentativas = tentativas + 1,
+                bloqueado_ate = NOW() + make_interval(secs => %(lease)s),
+                bloqueado_por = %(worker)s
+            WHERE id IN (
+                SELECT w.id
+                FROM webhook_inbox w
+                WHERE {agrupavel.format(a='w')}
+                AND (
+                    w.entidade IN (
+                        SELECT d.entidade
+                        FROM webhook_inbox d
+                        WHERE {agrupavel.format(a='d')}
+                        AND d.entidade IS NOT NULL
+                        AND (d.processar_em <= NOW() OR d.status = 'processando')
+                        GROUP BY d.entidade
+                        LIMIT %(limite)s
+                    )
+                    OR (w.entidade IS NULL AND (w.processar_em <= NOW() OR w.status = 'processando'))
+                )
+                AND NOT EXISTS (
+                    SELECT 1 FROM webhook_inbox a
+                    WHERE a.entidade = w.entidade
+                    AND a.id < w.id
+                    AND a.status IN ('pendente', 'processando')
+                    AND NOT ({agrupavel.format(a='a')})
+                )
+                ORDER BY w.id
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, origem, event_id, evento, entidade, payload, tentativas, ultimo_erro
+        """, params)
+
+        events = sorted((dict(row) for row in cur.fetchall()), key=lambda event: event['id'])
+        conn.commit()
+        return events
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def _mark_webhooks_done(results: Dict[int, Dict]):
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        psycopg2.extras.execute_values(cur, """
+            UPDATE webhook_inbox w
+            SET status = 'processado',
+                resultado = v.resultado::jsonb,
+                ultimo_erro = NULL,
+                bloqueado_ate = NULL,
+                processado_em = NOW()
+            FROM (VALUES %s) AS v(id, resultado)
+            WHERE w.id = v.id
+        """, [
+            (event_id, json.dumps(result, default=str))
+            for event_id, result in results.items()
+        ], page_size=max(len(results), 1))
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def process_next_webhook_batch(worker_id: str = None) -> bool:
+    """
+    Reserva e processa um lote de eventos agrupáveis (processadores em lote).
+
+    Deve ser chamado dentro de um app context.
+
+    Returns:
+        True se um lote foi processado, False se não havia eventos vencidos
+    """
+    if not _WEBHOOK_BATCH_PROCESSORS or not has_table('webhook_inbox'):
+        return False
+
+    worker_id = worker_id or _worker_id()
+    max_attempts = current_app.config.get('WEBHOOK_INBOX_MAX_ATTEMPTS', 5)
+
+    for (origem, eventos), processor in _WEBHOOK_BATCH_PROCESSORS.items():
+        events = _claim_webhook_batch(worker_id, origem, eventos)
+        if not events:
+            continue
+
+        # Lease expirado de eventos que já esgotaram as tentativas
+        for event in events:
+            if event['tentativas'] > max_attempts:
+                _mark_webhook_failed(event, event.get('ultimo_erro') or 'Lease expirado após esgotar tentativas')
+        events = [event for event in events if event['tentativas'] <= max_attempts]
+        if not events:
+            return True
+
+        started = time.time()
+        try:
+            results = processor(events)
+        except Exception as e:
+            current_app.logger.debug(traceback.format_exc())
+            try:
+                get_db().rollback()
+            except Exception:
+                pass
+            for event in events:
+                _mark_webhook_failed(event, str(e) or e.__class__.__name__)
+            return True
+
+        _mark_webhooks_done({event['id']: results.get(event['id'], {}) for event in events})
+        current_app.logger.info(
+            f"✅ [WEBHOOK] Lote de {len(events)} evento(s) {origem} "
+            f"({len({event['entidade'] for event in events})} entidade(s)) processado em "
+            f"{time.time() - started:.2f}s"
+        )
+        return True
+
+    return False
+
+
+def requeue_webhook(inbox_id: int) -> bool:
+    """
+    Reprocessa um evento com status 'erro', zerando as tentativas.
+
+    Returns:
+        True se o evento voltou para a fila
+    """
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            UPDATE webhook_inbox
+            SET status = 'pendente',
+                tentativas = 0,
+                processar_em = NOW()
+            WHERE id = %s AND status = 'erro'
+        """, (inbox_id,))
+        requeued = cur.rowcount > 0
+        conn.commit()
+        return requeued
+    finally:
+        cur.close()
+
+
+def purge_processed_webhooks() -> Dict:
+    """Apaga eventos processados há mais de WEBHOOK_INBOX_RETENTION_DAYS dias"""
+    if not has_table('webhook_inbox'):
+        return {'success': True, 'removidos': 0}
+
+    retention_days = current_app.config.get('WEBHOOK_INBOX_RETENTION_DAYS', 7)
+    conn = get_db()
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            DELETE FROM webhook_inbox
+            WHERE status = 'processado'
+            AND processado_em < NOW() - make_interval(days => %s)
+        """, (retention_days,))
+        removidos = cur.rowcount
+        conn.commit()
+        if removidos:
+            current_app.logger.info(f"🧹 [WEBHOOK] {removidos} evento(s) processado(s) removido(s) da caixa de entrada")
+        return {'success': True, 'removidos': removidos}
+    except Exception as e:
+        conn.rollback()
+        return {'success': False, 'error': str(e)}
+    finally:
+        cur.close()
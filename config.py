@@ -43,13 +43,30 @@ class Config:
         "password": os.environ.get('DB_PASSWORD', 'far111111'),
         "port": os.environ.get('DB_PORT', '5432')
     }
+    # Pool por processo: padrão = GUNICORN_THREADS + 2 (total = workers × (threads + 2))
+    DB_POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX_CONNECTIONS', int(os.environ.get('GUNICORN_THREADS', '2')) + 2))
+    # Tempo máximo de espera por uma conexão livre antes de falhar (segundos)
+    DB_POOL_CHECKOUT_TIMEOUT = float(os.environ.get('DB_POOL_CHECKOUT_TIMEOUT', '10'))
+    # Conexões ociosas há mais tempo que isso são validadas (SELECT 1) antes do uso
+    DB_POOL_IDLE_CHECK_SECONDS = float(os.environ.get('DB_POOL_IDLE_CHECK_SECONDS', '30'))
+    # Cache de tabelas/colunas existentes (information_schema); recarregado após esse tempo
+    SCHEMA_CACHE_TTL_SECONDS = float(os.environ.get('SCHEMA_CACHE_TTL_SECONDS', '300'))
+    # SSE de status de pedido (/api/orders/<token>/events): cada stream ocupa uma thread
+    # do Gunicorn por até ORDER_STATUS_STREAM_SECONDS. Desligado por padrão (0): com os
+    # workers gthread de 2 threads, streams abertos seguram as requisições da loja e as
+    # páginas de pagamento usam o polling leve (5s). Só habilitar quando /events for
+    # servido por processos próprios (fora do pool que atende a loja)
+    ORDER_STATUS_MAX_STREAMS = int(os.environ.get('ORDER_STATUS_MAX_STREAMS', '0'))
+    ORDER_STATUS_STREAM_SECONDS = float(os.environ.get('ORDER_STATUS_STREAM_SECONDS', '55'))
+    # Cache-Control max-age dos filtros da loja (revalidados via ETag após expirar)
+    STORE_FILTERS_MAX_AGE = int(os.environ.get('STORE_FILTERS_MAX_AGE', '60'))
     
     # ============================================
     # PAGBANK - GATEWAY DE PAGAMENTO
     # ============================================
     PAGBANK_API_TOKEN = os.environ.get('PAGBANK_API_TOKEN', '')
-    PAGBANK_SANDBOX_API_URL = "https://sandbox.api.pagseguro.com/orders"
-    PAGBANK_PRODUCTION_API_URL = "https://api.pagseguro.com/orders"
+    PAGBANK_SANDBOX_API_URL = os.environ.get('PAGBANK_SANDBOX_API_URL', "https://sandbox.api.pagseguro.com/orders")
+    PAGBANK_PRODUCTION_API_URL = os.environ.get('PAGBANK_PRODUCTION_API_URL', "https://api.pagseguro.com/orders")
     PAGBANK_ENVIRONMENT = os.environ.get('PAGBANK_ENVIRONMENT', 'sandbox')
     PAGBANK_NOTIFICATION_URL = os.environ.get(
         'PAGBANK_NOTIFICATION_URL',
@@ -66,6 +83,9 @@ class Config:
     BLING_CLIENT_ID = os.environ.get('BLING_CLIENT_ID', '')
     BLING_CLIENT_SECRET = os.environ.get('BLING_CLIENT_SECRET', '')
     BLING_REDIRECT_URI = os.environ.get('BLING_REDIRECT_URI', '')
+    # Endpoints da API (sobrescritos apenas em testes/benchmarks com servidores falsos)
+    BLING_API_BASE_URL = os.environ.get('BLING_API_BASE_URL', 'https://www.bling.com.br/Api/v3')
+    BLING_TOKEN_URL = os.environ.get('BLING_TOKEN_URL', 'https://www.bling.com.br/Api/v3/oauth/token')
     # URL base para webhooks e callbacks (usado com ngrok em desenvolvimento)
     NGROK_URL = os.environ.get('NGROK_URL', 'https://efractory-burdenless-kathlene.ngrok-free.dev')
     # URL do webhook do Bling (para receber notificações de estoque, produtos, etc.)
@@ -78,16 +98,109 @@ class Config:
     # Bling - Financeiro
     BLING_CATEGORIA_VENDAS_ID = os.environ.get('BLING_CATEGORIA_VENDAS_ID', '') # ID da categoria de vendas no Bling
     BLING_VENDEDOR_ID = os.environ.get('BLING_VENDEDOR_ID', '') # ID do vendedor padrão no Bling
+    
+    # Bling - Rate limit (token bucket compartilhado entre todos os processos via PostgreSQL)
+    BLING_RATE_LIMIT_PER_MINUTE = float(os.environ.get('BLING_RATE_LIMIT_PER_MINUTE', '100'))
+    BLING_RATE_LIMIT_BURST = float(os.environ.get('BLING_RATE_LIMIT_BURST', '10'))
+    # Pesos por endpoint: "/nfe=2,POST /pedidos/vendas=2" (padrão = 1 por requisição)
+    BLING_RATE_LIMIT_WEIGHTS = os.environ.get('BLING_RATE_LIMIT_WEIGHTS', '')
+    # Produtos por chamada a /estoques/saldos na reconciliação de estoque em lote
+    BLING_STOCK_BATCH_SIZE = int(os.environ.get('BLING_STOCK_BATCH_SIZE', '100'))
+    # Sincronização em lote (produtos/pedidos): itens por lote e threads que dividem o rate limit acima
+    BLING_SYNC_BATCH_SIZE = int(os.environ.get('BLING_SYNC_BATCH_SIZE', '50'))
+    BLING_SYNC_MAX_WORKERS = int(os.environ.get('BLING_SYNC_MAX_WORKERS', '4'))
+    # Reconciliação de status de pedidos: pedidos por página de /pedidos/vendas e folga da marca d'água
+    BLING_STATUS_PAGE_SIZE = int(os.environ.get('BLING_STATUS_PAGE_SIZE', '100'))
+    BLING_STATUS_OVERLAP_MINUTES = int(os.environ.get('BLING_STATUS_OVERLAP_MINUTES', '10'))
+    # Cache de dados de referência (situações, transportadoras, formas de pagamento, serviços de logística):
+    # intervalo de verificação das versões (cache_referencia_versoes) e idade máxima sem verificação
+    REFERENCE_CACHE_CHECK_SECONDS = float(os.environ.get('REFERENCE_CACHE_CHECK_SECONDS', '10'))
+    REFERENCE_CACHE_TTL_SECONDS = float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '3600'))
     BASE_URL = os.environ.get('BASE_URL', NGROK_URL if ENV == 'development' else 'https://lhama-banana.com.br')
     # URL base para webhooks e callbacks (usado com ngrok em desenvolvimento)
     NGROK_URL = os.environ.get('NGROK_URL', 'https://efractory-burdenless-kathlene.ngrok-free.dev')
     BASE_URL = os.environ.get('BASE_URL', NGROK_URL if ENV == 'development' else 'https://lhama-banana.com.br')
     
+    # ============================================
+    # FILA DE JOBS - PROCESSAMENTO EM SEGUNDO PLANO
+    # ============================================
+    # 'async': jobs gravados em fila_jobs e executados pelo worker (scripts/job_worker.py)
+    # 'inline': jobs executados na própria requisição (desenvolvimento sem worker)
+    JOB_QUEUE_MODE = os.environ.get('JOB_QUEUE_MODE', 'async').lower()
+    JOB_QUEUE_POLL_INTERVAL = float(os.environ.get('JOB_QUEUE_POLL_INTERVAL', '2'))
+    JOB_QUEUE_MAX_ATTEMPTS = int(os.environ.get('JOB_QUEUE_MAX_ATTEMPTS', '5'))
+    # Tempo máximo que um job pode ficar "executando" antes de outro worker retomá-lo
+    JOB_QUEUE_LEASE_SECONDS = int(os.environ.get('JOB_QUEUE_LEASE_SECONDS', '300'))
+    # Caixa de entrada de webhooks (sql/create-webhook-inbox.sql), drenada pelo mesmo worker
+    WEBHOOK_INBOX_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_INBOX_MAX_ATTEMPTS', '5'))
+    WEBHOOK_INBOX_RETENTION_DAYS = int(os.environ.get('WEBHOOK_INBOX_RETENTION_DAYS', '7'))
+    WEBHOOK_INBOX_PURGE_SECONDS = int(os.environ.get('WEBHOOK_INBOX_PURGE_SECONDS', '3600'))
+    # Eventos processados em lote (ex: saldo de estoque): entidades por lote
+    WEBHOOK_INBOX_BATCH_SIZE = int(os.environ.get('WEBHOOK_INBOX_BATCH_SIZE', '500'))
+    # Janela para agrupar webhooks de estoque do mesmo produto (só o último saldo é aplicado)
+    WEBHOOK_STOCK_COALESCE_SECONDS = float(os.environ.get('WEBHOOK_STOCK_COALESCE_SECONDS', '2'))
+
+    # ============================================
+    # RESERVAS DE ESTOQUE (CHECKOUT -> BAIXA NO BLING)
+    # ============================================
+    # Prazo (minutos) da reserva de pedidos não pagos, por forma de pagamento;
+    # PIX e boleto acompanham a validade do QR code (1 dia) e o vencimento (3 dias)
+    STOCK_RESERVATION_TTL_MINUTES = int(os.environ.get('STOCK_RESERVATION_TTL_MINUTES', '30'))
+    STOCK_RESERVATION_TTL_MINUTES_PIX = int(os.environ.get('STOCK_RESERVATION_TTL_MINUTES_PIX', '1440'))
+    STOCK_RESERVATION_TTL_MINUTES_BOLETO = int(os.environ.get('STOCK_RESERVATION_TTL_MINUTES_BOLETO', '4320'))
+    # Intervalo do job que expira reservas vencidas (enfileirado pelo worker; 0 desliga)
+    STOCK_RESERVATION_SWEEP_SECONDS = int(os.environ.get('STOCK_RESERVATION_SWEEP_SECONDS', '60'))
+
+    # ============================================
+    # CUPONS
+    # ============================================
+    # Intervalo do job que atualiza cupom.uso_atual a partir de cupom_usado
+    # (com sql/create-cupom-uso-slots.sql o checkout não incrementa mais o cupom; 0 desliga)
+    CUPOM_USO_SYNC_SECONDS = int(os.environ.get('CUPOM_USO_SYNC_SECONDS', '60'))
+
+    # ============================================
+    # CLIENTE HTTP - INTEGRAÇÕES EXTERNAS
+    # ============================================
+    # Sessões keep-alive por integração (bling, pagbank, melhor_envio, viacep, strapi).
+    # Ajuste por integração via ambiente: HTTP_CLIENT_<INTEGRACAO>_POOL_MAXSIZE, _CONNECT_TIMEOUT, _READ_TIMEOUT
+    HTTP_CLIENT_POOL_MAXSIZE = int(os.environ.get('HTTP_CLIENT_POOL_MAXSIZE', '10'))
+    HTTP_CLIENT_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CLIENT_CONNECT_TIMEOUT', '5'))
+    # Retries apenas de falhas de conexão (requisição não enviada)
+    HTTP_CLIENT_CONNECT_RETRIES = int(os.environ.get('HTTP_CLIENT_CONNECT_RETRIES', '2'))
+
+    # ============================================
+    # OBSERVABILIDADE - PROFILER POR REQUISIÇÃO E MÉTRICAS
+    # ============================================
+    # Conta consultas SQL, tempo no banco e chamadas externas de cada requisição
+    REQUEST_PROFILING_ENABLED = os.environ.get('REQUEST_PROFILING_ENABLED', 'true').lower() == 'true'
+    # Header Server-Timing nas respostas (db, db-max, ext-<integração>, total). Desligado por
+    # padrão: expõe a qualquer cliente o tempo no banco e nas integrações
+    REQUEST_PROFILING_SERVER_TIMING = os.environ.get('REQUEST_PROFILING_SERVER_TIMING', 'false').lower() == 'true'
+    # Log JSON apenas de requisições a partir dessa duração (0 = todas)
+    REQUEST_PROFILE_LOG_MIN_MS = float(os.environ.get('REQUEST_PROFILE_LOG_MIN_MS', '500'))
+    # /metrics: Bearer token exigido pelo endpoint (vazio = /metrics desabilitado, responde 403).
+    # Com vários workers, defina METRICS_MULTIPROC_DIR (ambiente) para agregar todos os processos
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    METRICS_FLUSH_INTERVAL_SECONDS = float(os.environ.get('METRICS_FLUSH_INTERVAL_SECONDS', '1'))
+    # Tracing por spans (buffer em memória exportado em lotes); desligado por padrão
+    TRACING_ENABLED = os.environ.get('TRACING_ENABLED', 'false').lower() == 'true'
+    # Amostragem padrão e por módulo: "bling_product_service=1.0,bling_order_service=0.1" (0 desliga)
+    TRACING_SAMPLE_RATE = float(os.environ.get('TRACING_SAMPLE_RATE', '1.0'))
+    TRACING_MODULES = os.environ.get('TRACING_MODULES', '')
+    TRACING_BUFFER_SIZE = int(os.environ.get('TRACING_BUFFER_SIZE', '2048'))
+    TRACING_EXPORT_INTERVAL_SECONDS = float(os.environ.get('TRACING_EXPORT_INTERVAL_SECONDS', '5'))
+    # 'log' (stdout, uma linha JSON por span) ou 'file' (JSONL em TRACING_EXPORT_FILE)
+    TRACING_EXPORTER = os.environ.get('TRACING_EXPORTER', 'log')
+    TRACING_EXPORT_FILE = os.environ.get('TRACING_EXPORT_FILE', '')
+
     # ============================================
     # MELHOR ENVIO - CÁLCULO DE FRETE
     # ============================================
     MELHOR_ENVIO_TOKEN = os.environ.get('MELHOR_ENVIO_TOKEN', '')
     MELHOR_ENVIO_CEP_ORIGEM = os.environ.get('MELHOR_ENVIO_CEP_ORIGEM', '13219-052')
+    # Endpoints da API (sobrescritos apenas em testes/benchmarks com servidores falsos)
+    MELHOR_ENVIO_API_URL = os.environ.get('MELHOR_ENVIO_API_URL', 'https://melhorenvio.com.br/api/v2/me')
+    VIACEP_API_URL = os.environ.get('VIACEP_API_URL', 'https://viacep.com.br/ws/{cep}/json/')
     
     # ============================================
     # ADMINISTRAÇÃO
@@ -104,6 +217,14 @@ class Config:
     # ============================================
     STRAPI_URL = os.environ.get('STRAPI_URL', 'http://strapi:1337')
     STRAPI_ENABLED = os.environ.get('STRAPI_ENABLED', 'true').lower() == 'true'
+    # Token enviado pelo webhook do Strapi (header Authorization: Bearer ...) para invalidar o cache do CMS
+    STRAPI_WEBHOOK_SECRET = os.environ.get('STRAPI_WEBHOOK_SECRET', '')
+    # Cache das páginas institucionais: servido sem consultar o banco dentro do TTL;
+    # depois disso, a versão antiga é servida enquanto revalida em segundo plano
+    CMS_CACHE_TTL_SECONDS = float(os.environ.get('CMS_CACHE_TTL_SECONDS', '300'))
+    CMS_CACHE_STALE_SECONDS = float(os.environ.get('CMS_CACHE_STALE_SECONDS', '3600'))
+    # Arquivo usado para propagar invalidações entre os workers do mesmo host
+    CMS_CACHE_INVALIDATION_FILE = os.environ.get('CMS_CACHE_INVALIDATION_FILE', '')
     
     # ============================================
     # EMAIL - SERVIÇO DE EMAILS CUSTOMIZADOS
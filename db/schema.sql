@@ -689,6 +689,7 @@ CREATE INDEX IF NOT EXISTS idx_vendas_usuario_id ON vendas (usuario_id);
 CREATE INDEX IF NOT EXISTS idx_vendas_codigo_pedido ON vendas (codigo_pedido);
 CREATE INDEX IF NOT EXISTS idx_vendas_status_pedido ON vendas (status_pedido);
 CREATE INDEX IF NOT EXISTS idx_vendas_data_venda ON vendas (data_venda);
+CREATE INDEX IF NOT EXISTS idx_vendas_usuario_data_venda ON vendas (usuario_id, data_venda DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_vendas_responsavel_id ON vendas (responsavel_id);
 CREATE INDEX IF NOT EXISTS idx_vendas_cupom_id ON vendas (cupom_id);
 
@@ -40,6 +40,11 @@ if [ "${USE_GUNICORN:-true}" = "true" ]; then
     # Criar diretório de logs se não existir
     mkdir -p /app/logs
     
+    # Métricas agregadas entre os workers (/metrics): diretório limpo a cada start
+    export METRICS_MULTIPROC_DIR=${METRICS_MULTIPROC_DIR:-/tmp/lhama_metrics}
+    rm -rf "${METRICS_MULTIPROC_DIR}"
+    mkdir -p "${METRICS_MULTIPROC_DIR}"
+    
     # Executar Gunicorn usando python -m para garantir que está no PATH correto
     exec python -m gunicorn \
         --bind "${BIND}" \
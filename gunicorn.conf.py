@@ -60,6 +60,14 @@ enable_stdio_inheritance = True
 # keyfile = '/path/to/keyfile'
 # certfile = '/path/to/certfile'
 
+def on_starting(server):
+    """Limpa os snapshots de métricas da execução anterior (METRICS_MULTIPROC_DIR)"""
+    metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+    if metrics_dir and os.path.isdir(metrics_dir):
+        for filename in os.listdir(metrics_dir):
+            if filename.startswith('metrics_') or filename == '.lock':
+                os.remove(os.path.join(metrics_dir, filename))
+
 def when_ready(server):
     """Callback quando o servidor está pronto"""
     server.log.info("🚀 Gunicorn iniciado com sucesso!")
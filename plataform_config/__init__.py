@@ -75,7 +75,12 @@ def init_app(app: Flask):
         print("⚠️  ATENÇÃO: 'DATABASE_CONFIG' não encontrado. Pool de conexões não será inicializado.")
     else:
         try:
-            init_db_pool(db_config)
+            init_db_pool(
+                db_config,
+                maxconn=app.config.get('DB_POOL_MAX_CONNECTIONS'),
+                checkout_timeout=app.config.get('DB_POOL_CHECKOUT_TIMEOUT'),
+                idle_check_seconds=app.config.get('DB_POOL_IDLE_CHECK_SECONDS')
+            )
             print("✅ Pool de conexões DB inicializado com sucesso!")
             
             # Registrar teardown para fechar conexões automaticamente
@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Auditoria de índices das consultas quentes do catálogo
+
+Executa EXPLAIN (ANALYZE, BUFFERS) sobre um conjunto de consultas reais da
+aplicação (loja, página de produto, carrinho e frete), aponta Seq Scans em
+tabelas grandes e gera uma migração idempotente com os índices compostos que
+faltam - em especial nas tabelas de link do Strapi (*_lnk), que não têm
+índices declarados em db/schema.sql.
+
+Os parâmetros das consultas (produto, carrinho, tamanhos...) são amostrados
+do próprio banco, escolhendo os valores com mais linhas associadas.
+
+Cada EXPLAIN ANALYZE roda dentro de uma transação desfeita com ROLLBACK.
+
+Uso:
+    python scripts/auditar_indices.py                              # relatório "antes"
+    python scripts/auditar_indices.py --migracao sql/novos.sql     # grava a migração sugerida
+    python scripts/auditar_indices.py --aplicar                    # cria os índices e mede de novo
+    python scripts/auditar_indices.py --aplicar --relatorio auditoria.md
+"""
+import sys
+import os
+import re
+import argparse
+import statistics
+from datetime import datetime
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from blueprints.services.db import open_dedicated_connection
+
+
+# Amostras de parâmetros: nome -> SQL que retorna um único valor
+AMOSTRAS = {
+    'nome_produto_id': """
+        SELECT pnp.nome_produto_id FROM produtos_nome_produto_lnk pnp
+        GROUP BY pnp.nome_produto_id ORDER BY COUNT(*) DESC LIMIT 1
+    """,
+    'carrinho_id': """
+        SELECT ci.carrinho_id FROM carrinho_itens ci
+        GROUP BY ci.carrinho_id ORDER BY COUNT(*) DESC LIMIT 1
+    """,
+    'tamanho_ids': "SELECT ARRAY(SELECT id FROM tamanho WHERE ativo = TRUE ORDER BY id LIMIT 2)",
+    'estampa_ids': "SELECT ARRAY(SELECT id FROM estampa WHERE ativo = TRUE ORDER BY id LIMIT 2)",
+}
+
+# Consultas capturadas dos caminhos quentes (mesmo SQL das rotas)
+CONSULTAS = [
+    {
+        'nome': 'filtros_categorias',
+        'origem': 'api/loja.py get_store_filters (fallback)',
+        'sql': """
+            SELECT DISTINCT c.id, c.nome
+            FROM categorias c
+            JOIN nome_produto_categoria_lnk npc ON c.id = npc.categoria_id
+            JOIN nome_produto np ON npc.nome_produto_id = np.id
+            JOIN produtos_nome_produto_lnk pnp ON np.id = pnp.nome_produto_id
+            JOIN produtos p ON pnp.produto_id = p.id
+            WHERE c.ativo = TRUE AND np.ativo = TRUE AND p.ativo = TRUE
+            ORDER BY c.nome
+        """,
+    },
+    {
+        'nome': 'filtros_tamanhos',
+        'origem': 'api/loja.py get_store_filters (fallback)',
+        'sql': """
+            SELECT DISTINCT t.id, t.nome, COALESCE(t.ordem_exibicao, 999) as ordem
+            FROM tamanho t
+            JOIN produtos_tamanho_lnk pt ON t.id = pt.tamanho_id
+            JOIN produtos p ON pt.produto_id = p.id
+            WHERE t.ativo = TRUE AND p.ativo = TRUE
+            ORDER BY ordem, t.nome
+        """,
+    },
+    {
+        'nome': 'filtros_estampas',
+        'origem': 'api/loja.py get_store_filters (fallback)',
+        'sql': """
+            SELECT DISTINCT e.id, e.nome, e.imagem_url, e.sexo, COALESCE(e.ordem_exibicao, 999) as ordem
+            FROM estampa e
+            JOIN produtos_estampa_lnk pe ON e.id = pe.estampa_id
+            JOIN produtos p ON pe.produto_id = p.id
+            WHERE e.ativo = TRUE AND p.ativo = TRUE
+            ORDER BY ordem, e.nome
+        """,
+    },
+    {
+        'nome': 'base_products_listagem',
+        'origem': 'api/loja.py get_base_products (consulta legada)',
+        'sql': """
+            SELECT DISTINCT
+                np.id AS nome_produto_id,
+                np.nome AS nome_produto,
+                COALESCE(c.nome, 'Sem categoria') AS categoria_nome,
+                (SELECT ip.url FROM produtos p_var
+                 JOIN produtos_nome_produto_lnk pnp_var ON p_var.id = pnp_var.produto_id
+                 JOIN imagens_produto_produto_lnk ipl ON p_var.id = ipl.produto_id
+                 JOIN imagens_produto ip ON ipl.imagem_produto_id = ip.id
+                 WHERE pnp_var.nome_produto_id = np.id
+                 ORDER BY COALESCE(ipl.imagem_produto_ord, ip.ordem, 0) ASC
+                 LIMIT 1) AS imagem_representativa_url,
+                (SELECT MIN(COALESCE(p_var.preco_promocional, p_var.preco_venda)) FROM produtos p_var JOIN produtos_nome_produto_lnk pnp_var ON p_var.id = pnp_var.produto_id WHERE pnp_var.nome_produto_id = np.id AND p_var.ativo = TRUE) AS preco_minimo
+            FROM nome_produto np
+            LEFT JOIN nome_produto_categoria_lnk npc ON np.id = npc.nome_produto_id
+            LEFT JOIN categorias c ON npc.categoria_id = c.id
+            WHERE np.ativo = TRUE
+            AND EXISTS (
+                SELECT 1 FROM produtos p JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
+                WHERE pnp.nome_produto_id = np.id AND p.ativo = TRUE
+                AND EXISTS (SELECT 1 FROM produtos_tamanho_lnk pt WHERE pt.produto_id = p.id AND pt.tamanho_id = ANY(%(tamanho_ids)s))
+                AND EXISTS (SELECT 1 FROM produtos_estampa_lnk pe WHERE pe.produto_id = p.id AND pe.estampa_id = ANY(%(estampa_ids)s))
+            )
+            ORDER BY np.nome
+        """,
+    },
+    {
+        'nome': 'produto_detalhe',
+        'origem': 'api/produto.py get_product_details',
+        'sql': """
+            SELECT np.id, np.nome, np.descricao, COALESCE(c.nome, 'Sem categoria') AS categoria_nome
+            FROM nome_produto np
+            LEFT JOIN nome_produto_categoria_lnk npc ON np.id = npc.nome_produto_id
+            LEFT JOIN categorias c ON npc.categoria_id = c.id
+            WHERE np.id = %(nome_produto_id)s
+        """,
+    },
+    {
+        'nome': 'produto_variacoes',
+        'origem': 'api/produto.py get_product_details',
+        'sql': """
+            SELECT
+                p.id, e.id, e.nome, t.id, t.nome, p.preco_venda, p.estoque,
+                ARRAY_AGG(JSON_BUILD_OBJECT('id', ip.id, 'url', ip.url) ORDER BY COALESCE(ipl.imagem_produto_ord, ip.ordem, 0)) FILTER (WHERE ip.id IS NOT NULL)
+            FROM produtos p
+            LEFT JOIN produtos_estampa_lnk pe ON p.id = pe.produto_id
+            LEFT JOIN estampa e ON pe.estampa_id = e.id
+            LEFT JOIN produtos_tamanho_lnk pt ON p.id = pt.produto_id
+            LEFT JOIN tamanho t ON pt.tamanho_id = t.id
+            LEFT JOIN imagens_produto_produto_lnk ipl ON p.id = ipl.produto_id
+            LEFT JOIN imagens_produto ip ON ipl.imagem_produto_id = ip.id
+            LEFT JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
+            WHERE pnp.nome_produto_id = %(nome_produto_id)s
+            GROUP BY p.id, e.id, t.id, p.preco_venda, p.estoque
+            ORDER BY e.nome, t.nome
+        """,
+    },
+    {
+        'nome': 'carrinho_itens',
+        'origem': 'api/carrinho.py view_cart',
+        'sql': """
+            SELECT
+                ci.id, ci.quantidade, p.id, p.codigo_sku, np.nome, e.nome, t.nome,
+                (SELECT ip.url FROM imagens_produto_produto_lnk ipl JOIN imagens_produto ip ON ipl.imagem_produto_id = ip.id WHERE ipl.produto_id = p.id ORDER BY COALESCE(ipl.imagem_produto_ord, ip.ordem, 0) ASC LIMIT 1) AS image_url
+            FROM carrinho_itens ci
+            JOIN produtos p ON ci.produto_id = p.id
+            LEFT JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
+            LEFT JOIN nome_produto np ON pnp.nome_produto_id = np.id
+            LEFT JOIN produtos_estampa_lnk pe ON p.id = pe.produto_id
+            LEFT JOIN estampa e ON pe.estampa_id = e.id
+            LEFT JOIN produtos_tamanho_lnk pt ON p.id = pt.produto_id
+            LEFT JOIN tamanho t ON pt.tamanho_id = t.id
+            WHERE ci.carrinho_id = %(carrinho_id)s
+            ORDER BY ci.id ASC
+        """,
+    },
+    {
+        'nome': 'frete_itens_carrinho',
+        'origem': 'api/shipping.py calculate_shipping',
+        'sql': """
+            SELECT ci.quantidade, p.codigo_sku, p.peso_kg, np.nome
+            FROM carrinho_itens ci
+            JOIN produtos p ON ci.produto_id = p.id
+            LEFT JOIN produtos_nome_produto_lnk pnp ON p.id = pnp.produto_id
+            LEFT JOIN nome_produto np ON pnp.nome_produto_id = np.id
+            WHERE ci.carrinho_id = %(carrinho_id)s
+        """,
+    },
+]
+
+# Índices compostos esperados nas tabelas de link do Strapi (os dois sentidos
+# do relacionamento; imagens na ordem usada pelo ORDER BY da imagem principal)
+INDICES_LINK = [
+    ('produtos_nome_produto_lnk', ('produto_id', 'nome_produto_id')),
+    ('produtos_nome_produto_lnk', ('nome_produto_id', 'produto_id')),
+    ('produtos_estampa_lnk', ('produto_id', 'estampa_id')),
+    ('produtos_estampa_lnk', ('estampa_id', 'produto_id')),
+    ('produtos_tamanho_lnk', ('produto_id', 'tamanho_id')),
+    ('produtos_tamanho_lnk', ('tamanho_id', 'produto_id')),
+    ('imagens_produto_produto_lnk', ('produto_id', 'imagem_produto_ord', 'imagem_produto_id')),
+    ('imagens_produto_produto_lnk', ('imagem_produto_id',)),
+    ('nome_produto_categoria_lnk', ('nome_produto_id', 'categoria_id')),
+    ('nome_produto_categoria_lnk', ('categoria_id', 'nome_produto_id')),
+]
+
+# Condições de igualdade em Filter / Hash Cond / Join Filter: "(alias.coluna = ..."
+# (comparações com booleanos, como ativo = true, não justificam índice)
+_CONDICAO_RE = re.compile(r'\(?(?:(\w+)\.)?(\w+)\s*=\s*(?!true\b|false\b)')
+
+
+def resolver_amostras(cur):
+    valores = {}
+    for nome, sql in AMOSTRAS.items():
+        try:
+            cur.execute(sql)
+            row = cur.fetchone()
+            valores[nome] = row[0] if row else None
+        except Exception as e:
+            print(f"   ⚠️ Amostra '{nome}' indisponível: {e}")
+            valores[nome] = None
+        cur.connection.rollback()
+    return valores
+
+
+def parametros_da_consulta(sql, amostras):
+    nomes = re.findall(r'%\((\w+)\)s', sql)
+    faltando = [n for n in nomes if amostras.get(n) in (None, [])]
+    return {n: amostras.get(n) for n in nomes}, faltando
+
+
+def explicar(cur, sql, params):
+    """Executa EXPLAIN (ANALYZE, BUFFERS) e retorna o plano (JSON) - sempre com ROLLBACK"""
+    try:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params or None)
+        return cur.fetchone()[0][0]
+    finally:
+        cur.connection.rollback()
+
+
+def percorrer_plano(node, pai=None):
+    yield node, pai
+    for filho in node.get('Plans', []):
+        yield from percorrer_plano(filho, node)
+
+
+def linhas_estimadas(cur, tabelas):
+    if not tabelas:
+        return {}
+    cur.execute("""
+        SELECT c.relname, c.reltuples::bigint
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema() AND c.relname = ANY(%s)
+    """, (list(tabelas),))
+    return dict(cur.fetchall())
+
+
+def colunas_da_condicao(texto, alias):
+    colunas = []
+    for alias_encontrado, coluna in _CONDICAO_RE.findall(texto or ''):
+        if alias_encontrado in ('', alias) and coluna not in colunas:
+            colunas.append(coluna)
+    return colunas
+
+
+def seq_scans(cur, plano, min_linhas):
+    """Seq Scans em tabelas com pelo menos min_linhas e as colunas usadas para filtrar/juntar"""
+    encontrados = []
+    nodes = list(percorrer_plano(plano['Plan']))
+    tamanhos = linhas_estimadas(cur, {n['Relation Name'] for n, _ in nodes if n.get('Node Type') == 'Seq Scan'})
+    for node, pai in nodes:
+        if node.get('Node Type') != 'Seq Scan':
+            continue
+        tabela = node['Relation Name']
+        linhas = tamanhos.get(tabela, 0)
+        if linhas < min_linhas:
+            continue
+        alias = node.get('Alias', tabela)
+        condicoes = [node.get('Filter')]
+        if pai is not None:
+            condicoes += [pai.get('Hash Cond'), pai.get('Join Filter'), pai.get('Merge Cond')]
+            # Hash Join: a condição fica no avô (o pai do Seq Scan é o nó Hash)
+            if pai.get('Node Type') == 'Hash':
+                for n, p in nodes:
+                    if n is pai and p is not None:
+                        condicoes.append(p.get('Hash Cond'))
+        colunas = []
+        for condicao in condicoes:
+            for coluna in colunas_da_condicao(condicao, alias):
+                if coluna not in colunas:
+                    colunas.append(coluna)
+        encontrados.append({
+            'tabela': tabela,
+            'linhas': linhas,
+            'loops': node.get('Actual Loops', 1),
+            'removidas': node.get('Rows Removed by Filter', 0),
+            'colunas': tuple(colunas[:3]),
+        })
+    return encontrados
+
+
+def medir(cur, consultas, amostras, repeticoes, min_linhas):
+    resultados = {}
+    for consulta in consultas:
+        params, faltando = parametros_da_consulta(consulta['sql'], amostras)
+        if faltando:
+            resultados[consulta['nome']] = {'pulada': f"sem amostra para {', '.join(faltando)}"}
+            continue
+        try:
+            tempos = []
+            plano = None
+            for _ in range(repeticoes):
+                plano = explicar(cur, consulta['sql'], params)
+                tempos.append(plano['Execution Time'])
+            topo = plano['Plan']
+            resultados[consulta['nome']] = {
+                'mediana_ms': statistics.median(tempos),
+                'buffers_hit': topo.get('Shared Hit Blocks', 0),
+                'buffers_read': topo.get('Shared Read Blocks', 0),
+                'seq_scans': seq_scans(cur, plano, min_linhas),
+            }
+        except Exception as e:
+            cur.connection.rollback()
+            resultados[consulta['nome']] = {'pulada': f"erro: {e}"}
+    return resultados
+
+
+def indices_existentes(cur, tabela):
+    """Colunas (em ordem) de cada índice não parcial da tabela"""
+    cur.execute("""
+        SELECT i.indexrelid::regclass::text,
+               array_agg(a.attname ORDER BY k.ord)
+        FROM pg_index i
+        CROSS JOIN LATERAL unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+        WHERE i.indrelid = to_regclass(%s) AND i.indpred IS NULL
+        GROUP BY i.indexrelid
+    """, (tabela,))
+    return [tuple(colunas) for _, colunas in cur.fetchall()]
+
+
+def colunas_existentes(cur, tabela):
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+    """, (tabela,))
+    return {row[0] for row in cur.fetchall()}
+
+
+def indices_faltantes(cur, resultados):
+    """Candidatos (link do Strapi + colunas dos Seq Scans) não cobertos por índice existente"""
+    candidatos = list(INDICES_LINK)
+    for resultado in resultados.values():
+        for scan in resultado.get('seq_scans', []):
+            if scan['colunas'] and (scan['tabela'], scan['colunas']) not in candidatos:
+                candidatos.append((scan['tabela'], scan['colunas']))
+
+    faltantes = []
+    for tabela, colunas in candidatos:
+        existentes = colunas_existentes(cur, tabela)
+        if not existentes or not set(colunas) <= existentes:
+            continue
+        cobertos = indices_existentes(cur, tabela)
+        if any(indice[:len(colunas)] == colunas for indice in cobertos):
+            continue
+        faltantes.append((tabela, colunas))
+    cur.connection.rollback()
+    return faltantes
+
+
+def nome_indice(tabela, colunas):
+    return f"idx_{tabela}_{'_'.join(colunas)}"[:63]
+
+
+def gerar_migracao(faltantes):
+    linhas = [
+        "-- =====================================================",
+        "-- ÍNDICES SUGERIDOS PELA AUDITORIA (scripts/auditar_indices.py)",
+        "-- =====================================================",
+        f"-- Gerado em {datetime.now():%Y-%m-%d %H:%M}. Idempotente: cada índice só é",
+        "-- criado se a tabela existir (as tabelas *_lnk são criadas pelo Strapi).",
+        "",
+    ]
+    if not faltantes:
+        linhas.append("-- Nenhum índice faltante encontrado.")
+        return "\n".join(linhas) + "\n"
+    linhas.append("DO $$")
+    linhas.append("BEGIN")
+    for tabela, colunas in faltantes:
+        linhas.append(f"    IF to_regclass('{tabela}') IS NOT NULL THEN")
+        linhas.append(f"        CREATE INDEX IF NOT EXISTS {nome_indice(tabela, colunas)}")
+        linhas.append(f"        ON {tabela} ({', '.join(colunas)});")
+        linhas.append("    END IF;")
+    linhas.append("END $$;")
+    linhas.append("")
+    for tabela in sorted({t for t, _ in faltantes}):
+        linhas.append(f"ANALYZE {tabela};")
+    return "\n".join(linhas) + "\n"
+
+
+def aplicar_migracao(sql):
+    conn = open_dedicated_connection(autocommit=True)
+    try:
+        cur = conn.cursor()
+        cur.execute(sql)
+        cur.close()
+    finally:
+        conn.close()
+
+
+def formatar_relatorio(antes, depois, faltantes):
+    linhas = ["# Auditoria de índices", ""]
+    linhas.append("| Consulta | Antes (ms) | Depois (ms) | Variação | Buffers (hit/read) | Seq Scans em tabelas grandes |")
+    linhas.append("|---|---:|---:|---:|---|---|")
+    for consulta in CONSULTAS:
+        nome = consulta['nome']
+        a = antes.get(nome, {})
+        if 'pulada' in a:
+            linhas.append(f"| {nome} | - | - | - | - | pulada ({a['pulada']}) |")
+            continue
+        d = (depois or {}).get(nome, {})
+        referencia = d if 'mediana_ms' in d else a
+        depois_ms = f"{d['mediana_ms']:.2f}" if 'mediana_ms' in d else '-'
+        variacao = '-'
+        if 'mediana_ms' in d and a['mediana_ms'] > 0:
+            variacao = f"{(d['mediana_ms'] - a['mediana_ms']) / a['mediana_ms'] * 100:+.0f}%"
+        scans = ', '.join(f"{s['tabela']} ({s['linhas']} linhas, {s['loops']}x)" for s in referencia['seq_scans']) or 'nenhum'
+        linhas.append(
+            f"| {nome} | {a['mediana_ms']:.2f} | {depois_ms} | {variacao} | "
+            f"{referencia['buffers_hit']}/{referencia['buffers_read']} | {scans} |"
+        )
+    linhas.append("")
+    linhas.append("## Índices faltantes")
+    linhas.append("")
+    if faltantes:
+        for tabela, colunas in faltantes:
+            linhas.append(f"- `{tabela} ({', '.join(colunas)})`")
+    else:
+        linhas.append("- nenhum")
+    return "\n".join(linhas) + "\n"
+
+
+def main():
+    """Audita índices das consultas quentes do catálogo"""
+    parser = argparse.ArgumentParser(description='Auditoria de índices com EXPLAIN (ANALYZE, BUFFERS)')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Execuções por consulta (usa a mediana)')
+    parser.add_argument('--min-linhas', type=int, default=1000,
+                        help='Só reporta Seq Scan em tabelas com pelo menos N linhas (estimativa do pg_class)')
+    parser.add_argument('--migracao', help='Arquivo onde gravar a migração sugerida')
+    parser.add_argument('--aplicar', action='store_true', help='Cria os índices faltantes e mede novamente')
+    parser.add_argument('--relatorio', help='Arquivo onde gravar o relatório (markdown)')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    with app.app_context():
+        conn = open_dedicated_connection(autocommit=False)
+        try:
+            cur = conn.cursor()
+            print("🔎 Auditando índices das consultas do catálogo...")
+            print("=" * 60)
+            amostras = resolver_amostras(cur)
+            antes = medir(cur, CONSULTAS, amostras, args.repeticoes, args.min_linhas)
+            faltantes = indices_faltantes(cur, antes)
+            migracao = gerar_migracao(faltantes)
+
+            if args.migracao:
+                with open(args.migracao, 'w', encoding='utf-8') as f:
+                    f.write(migracao)
+                print(f"📝 Migração gravada em {args.migracao}")
+
+            depois = None
+            if args.aplicar and faltantes:
+                print(f"🛠️  Criando {len(faltantes)} índice(s)...")
+                aplicar_migracao(migracao)
+                depois = medir(cur, CONSULTAS, amostras, args.repeticoes, args.min_linhas)
+            cur.close()
+        finally:
+            conn.close()
+
+    relatorio = formatar_relatorio(antes, depois, faltantes)
+    print(relatorio)
+    if not args.migracao and faltantes:
+        print(migracao)
+    if args.relatorio:
+        with open(args.relatorio, 'w', encoding='utf-8') as f:
+            f.write(relatorio)
+        print(f"📄 Relatório gravado em {args.relatorio}")
+    print("=" * 60)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
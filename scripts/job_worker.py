@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Worker da fila de jobs em segundo plano (tabela fila_jobs)
+
+Executa os jobs enfileirados pelos webhooks e pelo checkout (sincronização de
+pedidos com o Bling, emissão de NF-e, contas a receber, estoque) e processa
+os webhooks do Bling/PagBank gravados na caixa de entrada (webhook_inbox).
+Para mais vazão, rode mais de um worker: eventos do mesmo pedido/produto
+continuam sendo processados em ordem.
+
+Uso:
+    python scripts/job_worker.py              # loop contínuo
+    python scripts/job_worker.py --once       # processa o que houver e sai
+    python scripts/job_worker.py --stats      # mostra a situação da fila
+    python scripts/job_worker.py --requeue 42 # reenfileira job da dead-letter
+    python scripts/job_worker.py --requeue-webhook 7 # reprocessa webhook com erro
+"""
+import sys
+import os
+import argparse
+
+# Adicionar o diretório raiz ao path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from blueprints.services.job_queue_service import run_worker, get_queue_stats, requeue_dead_job
+from blueprints.services.webhook_inbox_service import requeue_webhook
+
+
+def main():
+    """Inicia o worker de jobs"""
+    parser = argparse.ArgumentParser(description='Worker da fila de jobs do LhamaBanana')
+    parser.add_argument('--once', action='store_true', help='Processa os jobs disponíveis e encerra')
+    parser.add_argument('--poll-interval', type=float, default=None,
+                        help='Intervalo de polling quando a fila está vazia (segundos)')
+    parser.add_argument('--stats', action='store_true', help='Mostra jobs não concluídos por tipo/status')
+    parser.add_argument('--requeue', type=int, metavar='JOB_ID', help='Reenfileira um job da dead-letter')
+    parser.add_argument('--requeue-webhook', type=int, metavar='INBOX_ID',
+                        help='Reprocessa um webhook da caixa de entrada com status erro')
+    args = parser.parse_args()
+
+    app = create_app()
+
+    if args.stats:
+        with app.app_context():
+            stats = get_queue_stats()
+        print("📊 Fila de jobs (não concluídos)")
+        print("=" * 60)
+        for row in stats.get('jobs', []):
+            print(f"   {row['tipo']:<35} {row['status']:<12} {row['total']:>6}  desde {row['mais_antigo']}")
+        if not stats.get('jobs'):
+            print("   Fila vazia")
+        return 0
+
+    if args.requeue:
+        with app.app_context():
+            requeued = requeue_dead_job(args.requeue)
+        if requeued:
+            print(f"✅ Job {args.requeue} reenfileirado")
+            return 0
+        print(f"❌ Job {args.requeue} não está na dead-letter (ou já existe job ativo com a mesma chave)")
+        return 1
+
+    if args.requeue_webhook:
+        with app.app_context():
+            requeued = requeue_webhook(args.requeue_webhook)
+        if requeued:
+            print(f"✅ Webhook {args.requeue_webhook} volta a ser processado")
+            return 0
+        print(f"❌ Webhook {args.requeue_webhook} não está com status erro")
+        return 1
+
+    run_worker(app, poll_interval=args.poll_interval, once=args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,52 +1,77 @@
 #!/usr/bin/env python3
 """
 Script para sincronizar estoque do Bling para o banco local
+
+Usa a reconciliação em lote (/estoques/saldos): uma chamada por lote de
+produtos, UPDATE apenas dos estoques que mudaram e checkpoint a cada lote.
+Se for interrompido, a próxima execução continua de onde parou.
+
+Uso:
+    python scripts/sync_estoque_bling.py              # retoma execução interrompida (se houver)
+    python scripts/sync_estoque_bling.py --reiniciar  # recomeça do primeiro produto
+    python scripts/sync_estoque_bling.py --lote 50    # produtos por chamada ao Bling
 """
 import sys
 import os
+import argparse
 
 # Adicionar o diretório raiz ao path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import create_app
-from blueprints.services.bling_product_service import sync_stock_from_bling
+from blueprints.services.bling_product_service import sync_stock_from_bling_bulk
+
+
+def print_progress(progresso):
+    total = progresso['total'] or 1
+    percentual = progresso['processados'] * 100 // total
+    print(f"   ⏳ {progresso['processados']}/{progresso['total']} ({percentual}%) - "
+          f"{progresso['alterados']} alterados, {progresso['erros']} erros")
+
 
 def main():
     """Sincroniza estoque do Bling para o banco local"""
+    parser = argparse.ArgumentParser(description='Sincroniza estoque do Bling para o banco local (em lote)')
+    parser.add_argument('--reiniciar', action='store_true', help='Ignora checkpoint e recomeça do início')
+    parser.add_argument('--lote', type=int, default=None, help='Produtos por chamada ao Bling (padrão: BLING_STOCK_BATCH_SIZE)')
+    args = parser.parse_args()
+    
     app = create_app()
     
     with app.app_context():
         print("🔄 Sincronizando estoque do Bling para o banco local...")
         print("=" * 60)
         
-        # Sincronizar todos os produtos
-        result = sync_stock_from_bling(produto_id=None)
+        result = sync_stock_from_bling_bulk(
+            batch_size=args.lote,
+            resume=not args.reiniciar,
+            progress_callback=print_progress
+        )
         
-        if result.get('success') or (isinstance(result.get('success'), int) and result.get('success', 0) > 0):
-            success_count = result.get('success', 0) if isinstance(result.get('success'), int) else len([r for r in result.get('results', []) if r.get('success')])
-            total = result.get('total', 0)
-            errors = result.get('errors', 0)
-            
-            print(f"✅ Sincronização concluída!")
-            print(f"   Total de produtos: {total}")
-            print(f"   Sincronizados com sucesso: {success_count}")
-            print(f"   Erros: {errors}")
-            
-            if result.get('results'):
-                print("\n📦 Produtos sincronizados:")
-                for r in result.get('results', []):
-                    if r.get('success'):
-                        print(f"   - Produto ID {r.get('produto_id')}: Estoque = {r.get('estoque_novo', 'N/A')}")
-            
-            if errors > 0:
-                print("\n⚠️  Alguns produtos tiveram erros:")
-                for r in result.get('results', []):
-                    if not r.get('success'):
-                        print(f"   - Produto ID {r.get('produto_id')}: {r.get('error', 'Erro desconhecido')}")
-        else:
+        if result.get('success') is False:
             print(f"❌ Erro na sincronização: {result.get('error', 'Erro desconhecido')}")
+            if result.get('resumable'):
+                print("   Execute novamente para continuar a partir do último lote confirmado.")
             return 1
         
+        print(f"✅ Sincronização concluída!")
+        print(f"   Total de produtos: {result.get('total', 0)}")
+        print(f"   Sincronizados com sucesso: {result.get('success', 0)}")
+        print(f"   Estoques alterados: {result.get('changed', 0)}")
+        print(f"   Erros: {result.get('errors', 0)}")
+        
+        alterados = [r for r in result.get('results', []) if r.get('success')]
+        if alterados:
+            print("\n📦 Estoques alterados:")
+            for r in alterados:
+                print(f"   - Produto ID {r.get('produto_id')}: {r.get('estoque_anterior')} -> {r.get('estoque_novo')}")
+        
+        if result.get('errors', 0) > 0:
+            print("\n⚠️  Alguns produtos tiveram erros:")
+            for r in result.get('results', []):
+                if not r.get('success'):
+                    print(f"   - Produto ID {r.get('produto_id')}: {r.get('error', 'Erro desconhecido')}")
+        
         print("=" * 60)
         return 0
 
@@ -0,0 +1,42 @@
+-- =====================================================
+-- COLUNAS USADAS NA CRIAÇÃO DO PEDIDO (CHECKOUT)
+-- =====================================================
+-- O schema do Strapi não tem vendas.usuario_id nem itens_venda.venda_id /
+-- itens_venda.produto_id. Antes, create_order_and_items criava essas colunas
+-- com ALTER TABLE no meio do checkout; agora o pedido é criado em uma única
+-- transação, sem DDL, e o checkout recusa o pedido se elas não existirem.
+--
+-- O mesmo vale para pagamentos.venda_id, pagbank_order_id e pagbank_charge_id,
+-- antes criadas por create_payment_entry. Este script roda antes de
+-- atualizar-checkout-pagamentos.sql: se pagamentos ainda não existe, aquele
+-- script a cria já com essas colunas.
+
+ALTER TABLE vendas
+ADD COLUMN IF NOT EXISTS usuario_id INTEGER REFERENCES usuarios(id) ON DELETE SET NULL;
+
+ALTER TABLE itens_venda
+ADD COLUMN IF NOT EXISTS venda_id INTEGER REFERENCES vendas(id) ON DELETE CASCADE;
+
+ALTER TABLE itens_venda
+ADD COLUMN IF NOT EXISTS produto_id INTEGER REFERENCES produtos(id) ON DELETE SET NULL;
+
+CREATE INDEX IF NOT EXISTS idx_vendas_usuario_id ON vendas (usuario_id);
+CREATE INDEX IF NOT EXISTS idx_itens_venda_venda_id ON itens_venda (venda_id);
+CREATE INDEX IF NOT EXISTS idx_itens_venda_produto_id ON itens_venda (produto_id);
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.tables
+        WHERE table_name = 'pagamentos'
+    ) THEN
+        ALTER TABLE pagamentos
+        ADD COLUMN IF NOT EXISTS venda_id INTEGER REFERENCES vendas(id) ON DELETE CASCADE;
+        ALTER TABLE pagamentos ADD COLUMN IF NOT EXISTS pagbank_order_id VARCHAR(100);
+        ALTER TABLE pagamentos ADD COLUMN IF NOT EXISTS pagbank_charge_id VARCHAR(100);
+        
+        CREATE INDEX IF NOT EXISTS idx_pagamentos_venda_id ON pagamentos (venda_id);
+        CREATE INDEX IF NOT EXISTS idx_pagamentos_order_id ON pagamentos (pagbank_order_id);
+        CREATE INDEX IF NOT EXISTS idx_pagamentos_charge_id ON pagamentos (pagbank_charge_id);
+    END IF;
+END $$;
@@ -0,0 +1,75 @@
+-- =====================================================
+-- ÍNDICES DAS TABELAS DE LINK DO STRAPI (CATÁLOGO)
+-- =====================================================
+-- As consultas da loja, página de produto, carrinho e frete juntam as
+-- tabelas de link do Strapi (produtos_nome_produto_lnk, produtos_estampa_lnk,
+-- produtos_tamanho_lnk, imagens_produto_produto_lnk e
+-- nome_produto_categoria_lnk) nos dois sentidos do relacionamento. Sem índice,
+-- cada junção vira Seq Scan.
+--
+-- Levantado com scripts/auditar_indices.py (EXPLAIN ANALYZE das consultas
+-- reais, com relatório antes/depois).
+--
+-- Idempotente: as tabelas são criadas pelo Strapi, então cada índice só é
+-- criado se a tabela existir e se nenhum índice existente (ex: o *_lnk_uq do
+-- próprio Strapi) já começar pelas mesmas colunas.
+
+DO $$
+DECLARE
+    indice RECORD;
+BEGIN
+    FOR indice IN
+        SELECT * FROM (VALUES
+            ('produtos_nome_produto_lnk', ARRAY['produto_id', 'nome_produto_id']),
+            ('produtos_nome_produto_lnk', ARRAY['nome_produto_id', 'produto_id']),
+            ('produtos_estampa_lnk', ARRAY['produto_id', 'estampa_id']),
+            ('produtos_estampa_lnk', ARRAY['estampa_id', 'produto_id']),
+            ('produtos_tamanho_lnk', ARRAY['produto_id', 'tamanho_id']),
+            ('produtos_tamanho_lnk', ARRAY['tamanho_id', 'produto_id']),
+            ('imagens_produto_produto_lnk', ARRAY['produto_id', 'imagem_produto_ord', 'imagem_produto_id']),
+            ('imagens_produto_produto_lnk', ARRAY['imagem_produto_id']),
+            ('nome_produto_categoria_lnk', ARRAY['nome_produto_id', 'categoria_id']),
+            ('nome_produto_categoria_lnk', ARRAY['categoria_id', 'nome_produto_id'])
+        ) AS t(tabela, colunas)
+    LOOP
+        IF to_regclass(indice.tabela) IS NULL THEN
+            RAISE NOTICE 'Tabela % não existe, pulando', indice.tabela;
+            CONTINUE;
+        END IF;
+
+        -- Já existe índice cujas primeiras colunas são as mesmas?
+        IF EXISTS (
+            SELECT 1
+            FROM pg_index i
+            WHERE i.indrelid = to_regclass(indice.tabela)
+            AND i.indpred IS NULL
+            AND (
+                SELECT array_agg(a.attname::text ORDER BY k.ord)
+                FROM unnest(i.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                WHERE k.ord <= array_length(indice.colunas, 1)
+            ) = indice.colunas
+        ) THEN
+            RAISE NOTICE 'Índice em %(%) já existe, pulando', indice.tabela, array_to_string(indice.colunas, ', ');
+            CONTINUE;
+        END IF;
+
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON %I (%s)',
+            left('idx_' || indice.tabela || '_' || array_to_string(indice.colunas, '_'), 63),
+            indice.tabela,
+            (SELECT string_agg(quote_ident(c), ', ') FROM unnest(indice.colunas) AS c)
+        );
+        RAISE NOTICE 'Criado índice em %(%)', indice.tabela, array_to_string(indice.colunas, ', ');
+    END LOOP;
+END $$;
+
+-- Atualizar estatísticas para o planejador passar a usar os índices
+DO $$
+BEGIN
+    IF to_regclass('produtos_nome_produto_lnk') IS NOT NULL THEN ANALYZE produtos_nome_produto_lnk; END IF;
+    IF to_regclass('produtos_estampa_lnk') IS NOT NULL THEN ANALYZE produtos_estampa_lnk; END IF;
+    IF to_regclass('produtos_tamanho_lnk') IS NOT NULL THEN ANALYZE produtos_tamanho_lnk; END IF;
+    IF to_regclass('imagens_produto_produto_lnk') IS NOT NULL THEN ANALYZE imagens_produto_produto_lnk; END IF;
+    IF to_regclass('nome_produto_categoria_lnk') IS NOT NULL THEN ANALYZE nome_produto_categoria_lnk; END IF;
+END $$;
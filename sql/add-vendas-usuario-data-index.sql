@@ -0,0 +1,14 @@
+-- =====================================================
+-- ÍNDICE DO HISTÓRICO DE PEDIDOS DO USUÁRIO
+-- =====================================================
+-- /api/orders (página /perfil) lista os pedidos do usuário do mais recente
+-- para o mais antigo, paginando por keyset em (data_venda, id). Este índice
+-- atende o filtro por usuario_id já na ordem da paginação: a condição do
+-- keyset é sobre as próprias colunas (sem COALESCE), e os pedidos antigos
+-- sem data_venda são buscados à parte (data_venda IS NULL, por id).
+--
+-- Os itens de cada página vêm agregados na mesma consulta e usam
+-- idx_itens_venda_venda_id (db/schema.sql).
+
+CREATE INDEX IF NOT EXISTS idx_vendas_usuario_data_venda
+ON vendas (usuario_id, data_venda DESC, id DESC);
@@ -70,6 +70,7 @@ BEGIN
             
             pagbank_transaction_id VARCHAR(100) UNIQUE,
             pagbank_order_id VARCHAR(100),
+            pagbank_charge_id VARCHAR(100),
             
             forma_pagamento_tipo VARCHAR(50) NOT NULL CHECK (forma_pagamento_tipo IN ('CREDIT_CARD', 'PIX', 'BOLETO')),
             bandeira_cartao VARCHAR(50),
@@ -95,6 +96,8 @@ BEGIN
         CREATE INDEX idx_pagamentos_venda_id ON pagamentos (venda_id);
         CREATE INDEX idx_pagamentos_transaction_id ON pagamentos (pagbank_transaction_id);
         CREATE INDEX idx_pagamentos_status ON pagamentos (status_pagamento);
+        CREATE INDEX idx_pagamentos_order_id ON pagamentos (pagbank_order_id);
+        CREATE INDEX idx_pagamentos_charge_id ON pagamentos (pagbank_charge_id);
         
         RAISE NOTICE 'Tabela pagamentos criada';
     ELSE
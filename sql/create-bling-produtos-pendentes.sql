@@ -0,0 +1,132 @@
+-- =====================================================
+-- SINCRONIZAÇÃO INCREMENTAL DE PRODUTOS COM O BLING
+-- =====================================================
+-- bling_produtos.payload_hash: SHA-256 do payload enviado ao Bling na última
+-- sincronização bem-sucedida (sem o bloco de estoque, que é ajustado via
+-- /estoques). Se o payload atual tiver o mesmo hash, o PUT é pulado.
+--
+-- bling_produtos_pendentes: "dirty set" alimentado por triggers. Edições no
+-- Strapi (nome, descrição, estampa, tamanho, vínculos), mudanças de preço e
+-- de estoque marcam o produto; sync_pending_products_to_bling processa só os
+-- marcados. produto_id = 0 significa "varrer todos" (alterações em tabelas
+-- de dimensão: estampa, tamanho).
+--
+-- A marcação atualiza marcado_em; a sincronização só remove a linha se ela
+-- não foi marcada de novo enquanto o produto era enviado.
+--
+-- Se as tabelas/colunas não existirem, a sincronização envia tudo (como antes).
+
+ALTER TABLE bling_produtos ADD COLUMN IF NOT EXISTS payload_hash VARCHAR(64);
+
+COMMENT ON COLUMN bling_produtos.payload_hash IS 'SHA-256 do payload (sem estoque) da última sincronização bem-sucedida';
+
+CREATE TABLE IF NOT EXISTS bling_produtos_pendentes (
+    produto_id INTEGER PRIMARY KEY, -- 0 = sincronizar todos
+    marcado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE bling_produtos_pendentes IS 'Produtos alterados aguardando envio ao Bling (0 = todos)';
+
+-- -----------------------------------------------------
+-- Função genérica de marcação
+-- TG_ARGV[0] = coluna com o id; TG_ARGV[1] = 'produto' ou 'nome_produto'
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION bling_marcar_produto_pendente()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_ids := ARRAY[(to_jsonb(NEW) ->> TG_ARGV[0])::INTEGER];
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_ids := COALESCE(v_ids, '{}') || (to_jsonb(OLD) ->> TG_ARGV[0])::INTEGER;
+    END IF;
+
+    IF TG_ARGV[1] = 'produto' THEN
+        INSERT INTO bling_produtos_pendentes (produto_id)
+        SELECT DISTINCT id FROM unnest(v_ids) AS id
+        WHERE id IS NOT NULL
+        ON CONFLICT (produto_id) DO UPDATE SET marcado_em = NOW();
+    ELSE
+        INSERT INTO bling_produtos_pendentes (produto_id)
+        SELECT DISTINCT pnp.produto_id
+        FROM produtos_nome_produto_lnk pnp
+        WHERE pnp.nome_produto_id = ANY(v_ids)
+        AND pnp.produto_id IS NOT NULL
+        ON CONFLICT (produto_id) DO UPDATE SET marcado_em = NOW();
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION bling_marcar_todos_pendentes()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO bling_produtos_pendentes (produto_id)
+    VALUES (0)
+    ON CONFLICT (produto_id) DO UPDATE SET marcado_em = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------
+-- Triggers (apenas para tabelas/colunas que existem)
+-- -----------------------------------------------------
+DO $$
+DECLARE
+    r RECORD;
+    v_colunas TEXT;
+BEGIN
+    -- Tabela, coluna com o id, tipo, colunas do payload observadas no UPDATE
+    FOR r IN SELECT * FROM (VALUES
+        ('produtos', 'id', 'produto',
+         'codigo_sku,ncm,cest,preco_venda,estoque,ativo,peso_kg,dimensoes_largura,dimensoes_altura,dimensoes_comprimento'),
+        ('produtos_nome_produto_lnk', 'produto_id', 'produto', NULL),
+        ('produtos_estampa_lnk', 'produto_id', 'produto', NULL),
+        ('produtos_tamanho_lnk', 'produto_id', 'produto', NULL),
+        ('nome_produto', 'id', 'nome_produto', 'nome,descricao_curta')
+    ) AS t(tabela, coluna, tipo, colunas_update)
+    LOOP
+        IF to_regclass('public.' || r.tabela) IS NOT NULL THEN
+            v_colunas := NULL;
+            IF r.colunas_update IS NOT NULL THEN
+                SELECT string_agg(quote_ident(column_name), ', ')
+                INTO v_colunas
+                FROM information_schema.columns
+                WHERE table_schema = 'public'
+                AND table_name = r.tabela
+                AND column_name = ANY(string_to_array(r.colunas_update, ','));
+            END IF;
+
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_bling_pendente_%s ON %I', r.tabela, r.tabela);
+            EXECUTE format(
+                'CREATE TRIGGER trg_bling_pendente_%s AFTER INSERT OR DELETE OR UPDATE%s ON %I '
+                'FOR EACH ROW EXECUTE FUNCTION bling_marcar_produto_pendente(%L, %L)',
+                r.tabela,
+                CASE WHEN v_colunas IS NOT NULL THEN ' OF ' || v_colunas ELSE '' END,
+                r.tabela, r.coluna, r.tipo
+            );
+        END IF;
+    END LOOP;
+
+    -- Nomes de estampa/tamanho fazem parte do nome do produto no Bling
+    FOR r IN SELECT * FROM (VALUES ('estampa'), ('tamanho')) AS t(tabela)
+    LOOP
+        IF to_regclass('public.' || r.tabela) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_bling_pendente_%s ON %I', r.tabela, r.tabela);
+            EXECUTE format(
+                'CREATE TRIGGER trg_bling_pendente_%s AFTER UPDATE OF nome ON %I '
+                'FOR EACH STATEMENT EXECUTE FUNCTION bling_marcar_todos_pendentes()',
+                r.tabela, r.tabela
+            );
+        END IF;
+    END LOOP;
+END $$;
+
+-- Carga inicial: a primeira sincronização incremental varre todos os produtos
+-- (e grava o payload_hash de cada um)
+INSERT INTO bling_produtos_pendentes (produto_id)
+VALUES (0)
+ON CONFLICT (produto_id) DO NOTHING;
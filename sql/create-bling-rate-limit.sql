@@ -0,0 +1,28 @@
+-- =====================================================
+-- RATE LIMIT COMPARTILHADO DA API DO BLING
+-- =====================================================
+-- Token bucket usado por make_bling_api_request() em todos os processos
+-- (workers do Gunicorn, worker da fila de jobs e scripts/).
+--
+-- Cada requisição executa um único UPDATE que reabastece o bucket pelo tempo
+-- decorrido (taxa_por_segundo) e debita o peso da requisição. Saldo negativo
+-- indica espera: o processo dorme -tokens / taxa_por_segundo segundos.
+--
+-- A aplicação não cria a tabela: sem ela, cada processo usa um bucket local.
+-- A capacidade e a taxa são reaplicadas a partir de BLING_RATE_LIMIT_BURST e
+-- BLING_RATE_LIMIT_PER_MINUTE quando cada processo inicia.
+
+CREATE TABLE IF NOT EXISTS bling_rate_limit (
+    nome VARCHAR(50) PRIMARY KEY, -- Ex: 'bling_api'
+    tokens DOUBLE PRECISION NOT NULL, -- Saldo no instante atualizado_em (pode ser negativo)
+    capacidade DOUBLE PRECISION NOT NULL, -- Burst máximo
+    taxa_por_segundo DOUBLE PRECISION NOT NULL, -- Reposição (100 req/min = 1.6667)
+    atualizado_em TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+INSERT INTO bling_rate_limit (nome, tokens, capacidade, taxa_por_segundo)
+VALUES ('bling_api', 10, 10, 100.0 / 60.0)
+ON CONFLICT (nome) DO NOTHING;
+
+COMMENT ON TABLE bling_rate_limit IS 'Token bucket compartilhado entre processos para a API do Bling (~100 req/min por conta)';
+COMMENT ON COLUMN bling_rate_limit.tokens IS 'Saldo de tokens em atualizado_em; negativo = requisições reservadas aguardando reposição';
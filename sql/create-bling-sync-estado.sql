@@ -0,0 +1,33 @@
+-- =====================================================
+-- CHECKPOINTS DAS SINCRONIZAÇÕES EM LOTE COM O BLING
+-- =====================================================
+-- Uma linha por sincronização em lote ('estoque', 'produtos', 'pedidos').
+-- Cada lote processado é confirmado junto com o checkpoint (ultimo_id = último
+-- id confirmado: maior produtos.id em 'estoque'/'produtos', menor vendas.id em
+-- 'pedidos', que vai do mais recente para o mais antigo), então uma execução
+-- interrompida é retomada do ponto em que parou.
+--
+-- Sincronizações incrementais por data ('pedidos_status') guardam em
+-- marca_dagua o instante até o qual as alterações do Bling já foram
+-- aplicadas; a próxima execução só consulta o que mudou depois disso.
+--
+-- A tabela também é criada automaticamente no primeiro uso
+-- (ensure_bling_sync_estado_table em bling_product_service.py).
+
+CREATE TABLE IF NOT EXISTS bling_sync_estado (
+    nome VARCHAR(50) PRIMARY KEY, -- 'estoque', 'produtos', 'pedidos' ou 'pedidos_status'
+    status VARCHAR(20) NOT NULL DEFAULT 'concluido', -- 'em_andamento' ou 'concluido'
+    ultimo_id INTEGER NOT NULL DEFAULT 0, -- Último id confirmado (0 = início)
+    total INTEGER NOT NULL DEFAULT 0,
+    processados INTEGER NOT NULL DEFAULT 0,
+    alterados INTEGER NOT NULL DEFAULT 0,
+    erros INTEGER NOT NULL DEFAULT 0,
+    iniciado_em TIMESTAMP,
+    atualizado_em TIMESTAMP DEFAULT NOW(),
+    concluido_em TIMESTAMP,
+    marca_dagua TIMESTAMP -- High-water mark das sincronizações incrementais por data
+);
+
+ALTER TABLE bling_sync_estado ADD COLUMN IF NOT EXISTS marca_dagua TIMESTAMP;
+
+COMMENT ON TABLE bling_sync_estado IS 'Progresso/checkpoint das sincronizações em lote com o Bling (retomáveis)';
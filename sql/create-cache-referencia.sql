@@ -0,0 +1,60 @@
+-- =====================================================
+-- VERSÕES DO CACHE DE DADOS DE REFERÊNCIA
+-- =====================================================
+-- Situações do Bling, transportadoras, formas de pagamento e serviços de
+-- logística ficam em memória em cada worker (reference_cache.py). Cada
+-- conjunto tem um contador de versão aqui; os workers comparam as versões
+-- a cada REFERENCE_CACHE_CHECK_SECONDS (uma query para todos os conjuntos)
+-- e recarregam apenas o que mudou.
+--
+-- As versões são incrementadas:
+-- - pelas triggers abaixo, em qualquer escrita em bling_situacoes e
+--   transportadoras_bling (sincronizações, mapeamentos editados à mão);
+-- - por invalidate_reference_cache() (conjuntos vindos da API do Bling).
+--
+-- Sem esta tabela, o cache expira apenas por REFERENCE_CACHE_TTL_SECONDS.
+
+CREATE TABLE IF NOT EXISTS cache_referencia_versoes (
+    nome VARCHAR(50) PRIMARY KEY,
+    versao BIGINT NOT NULL DEFAULT 0,
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE cache_referencia_versoes IS 'Contadores de versão dos dados de referência em cache nos workers';
+
+INSERT INTO cache_referencia_versoes (nome)
+VALUES ('situacoes'), ('transportadoras'), ('formas_pagamento'), ('servicos_logisticos')
+ON CONFLICT (nome) DO NOTHING;
+
+-- TG_ARGV[0] = nome do conjunto
+CREATE OR REPLACE FUNCTION cache_referencia_incrementar_versao()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO cache_referencia_versoes (nome, versao, atualizado_em)
+    VALUES (TG_ARGV[0], 1, NOW())
+    ON CONFLICT (nome) DO UPDATE SET
+        versao = cache_referencia_versoes.versao + 1,
+        atualizado_em = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT * FROM (VALUES
+        ('bling_situacoes', 'situacoes'),
+        ('transportadoras_bling', 'transportadoras')
+    ) AS t(tabela, conjunto)
+    LOOP
+        IF to_regclass('public.' || r.tabela) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_cache_referencia_%s ON %I', r.tabela, r.tabela);
+            EXECUTE format(
+                'CREATE TRIGGER trg_cache_referencia_%s AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I '
+                'FOR EACH STATEMENT EXECUTE FUNCTION cache_referencia_incrementar_versao(%L)',
+                r.tabela, r.tabela, r.conjunto
+            );
+        END IF;
+    END LOOP;
+END $$;
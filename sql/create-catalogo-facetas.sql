@@ -0,0 +1,27 @@
+-- =====================================================
+-- FACETAS DA LOJA PRÉ-CALCULADAS (/api/store/filters)
+-- =====================================================
+-- Linha única com o JSON de filtros da loja (categorias, tamanhos, estampas,
+-- tecidos, sexos e faixas de preço, com a quantidade de produtos base em cada
+-- valor). É recalculada junto com o catálogo materializado
+-- (catalogo_produtos), na mesma transação que consome os pendentes.
+--
+-- versao aumenta a cada recálculo; etag é o hash do JSON e é enviado no
+-- header ETag, permitindo revalidação (304) pelo navegador e pelo nginx.
+--
+-- Requer sql/create-catalogo-produtos.sql.
+
+CREATE TABLE IF NOT EXISTS catalogo_facetas (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versao BIGINT NOT NULL DEFAULT 0,
+    dados JSONB NOT NULL DEFAULT '{}',
+    etag VARCHAR(64),
+    gerado_em TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE catalogo_facetas IS 'Filtros da loja pré-calculados a partir de catalogo_produtos (linha única)';
+
+-- Forçar o cálculo inicial das facetas na próxima leitura do catálogo
+INSERT INTO catalogo_produtos_pendentes (nome_produto_id)
+VALUES (0)
+ON CONFLICT (nome_produto_id) DO NOTHING;
@@ -0,0 +1,166 @@
+-- =====================================================
+-- CATÁLOGO MATERIALIZADO DA LOJA (/api/base_products)
+-- =====================================================
+-- Projeção desnormalizada com uma linha por produto base (nome_produto):
+-- preços mínimos, imagem representativa, quantidade de variações ativas e
+-- arrays de facetas (tamanho, estampa, tecido, sexo, categoria) para que a
+-- listagem da loja seja uma única leitura indexada.
+--
+-- Atualização incremental:
+--   Triggers nas tabelas de produtos (alimentadas pelo Strapi, webhooks de
+--   estoque do Bling e sincronizações de preço) registram os produtos base
+--   afetados em catalogo_produtos_pendentes. A aplicação reprocessa apenas
+--   esses produtos antes de ler o catálogo (blueprints/services/catalog_service.py).
+--   nome_produto_id = 0 em catalogo_produtos_pendentes significa "reprocessar tudo"
+--   (usado para alterações em tabelas de dimensão: estampa, tamanho, tecidos...).
+--
+-- Filtros combinados (ex: tamanho M + estampa X) precisam casar na mesma
+-- variação, como na query original: catalogo_variacoes guarda as facetas de
+-- cada variação ativa, reprocessada junto com o produto base.
+--
+-- Se a tabela não existir, /api/base_products usa a query original.
+
+CREATE TABLE IF NOT EXISTS catalogo_produtos (
+    nome_produto_id INTEGER PRIMARY KEY,
+    nome VARCHAR(255),
+    descricao TEXT,
+    categoria_id INTEGER,
+    categoria_nome VARCHAR(255),
+    categoria_ids INTEGER[] NOT NULL DEFAULT '{}',
+    imagem_url TEXT,
+    preco_minimo NUMERIC(10, 2),
+    preco_minimo_original NUMERIC(10, 2),
+    precos NUMERIC(10, 2)[] NOT NULL DEFAULT '{}', -- Preços efetivos distintos das variações ativas
+    variacoes_count INTEGER NOT NULL DEFAULT 0,
+    tamanho_ids INTEGER[] NOT NULL DEFAULT '{}',
+    estampa_ids INTEGER[] NOT NULL DEFAULT '{}',
+    tecido_ids INTEGER[] NOT NULL DEFAULT '{}',
+    tecidos_texto TEXT[] NOT NULL DEFAULT '{}', -- Fallback: campo estampa.tecido (VARCHAR)
+    sexos TEXT[] NOT NULL DEFAULT '{}',
+    atualizado_em TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_nome ON catalogo_produtos (nome);
+CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_categorias ON catalogo_produtos USING GIN (categoria_ids);
+CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_tamanhos ON catalogo_produtos USING GIN (tamanho_ids);
+CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_estampas ON catalogo_produtos USING GIN (estampa_ids);
+CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_tecidos ON catalogo_produtos USING GIN (tecido_ids);
+CREATE INDEX IF NOT EXISTS idx_catalogo_produtos_sexos ON catalogo_produtos USING GIN (sexos);
+
+CREATE TABLE IF NOT EXISTS catalogo_variacoes (
+    nome_produto_id INTEGER NOT NULL,
+    produto_id INTEGER NOT NULL,
+    preco NUMERIC(10, 2), -- Preço efetivo (promocional ou venda)
+    tamanho_ids INTEGER[] NOT NULL DEFAULT '{}',
+    estampa_ids INTEGER[] NOT NULL DEFAULT '{}',
+    tecido_ids INTEGER[] NOT NULL DEFAULT '{}',
+    tecidos_texto TEXT[] NOT NULL DEFAULT '{}',
+    sexos TEXT[] NOT NULL DEFAULT '{}',
+    PRIMARY KEY (nome_produto_id, produto_id)
+);
+
+CREATE TABLE IF NOT EXISTS catalogo_produtos_pendentes (
+    nome_produto_id INTEGER PRIMARY KEY, -- 0 = reprocessar o catálogo inteiro
+    marcado_em TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE catalogo_produtos IS 'Projeção da listagem da loja: uma linha por produto base com preços mínimos e facetas';
+COMMENT ON TABLE catalogo_variacoes IS 'Facetas por variação ativa do catálogo (filtros combinados casam na mesma variação)';
+COMMENT ON TABLE catalogo_produtos_pendentes IS 'Produtos base alterados aguardando reprocessamento do catálogo (0 = todos)';
+
+-- -----------------------------------------------------
+-- Função genérica de marcação
+-- TG_ARGV[0] = coluna com o id; TG_ARGV[1] = 'produto' ou 'nome_produto'
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION catalogo_marcar_pendente()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_ids INTEGER[];
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        v_ids := ARRAY[(to_jsonb(NEW) ->> TG_ARGV[0])::INTEGER];
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        v_ids := COALESCE(v_ids, '{}') || (to_jsonb(OLD) ->> TG_ARGV[0])::INTEGER;
+    END IF;
+
+    IF TG_ARGV[1] = 'produto' THEN
+        INSERT INTO catalogo_produtos_pendentes (nome_produto_id)
+        SELECT DISTINCT pnp.nome_produto_id
+        FROM produtos_nome_produto_lnk pnp
+        WHERE pnp.produto_id = ANY(v_ids)
+        AND pnp.nome_produto_id IS NOT NULL
+        ON CONFLICT (nome_produto_id) DO NOTHING;
+    ELSE
+        INSERT INTO catalogo_produtos_pendentes (nome_produto_id)
+        SELECT DISTINCT id FROM unnest(v_ids) AS id
+        WHERE id IS NOT NULL
+        ON CONFLICT (nome_produto_id) DO NOTHING;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Alterações em tabelas de dimensão (nomes, sexo, imagens, tecidos...) reprocessam tudo
+CREATE OR REPLACE FUNCTION catalogo_marcar_completo()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO catalogo_produtos_pendentes (nome_produto_id)
+    VALUES (0)
+    ON CONFLICT (nome_produto_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------
+-- Triggers (apenas para tabelas que existem)
+-- -----------------------------------------------------
+DO $$
+DECLARE
+    r RECORD;
+BEGIN
+    -- Tabelas por produto (variação): tabela, coluna, tipo, colunas observadas no UPDATE
+    FOR r IN SELECT * FROM (VALUES
+        ('produtos', 'id', 'produto', 'ativo, preco_venda, preco_promocional'),
+        ('produtos_tamanho_lnk', 'produto_id', 'produto', NULL),
+        ('produtos_estampa_lnk', 'produto_id', 'produto', NULL),
+        ('imagens_produto_produto_lnk', 'produto_id', 'produto', NULL),
+        ('produtos_nome_produto_lnk', 'nome_produto_id', 'nome_produto', NULL),
+        ('nome_produto_categoria_lnk', 'nome_produto_id', 'nome_produto', NULL),
+        ('nome_produto', 'id', 'nome_produto', 'nome, descricao, ativo')
+    ) AS t(tabela, coluna, tipo, colunas_update)
+    LOOP
+        IF to_regclass('public.' || r.tabela) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_catalogo_%s ON %I', r.tabela, r.tabela);
+            EXECUTE format(
+                'CREATE TRIGGER trg_catalogo_%s AFTER INSERT OR DELETE OR UPDATE%s ON %I '
+                'FOR EACH ROW EXECUTE FUNCTION catalogo_marcar_pendente(%L, %L)',
+                r.tabela,
+                CASE WHEN r.colunas_update IS NOT NULL THEN ' OF ' || r.colunas_update ELSE '' END,
+                r.tabela, r.coluna, r.tipo
+            );
+        END IF;
+    END LOOP;
+
+    -- Tabelas de dimensão: reprocessamento completo (uma marcação por comando)
+    FOR r IN SELECT * FROM (VALUES
+        ('estampa'), ('estampa_tecido_lnk'), ('tecidos'), ('tamanho'),
+        ('categorias'), ('imagens_produto')
+    ) AS t(tabela)
+    LOOP
+        IF to_regclass('public.' || r.tabela) IS NOT NULL THEN
+            EXECUTE format('DROP TRIGGER IF EXISTS trg_catalogo_%s ON %I', r.tabela, r.tabela);
+            EXECUTE format(
+                'CREATE TRIGGER trg_catalogo_%s AFTER INSERT OR UPDATE OR DELETE ON %I '
+                'FOR EACH STATEMENT EXECUTE FUNCTION catalogo_marcar_completo()',
+                r.tabela, r.tabela
+            );
+        END IF;
+    END LOOP;
+END $$;
+
+-- Carga inicial: a primeira leitura do catálogo reprocessa tudo
+INSERT INTO catalogo_produtos_pendentes (nome_produto_id)
+VALUES (0)
+ON CONFLICT (nome_produto_id) DO NOTHING;
@@ -0,0 +1,122 @@
+-- =====================================================
+-- USO DE CUPONS SEM LINHA QUENTE
+-- =====================================================
+-- O limite global de um cupom (cupom.uso_maximo) é dividido em até 16
+-- "slots" (cupom_uso_slots), cada um com uma fração do limite. O checkout
+-- reivindica o cupom em um único comando (coupon_service.claim_cupom):
+-- valida ativo/validade, limite por usuário e por CPF, pega um slot com
+-- saldo com FOR UPDATE SKIP LOCKED, incrementa o slot e grava cupom_usado.
+-- Checkouts simultâneos do mesmo cupom usam slots diferentes em vez de
+-- esperar pela linha de cupom; a soma dos limites dos slots é exatamente
+-- uso_maximo, então o limite nunca é ultrapassado. Um slot fica travado até
+-- o commit do checkout que o usou: se nenhum slot com saldo estiver livre
+-- (mais checkouts do cupom em andamento do que slots, ou poucos slots com
+-- saldo perto do limite), a reivindicação espera pelos slots travados em vez
+-- de recusar o cupom, e só falha se nenhum ainda tiver saldo.
+--
+-- Sem uso_maximo (ilimitado) o cupom não tem slots: só os limites por
+-- usuário/CPF se aplicam.
+--
+-- Os slots são recriados quando o cupom é criado ou uso_maximo muda
+-- (trigger abaixo), contando os usos já registrados em cupom_usado.
+-- cupom.uso_atual (exibido no Strapi) passa a ser atualizado pelo job
+-- 'cupom.atualizar_uso_atual' (CUPOM_USO_SYNC_SECONDS).
+--
+-- As regras do cupom ficam em memória (cache de referência 'cupons'),
+-- invalidado por trigger quando o Strapi edita a tabela cupom.
+
+CREATE TABLE IF NOT EXISTS cupom_uso_slots (
+    cupom_id INTEGER NOT NULL REFERENCES cupom(id) ON DELETE CASCADE,
+    slot SMALLINT NOT NULL,
+    limite INTEGER NOT NULL CHECK (limite >= 0),
+    usos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (cupom_id, slot),
+    CHECK (usos <= limite)
+);
+
+COMMENT ON TABLE cupom_uso_slots IS 'Limite global de uso de cada cupom dividido em slots (sem disputa por linha)';
+
+-- Consultas por usuário no checkout e na validação
+CREATE INDEX IF NOT EXISTS idx_cupom_usado_cupom_usuario ON cupom_usado (cupom_id, usuario_id);
+
+-- -----------------------------------------------------
+-- (Re)cria os slots de um cupom a partir de uso_maximo e dos usos registrados
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION cupom_uso_slots_preparar(p_cupom_id INTEGER)
+RETURNS VOID AS $$
+DECLARE
+    v_maximo INTEGER;
+    v_usados INTEGER;
+    v_slots INTEGER;
+    v_base INTEGER;
+    v_resto INTEGER;
+BEGIN
+    -- Espera os checkouts com slot travado terminarem antes de contar os usos
+    DELETE FROM cupom_uso_slots WHERE cupom_id = p_cupom_id;
+
+    SELECT uso_maximo INTO v_maximo FROM cupom WHERE id = p_cupom_id;
+    IF v_maximo IS NULL THEN
+        RETURN;
+    END IF;
+
+    SELECT COUNT(*) INTO v_usados FROM cupom_usado WHERE cupom_id = p_cupom_id;
+
+    v_slots := LEAST(16, GREATEST(v_maximo, 0));
+    IF v_slots = 0 THEN
+        RETURN;
+    END IF;
+    v_base := v_maximo / v_slots;
+    v_resto := v_maximo % v_slots;
+
+    -- Usos já registrados preenchem os slots em ordem
+    INSERT INTO cupom_uso_slots (cupom_id, slot, limite, usos)
+    SELECT
+        p_cupom_id,
+        s,
+        v_base + CASE WHEN s < v_resto THEN 1 ELSE 0 END,
+        LEAST(
+            v_base + CASE WHEN s < v_resto THEN 1 ELSE 0 END,
+            GREATEST(v_usados - (s * v_base + LEAST(s, v_resto)), 0)
+        )
+    FROM generate_series(0, v_slots - 1) AS s;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION cupom_uso_slots_trigger()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM cupom_uso_slots_preparar(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cupom_uso_slots ON cupom;
+CREATE TRIGGER trg_cupom_uso_slots
+AFTER INSERT OR UPDATE OF uso_maximo ON cupom
+FOR EACH ROW
+EXECUTE FUNCTION cupom_uso_slots_trigger();
+
+-- Carga inicial
+SELECT cupom_uso_slots_preparar(id) FROM cupom;
+
+-- -----------------------------------------------------
+-- Cache de referência 'cupons' (ver sql/create-cache-referencia.sql)
+-- Só colunas de regra: a atualização periódica de uso_atual não invalida o cache
+-- -----------------------------------------------------
+DO $$
+BEGIN
+    IF to_regclass('public.cache_referencia_versoes') IS NOT NULL THEN
+        INSERT INTO cache_referencia_versoes (nome)
+        VALUES ('cupons')
+        ON CONFLICT (nome) DO NOTHING;
+
+        DROP TRIGGER IF EXISTS trg_cache_referencia_cupom ON cupom;
+        CREATE TRIGGER trg_cache_referencia_cupom
+        AFTER INSERT OR DELETE OR TRUNCATE
+            OR UPDATE OF codigo, tipo, valor, valor_minimo_pedido, validade_inicio, validade_fim,
+                         uso_maximo, uso_maximo_por_usuario, ativo, descricao
+        ON cupom
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION cache_referencia_incrementar_versao('cupons');
+    END IF;
+END $$;
@@ -0,0 +1,58 @@
+-- =====================================================
+-- FILA DE JOBS EM SEGUNDO PLANO
+-- =====================================================
+-- Fila durável (PostgreSQL) para trabalho que não deve rodar dentro das
+-- requisições HTTP: sincronização de pedidos com o Bling, emissão de NF-e,
+-- contas a receber, envio de estoque, etc.
+--
+-- Os jobs são enfileirados pelos handlers (webhooks, checkout, admin) e
+-- executados pelo worker separado:
+--     python scripts/job_worker.py
+--
+-- Ciclo de vida:
+--   pendente -> executando -> concluido
+--                          -> pendente (retry com backoff exponencial)
+--                          -> morto    (dead-letter após max_tentativas)
+
+CREATE TABLE IF NOT EXISTS fila_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    tipo VARCHAR(100) NOT NULL, -- Ex: 'bling.sync_order', 'bling.emit_nfe'
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    chave_idempotencia VARCHAR(255), -- Evita jobs duplicados enquanto um equivalente está ativo
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente'
+        CHECK (status IN ('pendente', 'executando', 'concluido', 'morto')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    max_tentativas INTEGER NOT NULL DEFAULT 5,
+    executar_em TIMESTAMP NOT NULL DEFAULT NOW(), -- Próxima execução (usado no backoff)
+    bloqueado_ate TIMESTAMP, -- Lease do worker; se expirar o job volta a ser elegível
+    bloqueado_por VARCHAR(100), -- Identificação do worker (host:pid)
+    ultimo_erro TEXT,
+    resultado JSONB,
+    criado_em TIMESTAMP DEFAULT NOW(),
+    atualizado_em TIMESTAMP DEFAULT NOW(),
+    concluido_em TIMESTAMP
+);
+
+-- Idempotência: só pode existir um job ativo (pendente/executando) por chave
+CREATE UNIQUE INDEX IF NOT EXISTS idx_fila_jobs_idempotencia_ativa
+    ON fila_jobs(chave_idempotencia)
+    WHERE status IN ('pendente', 'executando');
+
+-- Busca dos próximos jobs elegíveis
+CREATE INDEX IF NOT EXISTS idx_fila_jobs_pendentes
+    ON fila_jobs(executar_em, id)
+    WHERE status = 'pendente';
+
+-- Recuperação de jobs com lease expirado (worker morreu no meio da execução)
+CREATE INDEX IF NOT EXISTS idx_fila_jobs_executando
+    ON fila_jobs(bloqueado_ate)
+    WHERE status = 'executando';
+
+-- Consulta da dead-letter queue
+CREATE INDEX IF NOT EXISTS idx_fila_jobs_mortos
+    ON fila_jobs(tipo, atualizado_em DESC)
+    WHERE status = 'morto';
+
+COMMENT ON TABLE fila_jobs IS 'Fila durável de jobs em segundo plano (Bling, NF-e, financeiro, estoque)';
+COMMENT ON COLUMN fila_jobs.chave_idempotencia IS 'Chave única entre jobs ativos; enfileirar de novo com a mesma chave é ignorado';
+COMMENT ON COLUMN fila_jobs.bloqueado_ate IS 'Lease do worker; após expirar, outro worker pode retomar o job';
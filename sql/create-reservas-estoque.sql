@@ -0,0 +1,147 @@
+-- =====================================================
+-- RESERVAS DE ESTOQUE (CHECKOUT -> BAIXA NO BLING)
+-- =====================================================
+-- O estoque só é baixado quando o pedido vai para "Logística" no Bling;
+-- até lá, o checkout reserva as unidades para que dois compradores não
+-- levem a última peça.
+--
+-- estoque_reservado: um contador por produto (unidades em reservas ativas).
+-- Disponível para venda = produtos.estoque - estoque_reservado.reservado.
+-- A reserva é um único UPDATE condicional por checkout
+-- (... WHERE p.estoque - e.reservado >= quantidade RETURNING), que trava só
+-- a linha do contador - produtos e reservas_estoque não são travados, e o
+-- lock dura apenas até o commit do pedido.
+--
+-- reservas_estoque: uma linha por produto do pedido.
+--   ativa     -> segura o estoque (expira_em NULL depois do pagamento)
+--   consumida -> estoque baixado (Logística, pedido enviado/entregue)
+--   liberada  -> pedido cancelado/devolvido/reembolsado ou pagamento recusado
+--   expirada  -> PIX/boleto/cartão não pago dentro do prazo (job
+--                'estoque.expirar_reservas', enfileirado pelo worker)
+--
+-- Pedidos pagos mantêm a reserva até a baixa; se o Bling baixar o estoque
+-- antes (webhook stock.updated), as unidades contam duas vezes até a
+-- Logística: o erro é sempre para o lado de não vender a mais.
+
+CREATE TABLE IF NOT EXISTS estoque_reservado (
+    produto_id INTEGER PRIMARY KEY,
+    reservado INTEGER NOT NULL DEFAULT 0 CHECK (reservado >= 0),
+    atualizado_em TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+COMMENT ON TABLE estoque_reservado IS 'Unidades em reservas ativas por produto (disponível = produtos.estoque - reservado)';
+
+CREATE TABLE IF NOT EXISTS reservas_estoque (
+    id SERIAL PRIMARY KEY,
+    venda_id INTEGER NOT NULL REFERENCES vendas(id) ON DELETE CASCADE,
+    produto_id INTEGER NOT NULL,
+    quantidade INTEGER NOT NULL CHECK (quantidade > 0),
+    status VARCHAR(20) NOT NULL DEFAULT 'ativa'
+        CHECK (status IN ('ativa', 'consumida', 'liberada', 'expirada')),
+    expira_em TIMESTAMP,
+    criado_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    finalizada_em TIMESTAMP
+);
+
+COMMENT ON TABLE reservas_estoque IS 'Reservas de estoque dos pedidos entre o checkout e a baixa no Bling';
+
+CREATE INDEX IF NOT EXISTS idx_reservas_estoque_venda_ativa
+ON reservas_estoque (venda_id) WHERE status = 'ativa';
+
+CREATE INDEX IF NOT EXISTS idx_reservas_estoque_expiracao
+ON reservas_estoque (expira_em) WHERE status = 'ativa' AND expira_em IS NOT NULL;
+
+-- -----------------------------------------------------
+-- Finaliza as reservas ativas de um pedido e devolve as unidades ao contador
+-- p_somente_vencidas: apenas reservas com expira_em no passado (job de expiração)
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION reservas_estoque_finalizar(
+    p_venda_id INTEGER,
+    p_status VARCHAR,
+    p_somente_vencidas BOOLEAN DEFAULT FALSE
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_total INTEGER;
+BEGIN
+    -- Contadores travados sempre na mesma ordem (sem deadlock com checkouts)
+    PERFORM 1
+    FROM estoque_reservado
+    WHERE produto_id IN (
+        SELECT produto_id FROM reservas_estoque
+        WHERE venda_id = p_venda_id AND status = 'ativa'
+    )
+    ORDER BY produto_id
+    FOR UPDATE;
+
+    WITH finalizadas AS (
+        UPDATE reservas_estoque
+        SET status = p_status,
+            finalizada_em = NOW()
+        WHERE venda_id = p_venda_id
+        AND status = 'ativa'
+        AND (NOT p_somente_vencidas OR expira_em < NOW())
+        RETURNING produto_id, quantidade
+    ), por_produto AS (
+        SELECT produto_id, SUM(quantidade) AS quantidade
+        FROM finalizadas
+        GROUP BY produto_id
+    )
+    UPDATE estoque_reservado e
+    SET reservado = GREATEST(e.reservado - p.quantidade, 0),
+        atualizado_em = NOW()
+    FROM por_produto p
+    WHERE e.produto_id = p.produto_id;
+
+    GET DIAGNOSTICS v_total = ROW_COUNT;
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- -----------------------------------------------------
+-- Mudanças de status da venda (webhooks PagBank/Bling, admin, reconciliação)
+-- -----------------------------------------------------
+CREATE OR REPLACE FUNCTION reservas_estoque_status_venda()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.status_pedido IN ('cancelado_pelo_cliente', 'cancelado_pelo_vendedor', 'devolvido', 'reembolsado') THEN
+        PERFORM reservas_estoque_finalizar(NEW.id, 'liberada');
+    ELSIF NEW.status_pedido IN ('enviado', 'entregue') THEN
+        PERFORM reservas_estoque_finalizar(NEW.id, 'consumida');
+    ELSIF NEW.status_pedido NOT IN ('pendente', 'pendente_pagamento') THEN
+        -- Pagamento confirmado: a reserva não expira mais, segura até a baixa
+        UPDATE reservas_estoque
+        SET expira_em = NULL
+        WHERE venda_id = NEW.id
+        AND status = 'ativa'
+        AND expira_em IS NOT NULL;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_reservas_estoque_status_venda ON vendas;
+CREATE TRIGGER trg_reservas_estoque_status_venda
+AFTER UPDATE OF status_pedido ON vendas
+FOR EACH ROW
+WHEN (NEW.status_pedido IS DISTINCT FROM OLD.status_pedido)
+EXECUTE FUNCTION reservas_estoque_status_venda();
+
+-- Reserva ativa apagada (ex: venda excluída, ON DELETE CASCADE): devolver ao contador
+CREATE OR REPLACE FUNCTION reservas_estoque_apagada()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE estoque_reservado
+    SET reservado = GREATEST(reservado - OLD.quantidade, 0),
+        atualizado_em = NOW()
+    WHERE produto_id = OLD.produto_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_reservas_estoque_apagada ON reservas_estoque;
+CREATE TRIGGER trg_reservas_estoque_apagada
+AFTER DELETE ON reservas_estoque
+FOR EACH ROW
+WHEN (OLD.status = 'ativa')
+EXECUTE FUNCTION reservas_estoque_apagada();
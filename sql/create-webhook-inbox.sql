@@ -0,0 +1,68 @@
+-- =====================================================
+-- CAIXA DE ENTRADA DE WEBHOOKS (BLING, PAGBANK)
+-- =====================================================
+-- Os endpoints /api/webhook/bling e /api/webhook/pagbank só validam a
+-- origem (HMAC / headers), gravam o payload bruto aqui e respondem 200.
+-- O processamento (consultas, chamadas ao Bling/PagBank, NF-e) é feito
+-- pelo worker (python scripts/job_worker.py), fora da requisição.
+--
+-- Deduplicação: event_id é único ('bling:<eventId>'; no PagBank, que não
+-- envia id de evento, o hash do corpo). Reentregas do mesmo evento são
+-- ignoradas com ON CONFLICT DO NOTHING.
+--
+-- Ordem por entidade: eventos com a mesma entidade ('bling:pedido:<id>',
+-- 'bling:produto:<id>', 'pagbank:<pedido>') são processados um de cada vez,
+-- na ordem de chegada; entidades diferentes são processadas em paralelo
+-- pelos workers.
+--
+-- Eventos de saldo do Bling (stock.created/stock.updated) são gravados com
+-- processar_em = NOW() + WEBHOOK_STOCK_COALESCE_SECONDS e processados em lote
+-- (um worker por vez, advisory lock 7410002): por produto só o último saldo
+-- é aplicado; os anteriores ficam com resultado 'coalescido'.
+--
+-- Ciclo de vida:
+--   pendente -> processando -> processado
+--                           -> pendente (retry com backoff)
+--                           -> erro     (após WEBHOOK_INBOX_MAX_ATTEMPTS)
+-- Eventos processados são apagados após WEBHOOK_INBOX_RETENTION_DAYS.
+
+CREATE TABLE IF NOT EXISTS webhook_inbox (
+    id BIGSERIAL PRIMARY KEY,
+    origem VARCHAR(20) NOT NULL, -- 'bling', 'pagbank'
+    event_id VARCHAR(255) NOT NULL,
+    evento VARCHAR(100), -- Ex: 'order.updated', 'stock.updated'
+    entidade VARCHAR(255), -- Chave de ordenação (NULL = sem ordem)
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente'
+        CHECK (status IN ('pendente', 'processando', 'processado', 'erro')),
+    tentativas INTEGER NOT NULL DEFAULT 0,
+    processar_em TIMESTAMP NOT NULL DEFAULT NOW(), -- Próxima tentativa (backoff)
+    bloqueado_ate TIMESTAMP, -- Lease do worker
+    bloqueado_por VARCHAR(100),
+    ultimo_erro TEXT,
+    resultado JSONB,
+    recebido_em TIMESTAMP NOT NULL DEFAULT NOW(),
+    processado_em TIMESTAMP
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_inbox_event_id
+    ON webhook_inbox(event_id);
+
+-- Próximos eventos elegíveis
+CREATE INDEX IF NOT EXISTS idx_webhook_inbox_pendentes
+    ON webhook_inbox(id)
+    WHERE status IN ('pendente', 'processando');
+
+-- Verificação de eventos anteriores da mesma entidade ainda não processados
+CREATE INDEX IF NOT EXISTS idx_webhook_inbox_entidade_abertos
+    ON webhook_inbox(entidade, id)
+    WHERE status IN ('pendente', 'processando');
+
+-- Limpeza por retenção
+CREATE INDEX IF NOT EXISTS idx_webhook_inbox_processados
+    ON webhook_inbox(processado_em)
+    WHERE status = 'processado';
+
+COMMENT ON TABLE webhook_inbox IS 'Webhooks recebidos (payload bruto) aguardando processamento pelo worker';
+COMMENT ON COLUMN webhook_inbox.event_id IS 'Identificador único do evento (deduplica reentregas)';
+COMMENT ON COLUMN webhook_inbox.entidade IS 'Eventos da mesma entidade são processados em ordem, um de cada vez';